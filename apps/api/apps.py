@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+class ApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.api'
+    verbose_name = 'API'
+    
+    def ready(self):
+        """Registrar la invalidación de la caché de tokens"""
+        import apps.api.token_cache  # noqa F401
@@ -13,6 +13,7 @@ from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import get_user_model
 from apps.companies.models import CompanyAPIToken
+from apps.api.token_cache import get_company_token, record_usage
 from rest_framework.authtoken.models import Token
 
 logger = logging.getLogger(__name__)
@@ -45,7 +46,7 @@ class DualTokenAuthentication(BaseAuthentication):
         
         # 🔍 DETERMINAR TIPO DE TOKEN
         if token_key.startswith('vsr_'):
-            logger.info(f"🔑 Company token detected: {token_key[:12]}...")
+            logger.debug(f"🔑 Company token detected: {token_key[:12]}...")
             return self.authenticate_company_token(request, token_key)
         else:
             logger.info(f"👤 User token detected: {token_key[:12]}...")
@@ -55,13 +56,14 @@ class DualTokenAuthentication(BaseAuthentication):
         """
         Autenticar con token de empresa
         
+        El token sale de la caché local (token_cache) y el uso se acumula en
+        Redis: en un acierto de caché no hay consultas ni UPDATE a la BD.
+        
         Returns:
             (VirtualCompanyUser, CompanyAPIToken)
         """
         try:
-            company_token = CompanyAPIToken.objects.select_related('company').get(
-                key=token_key
-            )
+            company_token = get_company_token(token_key)
             
             # Verificar validez del token
             if not company_token.is_valid():
@@ -71,8 +73,8 @@ class DualTokenAuthentication(BaseAuthentication):
             # Obtener IP del cliente para estadísticas
             client_ip = self.get_client_ip(request)
             
-            # Incrementar estadísticas de uso
-            company_token.increment_usage(ip_address=client_ip)
+            # Incrementar estadísticas de uso (escritura diferida)
+            record_usage(company_token, ip_address=client_ip)
             
             # Crear usuario virtual para la empresa
             virtual_user = VirtualCompanyUser(company_token.company)
@@ -83,7 +85,7 @@ class DualTokenAuthentication(BaseAuthentication):
             request.token_type = 'company'
             request.token_permissions = company_token.get_permissions()
             
-            logger.info(f"✅ Company token authenticated: {company_token.company.business_name}")
+            logger.debug(f"✅ Company token authenticated: {company_token.company.business_name}")
             
             return (virtual_user, company_token)
             
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga del rate limiter por token
+apps/api/management/commands/rate_limit_loadtest.py
+
+Lanza verificaciones concurrentes contra el script GCRA en Redis con tokens
+sintéticos (ids negativos, sin tocar las cuotas reales) y reporta latencia
+por verificación, throughput y cuántas requests pasaron frente a la cuota.
+"""
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.api import throttling
+from apps.companies.models import CompanyAPIToken
+
+
+class Command(BaseCommand):
+    help = 'Mide la sobrecarga del rate limiter por token de empresa (GCRA en Redis)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=10000, help='Verificaciones totales')
+        parser.add_argument('--threads', type=int, default=8, help='Hilos concurrentes')
+        parser.add_argument('--tokens', type=int, default=10, help='Tokens sintéticos')
+        parser.add_argument('--per-hour', type=int, default=500, help='Cuota por hora de cada token')
+        parser.add_argument('--per-day', type=int, default=10000, help='Cuota por día de cada token')
+
+    def handle(self, *args, **options):
+        tokens = [
+            CompanyAPIToken(pk=-(index + 1), requests_per_hour=options['per_hour'], requests_per_day=options['per_day'])
+            for index in range(options['tokens'])
+        ]
+        if throttling._get_script() is None:
+            raise CommandError('Redis no disponible')
+        redis_conn = throttling._get_script().registered_client
+        keys = [throttling._key(token, name) for token in tokens for name, _, _ in throttling.WINDOWS]
+        redis_conn.delete(*keys)
+
+        def check(index):
+            started = time.perf_counter()
+            result = throttling.check_token_rate_limit(tokens[index % len(tokens)])
+            return (time.perf_counter() - started) * 1e6, result
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                results = list(executor.map(check, range(options['requests'])))
+        finally:
+            redis_conn.delete(*keys)
+        elapsed = time.perf_counter() - started
+
+        failed = sum(1 for _, result in results if result is None)
+        if failed:
+            raise CommandError(f'{failed} verificaciones fallaron (fail-open): revisar Redis')
+
+        latencies = sorted(latency for latency, _ in results)
+        allowed = sum(1 for _, result in results if result['allowed'])
+        expected = min(options['requests'], len(tokens) * min(options['per_hour'], options['per_day']))
+
+        self.stdout.write(
+            f"   {options['requests']} verificaciones, {options['threads']} hilos, {len(tokens)} tokens: "
+            f"{options['requests'] / elapsed:.0f}/s"
+        )
+        self.stdout.write(
+            f"   latencia: p50 {statistics.median(latencies):.0f} us, "
+            f"p99 {latencies[int(len(latencies) * 0.99)]:.0f} us, máx {latencies[-1]:.0f} us"
+        )
+        self.stdout.write(f"   permitidas {allowed} (cuota {expected}), rechazadas {options['requests'] - allowed}")
+        style = self.style.SUCCESS if allowed == expected else self.style.WARNING
+        self.stdout.write(style(f"🚦 Rate limiter: {'cuotas exactas' if allowed == expected else 'cuotas desviadas'}"))
@@ -588,10 +588,18 @@ class VendoSRIPermission(permissions.BasePermission):
 
 class CompanySecurityMiddleware(MiddlewareMixin):
     """
-    Middleware de seguridad para empresas - SIN CAMBIOS
+    Middleware de seguridad para empresas
+    
+    Agrega los headers X-RateLimit-* cuando CompanyTokenRateThrottle evaluó
+    las cuotas del token de empresa en la request.
     """
     def process_request(self, request):
         return None
     
     def process_response(self, request, response):
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit:
+            from apps.api.throttling import rate_limit_headers
+            for header, value in rate_limit_headers(rate_limit).items():
+                response[header] = value
         return response
\ No newline at end of file
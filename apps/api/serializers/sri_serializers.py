@@ -5,6 +5,7 @@ Serializers for SRI integration - VERSIÓN FINAL INTEGRADA Y CORREGIDA
 
 from rest_framework import serializers
 from django.db import transaction
+from django.urls import reverse
 from decimal import Decimal, ROUND_HALF_UP
 from apps.sri_integration.models import (
     ElectronicDocument, 
@@ -222,26 +223,24 @@ class ElectronicDocumentSerializer(serializers.ModelSerializer):
             'updated_at'
         ]
     
-    def get_xml_file_url(self, obj):
-        if obj.xml_file:
+    def _download_url(self, obj, field_file, artifact):
+        # Los XML están comprimidos en el almacén: se descargan por la API, no por MEDIA_URL
+        if field_file:
             request = self.context.get('request')
             if request:
-                return request.build_absolute_uri(obj.xml_file.url)
+                return request.build_absolute_uri(
+                    reverse('api:sri-documents-download', kwargs={'pk': obj.pk, 'artifact': artifact})
+                )
         return None
+
+    def get_xml_file_url(self, obj):
+        return self._download_url(obj, obj.xml_file, 'xml')
     
     def get_signed_xml_file_url(self, obj):
-        if obj.signed_xml_file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.signed_xml_file.url)
-        return None
+        return self._download_url(obj, obj.signed_xml_file, 'signed_xml')
     
     def get_pdf_file_url(self, obj):
-        if obj.pdf_file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.pdf_file.url)
-        return None
+        return self._download_url(obj, obj.pdf_file, 'pdf')
 
 
 class ElectronicDocumentCreateSerializer(serializers.ModelSerializer):
@@ -461,6 +460,10 @@ class SRIResponseSerializer(serializers.ModelSerializer):
             'operation_type_display',
             'response_code',
             'response_message',
+            'state',
+            'authorization_number',
+            'authorization_date',
+            'error_codes',
             'raw_response',
             'created_at'
         ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+Tareas Celery de la API
+apps/api/tasks.py
+"""
+
+import logging
+
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def flush_api_token_usage():
+    """
+    Vuelca a la BD las estadísticas de uso de los tokens de empresa acumuladas
+    en Redis (total_requests, last_used_at, last_used_ip).
+    """
+    from apps.api.token_cache import flush_usage
+    try:
+        return flush_usage()
+    except Exception as e:
+        logger.error(f"❌ Error flushing API token usage: {e}")
+        return {'error': str(e)}
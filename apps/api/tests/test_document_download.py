@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la descarga de artefactos de documentos por la API
+apps/api/tests/test_document_download.py
+"""
+
+import datetime
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.companies.models import Company
+from apps.sri_integration.models import ElectronicDocument
+
+XML = '<?xml version="1.0" encoding="UTF-8"?><factura id="comprobante"><razonSocial>José Pérez</razonSocial></factura>'
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DocumentDownloadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            email='admin@example.com', password='secret'
+        )
+        cls.company = Company.objects.create(
+            ruc='1790012345001',
+            business_name='COMERCIAL ANDINA S.A.',
+            email='facturas@andina.ec',
+            address='Av. Amazonas N24-03 y Colón',
+        )
+        cls.document = ElectronicDocument.objects.create(
+            company=cls.company,
+            document_type='INVOICE',
+            issue_date=datetime.date(2026, 10, 15),
+            customer_identification_type='05',
+            customer_identification='1712345678',
+            customer_name='José Pérez',
+            subtotal_without_tax=Decimal('10.00'),
+            total_tax=Decimal('1.50'),
+            total_amount=Decimal('11.50'),
+            status='SIGNED',
+        )
+
+    def setUp(self):
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(MEDIA_ROOT=media_root, SRI_ARTIFACT_STORE=True))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.document.xml_file.save(f'{self.document.access_key}.xml', ContentFile(XML.encode('utf-8')), save=True)
+
+    def get_xml_url(self):
+        response = self.client.get(f'/api/sri/documents/{self.document.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['xml_file_url']
+
+    def test_stored_xml_is_compressed(self):
+        self.assertTrue(self.document.xml_file.name.endswith(('.zst', '.gz')))
+
+    def test_xml_file_url_returns_plain_xml(self):
+        url = self.get_xml_url()
+
+        self.assertIn(f'/api/sri/documents/{self.document.pk}/download/xml/', url)
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/xml')
+        self.assertEqual(b''.join(response.streaming_content).decode('utf-8'), XML)
+
+    def test_xml_download_supports_range(self):
+        response = self.client.get(self.get_xml_url(), HTTP_RANGE='bytes=0-4')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'<?xml')
+        self.assertEqual(response['Content-Range'], f'bytes 0-4/{len(XML.encode("utf-8"))}')
+
+    def test_missing_artifact_has_no_url_and_returns_404(self):
+        response = self.client.get(f'/api/sri/documents/{self.document.pk}/')
+        self.assertIsNone(response.json()['signed_xml_file_url'])
+
+        response = self.client.get(f'/api/sri/documents/{self.document.pk}/download/signed_xml/')
+        self.assertEqual(response.status_code, 404)
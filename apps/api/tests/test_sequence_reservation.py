@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la reserva de secuenciales fuera de la transacción de la vista
+apps/api/tests/test_sequence_reservation.py
+"""
+
+import contextlib
+from unittest import mock
+
+from django.test import SimpleTestCase
+from rest_framework import status
+
+from apps.api.views import sri_views
+from apps.api.views.sri_views import sri_secure_endpoint
+
+
+class ReserveDocumentSequenceTests(SimpleTestCase):
+
+    def setUp(self):
+        self.events = []
+
+        @contextlib.contextmanager
+        def fake_atomic(*args, **kwargs):
+            self.events.append('atomic')
+            yield
+
+        patcher = mock.patch.object(sri_views.transaction, 'atomic', fake_atomic)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.sri_config = mock.Mock(id=1)
+        self.request = mock.Mock(validated_sri_config=self.sri_config)
+
+    def build_view(self):
+        @sri_secure_endpoint(require_company_access=False, atomic=True, sequence_type='INVOICE')
+        def view(viewset, request):
+            self.events.append('view')
+            return request.reserved_sequence
+        return view
+
+    def test_sequence_is_reserved_before_the_transaction_opens(self):
+        def reserve(document_type):
+            self.events.append('reserve')
+            return 42
+        self.sri_config.get_next_sequence.side_effect = reserve
+
+        result = self.build_view()(None, self.request)
+
+        self.assertEqual(result, 42)
+        self.assertEqual(self.events, ['reserve', 'atomic', 'view'])
+        self.sri_config.get_next_sequence.assert_called_once_with('INVOICE')
+
+    def test_reservation_error_does_not_open_the_transaction(self):
+        self.sri_config.get_next_sequence.side_effect = RuntimeError('db down')
+
+        response = self.build_view()(None, self.request)
+
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(response.data['error'], 'SEQUENCE_RESERVATION_ERROR')
+        self.assertEqual(self.events, [])
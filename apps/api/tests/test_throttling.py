@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de las cuotas por token de empresa (GCRA en Redis)
+apps/api/tests/test_throttling.py
+"""
+
+import math
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, override_settings
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from apps.api import throttling
+from apps.api.permissions import CompanySecurityMiddleware
+from apps.api.throttling import _GCRA_SCRIPT, CompanyTokenRateThrottle, check_token_rate_limit
+from apps.companies.models import CompanyAPIToken
+
+
+class FakeRedis:
+    """Claves TAT en memoria y el script GCRA con un reloj controlado por el test."""
+
+    def __init__(self):
+        self.data = {}
+        self.now = 1_800_000_000_000  # ms, como redis.call('TIME')
+
+    def register_script(self, script):
+        assert script == _GCRA_SCRIPT
+
+        def gcra(keys, args):
+            # Misma secuencia que el Lua: primero decide, luego guarda y reporta
+            now = self.now
+            peek = args[0] == '1'
+            windows = [(float(args[1 + i * 2]), float(args[2 + i * 2])) for i in range(len(keys))]
+            allowed, retry_after, tats = 1, 0, []
+            for key, (limit, period) in zip(keys, windows):
+                tat = max(self.data.get(key, now), now)
+                new_tat = tat + period / limit
+                if new_tat - now > period:
+                    allowed = 0
+                    retry_after = max(retry_after, new_tat - period - now)
+                    tats.append(tat)
+                else:
+                    tats.append(new_tat)
+            result = [allowed, math.ceil(retry_after)]
+            for key, (limit, period), tat in zip(keys, windows, tats):
+                if not allowed:
+                    tat = max(self.data.get(key, now), now)
+                elif not peek:
+                    self.data[key] = tat
+                result.append(max(0, math.floor((period - (tat - now)) / (period / limit))))
+                result.append(math.ceil(tat - now))
+            return result
+        return gcra
+
+
+class PingView(APIView):
+    authentication_classes = []
+    permission_classes = []
+    throttle_classes = [CompanyTokenRateThrottle]
+
+    def get(self, request):
+        return Response({'ok': True})
+
+
+@override_settings(API_RATE_LIMIT_ENABLED=True)
+class CompanyTokenRateLimitTests(SimpleTestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch.object(throttling, '_get_script', return_value=self.redis.register_script(_GCRA_SCRIPT))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.token = CompanyAPIToken(pk=7, key='vsr_' + 'a' * 40, requests_per_hour=3, requests_per_day=1000)
+        self.middleware = CompanySecurityMiddleware(PingView.as_view())
+        self.factory = APIRequestFactory()
+
+    def request(self):
+        request = self.factory.get('/api/ping/')
+        force_authenticate(request, user=AnonymousUser(), token=self.token)
+        return self.middleware(request)
+
+    def test_hourly_quota_is_exhausted_and_refills(self):
+        results = [check_token_rate_limit(self.token) for _ in range(4)]
+
+        self.assertEqual([result['allowed'] for result in results], [True, True, True, False])
+        self.assertEqual([result['remaining'] for result in results], [2, 1, 0, 0])
+        self.assertEqual(results[2]['window'], 'hour')
+        self.assertEqual(results[2]['windows']['day']['remaining'], 997)
+        # Una request cada hora / 3 = 20 minutos
+        self.assertEqual(results[3]['retry_after'], 1200)
+
+        self.redis.now += 1200 * 1000
+        self.assertTrue(check_token_rate_limit(self.token)['allowed'])
+        self.assertFalse(check_token_rate_limit(self.token)['allowed'])
+
+    def test_peek_does_not_consume(self):
+        for _ in range(3):
+            self.assertTrue(check_token_rate_limit(self.token, peek=True)['allowed'])
+
+        self.assertEqual(self.redis.data, {})
+        self.assertTrue(self.token.check_rate_limit('hour'))
+
+    def test_rejected_request_gets_429_with_rate_limit_headers(self):
+        for remaining in ('2', '1', '0'):
+            response = self.request()
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['X-RateLimit-Limit'], '3')
+            self.assertEqual(response['X-RateLimit-Remaining'], remaining)
+            self.assertEqual(response['X-RateLimit-Window'], 'hour')
+            self.assertNotIn('Retry-After', response)
+
+        response = self.request()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1200')
+        self.assertEqual(response['X-RateLimit-Limit'], '3')
+        self.assertEqual(response['X-RateLimit-Remaining'], '0')
+        self.assertEqual(response['X-RateLimit-Reset'], '3600')
+
+    def test_redis_failure_allows_the_request(self):
+        with mock.patch.object(throttling, '_get_script', return_value=mock.Mock(side_effect=ConnectionError)):
+            response = self.request()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-RateLimit-Limit', response)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la caché de tokens de empresa y del buffer de uso
+apps/api/tests/test_token_cache.py
+"""
+
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.api import token_cache
+from apps.api.token_cache import TokenCache, UsageBuffer
+from apps.companies.models import Company, CompanyAPIToken
+
+
+class UsageBufferPushTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(token_cache, '_get_redis', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        write_patcher = mock.patch.object(token_cache, 'write_usage')
+        self.write_usage = write_patcher.start()
+        self.addCleanup(write_patcher.stop)
+
+    @override_settings(API_TOKEN_USAGE_PUSH_INTERVAL=0.05)
+    def test_background_thread_pushes_without_more_traffic(self):
+        buffer = UsageBuffer()
+        self.addCleanup(buffer.close)
+
+        buffer.record(1, '10.0.0.1')
+        buffer.record(1)
+        self.write_usage.assert_not_called()
+
+        deadline = time.monotonic() + 2
+        while not self.write_usage.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.write_usage.assert_called_once()
+        (usage,), _ = self.write_usage.call_args
+        self.assertEqual(usage[1][0], 2)
+        self.assertEqual(usage[1][2], '10.0.0.1')
+
+    @override_settings(API_TOKEN_USAGE_PUSH_INTERVAL=60)
+    def test_close_pushes_pending_usage_and_is_registered_atexit(self):
+        with mock.patch.object(token_cache.atexit, 'register') as register:
+            buffer = UsageBuffer()
+            buffer.record(3)
+            buffer.record(3)
+
+        register.assert_called_once_with(buffer.close)
+        self.assertEqual(buffer.close(), 1)
+        (usage,), _ = self.write_usage.call_args
+        self.assertEqual(usage[3][0], 2)
+        buffer._pusher.join(timeout=1)
+        self.assertFalse(buffer._pusher.is_alive())
+
+    @override_settings(API_TOKEN_USAGE_PUSH_INTERVAL=60)
+    def test_one_pusher_per_process(self):
+        buffer = UsageBuffer()
+        self.addCleanup(buffer.close)
+
+        buffer.record(1)
+        pusher = buffer._pusher
+        buffer.record(2)
+        self.assertIs(buffer._pusher, pusher)
+
+        # Tras un fork el hilo no existe en el hijo: se arranca otro
+        with mock.patch.object(token_cache.os, 'getpid', return_value=-1):
+            buffer.record(3)
+        self.assertIsNot(buffer._pusher, pusher)
+
+
+class TokenInvalidationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(
+            ruc='1790012345001',
+            business_name='COMERCIAL ANDINA S.A.',
+            trade_name='Andina',
+            email='facturas@andina.ec',
+            phone='022345678',
+            address='Av. Amazonas N24-03 y Colón',
+            ciudad='Quito',
+            provincia='Pichincha',
+        )
+        cls.token, _ = CompanyAPIToken.objects.get_or_create(
+            company=cls.company,
+            defaults={'key': 'vsr_' + 'a' * 40, 'name': 'Integración'},
+        )
+
+    def setUp(self):
+        patcher = mock.patch.object(token_cache, '_get_redis', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache_patcher = mock.patch.object(token_cache, 'token_cache', TokenCache())
+        self.cache = cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+    def test_token_save_invalidates_after_commit(self):
+        self.cache.get(self.token.key)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.token.name = 'Renombrado'
+            self.token.save()
+            # Aún sin confirmar: la caché no se limpió
+            self.assertEqual(self.cache.get_stats()['size'], 1)
+
+        self.assertEqual(self.cache.stats['invalidations'], 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.cache.stats['invalidations'], 1)
+        self.assertEqual(self.cache.get_stats()['size'], 0)
+
+    def test_usage_fields_do_not_invalidate(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.token.save(update_fields=['last_used_ip'])
+
+        self.assertEqual(callbacks, [])
+
+    def test_company_update_invalidates_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.company.trade_name = 'Andina Norte'
+            self.company.save()
+
+        self.assertEqual(self.cache.stats['invalidations'], 0)
+        for callback in callbacks:
+            callback()
+        self.assertGreaterEqual(self.cache.stats['invalidations'], 1)
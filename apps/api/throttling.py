@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Rate limiting por token de empresa
+apps/api/throttling.py
+
+Cada CompanyAPIToken tiene sus cuotas (requests_per_hour, requests_per_day).
+Se aplican con GCRA (generic cell rate algorithm) en Redis:
+- Por ventana se guarda solo el TAT (theoretical arrival time) en una clave
+  con expiración; permite ráfagas de hasta toda la cuota y luego una request
+  cada periodo / cuota (equivalente a una ventana deslizante, sin listas)
+- Un script Lua evalúa la hora y el día juntos con el reloj de Redis: un solo
+  round trip por request, atómico entre workers y sin desfase de relojes
+- Resultado en la request (`rate_limit`); CompanySecurityMiddleware agrega
+  X-RateLimit-Limit / -Remaining / -Reset y DRF responde 429 con Retry-After
+
+Si Redis no está disponible no se bloquea el tráfico (fail-open).
+"""
+
+import logging
+import math
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle, UserRateThrottle
+
+from apps.companies.models import CompanyAPIToken
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'api:ratelimit'
+
+# (nombre, campo del token con la cuota, periodo en ms); cuota 0 = sin límite
+WINDOWS = (
+    ('hour', 'requests_per_hour', 3600 * 1000),
+    ('day', 'requests_per_day', 86400 * 1000),
+)
+
+# KEYS: TAT por ventana. ARGV[1]: 1 = solo consultar (no consume);
+# luego cuota y periodo (ms) por ventana.
+# Retorna {permitido, retry_after_ms, restantes_1, reset_ms_1, restantes_2, reset_ms_2, ...}
+_GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local peek = ARGV[1] == '1'
+local allowed = 1
+local retry_after = 0
+local tats = {}
+for i = 1, #KEYS do
+    local limit = tonumber(ARGV[i * 2])
+    local period = tonumber(ARGV[i * 2 + 1])
+    local interval = period / limit
+    local tat = math.max(tonumber(redis.call('GET', KEYS[i]) or now), now)
+    local new_tat = tat + interval
+    if new_tat - now > period then
+        allowed = 0
+        retry_after = math.max(retry_after, new_tat - period - now)
+        tats[i] = tat
+    else
+        tats[i] = new_tat
+    end
+end
+local result = {allowed, math.ceil(retry_after)}
+for i = 1, #KEYS do
+    local limit = tonumber(ARGV[i * 2])
+    local period = tonumber(ARGV[i * 2 + 1])
+    local interval = period / limit
+    local tat = tats[i]
+    if allowed == 0 then
+        tat = math.max(tonumber(redis.call('GET', KEYS[i]) or now), now)
+    elseif not peek then
+        redis.call('SET', KEYS[i], tostring(tat), 'PX', math.ceil(tat - now) + 1)
+    end
+    table.insert(result, math.max(0, math.floor((period - (tat - now)) / interval)))
+    table.insert(result, math.ceil(tat - now))
+end
+return result
+"""
+
+_script = None
+
+
+def _get_script():
+    global _script
+    if _script is None:
+        try:
+            from django_redis import get_redis_connection
+            _script = get_redis_connection('default').register_script(_GCRA_SCRIPT)
+        except Exception as e:
+            logger.warning(f"Redis not available for API rate limiting: {e}")
+            return None
+    return _script
+
+
+def _key(token, window):
+    # Hash tag {id}: las claves de un token caen en el mismo slot (Redis Cluster)
+    return f"{KEY_PREFIX}:{{{token.pk}}}:{window}"
+
+
+def check_token_rate_limit(token, windows=None, peek=False):
+    """
+    Evalúa las cuotas del token y consume una request (salvo peek=True).
+
+    Args:
+        token: CompanyAPIToken
+        windows: subconjunto de ('hour', 'day'); None = ambas
+        peek: solo consultar si la próxima request pasaría
+
+    Returns:
+        dict con allowed, limit, remaining, reset y retry_after (segundos) de la
+        ventana más restrictiva, más `windows` con el detalle por ventana; None
+        si el límite está deshabilitado o Redis no responde (fail-open)
+    """
+    if not getattr(settings, 'API_RATE_LIMIT_ENABLED', True):
+        return None
+
+    selected = [
+        (name, getattr(token, field), period)
+        for name, field, period in WINDOWS
+        if (windows is None or name in windows) and getattr(token, field)
+    ]
+    if not selected:
+        return None
+
+    script = _get_script()
+    if script is None:
+        return None
+
+    args = ['1' if peek else '0']
+    for _, limit, period in selected:
+        args.extend([limit, period])
+    try:
+        values = script(keys=[_key(token, name) for name, _, _ in selected], args=args)
+    except Exception as e:
+        logger.warning(f"API rate limit check failed for token {token.pk}, allowing request: {e}")
+        return None
+
+    detail = {}
+    for index, (name, limit, _) in enumerate(selected):
+        remaining, reset_ms = values[2 + index * 2], values[3 + index * 2]
+        detail[name] = {'limit': limit, 'remaining': int(remaining), 'reset': math.ceil(int(reset_ms) / 1000)}
+
+    binding = min(detail, key=lambda name: (detail[name]['remaining'], -detail[name]['reset']))
+    return {
+        'allowed': bool(values[0]),
+        'retry_after': math.ceil(int(values[1]) / 1000),
+        'window': binding,
+        **detail[binding],
+        'windows': detail,
+    }
+
+
+def rate_limit_headers(result):
+    """Headers X-RateLimit-* (y Retry-After si se rechazó) para una respuesta."""
+    headers = {
+        'X-RateLimit-Limit': str(result['limit']),
+        'X-RateLimit-Remaining': str(result['remaining']),
+        'X-RateLimit-Reset': str(result['reset']),
+        'X-RateLimit-Window': result['window'],
+    }
+    if not result['allowed']:
+        headers['Retry-After'] = str(max(result['retry_after'], 1))
+    return headers
+
+
+# ============================================================================
+# Throttles DRF
+# ============================================================================
+class CompanyTokenRateThrottle(BaseThrottle):
+    """
+    Cuotas propias de cada token de empresa (requests_per_hour / requests_per_day).
+    No aplica a tokens de usuario ni a sesiones.
+    """
+
+    def allow_request(self, request, view):
+        self.result = None
+        token = request.auth
+        if not isinstance(token, CompanyAPIToken):
+            return True
+
+        self.result = check_token_rate_limit(token)
+        if self.result is None:
+            return True
+
+        # Para CompanySecurityMiddleware (la HttpRequest original, no la de DRF)
+        request._request.rate_limit = self.result
+        if not self.result['allowed']:
+            logger.warning(
+                f"🚦 Rate limit exceeded for company token {token.pk} "
+                f"({self.result['window']}: {self.result['limit']}), retry in {self.result['retry_after']}s"
+            )
+        return self.result['allowed']
+
+    def wait(self):
+        if self.result is None:
+            return None
+        return max(self.result['retry_after'], 1)
+
+
+class UserTokenRateThrottle(UserRateThrottle):
+    """
+    Tasa global 'user' de DRF solo para usuarios: los tokens de empresa se
+    limitan con sus propias cuotas (CompanyTokenRateThrottle).
+    """
+
+    def get_cache_key(self, request, view):
+        if isinstance(request.auth, CompanyAPIToken):
+            return None
+        return super().get_cache_key(request, view)
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+Caché de tokens de empresa y estadísticas de uso con escritura diferida
+apps/api/token_cache.py
+
+Cada request con token vsr_ hacía un SELECT del token (con su empresa) y un
+UPDATE de total_requests / last_used_at / last_used_ip sobre la misma fila:
+los integradores con mucho tráfico se serializaban en esa fila. Ahora:
+- Token + empresa en una caché local del proceso (LRU de
+  API_TOKEN_CACHE_MAX_SIZE entradas, TTL corto API_TOKEN_CACHE_TTL)
+- Invalidación: guardar/borrar un token o guardar una empresa limpia la caché
+  local e incrementa una generación en Redis; los demás procesos la consultan
+  como máximo cada API_TOKEN_CACHE_SYNC_INTERVAL segundos. Los `.update()`
+  masivos no emiten señales: ahí rige el TTL. La invalidación corre al
+  confirmarse la transacción (on_commit): antes otro request podía volver a
+  cachear la fila vieja
+- Uso: se acumula en memoria y un hilo de fondo por proceso lo envía a Redis
+  (HINCRBY en pipeline) cada API_TOKEN_USAGE_PUSH_INTERVAL segundos, también
+  sin tráfico, y una última vez al salir (atexit); flush_api_token_usage
+  (Celery beat) lo vuelca a la BD por lotes, un UPDATE por token con
+  F('total_requests') + n
+- Sin Redis: la invalidación queda en el TTL y el buffer local se vuelca
+  directo a la BD en cada envío (un UPDATE por token y no uno por request)
+"""
+
+import atexit
+import copy
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.companies.models import Company, CompanyAPIToken
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'api:tokens:generation'
+USAGE_KEY_PREFIX = 'api:tokens:usage:'
+DIRTY_SET_KEY = 'api:tokens:dirty'
+
+# Tras un fallo de Redis no se reintenta en cada request
+REDIS_RETRY_SECONDS = 30
+
+# Campos que escribe el volcado de uso: no invalidan la caché
+USAGE_FIELDS = frozenset({'total_requests', 'last_used_at', 'last_used_ip'})
+
+
+def _get_redis():
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except Exception as e:
+        logger.warning(f"Redis not available for API token cache: {e}")
+        return None
+
+
+def _detached(token):
+    """Copia para la request: la instancia cacheada se comparte entre hilos."""
+    token_copy = copy.copy(token)
+    token_copy.company = copy.copy(token.company)
+    return token_copy
+
+
+# ============================================================================
+# Caché de tokens
+# ============================================================================
+class TokenCache:
+    """Token + empresa por clave, local al proceso."""
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._ttl = getattr(settings, 'API_TOKEN_CACHE_TTL', 30)
+        self._max_size = getattr(settings, 'API_TOKEN_CACHE_MAX_SIZE', 1000)
+        self._sync_interval = getattr(settings, 'API_TOKEN_CACHE_SYNC_INTERVAL', 1.0)
+        self._generation = None
+        self._next_sync = 0.0
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, key):
+        """
+        Token con su empresa (copia). Lanza CompanyAPIToken.DoesNotExist como
+        la consulta original; los tokens inexistentes no se cachean.
+        """
+        now = time.monotonic()
+        if now >= self._next_sync:
+            self._sync_generation(now)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            self.stats['hits'] += 1
+            return _detached(entry[1])
+
+        self.stats['misses'] += 1
+        token = CompanyAPIToken.objects.select_related('company').get(key=key)
+        with self._lock:
+            self._entries[key] = (now + self._ttl, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return _detached(token)
+
+    def _sync_generation(self, now):
+        """Limpia la caché si otro proceso invalidó desde la última consulta."""
+        self._next_sync = now + self._sync_interval
+        redis_conn = _get_redis()
+        if redis_conn is None:
+            self._next_sync = now + REDIS_RETRY_SECONDS
+            return
+        try:
+            generation = redis_conn.get(GENERATION_KEY)
+        except Exception as e:
+            logger.warning(f"Could not read API token cache generation: {e}")
+            self._next_sync = now + REDIS_RETRY_SECONDS
+            return
+        if generation != self._generation:
+            if self._generation is not None:
+                self.clear()
+            self._generation = generation
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self):
+        """
+        Limpia la caché local y avisa a los demás procesos. Se limpia todo (no
+        solo una clave): un token regenerado deja su clave anterior en caché.
+        """
+        self.clear()
+        self.stats['invalidations'] += 1
+        redis_conn = _get_redis()
+        if redis_conn is None:
+            return
+        try:
+            self._generation = str(redis_conn.incr(GENERATION_KEY)).encode()
+        except Exception as e:
+            logger.warning(f"Could not publish API token cache invalidation: {e}")
+
+    def get_stats(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'size': len(self._entries),
+            'max_size': self._max_size,
+            'ttl': self._ttl,
+            'hit_rate': round(self.stats['hits'] / lookups * 100, 2) if lookups else 0.0,
+        }
+
+
+# ============================================================================
+# Uso con escritura diferida
+# ============================================================================
+class UsageBuffer:
+    """
+    Contadores de uso por token, acumulados en memoria y enviados por lotes.
+    El hilo de envío arranca con el primer record() de cada proceso (los
+    workers de gunicorn se crean por fork y no heredan hilos).
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._push_interval = getattr(settings, 'API_TOKEN_USAGE_PUSH_INTERVAL', 1.0)
+        self._next_push = time.monotonic() + self._push_interval
+        self._redis_retry_at = 0.0
+        self._pusher = None
+        self._pusher_pid = None
+        self._stopped = threading.Event()
+
+    def _ensure_pusher(self):
+        if self._pusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._pusher_pid == os.getpid():
+                return
+            self._pusher_pid = os.getpid()
+            self._pusher = threading.Thread(target=self._push_loop, name='api-token-usage', daemon=True)
+            self._pusher.start()
+        atexit.register(self.close)
+
+    def _push_loop(self):
+        while not self._stopped.wait(self._push_interval):
+            try:
+                self.push()
+            except Exception as e:
+                logger.error(f"❌ Error pushing API token usage: {e}")
+
+    def close(self):
+        """Detiene el hilo de envío y envía lo pendiente (atexit)."""
+        self._stopped.set()
+        return self.push()
+
+    def record(self, token_id, ip_address=None):
+        self._ensure_pusher()
+        now = timezone.now()
+        with self._lock:
+            entry = self._pending.get(token_id)
+            if entry is None:
+                self._pending[token_id] = [1, now, ip_address]
+            else:
+                entry[0] += 1
+                entry[1] = now
+                if ip_address:
+                    entry[2] = ip_address
+            due = time.monotonic() >= self._next_push
+        if due:
+            self.push()
+
+    def push(self):
+        """Envía lo acumulado a Redis; sin Redis lo escribe directo en la BD."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._next_push = time.monotonic() + self._push_interval
+        if not pending:
+            return 0
+
+        redis_conn = _get_redis() if time.monotonic() >= self._redis_retry_at else None
+        if redis_conn is not None:
+            try:
+                pipe = redis_conn.pipeline(transaction=False)
+                for token_id, (count, last_used_at, ip_address) in pending.items():
+                    key = f"{USAGE_KEY_PREFIX}{token_id}"
+                    pipe.hincrby(key, 'requests', count)
+                    pipe.hset(key, 'last_used_at', last_used_at.isoformat())
+                    if ip_address:
+                        pipe.hset(key, 'last_used_ip', ip_address)
+                    pipe.sadd(DIRTY_SET_KEY, token_id)
+                pipe.execute()
+                return len(pending)
+            except Exception as e:
+                logger.warning(f"Could not push API token usage to Redis, writing to DB: {e}")
+                self._redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+        write_usage(pending)
+        return len(pending)
+
+
+def write_usage(usage):
+    """
+    {token_id: (requests, last_used_at, last_used_ip)} a la BD en una
+    transacción: un UPDATE por token, sin leer la fila.
+    """
+    with transaction.atomic():
+        for token_id, (count, last_used_at, ip_address) in usage.items():
+            fields = {'total_requests': F('total_requests') + count, 'last_used_at': last_used_at}
+            if ip_address:
+                fields['last_used_ip'] = ip_address
+            CompanyAPIToken.objects.filter(pk=token_id).update(**fields)
+
+
+def _pop_redis_usage(redis_conn, batch_size):
+    """Toma y borra (atómicamente por token) hasta `batch_size` tokens con uso pendiente."""
+    token_ids = redis_conn.spop(DIRTY_SET_KEY, batch_size) or []
+    if not token_ids:
+        return {}
+
+    pipe = redis_conn.pipeline(transaction=True)
+    for token_id in token_ids:
+        key = f"{USAGE_KEY_PREFIX}{int(token_id)}"
+        pipe.hgetall(key)
+        pipe.delete(key)
+    results = pipe.execute()
+
+    usage = {}
+    for token_id, data in zip(token_ids, results[::2]):
+        if not data:
+            continue
+        data = {k.decode(): v.decode() for k, v in data.items()}
+        usage[int(token_id)] = (
+            int(data.get('requests', 0)),
+            parse_datetime(data['last_used_at']) if data.get('last_used_at') else timezone.now(),
+            data.get('last_used_ip') or None,
+        )
+    return usage
+
+
+def _restore_redis_usage(redis_conn, usage):
+    """Devuelve a Redis el uso que no se pudo escribir (se reintenta en el próximo volcado)."""
+    pipe = redis_conn.pipeline(transaction=False)
+    for token_id, (count, last_used_at, ip_address) in usage.items():
+        key = f"{USAGE_KEY_PREFIX}{token_id}"
+        pipe.hincrby(key, 'requests', count)
+        pipe.hsetnx(key, 'last_used_at', last_used_at.isoformat())
+        if ip_address:
+            pipe.hsetnx(key, 'last_used_ip', ip_address)
+        pipe.sadd(DIRTY_SET_KEY, token_id)
+    pipe.execute()
+
+
+# ============================================================================
+# API del módulo
+# ============================================================================
+token_cache = TokenCache()
+usage_buffer = UsageBuffer()
+
+
+def get_company_token(key):
+    return token_cache.get(key)
+
+
+def record_usage(token, ip_address=None):
+    usage_buffer.record(token.pk, ip_address)
+
+
+def invalidate_tokens():
+    """Invalida la caché de tokens al confirmarse la transacción en curso (o ya, sin transacción)."""
+    transaction.on_commit(token_cache.invalidate)
+
+
+def flush_usage(batch_size=None):
+    """
+    Vuelca a la BD el uso acumulado en Redis. Solo envía el buffer de este
+    proceso; los de los workers web llegan a Redis por su propio hilo de envío
+    (como máximo API_TOKEN_USAGE_PUSH_INTERVAL segundos de retraso).
+
+    Returns:
+        dict con tokens, requests y batches escritos
+    """
+    batch_size = batch_size or getattr(settings, 'API_TOKEN_USAGE_FLUSH_BATCH_SIZE', 500)
+    usage_buffer.push()
+    stats = {'tokens': 0, 'requests': 0, 'batches': 0}
+
+    redis_conn = _get_redis()
+    if redis_conn is None:
+        return stats
+
+    while True:
+        try:
+            usage = _pop_redis_usage(redis_conn, batch_size)
+        except Exception as e:
+            logger.warning(f"Could not read API token usage from Redis: {e}")
+            break
+        if not usage:
+            break
+        try:
+            write_usage(usage)
+        except Exception as e:
+            logger.error(f"❌ Error writing API token usage, returning it to Redis: {e}")
+            _restore_redis_usage(redis_conn, usage)
+            break
+        stats['tokens'] += len(usage)
+        stats['requests'] += sum(count for count, _, _ in usage.values())
+        stats['batches'] += 1
+        if len(usage) < batch_size:
+            break
+
+    if stats['tokens']:
+        logger.info(f"📈 API token usage flushed: {stats['requests']} requests for {stats['tokens']} tokens")
+    return stats
+
+
+# ============================================================================
+# Invalidación
+# ============================================================================
+@receiver(post_save, sender=CompanyAPIToken)
+def company_token_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= USAGE_FIELDS:
+        return
+    invalidate_tokens()
+
+
+@receiver(post_delete, sender=CompanyAPIToken)
+def company_token_deleted(sender, instance, **kwargs):
+    invalidate_tokens()
+
+
+@receiver(post_save, sender=Company)
+def company_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_tokens()
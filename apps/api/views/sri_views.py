@@ -19,9 +19,9 @@ from apps.api.user_company_helper import get_user_companies_exact, get_user_comp
 import time
 
 from apps.sri_integration.models import (
-    SRIConfiguration, ElectronicDocument, DocumentItem,
+    SRIConfiguration, ElectronicDocument,
     DocumentTax, SRIResponse, CreditNote, DebitNote, 
-    Retention, RetentionDetail, PurchaseSettlement, PurchaseSettlementItem
+    Retention, PurchaseSettlement
 )
 from apps.api.serializers.sri_serializers import (
     SRIConfigurationSerializer, ElectronicDocumentSerializer,
@@ -33,6 +33,10 @@ from apps.api.serializers.sri_serializers import (
     DocumentProcessRequestSerializer, DocumentStatusSerializer
 )
 from apps.sri_integration.services.global_certificate_manager import get_certificate_manager
+from apps.sri_integration.storage import artifact_exists, artifact_response, read_artifact
+from apps.sri_integration.services.bulk_items import (
+    ItemValidationError, bulk_create_document_items, bulk_create_retention_details, bulk_create_settlement_items
+)
 from apps.api.permissions import IsCompanyOwnerOrAdmin
 
 logger = logging.getLogger(__name__)
@@ -222,7 +226,10 @@ def require_vsr_token_only():
             # Validar token VSR
             try:
                 from apps.companies.models import CompanyAPIToken
-                company_token = CompanyAPIToken.objects.get(key=token_key, is_active=True)
+                from apps.api.token_cache import get_company_token, record_usage
+                company_token = get_company_token(token_key)
+                if not company_token.is_active:
+                    raise CompanyAPIToken.DoesNotExist
                 
                 if not company_token.is_valid():
                     return Response(
@@ -238,10 +245,10 @@ def require_vsr_token_only():
                 request.company = company_token.company
                 request.company_token = company_token
                 
-                # Actualizar estadísticas del token
-                company_token.increment_usage(
-                    ip_address=request.META.get('REMOTE_ADDR')
-                )
+                # Actualizar estadísticas del token (si DualTokenAuthentication
+                # ya lo contó en esta request no se vuelve a contar)
+                if getattr(request, 'token_type', None) != 'company':
+                    record_usage(company_token, ip_address=request.META.get('REMOTE_ADDR'))
                 
                 logger.info(f"✅ VSR Token validated for company {company_token.company.business_name}")
                 
@@ -279,7 +286,10 @@ def require_user_company_access(get_company_id_func=None):
                 if token_key.startswith('vsr_'):
                     try:
                         from apps.companies.models import CompanyAPIToken
-                        company_token = CompanyAPIToken.objects.get(key=token_key, is_active=True)
+                        from apps.api.token_cache import get_company_token
+                        company_token = get_company_token(token_key)
+                        if not company_token.is_active:
+                            raise CompanyAPIToken.DoesNotExist
                         company = company_token.company
                         logger.info(f"✅ VSR Token: Company {company.business_name} identified automatically")
                     except CompanyAPIToken.DoesNotExist:
@@ -591,6 +601,37 @@ def atomic_transaction():
     return decorator
 
 
+def reserve_document_sequence(document_type):
+    """
+    Decorador que reserva el secuencial antes de abrir la transacción de la vista
+
+    El UPDATE ... RETURNING de reserve_sequences se confirma solo (autocommit), así
+    el lock de la fila de SRIConfiguration no se mantiene durante la generación del
+    XML, la firma y el envío al SRI. Si la vista falla después, el secuencial queda
+    consumido. Deja el valor en request.reserved_sequence.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(self, request, *args, **kwargs):
+            sri_config = request.validated_sri_config
+            
+            try:
+                request.reserved_sequence = sri_config.get_next_sequence(document_type)
+            except Exception as e:
+                logger.error(f" Could not reserve {document_type} sequence for config {sri_config.id}: {str(e)}")
+                return Response(
+                    {
+                        'error': 'SEQUENCE_RESERVATION_ERROR',
+                        'message': f'No se pudo reservar el secuencial: {str(e)}'
+                    },
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+            
+            return view_func(self, request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
 # Decorador combinado para endpoints SRI seguros
 def sri_secure_endpoint(
     require_company_access=True,
@@ -598,10 +639,14 @@ def sri_secure_endpoint(
     require_sri_config=False,
     audit_action=None,
     validate_fields=None,
-    atomic=True
+    atomic=True,
+    sequence_type=None
 ):
     """
     Decorador combinado para endpoints SRI seguros - CORREGIDO PARA VSR
+    
+    sequence_type reserva el secuencial fuera de la transacción atómica
+    (requiere require_sri_config=True).
     """
     def decorator(view_func):
         func = view_func
@@ -609,6 +654,9 @@ def sri_secure_endpoint(
         if atomic:
             func = atomic_transaction()(func)
         
+        if sequence_type:
+            func = reserve_document_sequence(sequence_type)(func)
+        
         if validate_fields:
             func = validate_request_data(required_fields=validate_fields)(func)
         
@@ -1179,7 +1227,8 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
         require_sri_config=True,
         audit_action='CREATE_AND_PROCESS_INVOICE_COMPLETE',
         validate_fields=['customer_identification_type', 'customer_identification', 'customer_name', 'issue_date', 'items'],
-        atomic=True
+        atomic=True,
+        sequence_type='INVOICE'
     )
     def create_and_process_invoice_complete(self, request):
         """
@@ -1187,7 +1236,6 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
          RESPUESTA SIMPLIFICADA PARA PRODUCCIÓN
         """
         try:
-            from decimal import Decimal, ROUND_HALF_UP
             from apps.sri_integration.services.document_processor import DocumentProcessor
             
             start_time = time.time()
@@ -1196,18 +1244,9 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
             sri_config = request.validated_sri_config
             
             logger.info(f" [INVOICE_COMPLETE] Creating and processing invoice for user {getattr(request.user, 'username', 'Unknown')}")
-            
-            # Función para manejar decimales
-            def fix_decimal(value, places=2):
-                if isinstance(value, (int, float)):
-                    value = Decimal(str(value))
-                elif isinstance(value, str):
-                    value = Decimal(value)
-                quantizer = Decimal('0.' + '0' * places)
-                return value.quantize(quantizer, rounding=ROUND_HALF_UP)
-            
+
             # ===== PASO 1: CREAR FACTURA =====
-            sequence = sri_config.get_next_sequence('INVOICE')
+            sequence = request.reserved_sequence
             document_number = f"{sri_config.establishment_code}-{sri_config.emission_point}-{sequence:09d}"
             
             electronic_doc = ElectronicDocument.objects.create(
@@ -1227,39 +1266,8 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
             # Generar clave de acceso
             electronic_doc.access_key = electronic_doc._generate_access_key()
             
-            # Crear items y calcular totales
-            total_subtotal = Decimal('0.00')
-            total_tax = Decimal('0.00')
-            
-            items_data = data.get('items', [])
-            for item_data in items_data:
-                quantity = fix_decimal(Decimal(str(item_data['quantity'])), 6)
-                unit_price = fix_decimal(Decimal(str(item_data['unit_price'])), 6)
-                discount = fix_decimal(Decimal(str(item_data.get('discount', 0))), 2)
-                
-                subtotal = fix_decimal((quantity * unit_price) - discount, 2)
-                
-                DocumentItem.objects.create(
-                    document=electronic_doc,
-                    main_code=item_data['main_code'],
-                    auxiliary_code=item_data.get('auxiliary_code', ''),
-                    description=item_data['description'],
-                    quantity=quantity,
-                    unit_price=unit_price,
-                    discount=discount,
-                    subtotal=subtotal
-                )
-                
-                # Calcular impuesto (IVA 15%)
-                tax_amount = fix_decimal(subtotal * Decimal('15.00') / 100, 2)
-                total_subtotal += subtotal
-                total_tax += tax_amount
-            
-            # Actualizar totales
-            total_amount = total_subtotal + total_tax
-            electronic_doc.subtotal_without_tax = fix_decimal(total_subtotal, 2)
-            electronic_doc.total_tax = fix_decimal(total_tax, 2)
-            electronic_doc.total_amount = fix_decimal(total_amount, 2)
+            # Crear items e impuestos en bloque y asignar totales (motor de impuestos)
+            bulk_create_document_items(electronic_doc, data.get('items', []))
             electronic_doc.status = 'GENERATED'
             electronic_doc.save()
             
@@ -1276,21 +1284,29 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
             if success:
                 logger.info(f" [INVOICE_COMPLETE] Processing completed in {process_time - creation_time:.2f}s")
                 
+                # RECIBIDA: la autorización, PDF, email y consumo del plan continúan en Celery
+                pending_authorization = electronic_doc.status == 'SENT'
+                
                 # 🎯 RESPUESTA SIMPLIFICADA
                 return Response(
                     {
                         'success': True,
-                        'message': 'Factura creada y enviada al SRI exitosamente',
+                        'message': (
+                            'Factura recibida por el SRI, autorización en proceso'
+                            if pending_authorization else
+                            'Factura creada y enviada al SRI exitosamente'
+                        ),
                         'invoice': {
                             'id': electronic_doc.id,
                             'number': electronic_doc.document_number,
+                            'access_key': electronic_doc.access_key,
                             'customer': electronic_doc.customer_name,
                             'total': float(electronic_doc.total_amount),
                             'status': electronic_doc.get_status_display(),
                             'date': electronic_doc.created_at.strftime("%Y-%m-%d %H:%M")
                         }
                     },
-                    status=status.HTTP_201_CREATED
+                    status=status.HTTP_202_ACCEPTED if pending_authorization else status.HTTP_201_CREATED
                 )
             else:
                 logger.error(f" [INVOICE_COMPLETE] Processing failed: {message}")
@@ -1307,6 +1323,18 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_201_CREATED
                 )
                 
+        except ItemValidationError as e:
+            # Líneas inválidas: no se guarda nada de este request
+            transaction.set_rollback(True)
+            logger.warning(f" [INVOICE_COMPLETE] Invalid lines: {e}")
+            return Response(
+                {
+                    'error': 'INVALID_ITEMS',
+                    'message': str(e),
+                    'errors': e.errors
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             logger.error(f" [INVOICE_COMPLETE] Critical error: {str(e)}")
             return Response(
@@ -1324,7 +1352,8 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
         require_sri_config=True,
         audit_action='CREATE_AND_PROCESS_CREDIT_NOTE_COMPLETE',
         validate_fields=['customer_identification_type', 'customer_identification', 'customer_name', 'reason_description', 'original_document_access_key'],
-        atomic=True
+        atomic=True,
+        sequence_type='CREDIT_NOTE'
     )
     def create_and_process_credit_note_complete(self, request):
         """
@@ -1343,7 +1372,7 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
             logger.info(f" [CREDIT_NOTE_COMPLETE] Creating and processing credit note for user {getattr(request.user, 'username', 'Unknown')}")
             
             # Generar número de documento
-            sequence = sri_config.get_next_sequence('CREDIT_NOTE')
+            sequence = request.reserved_sequence
             document_number = f"{sri_config.establishment_code}-{sri_config.emission_point}-{sequence:09d}"
             
             # Crear nota de crédito
@@ -1437,7 +1466,8 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
         require_sri_config=True,
         audit_action='CREATE_AND_PROCESS_DEBIT_NOTE_COMPLETE',
         validate_fields=['customer_identification_type', 'customer_identification', 'customer_name', 'reason_description', 'original_document_access_key'],
-        atomic=True
+        atomic=True,
+        sequence_type='DEBIT_NOTE'
     )
     def create_and_process_debit_note_complete(self, request):
         """
@@ -1456,7 +1486,7 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
             logger.info(f" [DEBIT_NOTE_COMPLETE] Creating and processing debit note for user {getattr(request.user, 'username', 'Unknown')}")
             
             # Generar número de documento
-            sequence = sri_config.get_next_sequence('DEBIT_NOTE')
+            sequence = request.reserved_sequence
             document_number = f"{sri_config.establishment_code}-{sri_config.emission_point}-{sequence:09d}"
             
             # Crear nota de débito
@@ -1550,7 +1580,8 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
         require_sri_config=True,
         audit_action='CREATE_AND_PROCESS_RETENTION_COMPLETE',
         validate_fields=['supplier_identification_type', 'supplier_identification', 'supplier_name', 'fiscal_period'],
-        atomic=True
+        atomic=True,
+        sequence_type='RETENTION'
     )
     def create_and_process_retention_complete(self, request):
         """
@@ -1569,7 +1600,7 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
             logger.info(f" [RETENTION_COMPLETE] Creating and processing retention for user {getattr(request.user, 'username', 'Unknown')}")
             
             # Generar número de documento
-            sequence = sri_config.get_next_sequence('RETENTION')
+            sequence = request.reserved_sequence
             document_number = f"{sri_config.establishment_code}-{sri_config.emission_point}-{sequence:09d}"
             
             # Crear retención
@@ -1591,20 +1622,10 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
             retention.status = 'GENERATED'
             retention.save()
             
-            # Crear detalles de retención si se proporcionan
+            # Crear detalles de retención en bloque si se proporcionan
             retention_details = data.get('retention_details', [])
-            for detail_data in retention_details:
-                RetentionDetail.objects.create(
-                    retention=retention,
-                    tax_code=detail_data.get('tax_code', '2'),
-                    retention_code=detail_data.get('retention_code', '303'),
-                    taxable_base=Decimal(str(detail_data.get('taxable_base', 0))),
-                    retention_percentage=Decimal(str(detail_data.get('retention_percentage', 30))),
-                    retained_amount=Decimal(str(detail_data.get('retained_amount', 0))),
-                    support_document_type=detail_data.get('support_document_type', '01'),
-                    support_document_number=detail_data.get('support_document_number', '001-001-000000001'),
-                    support_document_date=detail_data.get('support_document_date', retention.issue_date)
-                )
+            if retention_details:
+                bulk_create_retention_details(retention, retention_details)
             
             # Sincronizar con ElectronicDocument
             electronic_doc = sync_document_to_electronic_document(retention, 'RETENTION')
@@ -1657,6 +1678,18 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_201_CREATED
                 )
                 
+        except ItemValidationError as e:
+            # Líneas inválidas: no se guarda nada de este request
+            transaction.set_rollback(True)
+            logger.warning(f" [RETENTION_COMPLETE] Invalid lines: {e}")
+            return Response(
+                {
+                    'error': 'INVALID_ITEMS',
+                    'message': str(e),
+                    'errors': e.errors
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             logger.error(f" [RETENTION_COMPLETE] Critical error: {str(e)}")
             return Response(
@@ -1674,7 +1707,8 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
         require_sri_config=True,
         audit_action='CREATE_AND_PROCESS_PURCHASE_SETTLEMENT_COMPLETE',
         validate_fields=['supplier_identification_type', 'supplier_identification', 'supplier_name', 'items'],
-        atomic=True
+        atomic=True,
+        sequence_type='PURCHASE_SETTLEMENT'
     )
     def create_and_process_purchase_settlement_complete(self, request):
         """
@@ -1682,7 +1716,6 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
          RESPUESTA SIMPLIFICADA PARA PRODUCCIÓN
         """
         try:
-            from decimal import Decimal, ROUND_HALF_UP
             from apps.sri_integration.services.document_processor import DocumentProcessor
             
             start_time = time.time()
@@ -1691,18 +1724,9 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
             sri_config = request.validated_sri_config
             
             logger.info(f" [PURCHASE_SETTLEMENT_COMPLETE] Creating and processing purchase settlement for user {getattr(request.user, 'username', 'Unknown')}")
-            
-            # Función para manejar decimales
-            def fix_decimal(value, places=2):
-                if isinstance(value, (int, float)):
-                    value = Decimal(str(value))
-                elif isinstance(value, str):
-                    value = Decimal(value)
-                quantizer = Decimal('0.' + '0' * places)
-                return value.quantize(quantizer, rounding=ROUND_HALF_UP)
-            
+
             # Generar número de documento
-            sequence = sri_config.get_next_sequence('PURCHASE_SETTLEMENT')
+            sequence = request.reserved_sequence
             document_number = f"{sri_config.establishment_code}-{sri_config.emission_point}-{sequence:09d}"
             
             # Crear liquidación de compra
@@ -1720,39 +1744,9 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
             # Generar clave de acceso
             purchase_settlement.access_key = purchase_settlement._generate_access_key()
             
-            # Crear items y calcular totales
-            total_subtotal = Decimal('0.00')
-            total_tax = Decimal('0.00')
-            
-            items_data = data.get('items', [])
-            for item_data in items_data:
-                quantity = fix_decimal(Decimal(str(item_data['quantity'])), 6)
-                unit_price = fix_decimal(Decimal(str(item_data['unit_price'])), 6)
-                discount = fix_decimal(Decimal(str(item_data.get('discount', 0))), 2)
-                
-                subtotal = fix_decimal((quantity * unit_price) - discount, 2)
-                
-                PurchaseSettlementItem.objects.create(
-                    purchase_settlement=purchase_settlement,
-                    main_code=item_data['main_code'],
-                    auxiliary_code=item_data.get('auxiliary_code', ''),
-                    description=item_data['description'],
-                    quantity=quantity,
-                    unit_price=unit_price,
-                    discount=discount,
-                    subtotal=subtotal
-                )
-                
-                # Calcular impuesto (IVA 15%)
-                tax_amount = fix_decimal(subtotal * Decimal('15.00') / 100, 2)
-                total_subtotal += subtotal
-                total_tax += tax_amount
-            
-            # Actualizar totales
-            total_amount = total_subtotal + total_tax
-            purchase_settlement.subtotal_without_tax = fix_decimal(total_subtotal, 2)
-            purchase_settlement.total_tax = fix_decimal(total_tax, 2)
-            purchase_settlement.total_amount = fix_decimal(total_amount, 2)
+            # Crear items en bloque y asignar totales (motor de impuestos);
+            # los ítems de liquidación no guardan impuestos propios: IVA por defecto
+            bulk_create_settlement_items(purchase_settlement, data.get('items', []))
             purchase_settlement.status = 'GENERATED'
             purchase_settlement.save()
             
@@ -1808,6 +1802,18 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_201_CREATED
                 )
                 
+        except ItemValidationError as e:
+            # Líneas inválidas: no se guarda nada de este request
+            transaction.set_rollback(True)
+            logger.warning(f" [PURCHASE_SETTLEMENT_COMPLETE] Invalid lines: {e}")
+            return Response(
+                {
+                    'error': 'INVALID_ITEMS',
+                    'message': str(e),
+                    'errors': e.errors
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             logger.error(f" [PURCHASE_SETTLEMENT_COMPLETE] Critical error: {str(e)}")
             return Response(
@@ -1827,32 +1833,22 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
         require_sri_config=True,
         audit_action='CREATE_INVOICE',
         validate_fields=['customer_identification_type', 'customer_identification', 'customer_name', 'issue_date', 'items'],
-        atomic=True
+        atomic=True,
+        sequence_type='INVOICE'
     )
     def create_invoice(self, request):
         """
         Crear factura electrónica (solo creación) - MANTENIDO PARA COMPATIBILIDAD
         """
         try:
-            from decimal import Decimal, ROUND_HALF_UP
-            
             data = request.data
             company = request.validated_company
             sri_config = request.validated_sri_config
             
             # Generar número de documento
-            sequence = sri_config.get_next_sequence('INVOICE')
+            sequence = request.reserved_sequence
             document_number = f"{sri_config.establishment_code}-{sri_config.emission_point}-{sequence:09d}"
-            
-            # Función para manejar decimales
-            def fix_decimal(value, places=2):
-                if isinstance(value, (int, float)):
-                    value = Decimal(str(value))
-                elif isinstance(value, str):
-                    value = Decimal(value)
-                quantizer = Decimal('0.' + '0' * places)
-                return value.quantize(quantizer, rounding=ROUND_HALF_UP)
-            
+
             # Crear ElectronicDocument directamente
             electronic_doc = ElectronicDocument.objects.create(
                 company=company,
@@ -1871,39 +1867,8 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
             # Generar clave de acceso
             electronic_doc.access_key = electronic_doc._generate_access_key()
             
-            # Crear items y calcular totales
-            total_subtotal = Decimal('0.00')
-            total_tax = Decimal('0.00')
-            
-            items_data = data.get('items', [])
-            for item_data in items_data:
-                quantity = fix_decimal(Decimal(str(item_data['quantity'])), 6)
-                unit_price = fix_decimal(Decimal(str(item_data['unit_price'])), 6)
-                discount = fix_decimal(Decimal(str(item_data.get('discount', 0))), 2)
-                
-                subtotal = fix_decimal((quantity * unit_price) - discount, 2)
-                
-                DocumentItem.objects.create(
-                    document=electronic_doc,
-                    main_code=item_data['main_code'],
-                    auxiliary_code=item_data.get('auxiliary_code', ''),
-                    description=item_data['description'],
-                    quantity=quantity,
-                    unit_price=unit_price,
-                    discount=discount,
-                    subtotal=subtotal
-                )
-                
-                # Calcular impuesto (IVA 15%)
-                tax_amount = fix_decimal(subtotal * Decimal('15.00') / 100, 2)
-                total_subtotal += subtotal
-                total_tax += tax_amount
-            
-            # Actualizar totales
-            total_amount = total_subtotal + total_tax
-            electronic_doc.subtotal_without_tax = fix_decimal(total_subtotal, 2)
-            electronic_doc.total_tax = fix_decimal(total_tax, 2)
-            electronic_doc.total_amount = fix_decimal(total_amount, 2)
+            # Crear items e impuestos en bloque y asignar totales (motor de impuestos)
+            bulk_create_document_items(electronic_doc, data.get('items', []))
             electronic_doc.status = 'GENERATED'
             electronic_doc.save()
             
@@ -1938,6 +1903,18 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
             
             return Response(response_data, status=status.HTTP_201_CREATED)
             
+        except ItemValidationError as e:
+            # Líneas inválidas: no se guarda nada de este request
+            transaction.set_rollback(True)
+            logger.warning(f" [CREATE_INVOICE] Invalid lines: {e}")
+            return Response(
+                {
+                    'error': 'INVALID_ITEMS',
+                    'message': str(e),
+                    'errors': e.errors
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             logger.error(f"Error creating invoice for user {getattr(request.user, 'username', 'Unknown')}: {str(e)}")
             return Response(
@@ -2050,8 +2027,7 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
             from apps.sri_integration.services.document_processor import DocumentProcessor
             
             # Leer contenido XML existente
-            with open(electronic_doc.xml_file.path, 'r', encoding='utf-8') as f:
-                xml_content = f.read()
+            xml_content = read_artifact(electronic_doc.xml_file).decode('utf-8')
             
             processor = DocumentProcessor(document.company)
             success, result = processor._sign_xml_with_global_manager(electronic_doc, xml_content)
@@ -2131,8 +2107,7 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
             from apps.sri_integration.services.document_processor import DocumentProcessor
             
             # Leer XML firmado
-            with open(electronic_doc.signed_xml_file.path, 'r', encoding='utf-8') as f:
-                signed_xml = f.read()
+            signed_xml = read_artifact(electronic_doc.signed_xml_file).decode('utf-8')
             
             processor = DocumentProcessor(document.company)
             
@@ -2262,6 +2237,37 @@ class SRIDocumentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    # ========== DESCARGA DE ARTEFACTOS ==========
+
+    DOWNLOAD_ARTIFACTS = {
+        'xml': ('xml_file', '', 'xml', 'application/xml'),
+        'signed_xml': ('signed_xml_file', '_firmado', 'xml', 'application/xml'),
+        'pdf': ('pdf_file', '', 'pdf', 'application/pdf'),
+    }
+
+    @action(detail=True, methods=['get'], url_path=r'download/(?P<artifact>xml|signed_xml|pdf)')
+    def download(self, request, pk=None, artifact=None):
+        """
+        Descarga el XML, el XML firmado o el RIDE del documento.
+        Los XML se guardan comprimidos en el almacén de artefactos: se sirven
+        descomprimidos y con soporte de Range.
+        """
+        document = self.get_object()
+        field_name, suffix, extension, content_type = self.DOWNLOAD_ARTIFACTS[artifact]
+        field_file = getattr(document, field_name)
+
+        if not artifact_exists(field_file):
+            return Response(
+                {
+                    'error': 'FILE_NOT_FOUND',
+                    'message': f'The {artifact} file is not available for this document'
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        filename = f"{document.access_key or document.document_number}{suffix}.{extension}"
+        return artifact_response(request, field_file, filename, content_type)
+
     # ========== GESTIÓN DEL GlobalCertificateManager ==========
     
     @action(detail=False, methods=['get'])
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:47
+
+import logging
+
+from django.db import migrations, models
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+MAX_LISTED_IN_ERROR = 20
+
+
+def check_duplicate_consumptions(apps, schema_editor):
+    """
+    Consumos repetidos del mismo documento (doble finalización concurrente)
+    impiden crear la restricción única. Son historial de facturación: no se
+    borran aquí. La migración se detiene con el detalle para conciliarlos a
+    mano (devolver el saldo descontado de más y archivar los repetidos) y
+    volver a ejecutar migrate.
+    """
+    InvoiceConsumption = apps.get_model('billing', 'InvoiceConsumption')
+    duplicates = list(
+        InvoiceConsumption.objects.using(schema_editor.connection.alias)
+        .values('company_id', 'invoice_id')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .order_by('company_id', 'invoice_id')
+    )
+    if not duplicates:
+        return
+
+    lines = []
+    for row in duplicates:
+        consumptions = InvoiceConsumption.objects.using(schema_editor.connection.alias).filter(
+            company_id=row['company_id'], invoice_id=row['invoice_id']
+        ).order_by('id')
+        detail = ', '.join(
+            f"id={c.id} consumed_at={c.consumed_at:%Y-%m-%d %H:%M:%S} "
+            f"balance={c.balance_before}->{c.balance_after}"
+            for c in consumptions
+        )
+        line = f"company {row['company_id']}, invoice {row['invoice_id']}: {detail}"
+        logger.error(f"❌ BILLING: duplicate invoice consumption - {line}")
+        lines.append(line)
+
+    listed = '\n  '.join(lines[:MAX_LISTED_IN_ERROR])
+    more = f"\n  ... y {len(lines) - MAX_LISTED_IN_ERROR} más (ver log)" if len(lines) > MAX_LISTED_IN_ERROR else ''
+    raise RuntimeError(
+        f"{len(lines)} documento(s) con InvoiceConsumption repetido; conciliarlos a mano "
+        f"antes de crear unique_invoice_consumption:\n  {listed}{more}"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_alter_planpurchase_plan_invoice_limit_and_more'),
+        ('companies', '0003_company_ambiente_sri_company_ciudad_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_consumptions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='invoiceconsumption',
+            constraint=models.UniqueConstraint(fields=('company', 'invoice_id'), name='unique_invoice_consumption'),
+        ),
+    ]
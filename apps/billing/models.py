@@ -280,6 +280,10 @@ class InvoiceConsumption(models.Model):
         verbose_name = 'Consumo de Factura'
         verbose_name_plural = 'Consumos de Facturas'
         ordering = ['-consumed_at']
+        constraints = [
+            # Un documento se descuenta del plan una sola vez
+            models.UniqueConstraint(fields=['company', 'invoice_id'], name='unique_invoice_consumption'),
+        ]
     
     def __str__(self):
         return f"{self.company.business_name} - Factura {self.invoice_id} - {self.consumed_at.strftime('%d/%m/%Y %H:%M')}"
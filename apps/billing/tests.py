@@ -1,3 +1,66 @@
-from django.test import TestCase
+# -*- coding: utf-8 -*-
+"""
+Tests de billing
+apps/billing/tests.py
+"""
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+from apps.companies.models import Company
+
+
+class UniqueInvoiceConsumptionMigrationTests(TransactionTestCase):
+    """0003 no borra historial: con consumos repetidos se detiene y los lista."""
+
+    before = [('billing', '0002_alter_planpurchase_plan_invoice_limit_and_more')]
+    after = [('billing', '0003_invoiceconsumption_unique_invoice')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        self.apps = executor.loader.project_state(self.before).apps
+
+    def tearDown(self):
+        InvoiceConsumption = self.apps.get_model('billing', 'InvoiceConsumption')
+        InvoiceConsumption.objects.all().delete()
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate_forward(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+
+    def create_consumptions(self, *invoice_ids):
+        InvoiceConsumption = self.apps.get_model('billing', 'InvoiceConsumption')
+        company = Company.objects.create(
+            ruc='1790012345001',
+            business_name='COMERCIAL ANDINA S.A.',
+            email='facturas@andina.ec',
+            address='Av. Amazonas N24-03 y Colón',
+        )
+        for invoice_id in invoice_ids:
+            InvoiceConsumption.objects.create(
+                company_id=company.id, invoice_id=invoice_id, balance_before=10, balance_after=9
+            )
+        return company
+
+    def test_duplicates_stop_the_migration_and_are_kept(self):
+        company = self.create_consumptions('A', 'A', 'B')
+
+        with self.assertRaisesMessage(RuntimeError, f'company {company.id}, invoice A'):
+            self.migrate_forward()
+
+        InvoiceConsumption = self.apps.get_model('billing', 'InvoiceConsumption')
+        self.assertEqual(InvoiceConsumption.objects.count(), 3)
+
+    def test_without_duplicates_the_constraint_is_created(self):
+        self.create_consumptions('A', 'B')
+
+        self.migrate_forward()
+
+        constraints = connection.introspection.get_constraints(connection.cursor(), 'billing_invoiceconsumption')
+        self.assertIn('unique_invoice_consumption', constraints)
@@ -112,6 +112,10 @@ class CertificatesConfig(AppConfig):
                     from apps.certificates.signals import preload_certificates_on_startup
                     preload_certificates_on_startup()
                     
+                    # Warm-up paralelo de la caché (este hilo es daemon: no bloquea al worker)
+                    from apps.sri_integration.services.global_certificate_manager import get_certificate_manager
+                    get_certificate_manager().warm_up()
+                    
                 except Exception as e:
                     logger.error(f"❌ Error en precarga automática: {e}")
             
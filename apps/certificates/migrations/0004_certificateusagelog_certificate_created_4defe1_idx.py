@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0003_digitalcertificate_encrypted_password_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='certificateusagelog',
+            index=models.Index(fields=['created_at'], name='certificate_created_4defe1_idx'),
+        ),
+    ]
@@ -747,6 +747,9 @@ class CertificateUsageLog(BaseModel):
         verbose_name = _('Certificate Usage Log')
         verbose_name_plural = _('Certificate Usage Logs')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),  # Retención por meses (log_retention)
+        ]
     
     def __str__(self):
         return f"{self.certificate} - {self.operation} - {self.created_at}"
\ No newline at end of file
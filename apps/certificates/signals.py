@@ -284,9 +284,8 @@ if DigitalCertificate and Company:
                     logger.info(f"📝 Certificado actualizado para empresa {company_id} ({instance.company.business_name})")
                     
                     # Si el certificado fue desactivado, remover del cache
-                    if instance.status != 'ACTIVE' and hasattr(cert_manager, '_certificates_cache'):
-                        if company_id in cert_manager._certificates_cache:
-                            del cert_manager._certificates_cache[company_id]
+                    if instance.status != 'ACTIVE':
+                        if cert_manager.invalidate_certificate(company_id):
                             logger.info(f"🗑️ Certificado removido del cache para empresa {company_id} (desactivado)")
             
             except ImportError:
@@ -338,8 +337,7 @@ if DigitalCertificate and Company:
                 company_id = instance.company.id
                 
                 # Remover del cache si existe
-                if hasattr(cert_manager, '_certificates_cache') and company_id in cert_manager._certificates_cache:
-                    del cert_manager._certificates_cache[company_id]
+                if cert_manager.invalidate_certificate(company_id):
                     logger.info(f"🗑️ Certificado removido del cache para empresa {company_id} (eliminado)")
             
             except ImportError:
@@ -405,8 +403,7 @@ if DigitalCertificate and Company:
                         
                         cert_manager = get_certificate_manager()
                         
-                        if hasattr(cert_manager, '_certificates_cache') and instance.id in cert_manager._certificates_cache:
-                            del cert_manager._certificates_cache[instance.id]
+                        if cert_manager.invalidate_certificate(instance.id):
                             logger.info(f"🗑️ Certificado removido del cache para empresa {instance.id} (empresa desactivada)")
                     
                     except ImportError:
@@ -615,24 +615,17 @@ class CompanyAPIToken(models.Model):
     def check_rate_limit(self, period='hour'):
         """
         Verificar si el token está dentro de los límites de rate limiting
-        """
-        now = timezone.now()
         
-        if period == 'hour':
-            # Verificar requests en la última hora
-            limit = self.requests_per_hour
-            time_threshold = now - timezone.timedelta(hours=1)
-        elif period == 'day':
-            # Verificar requests en el último día
-            limit = self.requests_per_day
-            time_threshold = now - timezone.timedelta(days=1)
-        else:
+        Consulta (sin consumir) la cuota GCRA en Redis que aplica
+        CompanyTokenRateThrottle. Sin Redis o con el límite deshabilitado
+        se permite.
+        """
+        if period not in ('hour', 'day'):
             return True  # Período no reconocido, permitir
         
-        # Aquí podrías implementar un sistema más sofisticado
-        # que trackee requests individuales en una tabla separada
-        # Por ahora, asumimos que está dentro del límite
-        return True
+        from apps.api.throttling import check_token_rate_limit
+        result = check_token_rate_limit(self, windows=(period,), peek=True)
+        return result is None or result['allowed']
     
     def __str__(self):
         return f"API Token: {self.name} ({self.company.business_name})"
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_add_comprehensive_audit_actions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['created_at'], name='core_auditl_created_dc23ea_idx'),
+        ),
+    ]
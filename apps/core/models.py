@@ -215,6 +215,7 @@ class AuditLog(BaseModel):
             models.Index(fields=['action', 'created_at']),
             models.Index(fields=['model_name', 'object_id']),
             models.Index(fields=['action', 'model_name']),
+            models.Index(fields=['created_at']),  # Retención por meses (log_retention)
         ]
     
     def __str__(self):
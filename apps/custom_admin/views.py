@@ -1938,27 +1938,23 @@ def sri_document_authorize(request, document_id):
 @staff_required
 def sri_document_download(request, document_id):
     """Download SRI document"""
-    from apps.sri_integration.models import ElectronicDocument
     from django.http import FileResponse
-    import os
+    from apps.sri_integration.models import ElectronicDocument
+    from apps.sri_integration.storage import artifact_exists, artifact_response
     
     try:
         document = get_object_or_404(ElectronicDocument, id=document_id)
         
         # Verificar si existe el archivo PDF
-        if document.pdf_file and os.path.exists(document.pdf_file.path):
-            return FileResponse(
-                open(document.pdf_file.path, 'rb'),
-                as_attachment=True,
-                filename=f'{document.document_number}.pdf'
+        if artifact_exists(document.pdf_file):
+            return artifact_response(
+                request, document.pdf_file, f'{document.document_number}.pdf', 'application/pdf'
             )
         
         # Si no hay PDF, generar uno temporal o devolver el XML
-        if document.signed_xml_file and os.path.exists(document.signed_xml_file.path):
-            return FileResponse(
-                open(document.signed_xml_file.path, 'rb'),
-                as_attachment=True,
-                filename=f'{document.document_number}.xml'
+        if artifact_exists(document.signed_xml_file):
+            return artifact_response(
+                request, document.signed_xml_file, f'{document.document_number}.xml', 'application/xml'
             )
         
         # Si no hay archivos, generar un PDF básico
@@ -2063,6 +2059,7 @@ def sri_document_cancel(request, document_id):
 def sri_document_resend(request, document_id):
     """Resend SRI document by email"""
     from apps.sri_integration.models import ElectronicDocument
+    from apps.sri_integration.storage import read_artifact
     from django.core.mail import EmailMessage
     from django.conf import settings
     
@@ -2103,9 +2100,9 @@ def sri_document_resend(request, document_id):
         
         # Adjuntar archivos si existen
         if document.pdf_file:
-            email_msg.attach_file(document.pdf_file.path)
+            email_msg.attach(f'{document.document_number}.pdf', read_artifact(document.pdf_file), 'application/pdf')
         elif document.signed_xml_file:
-            email_msg.attach_file(document.signed_xml_file.path)
+            email_msg.attach(f'{document.document_number}.xml', read_artifact(document.signed_xml_file), 'application/xml')
         
         # Enviar email
         email_msg.send()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Clave de acceso del SRI (49 dígitos)
+apps/sri_integration/access_key.py
+
+Estructura (Ficha técnica de comprobantes electrónicos, esquema offline):
+    fecha ddmmaaaa (8) + tipo de comprobante (2) + RUC (13) + ambiente (1)
+    + serie (6) + secuencial (9) + código numérico (8) + tipo de emisión (1)
+    + dígito verificador módulo 11 (1)
+
+Módulo compartido por todos los modelos de documentos:
+- Pesos módulo 11 precalculados en tablas por bloques de 3 dígitos
+- Generación en bloque para secuenciales pre-reservados (reserve_sequences):
+  la suma ponderada del prefijo común se calcula una sola vez
+- Código numérico aleatorio (no fijo) por comprobante
+- Validador rápido para conciliación / importación de millones de claves
+"""
+
+import secrets
+from datetime import date, datetime
+
+ACCESS_KEY_LENGTH = 49
+PARTIAL_KEY_LENGTH = 48
+EMISSION_TYPE_NORMAL = '1'
+
+DOCUMENT_TYPE_CODES = {
+    'INVOICE': '01',
+    'PURCHASE_SETTLEMENT': '03',
+    'CREDIT_NOTE': '04',
+    'DEBIT_NOTE': '05',
+    'REMISSION_GUIDE': '06',
+    'RETENTION': '07',
+}
+
+ENVIRONMENT_CODES = {
+    'TEST': '1',
+    'PRODUCTION': '2',
+}
+
+# Factores 2..7 aplicados de derecha a izquierda sobre los 48 dígitos;
+# expresados de izquierda a derecha para indexar por posición
+_WEIGHTS = tuple(2 + (i % 6) for i in range(PARTIAL_KEY_LENGTH))[::-1]
+
+# Suma ponderada de cada bloque de 3 dígitos. Como los pesos tienen periodo 6,
+# solo hay dos tablas distintas (bloques en posición par / impar)
+_TRIPLET_TABLES = tuple(
+    {
+        f"{n:03d}": (n // 100) * _WEIGHTS[offset] + (n // 10 % 10) * _WEIGHTS[offset + 1] + (n % 10) * _WEIGHTS[offset + 2]
+        for n in range(1000)
+    }
+    for offset in (0, 3)
+)
+_BLOCKS = tuple((start, _TRIPLET_TABLES[(start // 3) % 2]) for start in range(0, PARTIAL_KEY_LENGTH, 3))
+
+# El prefijo (fecha, tipo, RUC, ambiente, serie) ocupa 30 dígitos: múltiplo de 6,
+# así que el sufijo conserva la alineación de las tablas
+_PREFIX_LENGTH = 30
+_PREFIX_BLOCKS = _BLOCKS[:_PREFIX_LENGTH // 3]
+_SUFFIX_BLOCKS = tuple((start - _PREFIX_LENGTH, table) for start, table in _BLOCKS[_PREFIX_LENGTH // 3:])
+
+# Dígito verificador por residuo: 11 - r, con 11 -> 0 y 10 -> 1
+_CHECK_DIGITS = tuple(str(r if r < 2 else 11 - r) for r in range(11))
+
+
+def _weighted_sum(digits, blocks):
+    return sum(table[digits[start:start + 3]] for start, table in blocks)
+
+
+def check_digit(partial_key):
+    """
+    Dígito verificador módulo 11 de una clave parcial de 48 dígitos.
+
+    Raises:
+        ValueError si la clave no tiene 48 dígitos numéricos
+    """
+    if len(partial_key) != PARTIAL_KEY_LENGTH:
+        raise ValueError(f"Clave parcial debe tener 48 dígitos, tiene {len(partial_key)}: {partial_key}")
+    try:
+        return _CHECK_DIGITS[_weighted_sum(partial_key, _BLOCKS) % 11]
+    except KeyError:
+        raise ValueError(f"Clave parcial con caracteres no numéricos: {partial_key}")
+
+
+def is_valid_access_key(access_key):
+    """True si la clave tiene 49 dígitos y su dígito verificador es correcto."""
+    if not access_key or len(access_key) != ACCESS_KEY_LENGTH:
+        return False
+    try:
+        return _CHECK_DIGITS[_weighted_sum(access_key, _BLOCKS) % 11] == access_key[48]
+    except (KeyError, TypeError):
+        return False
+
+
+def find_invalid_access_keys(access_keys):
+    """Claves inválidas de un iterable (conciliación / importación masiva)."""
+    return [access_key for access_key in access_keys if not is_valid_access_key(access_key)]
+
+
+def format_issue_date(issue_date):
+    """Fecha de emisión en formato ddmmaaaa (date, datetime o 'AAAA-MM-DD')."""
+    if isinstance(issue_date, (date, datetime)):
+        return f"{issue_date.day:02d}{issue_date.month:02d}{issue_date.year:04d}"
+
+    value = str(issue_date)
+    if len(value) >= 10 and value[4] == '-' and value[7] == '-' and (value[:4] + value[5:7] + value[8:10]).isdigit():
+        return f"{value[8:10]}{value[5:7]}{value[:4]}"
+    raise ValueError(f"Fecha de emisión inválida: {issue_date}")
+
+
+def random_numeric_code():
+    """Código numérico de 8 dígitos aleatorio."""
+    return f"{secrets.randbelow(100000000):08d}"
+
+
+def _build_prefix(issue_date, document_type, ruc, environment, establishment, emission_point):
+    doc_type_code = DOCUMENT_TYPE_CODES.get(document_type, document_type)
+    environment_code = ENVIRONMENT_CODES.get(environment, environment)
+    prefix = (
+        f"{format_issue_date(issue_date)}{doc_type_code}{str(ruc).zfill(13)}{environment_code}"
+        f"{str(establishment).zfill(3)}{str(emission_point).zfill(3)}"
+    )
+    if len(prefix) != _PREFIX_LENGTH or not prefix.isdigit():
+        raise ValueError(f"Datos de clave de acceso inválidos: {prefix}")
+    return prefix
+
+
+def build_access_key(issue_date, document_type, ruc, environment, establishment, emission_point,
+                     sequence, numeric_code=None):
+    """
+    Clave de acceso de 49 dígitos.
+
+    Args:
+        issue_date: date / datetime / 'AAAA-MM-DD'
+        document_type: 'INVOICE', 'CREDIT_NOTE', ... o el código SRI ('01', '04', ...)
+        environment: 'TEST' / 'PRODUCTION' o el código SRI ('1' / '2')
+        sequence: secuencial (int o str)
+        numeric_code: código numérico de 8 dígitos; aleatorio si no se indica
+    """
+    prefix = _build_prefix(issue_date, document_type, ruc, environment, establishment, emission_point)
+    if numeric_code is None:
+        numeric_code = random_numeric_code()
+
+    partial_key = f"{prefix}{str(sequence).zfill(9)}{str(numeric_code).zfill(8)}{EMISSION_TYPE_NORMAL}"
+    return f"{partial_key}{check_digit(partial_key)}"
+
+
+def generate_access_keys(issue_date, document_type, ruc, environment, establishment, emission_point,
+                         first_sequence, count, numeric_codes=None):
+    """
+    Claves de acceso para un bloque de secuenciales consecutivos
+    (first_sequence .. first_sequence + count - 1).
+
+    La suma ponderada del prefijo común se calcula una vez; por clave solo se
+    suman los 6 bloques del sufijo (secuencial + código numérico + emisión).
+    """
+    prefix = _build_prefix(issue_date, document_type, ruc, environment, establishment, emission_point)
+    prefix_sum = _weighted_sum(prefix, _PREFIX_BLOCKS)
+
+    if numeric_codes is None:
+        randbelow = secrets.randbelow
+        numeric_codes = [randbelow(100000000) for _ in range(count)]
+    elif len(numeric_codes) != count:
+        raise ValueError("numeric_codes debe tener un código por secuencial")
+
+    last_sequence = first_sequence + count - 1
+    if first_sequence < 0 or last_sequence > 999999999:
+        raise ValueError(f"Secuenciales fuera de rango: {first_sequence}-{last_sequence}")
+
+    s0, t0 = _SUFFIX_BLOCKS[0]
+    s1, t1 = _SUFFIX_BLOCKS[1]
+    s2, t2 = _SUFFIX_BLOCKS[2]
+    s3, t3 = _SUFFIX_BLOCKS[3]
+    s4, t4 = _SUFFIX_BLOCKS[4]
+    s5, t5 = _SUFFIX_BLOCKS[5]
+    check_digits = _CHECK_DIGITS
+
+    keys = []
+    append = keys.append
+    for sequence, numeric_code in zip(range(first_sequence, last_sequence + 1), numeric_codes):
+        suffix = f"{sequence:09d}{int(numeric_code):08d}{EMISSION_TYPE_NORMAL}"
+        total = (
+            prefix_sum + t0[suffix[s0:s0 + 3]] + t1[suffix[s1:s1 + 3]] + t2[suffix[s2:s2 + 3]]
+            + t3[suffix[s3:s3 + 3]] + t4[suffix[s4:s4 + 3]] + t5[suffix[s5:s5 + 3]]
+        )
+        append(f"{prefix}{suffix}{check_digits[total % 11]}")
+    return keys
+
+
+def parse_access_key(access_key):
+    """Campos de una clave de acceso de 49 dígitos."""
+    if not access_key or len(access_key) != ACCESS_KEY_LENGTH:
+        raise ValueError(f"Clave de acceso debe tener 49 dígitos: {access_key}")
+    return {
+        'issue_date': access_key[0:8],
+        'document_type_code': access_key[8:10],
+        'ruc': access_key[10:23],
+        'environment': access_key[23],
+        'establishment': access_key[24:27],
+        'emission_point': access_key[27:30],
+        'sequence': access_key[30:39],
+        'numeric_code': access_key[39:47],
+        'emission_type': access_key[47],
+        'check_digit': access_key[48],
+    }
@@ -233,23 +233,24 @@ class DocumentTaxAdmin(admin.ModelAdmin):
 @admin.register(SRIResponse)
 class SRIResponseAdmin(admin.ModelAdmin):
     list_display = (
-        'document', 'operation_type', 'response_code',
+        'document', 'operation_type', 'response_code', 'error_codes',
         'success_colored', 'created_at'
     )
     list_filter = ('operation_type', 'response_code', 'created_at')
-    search_fields = ('document__document_number', 'response_message')
+    search_fields = ('document__document_number', 'response_message', 'authorization_number')
     ordering = ('-created_at',)
-    readonly_fields = ('created_at', 'raw_response')
+    readonly_fields = ('created_at', 'raw_response', 'raw_payload')
     
     fieldsets = (
         ('📄 Documento', {
             'fields': ('document', 'operation_type')
         }),
         ('📨 Respuesta', {
-            'fields': ('response_code', 'response_message')
+            'fields': ('response_code', 'response_message', 'state',
+                       'authorization_number', 'authorization_date', 'error_codes')
         }),
         ('🔍 Detalles', {
-            'fields': ('raw_response', 'created_at'),
+            'fields': ('raw_response', 'raw_payload', 'created_at'),
             'classes': ('collapse',)
         }),
     )
@@ -10,4 +10,5 @@ class SriIntegrationConfig(AppConfig):
         try:
             import apps.sri_integration.signals  # noqa F401
         except ImportError:
-            pass
\ No newline at end of file
+            pass
+        import apps.sri_integration.checks  # noqa F401
\ No newline at end of file
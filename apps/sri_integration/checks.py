@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+System checks de la integración SRI
+apps/sri_integration/checks.py
+"""
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from apps.sri_integration.services.xsd_validator import get_xsd_dir, missing_schema_files
+
+
+@register()
+def check_xsd_schemas(app_configs, **kwargs):
+    """Con SRI_VALIDATE_XML_SCHEMA activo, los XSD oficiales deben estar instalados."""
+    if not getattr(settings, 'SRI_VALIDATE_XML_SCHEMA', True):
+        return []
+
+    missing = missing_schema_files()
+    if not missing:
+        return []
+
+    return [
+        Warning(
+            f"Faltan XSD del SRI en {get_xsd_dir()}: {', '.join(missing)}",
+            hint=(
+                'Los comprobantes de esos tipos fallarán con XML_SCHEMA_MISSING. '
+                'Instalar con: python manage.py install_sri_xsd <carpeta o .zip de XSD del SRI>'
+            ),
+            id='sri_integration.W001',
+        )
+    ]
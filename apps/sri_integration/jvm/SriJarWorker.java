@@ -0,0 +1,150 @@
+/*
+ * Worker JVM persistente para el JAR oficial del SRI (sri.jar)
+ * apps/sri_integration/jvm/SriJarWorker.java
+ *
+ * Carga sri.jar una sola vez y llama a su Main-Class por cada documento, con
+ * los mismos 5 parámetros que `java -jar sri.jar` (p12, password, xml de
+ * entrada, directorio y nombre del archivo de salida). Lo arranca y controla
+ * JarWorker (apps/sri_integration/services/jar_signer.py):
+ *
+ *   java -Djava.security.manager=allow -cp <dir con SriJarWorker.class> SriJarWorker /app/sri.jar
+ *
+ * Protocolo por stdin/stdout, una línea por petición:
+ *   al arrancar: READY
+ *   petición:    base64(p12) TAB base64(password) TAB base64(xml) TAB base64(dir) TAB base64(archivo)
+ *   respuesta:   OK | ERR TAB base64(mensaje)
+ *
+ * La salida del JAR se redirige a stderr para no mezclarse con el protocolo y
+ * System.exit dentro del JAR se intercepta para que la JVM siga viva (en JVMs
+ * sin SecurityManager un exit termina el worker y JarWorker lo reinicia).
+ */
+
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+import java.util.Base64;
+import java.util.jar.JarFile;
+
+public final class SriJarWorker {
+
+    private static final int FIELDS = 5;
+
+    /** System.exit(status) llamado por el JAR durante una firma. */
+    private static final class ExitTrapped extends SecurityException {
+        private static final long serialVersionUID = 1L;
+        final int status;
+
+        ExitTrapped(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    private SriJarWorker() {
+    }
+
+    public static void main(String[] args) throws Exception {
+        if (args.length != 1) {
+            System.err.println("Uso: SriJarWorker <ruta de sri.jar>");
+            System.exit(2);
+        }
+
+        Method jarMain = loadJarMain(args[0]);
+
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        System.setOut(System.err);
+        installExitTrap();
+
+        BufferedReader requests = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        protocol.println("READY");
+
+        String line;
+        while ((line = requests.readLine()) != null) {
+            try {
+                sign(jarMain, decodeFields(line));
+                protocol.println("OK");
+            } catch (Throwable e) {
+                protocol.println("ERR\t" + encode(String.valueOf(e)));
+            }
+        }
+    }
+
+    private static Method loadJarMain(String jarPath) throws Exception {
+        String mainClassName;
+        try (JarFile jar = new JarFile(jarPath)) {
+            mainClassName = jar.getManifest().getMainAttributes().getValue("Main-Class");
+        }
+        if (mainClassName == null) {
+            throw new IllegalStateException("Sin Main-Class en el manifiesto de " + jarPath);
+        }
+
+        URLClassLoader loader = new URLClassLoader(
+            new URL[] {new File(jarPath).toURI().toURL()},
+            SriJarWorker.class.getClassLoader()
+        );
+        return Class.forName(mainClassName.trim(), true, loader).getMethod("main", String[].class);
+    }
+
+    private static void sign(Method jarMain, String[] jarArgs) throws Throwable {
+        File output = new File(jarArgs[3], jarArgs[4]);
+        try {
+            jarMain.invoke(null, (Object) jarArgs);
+        } catch (InvocationTargetException e) {
+            Throwable cause = e.getCause();
+            if (!(cause instanceof ExitTrapped) || ((ExitTrapped) cause).status != 0) {
+                throw cause;
+            }
+        }
+        if (!output.isFile()) {
+            throw new IOException("El JAR no escribió " + output);
+        }
+    }
+
+    private static String[] decodeFields(String line) {
+        String[] fields = line.split("\t", -1);
+        if (fields.length != FIELDS) {
+            throw new IllegalArgumentException("Se esperaban " + FIELDS + " campos, llegaron " + fields.length);
+        }
+        String[] decoded = new String[FIELDS];
+        for (int i = 0; i < FIELDS; i++) {
+            decoded[i] = new String(Base64.getDecoder().decode(fields[i]), StandardCharsets.UTF_8);
+        }
+        return decoded;
+    }
+
+    private static String encode(String value) {
+        return Base64.getEncoder().encodeToString(value.getBytes(StandardCharsets.UTF_8));
+    }
+
+    @SuppressWarnings("removal")
+    private static void installExitTrap() {
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                @Override
+                public void checkExit(int status) {
+                    throw new ExitTrapped(status);
+                }
+
+                @Override
+                public void checkPermission(Permission perm) {
+                }
+
+                @Override
+                public void checkPermission(Permission perm, Object context) {
+                }
+            });
+        } catch (UnsupportedOperationException | SecurityException e) {
+            System.err.println("SriJarWorker: sin SecurityManager, un System.exit del JAR terminará el worker: " + e);
+        }
+    }
+}
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Comando de gestión para medir la firma XAdES-BES (documentos/segundo por núcleo)
+apps/sri_integration/management/commands/benchmark_signing.py
+
+Motores:
+- python: XAdESBESSigner en proceso (un núcleo y todos los núcleos con procesos)
+- jar: `java -jar sri.jar` por documento, como el respaldo de DocumentProcessor
+- jar-pool: JVMs calientes de JarWorkerPool, como el sidecar run_signing_daemon
+
+Por defecto firma la factura de las pruebas (fixtures/factura_unsigned.xml) con
+la clave y el certificado de pruebas; --p12/--password usan un certificado real.
+"""
+
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.serialization import pkcs12
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.sri_integration.services.global_certificate_manager import CertificateData
+from apps.sri_integration.services.jar_signer import (
+    JarSigningError, JarWorkerPool, jar_available, sign_with_jar, worker_available
+)
+from apps.sri_integration.services.xades_signer import XAdESBESSigner
+
+FIXTURES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'tests', 'fixtures'
+)
+TEST_P12_PASSWORD = 'vendo-sri-test'
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _python_worker(key_pem, cert_pem, xml_content, count):
+    """Firma `count` documentos en un proceso; retorna los segundos empleados."""
+    private_key = serialization.load_pem_private_key(key_pem, password=None)
+    certificate = x509.load_pem_x509_certificate(cert_pem)
+    signer = XAdESBESSigner(CertificateData(0, private_key, certificate, [], None))
+    started = time.perf_counter()
+    for _ in range(count):
+        signer.sign(xml_content)
+    return time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = 'Mide documentos firmados por segundo y por núcleo (firmador nativo, JAR y JVMs calientes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--engine',
+            choices=['python', 'jar', 'jar-pool', 'all'],
+            default='all',
+            help='Motor a medir (por defecto: todos los disponibles)'
+        )
+
+        parser.add_argument(
+            '--documents',
+            type=int,
+            default=500,
+            help='Documentos por núcleo para el firmador nativo'
+        )
+
+        parser.add_argument(
+            '--jar-documents',
+            type=int,
+            default=20,
+            help='Documentos por núcleo para el JAR (jar y jar-pool)'
+        )
+
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Núcleos a usar en la medición en paralelo'
+        )
+
+        parser.add_argument(
+            '--xml',
+            type=str,
+            help='Comprobante sin firmar (por defecto la factura de las pruebas)'
+        )
+
+        parser.add_argument(
+            '--p12',
+            type=str,
+            help='Certificado P12 (por defecto clave y certificado de pruebas)'
+        )
+
+        parser.add_argument(
+            '--password',
+            type=str,
+            default='',
+            help='Contraseña del P12'
+        )
+
+        parser.add_argument(
+            '--save-jar-sample',
+            type=str,
+            metavar='DIR',
+            help='Guardar en DIR un comprobante firmado por el JAR (fixtures/jar de las pruebas)'
+        )
+
+    def handle(self, *args, **options):
+        if options['documents'] < 1 or options['jar_documents'] < 1 or options['workers'] < 1:
+            raise CommandError('--documents, --jar-documents y --workers deben ser mayores que 0')
+
+        xml_content = _read(options['xml'] or os.path.join(FIXTURES_DIR, 'factura_unsigned.xml'))
+
+        with tempfile.TemporaryDirectory(prefix='sri_bench_') as work_dir:
+            key_pem, cert_pem, p12_path, password = self._load_credentials(options, work_dir)
+
+            self.stdout.write(self.style.SUCCESS('🔐 Benchmark de firma XAdES-BES'))
+            self.stdout.write('=' * 80)
+            self.stdout.write(f"📄 Comprobante: {len(xml_content)} bytes - núcleos: {options['workers']}")
+
+            if options['engine'] in ('python', 'all'):
+                self._bench_python(key_pem, cert_pem, xml_content, options)
+
+            if options['engine'] in ('jar', 'all'):
+                if not jar_available():
+                    message = '⚠️  Sin java o sin SRI_SIGNING_JAR_PATH: se omite el JAR'
+                    if options['engine'] == 'jar':
+                        raise CommandError(message)
+                    self.stdout.write(self.style.WARNING(message))
+                else:
+                    self._bench_jar(p12_path, password, xml_content, options)
+
+            if options['engine'] in ('jar-pool', 'all'):
+                if not worker_available():
+                    message = '⚠️  Sin SriJarWorker.class en SRI_SIGNING_WORKER_CLASSPATH: se omiten las JVMs calientes'
+                    if options['engine'] == 'jar-pool':
+                        raise CommandError(message)
+                    self.stdout.write(self.style.WARNING(message))
+                else:
+                    self._bench_jar_pool(p12_path, password, xml_content, options)
+
+    def _load_credentials(self, options, work_dir):
+        """PEM de clave y certificado (motor nativo) y ruta/contraseña del P12 (JAR)."""
+        if options['p12']:
+            password = options['password']
+            private_key, certificate, _ = pkcs12.load_key_and_certificates(
+                _read(options['p12']), password.encode() if password else None
+            )
+            p12_path = options['p12']
+        else:
+            private_key = serialization.load_pem_private_key(
+                _read(os.path.join(FIXTURES_DIR, 'test_signer.key.pem')), password=None
+            )
+            certificate = x509.load_pem_x509_certificate(_read(os.path.join(FIXTURES_DIR, 'test_signer.cert.pem')))
+            password = TEST_P12_PASSWORD
+            p12_path = os.path.join(work_dir, 'test_signer.p12')
+            with open(p12_path, 'wb') as f:
+                f.write(pkcs12.serialize_key_and_certificates(
+                    b'test_signer', private_key, certificate, None,
+                    serialization.BestAvailableEncryption(password.encode()),
+                ))
+
+        key_pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        cert_pem = certificate.public_bytes(serialization.Encoding.PEM)
+        return key_pem, cert_pem, p12_path, password
+
+    def _report(self, label, documents, elapsed, cores, per_core=None):
+        rate = documents / elapsed if elapsed > 0 else 0
+        if per_core is None:
+            per_core = rate / cores
+        self.stdout.write(
+            f"   {label:<28} {documents:>6} docs en {elapsed:8.2f}s  "
+            f"{rate:9.1f} docs/s  {per_core:9.1f} docs/s/núcleo"
+        )
+
+    def _bench_python(self, key_pem, cert_pem, xml_content, options):
+        count = options['documents']
+        workers = options['workers']
+        self.stdout.write('\n🐍 Firmador nativo (XAdESBESSigner)')
+
+        # Calentamiento: importaciones y primer parseo fuera de la medición
+        _python_worker(key_pem, cert_pem, xml_content, 5)
+
+        elapsed = _python_worker(key_pem, cert_pem, xml_content, count)
+        self._report('1 núcleo', count, elapsed, 1)
+
+        if workers > 1:
+            started = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                worker_times = list(executor.map(
+                    _python_worker,
+                    [key_pem] * workers, [cert_pem] * workers, [xml_content] * workers, [count] * workers
+                ))
+            # Por núcleo con el tiempo de firma de cada proceso (sin el arranque del pool)
+            per_core = sum(count / elapsed for elapsed in worker_times) / workers
+            self._report(
+                f'{workers} núcleos (procesos)', count * workers, time.perf_counter() - started, workers, per_core
+            )
+
+    def _bench_jar(self, p12_path, password, xml_content, options):
+        count = options['jar_documents']
+        workers = options['workers']
+        self.stdout.write('\n☕ JAR oficial (una JVM por documento)')
+
+        try:
+            signed = sign_with_jar(p12_path, password, xml_content)
+        except JarSigningError as e:
+            raise CommandError(f'El JAR no pudo firmar el comprobante: {e}')
+
+        if options['save_jar_sample']:
+            os.makedirs(options['save_jar_sample'], exist_ok=True)
+            sample_path = os.path.join(options['save_jar_sample'], 'factura_jar_signed.xml')
+            with open(sample_path, 'wb') as f:
+                f.write(signed)
+            self.stdout.write(self.style.SUCCESS(f'   💾 Muestra firmada por el JAR: {sample_path}'))
+
+        started = time.perf_counter()
+        for _ in range(count):
+            sign_with_jar(p12_path, password, xml_content)
+        self._report('1 núcleo', count, time.perf_counter() - started, 1)
+
+        if workers > 1:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(
+                    lambda _: sign_with_jar(p12_path, password, xml_content), range(count * workers)
+                ))
+            self._report(f'{workers} núcleos (JVMs)', count * workers, time.perf_counter() - started, workers)
+
+    def _bench_jar_pool(self, p12_path, password, xml_content, options):
+        count = options['jar_documents']
+        workers = options['workers']
+        self.stdout.write('\n🔥 JAR oficial en JVMs calientes (JarWorkerPool)')
+
+        for size in sorted({1, workers}):
+            pool = JarWorkerPool(size=size)
+            try:
+                # Arranque de las JVMs y primera firma (JIT) fuera de la medición
+                pool.start()
+                warmup = pool.sign_many([(p12_path, password, xml_content)] * size)
+                failed = [message for ok, message in warmup if not ok]
+                if failed:
+                    raise CommandError(f'El worker JVM no pudo firmar el comprobante: {failed[0]}')
+
+                jobs = [(p12_path, password, xml_content)] * (count * size)
+                started = time.perf_counter()
+                pool.sign_many(jobs)
+                label = '1 núcleo' if size == 1 else f'{size} núcleos (JVMs calientes)'
+                self._report(label, len(jobs), time.perf_counter() - started, size)
+            finally:
+                pool.close()
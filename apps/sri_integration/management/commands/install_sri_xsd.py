@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Comando de gestión para instalar los XSD oficiales del SRI
+apps/sri_integration/management/commands/install_sri_xsd.py
+
+Copia a SRI_XSD_DIR los XSD de comprobantes (factura_V1.1.0.xsd, ...) y el
+xmldsig-core-schema.xsd que importan, desde una carpeta o el .zip descargado de
+la ficha técnica del SRI, y verifica que compilan.
+"""
+
+import os
+import shutil
+import tempfile
+import zipfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.sri_integration.services import xsd_validator
+from apps.sri_integration.services.xsd_validator import (
+    SCHEMA_FILES, XMLDSIG_SCHEMA_FILE, XSDSchemaMissingError, get_schema, get_xsd_dir
+)
+
+
+class Command(BaseCommand):
+    help = 'Instala los XSD oficiales del SRI en SRI_XSD_DIR y verifica que compilan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', type=str, help='Carpeta o .zip con los XSD publicados por el SRI')
+        parser.add_argument('--allow-partial', action='store_true',
+                            help='Instalar aunque falte el XSD de algún tipo de comprobante')
+
+    def handle(self, *args, **options):
+        source = options['source']
+        if not os.path.exists(source):
+            raise CommandError(f'No existe {source}')
+
+        with tempfile.TemporaryDirectory(prefix='sri_xsd_') as work_dir:
+            if zipfile.is_zipfile(source):
+                with zipfile.ZipFile(source) as archive:
+                    archive.extractall(work_dir)
+                source = work_dir
+            elif not os.path.isdir(source):
+                raise CommandError(f'{source} no es una carpeta ni un .zip')
+
+            found = self._find_schemas(source)
+            missing = [name for name in [*SCHEMA_FILES.values(), XMLDSIG_SCHEMA_FILE] if name not in found]
+            if XMLDSIG_SCHEMA_FILE in missing or (missing and not options['allow_partial']):
+                raise CommandError(f"Faltan en {options['source']}: {', '.join(missing)}")
+
+            xsd_dir = get_xsd_dir()
+            os.makedirs(xsd_dir, exist_ok=True)
+            for name, path in found.items():
+                shutil.copyfile(path, os.path.join(xsd_dir, name))
+
+        xsd_validator.clear_schema_cache()
+        errors = []
+        for root_tag, name in SCHEMA_FILES.items():
+            if name not in found:
+                continue
+            try:
+                get_schema(root_tag)
+                self.stdout.write(f'✅ {name}')
+            except XSDSchemaMissingError as e:
+                errors.append(str(e))
+
+        if errors:
+            raise CommandError('\n'.join(errors))
+        for name in missing:
+            self.stdout.write(self.style.WARNING(f'⚠️  {name} no instalado'))
+        self.stdout.write(self.style.SUCCESS(f'📁 XSD instalados en {xsd_dir}'))
+
+    def _find_schemas(self, source):
+        """Nombre esperado -> ruta, buscando en subcarpetas (el .zip del SRI las usa)."""
+        expected = {*SCHEMA_FILES.values(), XMLDSIG_SCHEMA_FILE}
+        found = {}
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name in expected and name not in found:
+                    found[name] = os.path.join(root, name)
+        return found
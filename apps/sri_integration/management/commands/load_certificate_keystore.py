@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Comando de gestión para poblar el almacén compartido de claves de firma
+apps/sri_integration/management/commands/load_certificate_keystore.py
+
+Proceso cargador único: descifra el P12 de cada empresa activa una vez y
+publica la clave de firma en el almacén (Redis) para que los workers
+gunicorn / Celery la carguen al primer uso sin descifrar el P12.
+"""
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.certificates.models import DigitalCertificate
+from apps.sri_integration.services.certificate_keystore import certificate_version, get_keystore
+from apps.sri_integration.services.global_certificate_manager import get_certificate_manager
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Publica las claves de firma de las empresas activas en el almacén compartido'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company-id',
+            type=int,
+            action='append',
+            help='Empresa a cargar (se puede repetir); por defecto todas las activas'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Volver a descifrar el P12 aunque el bundle vigente ya esté publicado'
+        )
+        parser.add_argument(
+            '--watch',
+            type=int,
+            default=0,
+            help='Repetir cada N segundos (renueva los bundles antes de que venza el TTL)'
+        )
+
+    def handle(self, *args, **options):
+        keystore = get_keystore()
+        if not keystore.enabled:
+            raise CommandError(f'Almacén de claves desactivado: {keystore.disabled_reason}')
+
+        while True:
+            self._load_all(keystore, options['company_id'], options['force'])
+            if not options['watch']:
+                break
+            try:
+                time.sleep(options['watch'])
+            except KeyboardInterrupt:
+                self.stdout.write('\n⏹️  Deteniendo cargador de claves...')
+                break
+
+    def _load_all(self, keystore, company_ids, force):
+        manager = get_certificate_manager()
+        certificates = DigitalCertificate.objects.filter(
+            status='ACTIVE',
+            company__is_active=True
+        ).select_related('company')
+        if company_ids:
+            certificates = certificates.filter(company_id__in=company_ids)
+
+        published = skipped = failed = 0
+        load_ms = []
+        started = time.perf_counter()
+
+        for certificate_obj in certificates.iterator():
+            company_id = certificate_obj.company_id
+
+            if not force and keystore.fetch(company_id, certificate_version(certificate_obj)) is not None:
+                skipped += 1
+                continue
+
+            # reload_certificate invalida el bundle anterior y descifra el P12 en este proceso
+            if manager.reload_certificate(company_id):
+                cert_data = manager.get_certificate(company_id)
+                published += 1
+                if cert_data and cert_data.load_source == 'p12':
+                    load_ms.append(cert_data.load_ms)
+                    self.stdout.write(
+                        f"   ✅ Empresa {company_id}: {cert_data.load_ms:.0f} ms, {cert_data.key_bytes} bytes"
+                    )
+            else:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f"   ❌ Empresa {company_id}: no se pudo cargar el certificado"))
+
+        elapsed = time.perf_counter() - started
+        average = f"{sum(load_ms) / len(load_ms):.0f} ms" if load_ms else 'n/a'
+        self.stdout.write(self.style.SUCCESS(
+            f"🔐 Almacén de claves: {published} publicadas, {skipped} vigentes, {failed} fallidas "
+            f"en {elapsed:.1f}s (carga P12 promedio: {average})"
+        ))
@@ -37,6 +37,12 @@ class Command(BaseCommand):
             help='Forzar recarga de certificados ya cacheados'
         )
         
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Hilos para la carga en paralelo con --all (1 = secuencial; por defecto CERTIFICATE_WARMUP_WORKERS)'
+        )
+        
         parser.add_argument(
             '--validate-only',
             action='store_true',
@@ -86,8 +92,11 @@ class Command(BaseCommand):
             )
             return
         
-        # Precargar certificados
-        self._preload_certificates(cert_manager, companies_to_process, options)
+        # Precargar certificados (en paralelo para --all)
+        if options['all'] and options['workers'] != 1:
+            self._warm_up_certificates(cert_manager, companies_to_process, options)
+        else:
+            self._preload_certificates(cert_manager, companies_to_process, options)
         
         # Mostrar estadísticas finales
         self._show_final_stats(cert_manager)
@@ -142,12 +151,11 @@ class Command(BaseCommand):
                     continue
                 
                 # Cargar certificado
-                if options['force_reload'] and company.id in cert_manager._certificates_cache:
-                    del cert_manager._certificates_cache[company.id]
+                if options['force_reload'] and cert_manager.invalidate_certificate(company.id):
                     self.stdout.write("   🔄 Forzando recarga...")
                 
                 # Intentar cargar
-                result = cert_manager._load_certificate(company.id)
+                result = cert_manager.get_certificate(company.id)
                 
                 if result:
                     loaded_count += 1
@@ -204,6 +212,39 @@ class Command(BaseCommand):
         success_rate = ((loaded_count + already_cached_count) / total_companies * 100) if total_companies > 0 else 0
         self.stdout.write(f"   📈 Tasa de éxito: {success_rate:.1f}%")
     
+    def _warm_up_certificates(self, cert_manager, companies, options):
+        """Precarga en paralelo, empresas con más documentos recientes primero"""
+        company_ids = list(companies.values_list('id', flat=True))
+        self.stdout.write(f'\n🔥 Warm-up paralelo de {len(company_ids)} certificados...')
+        
+        if options['force_reload']:
+            for company_id in company_ids:
+                cert_manager.invalidate_certificate(company_id)
+        
+        report_every = max(1, len(company_ids) // 20)
+        
+        def progress(done, total, company_id, loaded):
+            if not loaded:
+                self.stdout.write(self.style.ERROR(f"   ❌ Empresa {company_id}: error cargando certificado"))
+            if done % report_every == 0 or done == total:
+                self.stdout.write(f"   🔄 {done}/{total}")
+        
+        result = cert_manager.warm_up(company_ids, workers=options['workers'], progress_callback=progress)
+        
+        total_companies = result['total_companies']
+        self.stdout.write('\n' + '=' * 80)
+        self.stdout.write(
+            self.style.SUCCESS(f"📊 RESUMEN DE PRECARGA:")
+        )
+        self.stdout.write(f"   📦 Total empresas: {total_companies}")
+        self.stdout.write(f"   ✅ Cargados exitosamente: {result['loaded']}")
+        self.stdout.write(f"   💾 Ya cacheados: {result['already_cached']}")
+        self.stdout.write(f"   ❌ Fallidos: {result['failed']}")
+        self.stdout.write(f"   ⏱️  Tiempo: {result['elapsed_s']}s")
+        
+        success_rate = ((result['loaded'] + result['already_cached']) / total_companies * 100) if total_companies > 0 else 0
+        self.stdout.write(f"   📈 Tasa de éxito: {success_rate:.1f}%")
+    
     def _validate_certificates(self):
         """Valida certificados sin cargarlos"""
         self.stdout.write('\n🔍 Validando certificados...')
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Comando de gestión para la retención de logs
+apps/sri_integration/management/commands/run_log_retention.py
+
+Misma ejecución que la tarea cleanup_old_sri_responses, con el detalle por
+tabla: filas archivadas / borradas, archivos, duración y tiempo de bloqueo.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.sri_integration.services.log_retention import run_retention
+
+TABLES = ('sri_responses', 'audit_logs', 'certificate_usage_logs')
+
+
+class Command(BaseCommand):
+    help = 'Archiva y borra por lotes los logs antiguos (SRIResponse, AuditLog, CertificateUsageLog)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--table',
+            choices=TABLES,
+            action='append',
+            help='Tabla a procesar (se puede repetir); por defecto todas'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo contar las filas que se archivarían y borrarían'
+        )
+        parser.add_argument(
+            '--no-archive',
+            action='store_true',
+            help='Borrar sin generar el archivo mensual'
+        )
+
+    def handle(self, *args, **options):
+        result = run_retention(
+            tables=options['table'],
+            archive=False if options['no_archive'] else None,
+            dry_run=options['dry_run'],
+        )
+
+        for table in result['tables']:
+            if options['dry_run']:
+                self.stdout.write(f"   {table['label']}: {table['archived']} filas en {table['months']} meses")
+                continue
+            self.stdout.write(
+                f"   {table['label']}: {table['archived']} archivadas, {table['deleted']} borradas "
+                f"en {table['batches']} lotes de {table['batch_size']}, {table['runtime_s']}s "
+                f"(bloqueo máx {table['lock_ms_max']} ms, prom {table['lock_ms_avg']} ms, "
+                f"{table['archive_bytes'] / 1024:.0f} KB archivados, {table['blobs_deleted']} blobs eliminados)"
+            )
+
+        action = 'a procesar' if options['dry_run'] else 'borradas'
+        total = result['archived'] if options['dry_run'] else result['deleted']
+        self.stdout.write(self.style.SUCCESS(
+            f"🧹 Retención de logs: {total} filas {action} en {result['runtime_s']}s "
+            f"(bloqueo máx {result['lock_ms_max']} ms)"
+        ))
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Comando de gestión para ejecutar el sidecar de firma con JVMs calientes
+apps/sri_integration/management/commands/run_signing_daemon.py
+
+Arranca un pool de SriJarWorker (sri.jar cargado una vez por JVM) y atiende a
+SigningDaemonClient en SRI_SIGNING_DAEMON_SOCKET. Se despliega como el servicio
+signing-daemon de docker-compose.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.sri_integration.services.jar_signer import (
+    JarSigningError, JarWorkerPool, get_jar_path, worker_available
+)
+from apps.sri_integration.services.signing_daemon import SigningDaemonServer
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta el sidecar de firma XAdES-BES con un pool de JVMs calientes del JAR oficial'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', type=str, default=None,
+                            help='Socket Unix (por defecto: SRI_SIGNING_DAEMON_SOCKET)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='JVMs calientes (por defecto: SRI_SIGNING_DAEMON_WORKERS)')
+        parser.add_argument('--timeout', type=int, default=60,
+                            help='Segundos máximos por firma antes de reiniciar la JVM')
+
+    def handle(self, *args, **options):
+        socket_path = options['socket'] or settings.SRI_SIGNING_DAEMON_SOCKET
+        workers = options['workers'] or settings.SRI_SIGNING_DAEMON_WORKERS
+
+        if not socket_path:
+            raise CommandError('Configure SRI_SIGNING_DAEMON_SOCKET o use --socket')
+        if workers < 1:
+            raise CommandError('--workers debe ser mayor que 0')
+        if not worker_available():
+            raise CommandError(
+                f'Sin java, sin {get_jar_path()} o sin SriJarWorker.class en SRI_SIGNING_WORKER_CLASSPATH'
+            )
+
+        pool = JarWorkerPool(size=workers, timeout=options['timeout'])
+        try:
+            pool.start()
+        except JarSigningError as e:
+            pool.close()
+            raise CommandError(f'No se pudieron arrancar las JVMs: {e}')
+
+        server = SigningDaemonServer(socket_path, pool)
+        self.stdout.write(self.style.SUCCESS(
+            f'🔐 Sidecar de firma en {socket_path} con {workers} JVMs calientes'
+        ))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            pool.close()
+            logger.info(f"Signing daemon stopped: {server.stats} {pool.stats()}")
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Comando de gestión para procesar recepción/autorización masiva con asyncio
+apps/sri_integration/management/commands/run_sri_async_worker.py
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.sri_integration.models import ElectronicDocument
+from apps.sri_integration.services.async_soap_client import (
+    AIOHTTP_AVAILABLE, run_async_authorizations, run_async_receptions
+)
+from apps.sri_integration.services.authorization_poller import claim_access_keys, release_access_keys
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Envía documentos SIGNED y/o consulta autorizaciones SENT en masa con el cliente asyncio del SRI'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode',
+            choices=['reception', 'authorization', 'both'],
+            default='authorization',
+            help='Etapa a procesar (por defecto: authorization)'
+        )
+        parser.add_argument('--limit', type=int, default=1000, help='Máximo de documentos por ciclo')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Llamadas en vuelo por ambiente (por defecto: SRI_ASYNC_MAX_CONCURRENCY)')
+        parser.add_argument('--max-age-hours', type=int, default=24,
+                            help='Antigüedad máxima de los documentos a procesar')
+        parser.add_argument('--loop', type=int, default=0,
+                            help='Repetir cada N segundos (modo worker); 0 = una sola pasada')
+
+    def handle(self, *args, **options):
+        if not AIOHTTP_AVAILABLE:
+            raise CommandError('aiohttp no está instalado')
+
+        while True:
+            if options['mode'] in ('reception', 'both'):
+                self._run_reception(options)
+            if options['mode'] in ('authorization', 'both'):
+                self._run_authorization(options)
+
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
+
+    def _base_queryset(self, status, options):
+        time_limit = timezone.now() - timedelta(hours=options['max_age_hours'])
+        return (
+            ElectronicDocument.objects
+            .filter(status=status, created_at__gte=time_limit)
+            .select_related('company', 'company__sri_configuration')
+            .order_by('created_at')[:options['limit']]
+        )
+
+    def _run_reception(self, options):
+        from apps.sri_integration.tasks import schedule_document_finalization
+
+        items = []
+        for document in self._base_queryset('SIGNED', options):
+            if not document.signed_xml_file:
+                continue
+            try:
+                with document.signed_xml_file.open('rb') as signed_file:
+                    items.append((document, signed_file.read()))
+            except Exception as e:
+                logger.error(f"❌ [SRI_ASYNC] Cannot read signed XML for document {document.id}: {e}")
+
+        if not items:
+            self.stdout.write('ℹ️  Sin documentos SIGNED pendientes de envío')
+            return
+
+        started = time.monotonic()
+        results, stats = run_async_receptions(items, max_concurrency=options['concurrency'])
+        elapsed = max(time.monotonic() - started, 0.001)
+
+        received = [document_id for document_id, (ok, _) in results.items() if ok]
+        for document_id in received:
+            schedule_document_finalization(document_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"📤 Recepción: {len(received)}/{len(items)} recibidos en {elapsed:.1f}s "
+            f"({len(items) / elapsed:.1f} docs/s) - peticiones: {stats['requests']}, "
+            f"reintentos: {stats['retries']}, errores: {stats['errors']}"
+        ))
+
+    def _run_authorization(self, options):
+        from apps.sri_integration.tasks import finalize_document_async
+
+        documents = list(self._base_queryset('SENT', options))
+        if not documents:
+            self.stdout.write('ℹ️  Sin documentos SENT pendientes de autorización')
+            return
+
+        # Mismas claves "en curso" (SET NX EX por clave de acceso) que el poller,
+        # check_document_authorization_async y finalize_document_async
+        claimed = set(claim_access_keys([document.access_key for document in documents]))
+        documents = [document for document in documents if document.access_key in claimed]
+
+        started = time.monotonic()
+        try:
+            results, stats = run_async_authorizations(documents, max_concurrency=options['concurrency'])
+        finally:
+            release_access_keys(list(claimed))
+        elapsed = max(time.monotonic() - started, 0.001)
+
+        authorized = [document_id for document_id, (ok, _) in results.items() if ok]
+        for document_id in authorized:
+            # PDF, email y consumo del plan
+            finalize_document_async.delay(document_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"🔍 Autorización: {len(authorized)}/{len(documents)} autorizados en {elapsed:.1f}s "
+            f"({len(documents) / elapsed:.1f} docs/s) - peticiones: {stats['requests']}, "
+            f"reintentos: {stats['retries']}, errores: {stats['errors']}"
+        ))
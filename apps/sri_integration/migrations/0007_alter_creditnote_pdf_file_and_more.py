@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:11
+
+import apps.sri_integration.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sri_integration', '0006_sriconfiguration_auto_backup_documents_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='creditnote',
+            name='pdf_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='credit_notes/pdf/', verbose_name='PDF file'),
+        ),
+        migrations.AlterField(
+            model_name='creditnote',
+            name='signed_xml_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='credit_notes/xml/', verbose_name='signed XML file'),
+        ),
+        migrations.AlterField(
+            model_name='creditnote',
+            name='xml_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='credit_notes/xml/', verbose_name='XML file'),
+        ),
+        migrations.AlterField(
+            model_name='debitnote',
+            name='pdf_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='debit_notes/pdf/', verbose_name='PDF file'),
+        ),
+        migrations.AlterField(
+            model_name='debitnote',
+            name='signed_xml_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='debit_notes/xml/', verbose_name='signed XML file'),
+        ),
+        migrations.AlterField(
+            model_name='debitnote',
+            name='xml_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='debit_notes/xml/', verbose_name='XML file'),
+        ),
+        migrations.AlterField(
+            model_name='electronicdocument',
+            name='pdf_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='invoices/pdf/', verbose_name='PDF file'),
+        ),
+        migrations.AlterField(
+            model_name='electronicdocument',
+            name='signed_xml_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='invoices/xml/', verbose_name='signed XML file'),
+        ),
+        migrations.AlterField(
+            model_name='electronicdocument',
+            name='xml_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='invoices/xml/', verbose_name='XML file'),
+        ),
+        migrations.AlterField(
+            model_name='purchasesettlement',
+            name='pdf_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='settlements/pdf/', verbose_name='PDF file'),
+        ),
+        migrations.AlterField(
+            model_name='purchasesettlement',
+            name='signed_xml_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='settlements/xml/', verbose_name='signed XML file'),
+        ),
+        migrations.AlterField(
+            model_name='purchasesettlement',
+            name='xml_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='settlements/xml/', verbose_name='XML file'),
+        ),
+        migrations.AlterField(
+            model_name='retention',
+            name='pdf_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='retentions/pdf/', verbose_name='PDF file'),
+        ),
+        migrations.AlterField(
+            model_name='retention',
+            name='signed_xml_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='retentions/xml/', verbose_name='signed XML file'),
+        ),
+        migrations.AlterField(
+            model_name='retention',
+            name='xml_file',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='retentions/xml/', verbose_name='XML file'),
+        ),
+    ]
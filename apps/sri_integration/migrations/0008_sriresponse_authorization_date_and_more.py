@@ -0,0 +1,192 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:15
+
+import logging
+import re
+from datetime import datetime
+
+import apps.sri_integration.storage
+from django.core.files.base import ContentFile
+from django.db import migrations, models, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+# ----------------------------------------------------------------------------
+# Copia congelada de apps/sri_integration/response_log.py (no importar el
+# módulo vivo: sus cambios futuros no deben alterar esta migración)
+# ----------------------------------------------------------------------------
+RAW_KEYS = ('response',)
+ERROR_CODES_MAX_LENGTH = 100
+
+_ERROR_CODE_RE = re.compile(r'Error\s+(\w+)\s*:')
+_DATE_FORMATS = ('%Y-%m-%dT%H:%M:%S.%f%z', '%Y-%m-%dT%H:%M:%S%z', '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%d/%m/%Y %H:%M:%S')
+
+
+def extract_error_codes(errors):
+    codes = []
+    for error in errors or []:
+        for code in _ERROR_CODE_RE.findall(str(error)):
+            if code not in codes:
+                codes.append(code)
+    return ','.join(codes)[:ERROR_CODES_MAX_LENGTH]
+
+
+def parse_authorization_date(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value).strip()
+        parsed = None
+        for fmt in _DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt)
+                break
+            except ValueError:
+                continue
+        if parsed is None:
+            return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def store_raw_payload(access_key, operation_type, payload):
+    if not payload:
+        return ''
+    data = payload.encode('utf-8') if isinstance(payload, str) else bytes(payload)
+    name = f"{access_key or 'sin_clave'}_{operation_type.lower()}.xml"
+    try:
+        return apps.sri_integration.storage.get_artifact_storage().save(f"sri_responses/{name}", ContentFile(data))
+    except Exception as e:
+        logger.warning(f"⚠️ Could not store raw SRI payload for {access_key}: {e}")
+        return ''
+
+
+def compact_response(access_key, operation_type, response_data):
+    if not isinstance(response_data, dict):
+        name = store_raw_payload(access_key, operation_type, str(response_data))
+        return {'raw_payload': name} if name else {}
+
+    if not any(key in response_data for key in RAW_KEYS):
+        return response_data
+
+    compact = {key: value for key, value in response_data.items() if key not in RAW_KEYS}
+    payload = next((response_data[key] for key in RAW_KEYS if response_data.get(key)), None)
+    name = store_raw_payload(access_key, operation_type, payload)
+    if name:
+        compact['raw_payload'] = name
+    return compact
+
+
+def typed_fields(response_data, response_code=''):
+    data = response_data if isinstance(response_data, dict) else {}
+    return {
+        'state': str(data.get('estado') or data.get('batch_estado') or response_code or '')[:20],
+        'authorization_number': str(data.get('numeroAutorizacion') or '')[:49],
+        'authorization_date': parse_authorization_date(data.get('fechaAutorizacion')),
+        'error_codes': extract_error_codes(data.get('errors')),
+        'raw_payload': data.get('raw_payload', ''),
+    }
+
+
+def _update_rows(schema_editor, model, field_names, rows):
+    """UPDATE por pk con executemany (bulk_update arma un CASE por fila y campo)."""
+    connection = schema_editor.connection
+    fields = [model._meta.get_field(name) for name in field_names]
+    assignments = ', '.join(f"{connection.ops.quote_name(field.column)} = %s" for field in fields)
+    sql = f"UPDATE {connection.ops.quote_name(model._meta.db_table)} SET {assignments} WHERE id = %s"
+    params = [
+        [field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields] + [obj.pk]
+        for obj in rows
+    ]
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def compact_sri_responses(apps, schema_editor):
+    """
+    Saca el texto SOAP de SRIResponse.raw_response y ElectronicDocument.sri_response
+    al almacén de artefactos y rellena los campos tipados. Por lotes e idempotente.
+    """
+    SRIResponse = apps.get_model('sri_integration', 'SRIResponse')
+    ElectronicDocument = apps.get_model('sri_integration', 'ElectronicDocument')
+    response_fields = ['raw_response', 'state', 'authorization_number', 'authorization_date', 'error_codes', 'raw_payload']
+
+    responses = (
+        SRIResponse.objects.filter(state='')
+        .select_related('document')
+        .only('id', 'response_code', 'raw_response', 'operation_type', 'document__access_key')
+        .order_by('pk')
+    )
+    batch = []
+    for response in responses.iterator(chunk_size=BATCH_SIZE):
+        response.raw_response = compact_response(
+            response.document.access_key, response.operation_type, response.raw_response
+        )
+        for name, value in typed_fields(response.raw_response, response.response_code).items():
+            setattr(response, name, value)
+        batch.append(response)
+        if len(batch) >= BATCH_SIZE:
+            _update_rows(schema_editor, SRIResponse, response_fields, batch)
+            batch = []
+    if batch:
+        _update_rows(schema_editor, SRIResponse, response_fields, batch)
+
+    documents = (
+        ElectronicDocument.objects.filter(sri_response__has_any_keys=list(RAW_KEYS))
+        .only('id', 'access_key', 'sri_response')
+        .order_by('pk')
+    )
+    batch = []
+    for document in documents.iterator(chunk_size=BATCH_SIZE):
+        document.sri_response = compact_response(document.access_key, 'AUTHORIZATION', document.sri_response)
+        batch.append(document)
+        if len(batch) >= BATCH_SIZE:
+            _update_rows(schema_editor, ElectronicDocument, ['sri_response'], batch)
+            batch = []
+    if batch:
+        _update_rows(schema_editor, ElectronicDocument, ['sri_response'], batch)
+
+
+class Migration(migrations.Migration):
+
+    # Lotes en su propia transacción: no bloquear tablas grandes en una sola
+    atomic = False
+
+    dependencies = [
+        ('sri_integration', '0007_alter_creditnote_pdf_file_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sriresponse',
+            name='authorization_date',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='authorization date'),
+        ),
+        migrations.AddField(
+            model_name='sriresponse',
+            name='authorization_number',
+            field=models.CharField(blank=True, max_length=49, verbose_name='authorization number'),
+        ),
+        migrations.AddField(
+            model_name='sriresponse',
+            name='error_codes',
+            field=models.CharField(blank=True, help_text='SRI error identifiers, comma separated', max_length=100, verbose_name='error codes'),
+        ),
+        migrations.AddField(
+            model_name='sriresponse',
+            name='raw_payload',
+            field=models.FileField(blank=True, storage=apps.sri_integration.storage.get_artifact_storage, upload_to='sri_responses/', verbose_name='raw payload'),
+        ),
+        migrations.AddField(
+            model_name='sriresponse',
+            name='state',
+            field=models.CharField(blank=True, max_length=20, verbose_name='state'),
+        ),
+        migrations.RunPython(compact_sri_responses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sri_integration', '0008_sriresponse_authorization_date_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sriresponse',
+            index=models.Index(fields=['created_at'], name='sri_integra_created_6ecdfc_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sri_integration', '0009_sriresponse_sri_integra_created_6ecdfc_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documenttax',
+            name='percentage_code',
+            field=models.CharField(choices=[('0', '0%'), ('2', '12%'), ('3', '14%'), ('4', '15%'), ('5', '5%'), ('6', 'No Objeto de Impuesto'), ('7', 'Exento de IVA'), ('8', '8%'), ('10', '13%')], max_length=2, verbose_name='percentage code'),
+        ),
+    ]
@@ -10,12 +10,19 @@ Modelos para integración con el SRI
 """
 
 import uuid
-from django.db import models
+from django.db import connection, models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
 from apps.core.models import BaseModel
 from apps.companies.models import Company
+from apps.sri_integration.access_key import (
+    DOCUMENT_TYPE_CODES, build_access_key, generate_access_keys, parse_access_key
+)
+from apps.sri_integration.storage import get_artifact_storage
+from apps.sri_integration import tax_engine
+from apps.sri_integration.tax_engine import ZERO, line_subtotal, to_decimal
 
 
 class SRIConfiguration(BaseModel):
@@ -479,28 +486,87 @@ class SRIConfiguration(BaseModel):
             }
         }
     
+    SEQUENCE_FIELDS = {
+        'INVOICE': 'invoice_sequence',
+        'CREDIT_NOTE': 'credit_note_sequence',
+        'DEBIT_NOTE': 'debit_note_sequence',
+        'RETENTION': 'retention_sequence',
+        'REMISSION_GUIDE': 'remission_guide_sequence',
+        'PURCHASE_SETTLEMENT': 'purchase_settlement_sequence',
+    }
+    
     def get_next_sequence(self, document_type):
         """Obtiene el siguiente secuencial para un tipo de documento"""
-        field_map = {
-            'INVOICE': 'invoice_sequence',
-            'CREDIT_NOTE': 'credit_note_sequence',
-            'DEBIT_NOTE': 'debit_note_sequence',
-            'RETENTION': 'retention_sequence',
-            'REMISSION_GUIDE': 'remission_guide_sequence',
-            'PURCHASE_SETTLEMENT': 'purchase_settlement_sequence',
-        }
+        return self.reserve_sequences(document_type, 1)
+    
+    def reserve_sequences(self, document_type, count=1):
+        """
+        Reserva atómicamente `count` secuenciales consecutivos y retorna el primero.
         
-        if document_type not in field_map:
+        El incremento se hace en la base de datos (UPDATE ... RETURNING en PostgreSQL),
+        nunca como lectura-modificación-escritura en Python: dos procesos para el mismo
+        punto de emisión y tipo de documento jamás reciben el mismo secuencial, y solo
+        se toca la columna del contador (no un save() completo del modelo).
+        
+        El lock de la fila dura hasta el commit: llamarlo fuera de transacciones largas
+        (ver reserve_document_sequence en apps/api/views/sri_views.py).
+        """
+        if document_type not in self.SEQUENCE_FIELDS:
             raise ValidationError(f"Unknown document type: {document_type}")
+        if count < 1:
+            raise ValidationError(f"Invalid sequence count: {count}")
+        
+        field_name = self.SEQUENCE_FIELDS[document_type]
+        
+        if connection.vendor == 'postgresql':
+            qn = connection.ops.quote_name
+            column = qn(self._meta.get_field(field_name).column)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {qn(self._meta.db_table)} "
+                    f"SET {column} = {column} + %s, {qn('updated_at')} = %s "
+                    f"WHERE {qn('id')} = %s RETURNING {column}",
+                    [count, timezone.now(), self.pk]
+                )
+                row = cursor.fetchone()
+        else:
+            # UPDATE con F() toma el lock de escritura; la lectura dentro de la misma
+            # transacción ve el valor propio
+            with transaction.atomic():
+                updated = SRIConfiguration.objects.filter(pk=self.pk).update(
+                    **{field_name: models.F(field_name) + count, 'updated_at': timezone.now()}
+                )
+                row = SRIConfiguration.objects.filter(pk=self.pk).values_list(field_name).first() if updated else None
         
-        field_name = field_map[document_type]
-        current_value = getattr(self, field_name)
+        if row is None:
+            raise ValidationError(f"SRI configuration {self.pk} not found")
         
-        # Incrementar y guardar
-        setattr(self, field_name, current_value + 1)
-        self.save()
+        new_value = row[0]
+        # Mantener la instancia en memoria al día para usos posteriores
+        setattr(self, field_name, new_value)
         
-        return current_value
+        return new_value - count
+    
+    def reserve_access_keys(self, document_type, issue_date, count):
+        """
+        Reserva un bloque de secuenciales y genera sus claves de acceso.
+        Retorna [(document_number, access_key)] en orden de secuencial.
+        """
+        first_sequence = self.reserve_sequences(document_type, count)
+        access_keys = generate_access_keys(
+            issue_date=issue_date,
+            document_type=document_type,
+            ruc=self.company.ruc,
+            environment=self.environment,
+            establishment=self.establishment_code,
+            emission_point=self.emission_point,
+            first_sequence=first_sequence,
+            count=count,
+        )
+        return [
+            (f"{self.establishment_code}-{self.emission_point}-{first_sequence + offset:09d}", access_key)
+            for offset, access_key in enumerate(access_keys)
+        ]
     
     def get_full_document_number(self, document_type, sequence=None):
         """Genera el número completo del documento"""
@@ -650,18 +716,21 @@ class ElectronicDocument(BaseModel):
     xml_file = models.FileField(
         _('XML file'),
         upload_to='invoices/xml/',
+        storage=get_artifact_storage,
         blank=True
     )
     
     signed_xml_file = models.FileField(
         _('signed XML file'),
         upload_to='invoices/xml/',
+        storage=get_artifact_storage,
         blank=True
     )
     
     pdf_file = models.FileField(
         _('PDF file'),
         upload_to='invoices/pdf/',
+        storage=get_artifact_storage,
         blank=True
     )
     
@@ -734,104 +803,61 @@ class ElectronicDocument(BaseModel):
     
     def _generate_access_key(self):
         """Genera la clave de acceso de 49 dígitos según especificaciones del SRI"""
-        from datetime import datetime
-        
         # Obtener configuración SRI de la empresa
         try:
             sri_config = self.company.sri_configuration
         except:
             # Si no hay configuración, usar valores por defecto
+            sri_config = None
             establishment = '001'
             emission_point = '001'
-            environment = '1'  # Pruebas por defecto
+            environment = 'TEST'  # Pruebas por defecto
         else:
-            establishment = sri_config.establishment_code.zfill(3)
-            emission_point = sri_config.emission_point.zfill(3)
-            environment = '1' if sri_config.environment == 'TEST' else '2'
+            establishment = sri_config.establishment_code
+            emission_point = sri_config.emission_point
+            environment = sri_config.environment
         
-        # 1. FECHA DE EMISIÓN (8 dígitos): ddmmyyyy - ✅ CORREGIDO
-        # Manejar tanto string como objeto date
-        if isinstance(self.issue_date, str):
-            date_obj = datetime.strptime(self.issue_date, '%Y-%m-%d').date()
-            date_str = date_obj.strftime('%d%m%Y')
-        else:
-            date_str = self.issue_date.strftime('%d%m%Y')
-        
-        # 2. TIPO DE COMPROBANTE (2 dígitos)
-        doc_type_map = {
-            'INVOICE': '01',
-            'CREDIT_NOTE': '04',
-            'DEBIT_NOTE': '05',
-            'RETENTION': '07',
-            'REMISSION_GUIDE': '06',
-            'PURCHASE_SETTLEMENT': '03',
-        }
-        doc_type_code = doc_type_map.get(self.document_type, '01')
-        
-        # 3. RUC (13 dígitos) - rellenar con ceros si es necesario
-        ruc = self.company.ruc.zfill(13)
-        
-        # 4. AMBIENTE (1 dígito): 1=pruebas, 2=producción
-        # Ya definido arriba
-        
-        # 5. SERIE (6 dígitos): establecimiento (3) + punto emisión (3)
-        serie = f"{establishment}{emission_point}"
-        
-        # 6. SECUENCIAL (9 dígitos) - ¡CRÍTICO: debe ser 9 dígitos!
+        # Secuencial (9 dígitos) - ¡CRÍTICO: debe ser 9 dígitos!
         if self.document_number and '-' in self.document_number:
-            sequence = self.document_number.split('-')[-1].zfill(9)
+            sequence = self.document_number.split('-')[-1]
         else:
             # Si no hay número, obtener del SRI config
             try:
-                next_seq = sri_config.get_next_sequence(self.document_type)
-                sequence = str(next_seq).zfill(9)
+                sequence = sri_config.get_next_sequence(self.document_type)
             except:
-                sequence = '000000001'  # Por defecto
-        
-        # 7. CÓDIGO NUMÉRICO (8 dígitos) - aleatorio pero fijo para esta implementación
-        numeric_code = '12345678'
-        
-        # 8. TIPO DE EMISIÓN (1 dígito): 1=normal
-        emission_type = '1'
-        
-        # Construir clave sin dígito verificador (48 dígitos)
-        partial_key = f"{date_str}{doc_type_code}{ruc}{environment}{serie}{sequence}{numeric_code}{emission_type}"
-        
-        # Verificar que sean exactamente 48 dígitos antes del dígito verificador
-        if len(partial_key) != 48:
-            raise ValueError(f"Clave parcial debe tener 48 dígitos, tiene {len(partial_key)}: {partial_key}")
-        
-        # 9. DÍGITO VERIFICADOR (1 dígito) - usando módulo 11
-        check_digit = self._calculate_check_digit(partial_key)
-        
-        # Clave final (49 dígitos)
-        final_key = f"{partial_key}{check_digit}"
-        
-        return final_key
-    
-    def _calculate_check_digit(self, partial_key):
+                sequence = 1  # Por defecto
+        
+        return build_access_key(
+            issue_date=self.issue_date,
+            document_type=DOCUMENT_TYPE_CODES.get(self.document_type, '01'),
+            ruc=self.company.ruc,
+            environment=environment,
+            establishment=establishment,
+            emission_point=emission_point,
+            sequence=sequence,
+        )
+    
+    @classmethod
+    def generate_batch_access_key(cls, documents):
         """
-        Calcula el dígito verificador usando algoritmo módulo 11
-        Según las especificaciones técnicas del SRI
+        Clave de acceso del lote masivo (misma estructura de 49 dígitos).
+        Usa la fecha, tipo, ambiente y serie del primer comprobante; el
+        secuencial es el del primer comprobante y el código numérico es
+        aleatorio para que dos lotes del mismo día no colisionen.
         """
-        # Factores de multiplicación para módulo 11 (de derecha a izquierda)
-        factors = [2, 3, 4, 5, 6, 7, 2, 3, 4, 5, 6, 7, 2, 3, 4, 5, 6, 7, 2, 3, 4, 5, 6, 7, 
-                   2, 3, 4, 5, 6, 7, 2, 3, 4, 5, 6, 7, 2, 3, 4, 5, 6, 7, 2, 3, 4, 5, 6, 7]
-        
-        # Invertir la clave para multiplicar de derecha a izquierda
-        reversed_key = partial_key[::-1]
-        
-        # Calcular suma de productos
-        total = sum(int(digit) * factor for digit, factor in zip(reversed_key, factors))
-        
-        # Calcular residuo
-        remainder = total % 11
-        
-        # Determinar dígito verificador
-        if remainder < 2:
-            return remainder
-        else:
-            return 11 - remainder
+        first = documents[0]
+        fields = parse_access_key(first.access_key or first._generate_access_key())
+        date_str = fields['issue_date']
+        
+        return build_access_key(
+            issue_date=f"{date_str[4:8]}-{date_str[2:4]}-{date_str[0:2]}",
+            document_type=fields['document_type_code'],
+            ruc=fields['ruc'],
+            environment=fields['environment'],
+            establishment=fields['establishment'],
+            emission_point=fields['emission_point'],
+            sequence=fields['sequence'],
+        )
 
 
 class DocumentItem(BaseModel):
@@ -954,17 +980,9 @@ class DocumentItem(BaseModel):
     def _calculate_subtotal_safe(self):
         """
         Cálculo seguro del subtotal con manejo de precisión decimal
+        (motor de impuestos: (cantidad × precio) - descuento, ROUND_HALF_UP a 0.01)
         """
-        # Convertir a Decimal con precisión controlada
-        quantity = Decimal(str(self.quantity)) if self.quantity else Decimal('0')
-        unit_price = Decimal(str(self.unit_price)) if self.unit_price else Decimal('0')
-        discount = Decimal(str(self.discount)) if self.discount else Decimal('0')
-        
-        # Calcular subtotal: (cantidad × precio) - descuento
-        subtotal = (quantity * unit_price) - discount
-        
-        # Redondear a 2 decimales usando ROUND_HALF_UP (redondeo bancario)
-        return subtotal.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return line_subtotal(self.quantity or ZERO, self.unit_price or ZERO, self.discount or ZERO)
     
     def save(self, *args, **kwargs):
         """
@@ -1009,8 +1027,11 @@ class DocumentTax(BaseModel):
         ('2', _('12%')),
         ('3', _('14%')),
         ('4', _('15%')),  # ✅ AGREGADO PARA 15%
+        ('5', _('5%')),
         ('6', _('No Objeto de Impuesto')),
         ('7', _('Exento de IVA')),
+        ('8', _('8%')),
+        ('10', _('13%')),
     ]
     
     document = models.ForeignKey(
@@ -1097,15 +1118,52 @@ class SRIResponse(BaseModel):
         _('response message')
     )
     
+    # Datos tipados de la respuesta (ver response_log)
+    state = models.CharField(
+        _('state'),
+        max_length=20,
+        blank=True
+    )
+    
+    authorization_number = models.CharField(
+        _('authorization number'),
+        max_length=49,
+        blank=True
+    )
+    
+    authorization_date = models.DateTimeField(
+        _('authorization date'),
+        null=True,
+        blank=True
+    )
+    
+    error_codes = models.CharField(
+        _('error codes'),
+        max_length=100,
+        blank=True,
+        help_text=_('SRI error identifiers, comma separated')
+    )
+    
+    # Metadatos pequeños (método, lote, mensajes); el texto SOAP va en raw_payload
     raw_response = models.JSONField(
         _('raw response'),
         default=dict
     )
     
+    raw_payload = models.FileField(
+        _('raw payload'),
+        upload_to='sri_responses/',
+        storage=get_artifact_storage,
+        blank=True
+    )
+    
     class Meta:
         verbose_name = _('SRI Response')
         verbose_name_plural = _('SRI Responses')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),  # Retención por meses (log_retention)
+        ]
     
     def __str__(self):
         return f"{self.operation_type} - {self.response_code} - {self.document}"
@@ -1113,10 +1171,51 @@ class SRIResponse(BaseModel):
 
 # ========== MODELOS ESPECÍFICOS DE DOCUMENTOS ==========
 
-class CreditNote(BaseModel):
+class AccessKeyMixin:
+    """
+    Clave de acceso para los comprobantes con company / document_number / issue_date
+    (notas de crédito y débito, retenciones, liquidaciones de compra)
+    """
+    ACCESS_KEY_DOCUMENT_TYPE = None
+    
+    def _generate_access_key(self):
+        """Genera la clave de acceso de 49 dígitos del comprobante"""
+        # Obtener configuración SRI de la empresa
+        try:
+            sri_config = self.company.sri_configuration
+            establishment = sri_config.establishment_code
+            emission_point = sri_config.emission_point
+            environment = sri_config.environment
+        except:
+            establishment = "001"
+            emission_point = "001"
+            environment = "TEST"  # Pruebas por defecto
+        
+        # Secuencial (9 dígitos)
+        if self.document_number and "-" in self.document_number:
+            sequence = self.document_number.split("-")[-1]
+        else:
+            # Generar secuencial temporal
+            import random
+            sequence = random.randint(1, 999999999)
+        
+        return build_access_key(
+            issue_date=self.issue_date,
+            document_type=self.ACCESS_KEY_DOCUMENT_TYPE,
+            ruc=self.company.ruc,
+            environment=environment,
+            establishment=establishment,
+            emission_point=emission_point,
+            sequence=sequence,
+        )
+
+
+class CreditNote(AccessKeyMixin, BaseModel):
     """
     Nota de Crédito - Documento que anula o corrige una factura - VERSIÓN CORREGIDA
     """
+    ACCESS_KEY_DOCUMENT_TYPE = 'CREDIT_NOTE'
+    
     CREDIT_NOTE_REASONS = [
         ('01', _('Devolución de bienes')),
         ('02', _('Anulación de venta')),
@@ -1195,9 +1294,9 @@ class CreditNote(BaseModel):
     
     # Status y archivos
     status = models.CharField(_('status'), max_length=20, choices=STATUS_CHOICES, default='DRAFT')
-    xml_file = models.FileField(_('XML file'), upload_to='credit_notes/xml/', blank=True)
-    signed_xml_file = models.FileField(_('signed XML file'), upload_to='credit_notes/xml/', blank=True)
-    pdf_file = models.FileField(_('PDF file'), upload_to='credit_notes/pdf/', blank=True)
+    xml_file = models.FileField(_('XML file'), upload_to='credit_notes/xml/', storage=get_artifact_storage, blank=True)
+    signed_xml_file = models.FileField(_('signed XML file'), upload_to='credit_notes/xml/', storage=get_artifact_storage, blank=True)
+    pdf_file = models.FileField(_('PDF file'), upload_to='credit_notes/pdf/', storage=get_artifact_storage, blank=True)
     
     # SRI response
     sri_authorization_code = models.CharField(_('SRI authorization code'), max_length=49, blank=True)
@@ -1244,93 +1343,14 @@ class CreditNote(BaseModel):
         except Exception as e:
             # Intentar con super() como backup
             super().save(*args, **kwargs)
-    
-    def _generate_access_key(self):
-        """Genera la clave de acceso de 49 dígitos para nota de crédito - ✅ CORREGIDO"""
-        from datetime import datetime
-        
-        # Obtener configuración SRI de la empresa
-        try:
-            sri_config = self.company.sri_configuration
-            establishment = sri_config.establishment_code.zfill(3)
-            emission_point = sri_config.emission_point.zfill(3)
-            environment = "1" if sri_config.environment == "TEST" else "2"
-        except:
-            establishment = "001"
-            emission_point = "001"
-            environment = "1"  # Pruebas por defecto
-        
-        # 1. FECHA DE EMISIÓN (8 dígitos): ddmmyyyy - ✅ CORREGIDO
-        # Manejar tanto string como objeto date
-        if isinstance(self.issue_date, str):
-            date_obj = datetime.strptime(self.issue_date, '%Y-%m-%d').date()
-            date_str = date_obj.strftime("%d%m%Y")
-        else:
-            date_str = self.issue_date.strftime("%d%m%Y")
-        
-        # 2. TIPO DE COMPROBANTE (2 dígitos) - 04 para nota de crédito
-        doc_type_code = "04"
-        
-        # 3. RUC (13 dígitos)
-        ruc = self.company.ruc.zfill(13)
-        
-        # 4. AMBIENTE (1 dígito): ya definido arriba
-        
-        # 5. SERIE (6 dígitos): establecimiento + punto emisión
-        serie = f"{establishment}{emission_point}"
-        
-        # 6. SECUENCIAL (9 dígitos)
-        if self.document_number and "-" in self.document_number:
-            sequence = self.document_number.split("-")[-1].zfill(9)
-        else:
-            # Generar secuencial temporal
-            import random
-            sequence = str(random.randint(1, 999999999)).zfill(9)
-        
-        # 7. CÓDIGO NUMÉRICO (8 dígitos)
-        numeric_code = "12345678"
-        
-        # 8. TIPO DE EMISIÓN (1 dígito): 1=normal
-        emission_type = "1"
-        
-        # Construir clave sin dígito verificador (48 dígitos)
-        partial_key = f"{date_str}{doc_type_code}{ruc}{environment}{serie}{sequence}{numeric_code}{emission_type}"
-        
-        # Verificar longitud
-        if len(partial_key) != 48:
-            raise ValueError(f"Clave parcial debe tener 48 dígitos, tiene {len(partial_key)}: {partial_key}")
-        
-        # 9. DÍGITO VERIFICADOR
-        check_digit = self._calculate_check_digit(partial_key)
-        
-        return f"{partial_key}{check_digit}"
-    
-    def _calculate_check_digit(self, partial_key):
-        """Calcula el dígito verificador usando algoritmo módulo 11"""
-        # Factores de multiplicación para módulo 11
-        factors = [2, 3, 4, 5, 6, 7, 2, 3, 4, 5, 6, 7, 2, 3, 4, 5, 6, 7, 2, 3, 4, 5, 6, 7, 
-                   2, 3, 4, 5, 6, 7, 2, 3, 4, 5, 6, 7, 2, 3, 4, 5, 6, 7, 2, 3, 4, 5, 6, 7]
-        
-        # Invertir la clave para multiplicar de derecha a izquierda
-        reversed_key = partial_key[::-1]
-        
-        # Calcular suma de productos
-        total = sum(int(digit) * factor for digit, factor in zip(reversed_key, factors))
-        
-        # Calcular residuo
-        remainder = total % 11
-        
-        # Determinar dígito verificador
-        if remainder < 2:
-            return remainder
-        else:
-            return 11 - remainder
 
 
-class DebitNote(BaseModel):
+class DebitNote(AccessKeyMixin, BaseModel):
     """
     Nota de Débito - Documento que incrementa el valor de una factura
     """
+    ACCESS_KEY_DOCUMENT_TYPE = 'DEBIT_NOTE'
+    
     DEBIT_NOTE_REASONS = [
         ('01', _('Intereses de mora')),
         ('02', _('Gastos de cobranza')),
@@ -1370,9 +1390,9 @@ class DebitNote(BaseModel):
     
     # Status y archivos
     status = models.CharField(_('status'), max_length=20, choices=ElectronicDocument.STATUS_CHOICES, default='DRAFT')
-    xml_file = models.FileField(_('XML file'), upload_to='debit_notes/xml/', blank=True)
-    signed_xml_file = models.FileField(_('signed XML file'), upload_to='debit_notes/xml/', blank=True)
-    pdf_file = models.FileField(_('PDF file'), upload_to='debit_notes/pdf/', blank=True)
+    xml_file = models.FileField(_('XML file'), upload_to='debit_notes/xml/', storage=get_artifact_storage, blank=True)
+    signed_xml_file = models.FileField(_('signed XML file'), upload_to='debit_notes/xml/', storage=get_artifact_storage, blank=True)
+    pdf_file = models.FileField(_('PDF file'), upload_to='debit_notes/pdf/', storage=get_artifact_storage, blank=True)
     
     # SRI response
     sri_authorization_code = models.CharField(_('SRI authorization code'), max_length=49, blank=True)
@@ -1384,10 +1404,12 @@ class DebitNote(BaseModel):
         unique_together = ['company', 'document_number']
 
 
-class Retention(BaseModel):
+class Retention(AccessKeyMixin, BaseModel):
     """
     Comprobante de Retención
     """
+    ACCESS_KEY_DOCUMENT_TYPE = 'RETENTION'
+    
     RETENTION_TYPES = [
         ('RENT', _('Retención en la Fuente del Impuesto a la Renta')),
         ('IVA', _('Retención del Impuesto al Valor Agregado')),
@@ -1413,9 +1435,9 @@ class Retention(BaseModel):
     
     # Status y archivos
     status = models.CharField(_('status'), max_length=20, choices=ElectronicDocument.STATUS_CHOICES, default='DRAFT')
-    xml_file = models.FileField(_('XML file'), upload_to='retentions/xml/', blank=True)
-    signed_xml_file = models.FileField(_('signed XML file'), upload_to='retentions/xml/', blank=True)
-    pdf_file = models.FileField(_('PDF file'), upload_to='retentions/pdf/', blank=True)
+    xml_file = models.FileField(_('XML file'), upload_to='retentions/xml/', storage=get_artifact_storage, blank=True)
+    signed_xml_file = models.FileField(_('signed XML file'), upload_to='retentions/xml/', storage=get_artifact_storage, blank=True)
+    pdf_file = models.FileField(_('PDF file'), upload_to='retentions/pdf/', storage=get_artifact_storage, blank=True)
     
     # SRI response
     sri_authorization_code = models.CharField(_('SRI authorization code'), max_length=49, blank=True)
@@ -1451,10 +1473,12 @@ class RetentionDetail(BaseModel):
         verbose_name_plural = _('Retention Details')
 
 
-class PurchaseSettlement(BaseModel):
+class PurchaseSettlement(AccessKeyMixin, BaseModel):
     """
     Liquidación de Compra
     """
+    ACCESS_KEY_DOCUMENT_TYPE = 'PURCHASE_SETTLEMENT'
+    
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='purchase_settlements')
     
     document_number = models.CharField(_('document number'), max_length=17)
@@ -1474,9 +1498,9 @@ class PurchaseSettlement(BaseModel):
     
     # Status y archivos
     status = models.CharField(_('status'), max_length=20, choices=ElectronicDocument.STATUS_CHOICES, default='DRAFT')
-    xml_file = models.FileField(_('XML file'), upload_to='settlements/xml/', blank=True)
-    signed_xml_file = models.FileField(_('signed XML file'), upload_to='settlements/xml/', blank=True)
-    pdf_file = models.FileField(_('PDF file'), upload_to='settlements/pdf/', blank=True)
+    xml_file = models.FileField(_('XML file'), upload_to='settlements/xml/', storage=get_artifact_storage, blank=True)
+    signed_xml_file = models.FileField(_('signed XML file'), upload_to='settlements/xml/', storage=get_artifact_storage, blank=True)
+    pdf_file = models.FileField(_('PDF file'), upload_to='settlements/pdf/', storage=get_artifact_storage, blank=True)
     
     # SRI response
     sri_authorization_code = models.CharField(_('SRI authorization code'), max_length=49, blank=True)
@@ -1589,17 +1613,9 @@ class PurchaseSettlementItem(BaseModel):
     def _calculate_subtotal_safe(self):
         """
         Cálculo seguro del subtotal con manejo de precisión decimal
+        (motor de impuestos: (cantidad × precio) - descuento, ROUND_HALF_UP a 0.01)
         """
-        # Convertir a Decimal con precisión controlada
-        quantity = Decimal(str(self.quantity)) if self.quantity else Decimal('0')
-        unit_price = Decimal(str(self.unit_price)) if self.unit_price else Decimal('0')
-        discount = Decimal(str(self.discount)) if self.discount else Decimal('0')
-        
-        # Calcular subtotal: (cantidad × precio) - descuento
-        subtotal = (quantity * unit_price) - discount
-        
-        # Redondear a 2 decimales usando ROUND_HALF_UP
-        return subtotal.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return line_subtotal(self.quantity or ZERO, self.unit_price or ZERO, self.discount or ZERO)
     
     def save(self, *args, **kwargs):
         """
@@ -1635,6 +1651,12 @@ class SafeDocumentCalculations:
     Clase utilitaria para cálculos seguros de documentos
     """
     
+    # Límites del motor de impuestos
+    MAX_QUANTITY_PRICE = tax_engine.MAX_UNIT_VALUE
+    MAX_DISCOUNT = tax_engine.MAX_AMOUNT
+    MAX_SUBTOTAL = tax_engine.MAX_AMOUNT
+    MAX_DOCUMENT_TOTAL = tax_engine.MAX_DOCUMENT_TOTAL
+    
     @staticmethod
     def validate_item_calculation(quantity, unit_price, discount=0):
         """
@@ -1649,15 +1671,14 @@ class SafeDocumentCalculations:
             tuple: (is_valid, calculated_subtotal, error_message)
         """
         try:
-            # Convertir a Decimal
-            qty = Decimal(str(quantity))
-            price = Decimal(str(unit_price))
-            disc = Decimal(str(discount))
+            qty = to_decimal(quantity)
+            price = to_decimal(unit_price)
+            disc = to_decimal(discount)
             
             # Validar rangos individuales
-            max_qty_price = Decimal('999999.999999')
-            max_discount = Decimal('9999999999.99')
-            max_subtotal = Decimal('9999999999.99')
+            max_qty_price = SafeDocumentCalculations.MAX_QUANTITY_PRICE
+            max_discount = SafeDocumentCalculations.MAX_DISCOUNT
+            max_subtotal = SafeDocumentCalculations.MAX_SUBTOTAL
             
             if qty <= 0:
                 return False, None, "Quantity must be greater than 0"
@@ -1677,17 +1698,14 @@ class SafeDocumentCalculations:
             if disc > max_discount:
                 return False, None, f"Discount exceeds maximum allowed ({max_discount})"
             
-            # Calcular subtotal
-            subtotal = (qty * price) - disc
+            # Subtotal redondeado con la misma regla que el motor de impuestos
+            final_subtotal = line_subtotal(qty, price, disc)
             
-            if subtotal < 0:
+            if final_subtotal < 0:
                 return False, None, "Discount cannot be greater than (quantity × unit_price)"
             
-            if subtotal > max_subtotal:
-                return False, None, f"Calculated subtotal ({subtotal}) exceeds maximum allowed ({max_subtotal})"
-            
-            # Redondear resultado
-            final_subtotal = subtotal.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            if final_subtotal > max_subtotal:
+                return False, None, f"Calculated subtotal ({final_subtotal}) exceeds maximum allowed ({max_subtotal})"
             
             return True, final_subtotal, None
             
@@ -1707,7 +1725,7 @@ class SafeDocumentCalculations:
         """
         try:
             total = Decimal('0.00')
-            max_document_total = Decimal('99999999999.99')  # Límite realista para documentos
+            max_document_total = SafeDocumentCalculations.MAX_DOCUMENT_TOTAL
             
             for i, item in enumerate(items_data):
                 is_valid, subtotal, error = SafeDocumentCalculations.validate_item_calculation(
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Registro compacto de respuestas del SRI
+apps/sri_integration/response_log.py
+
+ElectronicDocument.sri_response y SRIResponse.raw_response guardaban el texto
+SOAP completo (la respuesta de autorización incluye el comprobante autorizado
+entero) en cada consulta. Ahora:
+- Las filas guardan solo datos tipados: estado, número y fecha de autorización
+  y códigos de error
+- El texto SOAP va al almacén de artefactos (fuera de la fila, comprimido y
+  deduplicado: las consultas "EN PROCESO" repetidas son el mismo blob)
+- El JSON conserva solo los metadatos pequeños (método, lote, mensajes de error)
+  y el nombre del blob en `raw_payload`
+
+Sin dependencias de modelos: lo usan soap_client y el poller (la migración 0008
+lleva su propia copia congelada).
+"""
+
+import logging
+import re
+from datetime import datetime
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from apps.sri_integration.storage import get_artifact_storage
+
+logger = logging.getLogger(__name__)
+
+# Claves con el texto SOAP / comprobante completo
+RAW_KEYS = ('response',)
+
+# Estados intermedios: no generan fila de auditoría en cada consulta
+IN_PROCESS_STATES = ('EN PROCESO', 'EN PROCESAMIENTO', 'PENDIENTE', 'PPR')
+
+ERROR_CODES_MAX_LENGTH = 100
+
+_ERROR_CODE_RE = re.compile(r'Error\s+(\w+)\s*:')
+_DATE_FORMATS = ('%Y-%m-%dT%H:%M:%S.%f%z', '%Y-%m-%dT%H:%M:%S%z', '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%d/%m/%Y %H:%M:%S')
+
+
+def is_in_process(state):
+    return (state or '').strip().upper() in IN_PROCESS_STATES
+
+
+def extract_error_codes(errors):
+    """Códigos SRI ("[ERROR] Error 45: ..." -> "45") sin repetir, separados por coma."""
+    codes = []
+    for error in errors or []:
+        for code in _ERROR_CODE_RE.findall(str(error)):
+            if code not in codes:
+                codes.append(code)
+    return ','.join(codes)[:ERROR_CODES_MAX_LENGTH]
+
+
+def parse_authorization_date(value):
+    """fechaAutorizacion del SRI a datetime aware; None si no se reconoce."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value).strip()
+        parsed = None
+        for fmt in _DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt)
+                break
+            except ValueError:
+                continue
+        if parsed is None:
+            return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def store_raw_payload(access_key, operation_type, payload):
+    """
+    Guarda el texto SOAP en el almacén de artefactos.
+
+    Returns:
+        str: nombre del blob, '' si no hay payload o el almacén falla
+    """
+    if not payload:
+        return ''
+    data = payload.encode('utf-8') if isinstance(payload, str) else bytes(payload)
+    name = f"{access_key or 'sin_clave'}_{operation_type.lower()}.xml"
+    try:
+        return get_artifact_storage().save(f"sri_responses/{name}", ContentFile(data))
+    except Exception as e:
+        logger.warning(f"⚠️ Could not store raw SRI payload for {access_key}: {e}")
+        return ''
+
+
+def compact_response(access_key, operation_type, response_data):
+    """
+    Copia de la respuesta sin el texto SOAP, con `raw_payload` apuntando al blob.
+    Idempotente: una respuesta ya compacta se retorna sin cambios.
+    """
+    if not isinstance(response_data, dict):
+        name = store_raw_payload(access_key, operation_type, str(response_data))
+        return {'raw_payload': name} if name else {}
+
+    if not any(key in response_data for key in RAW_KEYS):
+        return response_data
+
+    compact = {key: value for key, value in response_data.items() if key not in RAW_KEYS}
+    payload = next((response_data[key] for key in RAW_KEYS if response_data.get(key)), None)
+    name = store_raw_payload(access_key, operation_type, payload)
+    if name:
+        compact['raw_payload'] = name
+    return compact
+
+
+def typed_fields(response_data, response_code=''):
+    """Campos tipados de SRIResponse a partir de la respuesta compacta."""
+    data = response_data if isinstance(response_data, dict) else {}
+    return {
+        'state': str(data.get('estado') or data.get('batch_estado') or response_code or '')[:20],
+        'authorization_number': str(data.get('numeroAutorizacion') or '')[:49],
+        'authorization_date': parse_authorization_date(data.get('fechaAutorizacion')),
+        'error_codes': extract_error_codes(data.get('errors')),
+        'raw_payload': data.get('raw_payload', ''),
+    }
@@ -11,6 +11,7 @@ from .document_processor import DocumentProcessor
 from .email_service import EmailService
 from .digital_signer import DigitalSigner
 from .global_certificate_manager import GlobalCertificateManager, get_certificate_manager
+from .xades_signer import XAdESBESSigner
 
 __all__ = [
     'SRISOAPClient',
@@ -21,5 +22,6 @@ __all__ = [
     'EmailService',
     'DigitalSigner',
     'GlobalCertificateManager',
-    'get_certificate_manager'
+    'get_certificate_manager',
+    'XAdESBESSigner'
 ]
\ No newline at end of file
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente asíncrono (asyncio) para recepción y autorización del SRI
+apps/sri_integration/services/async_soap_client.py
+
+Para cargas masivas: cientos de llamadas en vuelo por proceso sin ocupar
+un slot de worker por respuesta lenta del SRI.
+- Límite de concurrencia por ambiente (asyncio.Semaphore)
+- Backoff con asyncio.sleep (no bloquea el event loop)
+- Reutiliza los sobres y el parseo de SRISOAPClient
+  (_process_sri_response_fixed / _process_authorization_response_ultra_fixed)
+- Mismo circuit breaker y rate limiter compartidos que el transporte síncrono
+
+Requiere aiohttp (dependencia opcional).
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from apps.sri_integration.services.circuit_breaker import (
+    CIRCUIT_OPEN_PREFIX, SRIEndpointUnavailable, get_endpoint_guard, service_for_url
+)
+from apps.sri_integration.services.soap_client import SRISOAPClient
+
+logger = logging.getLogger(__name__)
+
+AIOHTTP_AVAILABLE = False
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"aiohttp not available, async SRI client disabled: {e}")
+
+
+class _SRIResponse:
+    """Respuesta mínima compatible con los parsers de SRISOAPClient (.text / .status_code)."""
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+
+class AsyncSRIClient:
+    """
+    Cliente asyncio para el SRI. Usar como context manager asíncrono:
+
+        async with AsyncSRIClient() as client:
+            results = await client.authorize_many(documents)
+    """
+
+    # Reintentos sin bloquear el loop (mismo patrón que _send_with_requests_robust, más corto)
+    BACKOFF_DELAYS = [3, 7, 15, 30, 60]
+    RETRY_STATUS = [500, 502, 503, 504]
+    SRI_RESPONSE_KEYWORDS = ['RECIBIDA', 'DEVUELTA', 'estado', 'comprobante']
+
+    def __init__(self, max_concurrency=None, max_attempts=None):
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("aiohttp is required for AsyncSRIClient")
+
+        self.max_concurrency = max_concurrency or getattr(settings, 'SRI_ASYNC_MAX_CONCURRENCY', 100)
+        self.max_attempts = max_attempts or len(self.BACKOFF_DELAYS) + 1
+        timeouts = getattr(settings, 'SRI_TIMEOUTS', {})
+        self.timeout = aiohttp.ClientTimeout(
+            sock_connect=timeouts.get('connection_timeout', 30),
+            sock_read=timeouts.get('read_timeout', 60) * 2,
+        )
+        self._semaphores = {}
+        self._sync_clients = {}
+        self._session = None
+        # Hilos solo para las llamadas a Redis del guard (la espera del token es asyncio.sleep)
+        self._guard_executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='sri-guard')
+        self.stats = {'requests': 0, 'retries': 0, 'errors': 0}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency * 2, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._guard_executor.shutdown(wait=False)
+
+    # ========================================================================
+    # Infraestructura
+    # ========================================================================
+    def _get_semaphore(self, environment):
+        semaphore = self._semaphores.get(environment)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[environment] = semaphore
+        return semaphore
+
+    def _get_sync_client(self, company):
+        """SRISOAPClient por empresa: aporta ambiente, URLs, parseo y logging."""
+        client = self._sync_clients.get(company.id)
+        if client is None:
+            client = SRISOAPClient(company)
+            self._sync_clients[company.id] = client
+        return client
+
+    async def _post(self, environment, url, body, headers):
+        """
+        POST con reintentos y backoff asíncrono.
+
+        Returns:
+            _SRIResponse o None si se agotaron los intentos
+
+        Raises:
+            SRIEndpointUnavailable si el circuito del endpoint está abierto
+        """
+        guard = get_endpoint_guard(environment, service_for_url(url))
+        last_error = None
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                self.stats['retries'] += 1
+                await asyncio.sleep(self.BACKOFF_DELAYS[min(attempt - 1, len(self.BACKOFF_DELAYS) - 1)])
+
+            await guard.abefore_request(self._guard_executor)
+
+            started = time.monotonic()
+            try:
+                async with self._get_semaphore(environment):
+                    self.stats['requests'] += 1
+                    async with self._session.post(url, data=body, headers=headers, allow_redirects=False) as resp:
+                        text = await resp.text()
+                        response = _SRIResponse(resp.status, text)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                await guard.aafter_request(False, time.monotonic() - started, self._guard_executor)
+                last_error = f"{type(e).__name__}: {e}"
+                logger.warning(f"⚠️ [SRI_ASYNC] Attempt {attempt + 1} to {url} failed: {last_error}")
+                continue
+
+            is_sri_fault = response.status_code == 500 and any(
+                keyword in response.text for keyword in self.SRI_RESPONSE_KEYWORDS
+            )
+            await guard.aafter_request(
+                is_sri_fault or response.status_code not in self.RETRY_STATUS,
+                time.monotonic() - started,
+                self._guard_executor,
+            )
+
+            if is_sri_fault:
+                # SOAP fault con respuesta válida del SRI: no reintentar
+                return response
+
+            if response.status_code in self.RETRY_STATUS:
+                last_error = f"HTTP {response.status_code}"
+                logger.warning(f"⚠️ [SRI_ASYNC] {last_error} on attempt {attempt + 1} to {url}")
+                continue
+
+            return response
+
+        self.stats['errors'] += 1
+        logger.error(f"❌ [SRI_ASYNC] {url} unavailable after {self.max_attempts} attempts: {last_error}")
+        return None
+
+    # ========================================================================
+    # Recepción
+    # ========================================================================
+    async def send_to_reception(self, document, signed_xml):
+        """Envía un comprobante firmado a validarComprobante. Retorna (success, message)."""
+        client = self._get_sync_client(document.company)
+        if isinstance(signed_xml, str):
+            signed_xml = signed_xml.encode('utf-8')
+
+        envelope = client.build_reception_envelope(signed_xml).encode('utf-8')
+        url = client.SRI_URLS[client.environment]['reception_endpoint']
+
+        response = await self._post(client.environment, url, envelope, client.RECEPTION_HEADERS)
+        if response is None:
+            return False, "SRI temporarily unavailable"
+
+        if response.status_code == 200:
+            return await sync_to_async(client._process_sri_response_fixed)(document, response)
+        if response.status_code == 500:
+            return await sync_to_async(client._process_sri_soap_fault_fixed)(document, response)
+        return False, f"HTTP {response.status_code}: {response.text[:200]}"
+
+    async def send_many(self, items):
+        """
+        Recepción concurrente de [(document, signed_xml)].
+        Retorna {document.id: (success, message)}.
+        """
+        results = await asyncio.gather(
+            *(self._safe(self.send_to_reception(document, xml)) for document, xml in items)
+        )
+        return {document.id: result for (document, _), result in zip(items, results)}
+
+    # ========================================================================
+    # Autorización
+    # ========================================================================
+    async def get_authorization(self, document):
+        """Una consulta autorizacionComprobante. Retorna (success, message)."""
+        client = self._get_sync_client(document.company)
+        envelope = client.build_authorization_envelope(document.access_key).encode('utf-8')
+        url = client.SRI_URLS[client.environment]['authorization_endpoint']
+
+        response = await self._post(client.environment, url, envelope, client.AUTHORIZATION_HEADERS)
+        if response is None:
+            return False, "SRI temporarily unavailable"
+
+        if response.status_code == 200:
+            return await sync_to_async(client._process_authorization_response_ultra_fixed)(document, response)
+        if response.status_code == 500:
+            return await sync_to_async(client._process_authorization_soap_fault_ultra_fixed)(document, response)
+        return False, f'Authorization HTTP Error: {response.status_code}'
+
+    async def authorize_many(self, documents):
+        """Autorización concurrente. Retorna {document.id: (success, message)}."""
+        results = await asyncio.gather(*(self._safe(self.get_authorization(document)) for document in documents))
+        return {document.id: result for document, result in zip(documents, results)}
+
+    @staticmethod
+    async def _safe(coro):
+        try:
+            return await coro
+        except SRIEndpointUnavailable as e:
+            return False, f"{CIRCUIT_OPEN_PREFIX}: {e}"
+        except Exception as e:
+            logger.error(f"❌ [SRI_ASYNC] Unexpected error: {e}")
+            return False, f"Unexpected error: {str(e)}"
+
+
+# ============================================================================
+# Helpers síncronos (Celery / management commands)
+# ============================================================================
+def run_async_authorizations(documents, max_concurrency=None):
+    """Consulta la autorización de todos los documentos en un event loop propio."""
+    async def _run():
+        async with AsyncSRIClient(max_concurrency=max_concurrency) as client:
+            return await client.authorize_many(documents), dict(client.stats)
+    return asyncio.run(_run())
+
+
+def run_async_receptions(items, max_concurrency=None):
+    """Envía [(document, signed_xml)] a recepción en un event loop propio."""
+    async def _run():
+        async with AsyncSRIClient(max_concurrency=max_concurrency) as client:
+            return await client.send_many(items), dict(client.stats)
+    return asyncio.run(_run())
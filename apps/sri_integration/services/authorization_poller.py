@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Consulta de autorizaciones en lote por clave de acceso
+apps/sri_integration/services/authorization_poller.py
+
+Reemplaza "una tarea Celery por documento en SENT":
+- Agrupa las claves pendientes por empresa y ambiente
+- Consulta en paralelo sobre el transporte HTTP compartido del proceso
+- Actualiza los documentos con bulk_update (sin select_for_update por documento)
+- Evita consultas duplicadas con un set en Redis de claves en curso
+- Reporta claves/segundo y tiempo hasta la autorización
+"""
+
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core.models import AuditLog
+from apps.sri_integration.models import ElectronicDocument, SRIResponse
+from apps.sri_integration.response_log import is_in_process, typed_fields
+from apps.sri_integration.services.soap_client import SRISOAPClient
+from apps.sri_integration.services.sri_transport import get_transport
+from apps.sri_integration.services.circuit_breaker import is_sri_available
+
+logger = logging.getLogger(__name__)
+
+INFLIGHT_KEY_PREFIX = 'sri:auth:inflight:'
+INFLIGHT_TTL_SECONDS = 600
+
+
+# ============================================================================
+# Deduplicación de claves en curso (Redis)
+# ============================================================================
+def _get_redis():
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except Exception as e:
+        logger.warning(f"Redis not available for authorization dedupe: {e}")
+        return None
+
+
+def claim_access_keys(access_keys):
+    """
+    Marca claves como "en curso" y retorna solo las que no lo estaban.
+
+    Una clave Redis por documento (SET NX EX): si un worker muere sin liberar,
+    su clave vence sola a los INFLIGHT_TTL_SECONDS. Si Redis no está
+    disponible no deduplica (retorna todas).
+    """
+    access_keys = [key for key in access_keys if key]
+    if not access_keys:
+        return []
+
+    redis_conn = _get_redis()
+    if redis_conn is None:
+        return access_keys
+
+    try:
+        pipe = redis_conn.pipeline(transaction=False)
+        for key in access_keys:
+            pipe.set(f"{INFLIGHT_KEY_PREFIX}{key}", 1, nx=True, ex=INFLIGHT_TTL_SECONDS)
+        added = pipe.execute()
+        return [key for key, was_added in zip(access_keys, added) if was_added]
+    except Exception as e:
+        logger.warning(f"Could not claim access keys in Redis: {e}")
+        return access_keys
+
+
+def release_access_keys(access_keys):
+    """Libera las claves tomadas con claim_access_keys."""
+    if not access_keys:
+        return
+
+    redis_conn = _get_redis()
+    if redis_conn is None:
+        return
+
+    try:
+        redis_conn.delete(*[f"{INFLIGHT_KEY_PREFIX}{key}" for key in access_keys])
+    except Exception as e:
+        logger.warning(f"Could not release access keys in Redis: {e}")
+
+
+# ============================================================================
+# Poller
+# ============================================================================
+class AuthorizationPoller:
+    """
+    Consulta en lote las autorizaciones de documentos en SENT.
+    """
+
+    UPDATE_FIELDS = ['status', 'sri_authorization_code', 'sri_authorization_date', 'sri_response', 'updated_at']
+
+    def __init__(self, max_workers=None, max_age_hours=24, batch_size=None):
+        self.max_workers = max_workers or getattr(settings, 'SRI_AUTH_POLLER_WORKERS', 16)
+        self.max_age_hours = max_age_hours
+        self.batch_size = batch_size or getattr(settings, 'SRI_AUTH_POLLER_BATCH_SIZE', 500)
+        timeouts = getattr(settings, 'SRI_TIMEOUTS', {})
+        self.timeout = (
+            timeouts.get('connection_timeout', 30),
+            timeouts.get('read_timeout', 60),
+        )
+
+
+    def get_pending_documents(self):
+        time_limit = timezone.now() - timedelta(hours=self.max_age_hours)
+        return ElectronicDocument.objects.filter(
+            status='SENT',
+            created_at__gte=time_limit
+        ).select_related('company', 'company__sri_configuration').order_by('created_at')
+
+    # ------------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------------
+    def poll(self, documents=None):
+        """
+        Consulta todas las autorizaciones pendientes.
+
+        Returns:
+            dict con métricas: checked, skipped_inflight, authorized, rejected,
+            pending, errors, keys_per_second, avg/max seconds to authorization.
+        """
+        started = time.monotonic()
+        documents = list(documents if documents is not None else self.get_pending_documents())
+
+        stats = {
+            'checked': 0,
+            'skipped_inflight': 0,
+            'authorized': 0,
+            'rejected': 0,
+            'pending': 0,
+            'errors': 0,
+            'groups': 0,
+            'skipped_circuit_open': 0,
+        }
+        authorization_times = []
+        authorized_ids = []
+
+        # Agrupar por empresa y ambiente
+        groups = defaultdict(list)
+        for document in documents:
+            sri_config = getattr(document.company, 'sri_configuration', None)
+            environment = getattr(sri_config, 'environment', 'TEST') or 'TEST'
+            groups[(document.company_id, environment)].append(document)
+        stats['groups'] = len(groups)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for (company_id, environment), group_docs in groups.items():
+                if not is_sri_available(environment, 'authorization'):
+                    stats['skipped_circuit_open'] += len(group_docs)
+                    continue
+
+                for start in range(0, len(group_docs), self.batch_size):
+                    chunk = group_docs[start:start + self.batch_size]
+                    claimed = set(claim_access_keys([doc.access_key for doc in chunk]))
+                    stats['skipped_inflight'] += len(chunk) - len(claimed)
+                    chunk = [doc for doc in chunk if doc.access_key in claimed]
+                    if not chunk:
+                        continue
+
+                    try:
+                        client = SRISOAPClient(chunk[0].company)
+                        transport = get_transport(environment)
+                        endpoint = SRISOAPClient.SRI_URLS[environment]['authorization_endpoint']
+
+                        results = list(executor.map(
+                            lambda doc: self._query(client, transport, endpoint, doc.access_key),
+                            chunk
+                        ))
+
+                        chunk_stats = self._apply_results(client, chunk, results)
+                        for key in ('authorized', 'rejected', 'pending', 'errors'):
+                            stats[key] += chunk_stats[key]
+                        authorization_times.extend(chunk_stats['authorization_times'])
+                        authorized_ids.extend(chunk_stats['authorized_ids'])
+                        stats['checked'] += len(chunk)
+                    finally:
+                        release_access_keys(list(claimed))
+
+        elapsed = time.monotonic() - started
+        stats['elapsed_seconds'] = round(elapsed, 3)
+        stats['keys_per_second'] = round(stats['checked'] / elapsed, 2) if elapsed > 0 else 0
+        stats['avg_seconds_to_authorization'] = (
+            round(sum(authorization_times) / len(authorization_times), 1) if authorization_times else None
+        )
+        stats['max_seconds_to_authorization'] = (
+            round(max(authorization_times), 1) if authorization_times else None
+        )
+        stats['authorized_ids'] = authorized_ids
+
+        logger.info(
+            f"📊 [AUTH_POLLER] {stats['checked']} keys in {stats['elapsed_seconds']}s "
+            f"({stats['keys_per_second']} keys/s): {stats['authorized']} authorized, "
+            f"{stats['rejected']} rejected, {stats['pending']} pending, {stats['errors']} errors, "
+            f"{stats['skipped_inflight']} already in flight"
+        )
+        return stats
+
+    def _query(self, client, transport, endpoint, access_key):
+        """Una consulta autorizacionComprobante. Retorna dict parseado o {'error': ...}."""
+        try:
+            response = transport.post(
+                endpoint,
+                data=client.build_authorization_envelope(access_key).encode('utf-8'),
+                headers=client.AUTHORIZATION_HEADERS,
+                timeout=self.timeout,
+                verify=True,
+                allow_redirects=False
+            )
+            if response.status_code != 200:
+                return {'error': f'HTTP {response.status_code}'}
+
+            parsed = client.parse_authorization_response(response.text)
+            if parsed is None:
+                return {'error': 'No authorization data in response'}
+            return parsed
+
+        except Exception as e:
+            return {'error': str(e)}
+
+    def _apply_results(self, client, documents, results):
+        """Aplica los resultados de un lote con bulk_update/bulk_create."""
+        now = timezone.now()
+        to_update = []
+        responses = []
+        audit_logs = []
+        chunk_stats = {
+            'authorized': 0, 'rejected': 0, 'pending': 0, 'errors': 0,
+            'authorization_times': [], 'authorized_ids': [],
+        }
+
+        for document, result in zip(documents, results):
+            if 'error' in result:
+                chunk_stats['errors'] += 1
+                continue
+
+            estado = result['estado'] or ''
+            response_data = {
+                'estado': estado,
+                'numeroAutorizacion': result['numeroAutorizacion'],
+                'fechaAutorizacion': result['fechaAutorizacion'],
+                'method': 'authorization_poller',
+            }
+            if result['errors']:
+                response_data['errors'] = result['errors']
+            previous = document.sri_response if isinstance(document.sri_response, dict) else {}
+
+            if estado == 'AUTORIZADO':
+                document.status = 'AUTHORIZED'
+                document.sri_authorization_code = result['numeroAutorizacion']
+                document.sri_authorization_date = result['fecha_autorizacion'] or now
+                chunk_stats['authorized'] += 1
+                chunk_stats['authorized_ids'].append(document.id)
+                chunk_stats['authorization_times'].append((now - document.created_at).total_seconds())
+                audit_action = 'SRI_AUTHORIZED'
+            elif estado == 'NO AUTORIZADO':
+                # Igual que el flujo por documento: se mantiene SENT y se guarda la respuesta.
+                # Idempotente: si ya se registró el mismo rechazo no se vuelve a escribir
+                # (ni SRIResponse ni AuditLog) en cada pasada del poller
+                chunk_stats['rejected'] += 1
+                if previous.get('estado') == estado and previous.get('errors') == response_data.get('errors'):
+                    continue
+                audit_action = 'SRI_REJECTED'
+            else:
+                chunk_stats['pending'] += 1
+                # Sigue EN PROCESO igual que en la pasada anterior: nada nuevo que guardar
+                if is_in_process(estado) and previous.get('estado') == estado:
+                    continue
+                audit_action = None
+
+            document.sri_response = response_data
+            document.updated_at = now
+            to_update.append(document)
+
+            responses.append(SRIResponse(
+                document=document,
+                operation_type='AUTHORIZATION',
+                response_code=estado[:10] or 'UNKNOWN',
+                response_message=(
+                    f"Authorization response: {estado}"
+                    + (f" - {'; '.join(result['errors'])}" if result['errors'] else '')
+                )[:500],
+                raw_response=response_data,
+                **typed_fields(response_data, estado or 'UNKNOWN'),
+            ))
+
+            if audit_action:
+                audit_logs.append(AuditLog(
+                    action=audit_action,
+                    model_name='ElectronicDocument',
+                    object_id=str(document.id),
+                    object_representation=str(document)[:100],
+                    additional_data={
+                        'operation_type': 'AUTHORIZATION',
+                        'response_code': estado[:10],
+                        'environment': client.environment,
+                        'document_number': document.document_number,
+                        'access_key': document.access_key,
+                    }
+                ))
+
+        if to_update:
+            with transaction.atomic():
+                ElectronicDocument.objects.bulk_update(to_update, self.UPDATE_FIELDS)
+                SRIResponse.objects.bulk_create(responses)
+
+        # Fuera del bloque anterior: un fallo de auditoría no debe dejar la
+        # transacción de los documentos rota ni revertir las autorizaciones
+        if audit_logs:
+            try:
+                with transaction.atomic():
+                    AuditLog.objects.bulk_create(audit_logs)
+            except Exception as e:
+                logger.warning(f"⚠️ [AUTH_POLLER] Audit log failed (non-critical): {e}")
+
+        return chunk_stats
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Inserción masiva de líneas de comprobantes
+apps/sri_integration/services/bulk_items.py
+
+Ruta de creación para los endpoints que reciben los ítems en el request:
+- Cálculo de cantidades, subtotales e impuestos con el motor de impuestos (una pasada)
+- Validación en memoria: clean_fields() + clean() del modelo por línea, sin
+  full_clean() (que consulta la BD para validar FKs y unicidad en cada fila)
+- Ítems e impuestos con bulk_create en una sola transacción
+- Los totales del documento se asignan desde los mismos cálculos
+
+El llamador guarda el documento (estado + totales) dentro de su transacción.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from apps.sri_integration.models import (
+    DocumentItem, DocumentTax, PurchaseSettlementItem, RetentionDetail
+)
+from apps.sri_integration.tax_engine import compute_totals, to_decimal
+
+logger = logging.getLogger(__name__)
+
+# Campos que nunca se validan en memoria (se asignan al insertar)
+_EXCLUDED_FIELDS = ('created_by', 'updated_by')
+
+# Campos de texto que se copian del request si existen en el modelo
+_ITEM_TEXT_FIELDS = ('main_code', 'auxiliary_code', 'description')
+
+
+class ItemValidationError(ValueError):
+    """Líneas inválidas. `errors` trae [{line, errors: {campo: [mensajes]}}]."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        first = errors[0] if errors else {}
+        super().__init__(
+            f"{len(errors)} líneas inválidas; línea {first.get('line')}: {first.get('errors')}"
+        )
+
+
+def _batch_size():
+    return getattr(settings, 'SRI_BULK_BATCH_SIZE', 500)
+
+
+def _validate_in_memory(instance, exclude, line, errors):
+    """clean_fields() + clean() sin consultas; acumula errores por línea."""
+    try:
+        instance.clean_fields(exclude=exclude)
+        instance.clean()
+    except ValidationError as e:
+        errors.append({
+            'line': line,
+            'errors': e.message_dict if hasattr(e, 'error_dict') else {'__all__': e.messages},
+        })
+
+
+def _compute(items_data, per_line_codes):
+    try:
+        return compute_totals(items_data, per_line_codes=per_line_codes)
+    except ValueError as e:
+        raise ItemValidationError([{'line': None, 'errors': {'__all__': [str(e)]}}])
+
+
+def build_items(parent, items_data, item_model, parent_field, per_line_codes=True):
+    """
+    Instancias de ítems (sin guardar) validadas en memoria.
+
+    Returns:
+        tuple: (items, totals) con totals del motor de impuestos
+
+    Raises:
+        ItemValidationError con el detalle por línea
+    """
+    totals = _compute(items_data, per_line_codes)
+
+    model_fields = {field.name for field in item_model._meta.concrete_fields}
+    text_fields = [name for name in _ITEM_TEXT_FIELDS if name in model_fields]
+    exclude = [parent_field, *_EXCLUDED_FIELDS]
+
+    items = []
+    errors = []
+    for line_number, (item_data, line) in enumerate(zip(items_data, totals.lines), start=1):
+        item = item_model(
+            quantity=line.quantity,
+            unit_price=line.unit_price,
+            discount=line.discount,
+            subtotal=line.subtotal,
+            **{parent_field: parent},
+            **{name: str(item_data.get(name) or '') for name in text_fields},
+        )
+        _validate_in_memory(item, exclude, line_number, errors)
+        items.append(item)
+
+    if errors:
+        raise ItemValidationError(errors)
+    return items, totals
+
+
+def _apply_totals(document, totals):
+    document.subtotal_without_tax = totals.subtotal
+    document.total_tax = totals.total_tax
+    document.total_amount = totals.total
+
+
+def bulk_create_document_items(document, items_data):
+    """
+    DocumentItem + DocumentTax por línea con bulk_create (factura).
+    Asigna subtotal_without_tax / total_tax / total_amount al documento.
+
+    Returns:
+        DocumentTotals del motor de impuestos
+
+    Raises:
+        ItemValidationError si alguna línea o impuesto no es válido
+    """
+    items, totals = build_items(document, items_data, DocumentItem, 'document')
+
+    taxes = []
+    errors = []
+    exclude = ['document', 'item', *_EXCLUDED_FIELDS]
+    for line_number, (item, line) in enumerate(zip(items, totals.lines), start=1):
+        tax = DocumentTax(
+            document=document,
+            item=item,
+            tax_code=line.tax.tax_code,
+            percentage_code=line.tax.percentage_code,
+            rate=line.tax.rate,
+            taxable_base=line.tax.base,
+            tax_amount=line.tax.amount,
+        )
+        _validate_in_memory(tax, exclude, line_number, errors)
+        taxes.append(tax)
+
+    if errors:
+        raise ItemValidationError(errors)
+
+    batch_size = _batch_size()
+    with transaction.atomic():
+        # bulk_create asigna los pk de los ítems (RETURNING) antes de insertar sus impuestos
+        DocumentItem.objects.bulk_create(items, batch_size=batch_size)
+        DocumentTax.objects.bulk_create(taxes, batch_size=batch_size)
+
+    _apply_totals(document, totals)
+    logger.info(f"📦 [BULK_ITEMS] {len(items)} items + {len(taxes)} taxes for document {document.pk}")
+    return totals
+
+
+def bulk_create_settlement_items(settlement, items_data):
+    """
+    PurchaseSettlementItem con bulk_create; IVA por defecto (sin impuestos por ítem).
+    Asigna los totales a la liquidación.
+    """
+    items, totals = build_items(settlement, items_data, PurchaseSettlementItem, 'settlement', per_line_codes=False)
+
+    with transaction.atomic():
+        PurchaseSettlementItem.objects.bulk_create(items, batch_size=_batch_size())
+
+    _apply_totals(settlement, totals)
+    logger.info(f"📦 [BULK_ITEMS] {len(items)} items for purchase settlement {settlement.pk}")
+    return totals
+
+
+def bulk_create_retention_details(retention, details_data):
+    """
+    RetentionDetail con bulk_create, validados en memoria.
+
+    Returns:
+        list: detalles creados
+    """
+    details = []
+    errors = []
+    exclude = ['retention', *_EXCLUDED_FIELDS]
+    for line_number, detail_data in enumerate(details_data, start=1):
+        try:
+            detail = RetentionDetail(
+                retention=retention,
+                tax_code=detail_data.get('tax_code', '2'),
+                retention_code=detail_data.get('retention_code', '303'),
+                taxable_base=to_decimal(detail_data.get('taxable_base', 0)),
+                retention_percentage=to_decimal(detail_data.get('retention_percentage', 30)),
+                retained_amount=to_decimal(detail_data.get('retained_amount', 0)),
+                support_document_type=detail_data.get('support_document_type', '01'),
+                support_document_number=detail_data.get('support_document_number', '001-001-000000001'),
+                support_document_date=detail_data.get('support_document_date', retention.issue_date),
+            )
+        except ValueError as e:
+            errors.append({'line': line_number, 'errors': {'__all__': [str(e)]}})
+            continue
+        _validate_in_memory(detail, exclude, line_number, errors)
+        details.append(detail)
+
+    if errors:
+        raise ItemValidationError(errors)
+
+    with transaction.atomic():
+        RetentionDetail.objects.bulk_create(details, batch_size=_batch_size())
+
+    logger.info(f"📦 [BULK_ITEMS] {len(details)} details for retention {retention.pk}")
+    return details
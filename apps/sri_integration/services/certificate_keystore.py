@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+Almacén compartido de claves de firma entre procesos
+apps/sri_integration/services/certificate_keystore.py
+
+Cada proceso gunicorn / Celery cargaba por su cuenta todos los P12
+(descifrado PBKDF2/3DES/RC2 del P12 y selección de la clave de firma). Con el almacén:
+- Un solo proceso cargador descifra cada P12 (`manage.py load_certificate_keystore`
+  o el primer worker que lo necesita, bajo un lock en Redis) y publica la
+  clave de firma + certificado + cadena en Redis
+- El bundle va cifrado con Fernet usando una clave propia
+  (CERTIFICATE_KEYSTORE_KEY, independiente de SECRET_KEY) y versionado por
+  certificado activo (id + updated_at); un certificado nuevo invalida el anterior
+- Los workers lo cargan en su caché local la primera vez que lo usan: un
+  descifrado AES + parseo DER, sin PBKDF2/RC2 del P12
+- Métricas por certificado: tiempo de carga del P12, tiempo de carga desde el
+  almacén y bytes del material de clave/certificados
+
+Sin Redis, con CERTIFICATE_SHARED_KEYSTORE=False, sin CERTIFICATE_KEYSTORE_KEY
+o con el SECRET_KEY por defecto cada proceso carga el P12 como antes.
+
+Generar la clave con:
+    python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
+Para rotarla, CERTIFICATE_KEYSTORE_KEY admite varias claves separadas por comas:
+la primera cifra y todas descifran.
+"""
+
+import base64
+import json
+import logging
+import secrets
+import threading
+import time
+
+from cryptography import x509
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from cryptography.hazmat.primitives import serialization
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'sri:keystore'
+BUNDLE_FORMAT = 1
+
+# Borra el lock del cargador solo si sigue siendo nuestro (pudo vencer y
+# tomarlo otro proceso mientras descifrábamos el P12)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _get_redis():
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except Exception as e:
+        logger.warning(f"Redis not available for certificate keystore: {e}")
+        return None
+
+
+def certificate_version(certificate_obj):
+    """Versión del bundle: cambia al reemplazar o actualizar el certificado activo."""
+    updated_at = certificate_obj.updated_at.timestamp() if certificate_obj.updated_at else 0
+    return f"{certificate_obj.pk}:{updated_at:.6f}"
+
+
+class LoadedKey:
+    """Clave de firma parseada y métricas de su carga."""
+
+    __slots__ = ('private_key', 'certificate', 'additional_certificates', 'source', 'load_ms', 'key_bytes')
+
+    def __init__(self, private_key, certificate, additional_certificates, source, load_ms, key_bytes):
+        self.private_key = private_key
+        self.certificate = certificate
+        self.additional_certificates = additional_certificates
+        self.source = source          # 'p12' o 'keystore'
+        self.load_ms = load_ms
+        self.key_bytes = key_bytes    # bytes DER de clave + certificado + cadena
+
+
+def _key_material(private_key, certificate, additional_certificates):
+    key_der = private_key.private_bytes(
+        serialization.Encoding.DER,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    cert_der = certificate.public_bytes(serialization.Encoding.DER)
+    chain_der = [cert.public_bytes(serialization.Encoding.DER) for cert in additional_certificates or []]
+    return key_der, cert_der, chain_der
+
+
+class CertificateKeyStore:
+    """Bundles de claves de firma en Redis con un cargador por empresa."""
+
+    def __init__(self):
+        self._fernet = None
+        self.disabled_reason = None
+        if not getattr(settings, 'CERTIFICATE_SHARED_KEYSTORE', True):
+            self.disabled_reason = 'CERTIFICATE_SHARED_KEYSTORE está desactivado'
+        elif settings.SECRET_KEY.startswith('django-insecure'):
+            self.disabled_reason = 'SECRET_KEY por defecto en uso'
+        else:
+            self._fernet = self._build_fernet(getattr(settings, 'CERTIFICATE_KEYSTORE_KEY', ''))
+            if self._fernet is None:
+                self.disabled_reason = 'CERTIFICATE_KEYSTORE_KEY no configurada o inválida'
+        self.enabled = self.disabled_reason is None
+        if not self.enabled and getattr(settings, 'CERTIFICATE_SHARED_KEYSTORE', True):
+            logger.warning(f"⚠️ [KEYSTORE] Shared keystore disabled: {self.disabled_reason}")
+
+        self.ttl = getattr(settings, 'CERTIFICATE_KEYSTORE_TTL', 86400)
+        self.lock_timeout = getattr(settings, 'CERTIFICATE_KEYSTORE_LOCK_TIMEOUT', 60)
+        self.wait_timeout = getattr(settings, 'CERTIFICATE_KEYSTORE_WAIT_TIMEOUT', 15)
+        self._release_script = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'published': 0,
+            'loader_waits': 0,
+            'wait_timeouts': 0,
+            'invalid_bundles': 0,
+        }
+
+    # ------------------------------------------------------------------
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def _build_fernet(keys):
+        """MultiFernet con las claves de CERTIFICATE_KEYSTORE_KEY, o None si falta o no es válida."""
+        try:
+            fernets = [Fernet(key.strip()) for key in keys.split(',') if key.strip()]
+        except ValueError as e:
+            logger.error(f"❌ [KEYSTORE] Invalid CERTIFICATE_KEYSTORE_KEY: {e}")
+            return None
+        return MultiFernet(fernets) if fernets else None
+
+    @staticmethod
+    def _bundle_key(company_id):
+        return f"{KEY_PREFIX}:{company_id}"
+
+    @staticmethod
+    def _lock_key(company_id):
+        return f"{KEY_PREFIX}:{company_id}:loader"
+
+    def _redis(self):
+        return _get_redis() if self.enabled else None
+
+    # ------------------------------------------------------------------
+    def fetch(self, company_id, version):
+        """
+        Clave parseada desde el almacén, o None si no está publicada,
+        es de otra versión del certificado o Redis no está disponible.
+        """
+        redis_conn = self._redis()
+        if redis_conn is None:
+            return None
+
+        started = time.perf_counter()
+        try:
+            token = redis_conn.get(self._bundle_key(company_id))
+        except Exception as e:
+            logger.warning(f"Certificate keystore read failed for company {company_id}: {e}")
+            return None
+
+        if not token:
+            self._count('misses')
+            return None
+
+        try:
+            bundle = json.loads(self._fernet.decrypt(token))
+            if bundle.get('format') != BUNDLE_FORMAT or bundle.get('version') != version:
+                self._count('misses')
+                return None
+
+            key_der = base64.b64decode(bundle['key'])
+            cert_der = base64.b64decode(bundle['cert'])
+            chain_der = [base64.b64decode(der) for der in bundle.get('chain', [])]
+            # El bundle está autenticado (HMAC de Fernet) y la clave ya se validó al
+            # cargar el P12: se omite la verificación RSA, que domina el tiempo de carga
+            private_key = serialization.load_der_private_key(
+                key_der, password=None, unsafe_skip_rsa_key_validation=True
+            )
+            certificate = x509.load_der_x509_certificate(cert_der)
+            additional_certificates = [x509.load_der_x509_certificate(der) for der in chain_der]
+        except (InvalidToken, ValueError, KeyError, TypeError) as e:
+            self._count('invalid_bundles')
+            logger.warning(f"Invalid keystore bundle for company {company_id}: {e}")
+            return None
+
+        self._count('hits')
+        return LoadedKey(
+            private_key, certificate, additional_certificates,
+            source='keystore',
+            load_ms=(time.perf_counter() - started) * 1000,
+            key_bytes=len(key_der) + len(cert_der) + sum(len(der) for der in chain_der),
+        )
+
+    def publish(self, company_id, version, private_key, certificate, additional_certificates, load_ms):
+        """Publica la clave de firma cargada desde el P12. Retorna los bytes de material."""
+        key_der, cert_der, chain_der = _key_material(private_key, certificate, additional_certificates)
+        key_bytes = len(key_der) + len(cert_der) + sum(len(der) for der in chain_der)
+
+        redis_conn = self._redis()
+        if redis_conn is None:
+            return key_bytes
+
+        bundle = {
+            'format': BUNDLE_FORMAT,
+            'version': version,
+            'key': base64.b64encode(key_der).decode('ascii'),
+            'cert': base64.b64encode(cert_der).decode('ascii'),
+            'chain': [base64.b64encode(der).decode('ascii') for der in chain_der],
+            'p12_load_ms': round(load_ms, 2),
+            'published_at': time.time(),
+        }
+        try:
+            token = self._fernet.encrypt(json.dumps(bundle).encode('utf-8'))
+            redis_conn.set(self._bundle_key(company_id), token, ex=self.ttl)
+            self._count('published')
+            logger.info(f"🔐 [KEYSTORE] Published signing key for company {company_id} ({key_bytes} bytes, P12 load {load_ms:.0f} ms)")
+        except Exception as e:
+            logger.warning(f"Certificate keystore publish failed for company {company_id}: {e}")
+        return key_bytes
+
+    def invalidate(self, company_id):
+        redis_conn = self._redis()
+        if redis_conn is None:
+            return
+        try:
+            redis_conn.delete(self._bundle_key(company_id))
+        except Exception as e:
+            logger.warning(f"Certificate keystore invalidate failed for company {company_id}: {e}")
+
+    # ------------------------------------------------------------------
+    def acquire_loader(self, company_id):
+        """
+        Token de dueño del lock si este proceso debe cargar el P12 (o no hay
+        Redis); None si otro proceso ya lo está cargando.
+        """
+        token = secrets.token_hex(16)
+        redis_conn = self._redis()
+        if redis_conn is None:
+            return token
+        try:
+            if redis_conn.set(self._lock_key(company_id), token, nx=True, ex=self.lock_timeout):
+                return token
+            return None
+        except Exception:
+            return token
+
+    def release_loader(self, company_id, token):
+        """Libera el lock del cargador solo si `token` sigue siendo su dueño."""
+        redis_conn = self._redis()
+        if redis_conn is None:
+            return
+        try:
+            if self._release_script is None:
+                self._release_script = redis_conn.register_script(_RELEASE_LOCK_SCRIPT)
+            self._release_script(keys=[self._lock_key(company_id)], args=[token])
+        except Exception:
+            pass
+
+    def wait_for(self, company_id, version):
+        """Espera a que el cargador publique el bundle; None si vence wait_timeout."""
+        self._count('loader_waits')
+        deadline = time.monotonic() + self.wait_timeout
+        delay = 0.05
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            loaded = self.fetch(company_id, version)
+            if loaded is not None:
+                return loaded
+            delay = min(delay * 2, 0.5)
+        self._count('wait_timeouts')
+        return None
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['enabled'] = self.enabled
+        stats['disabled_reason'] = self.disabled_reason
+        stats['ttl'] = self.ttl
+        return stats
+
+
+_keystore = None
+_keystore_lock = threading.Lock()
+
+
+def get_keystore():
+    """Almacén compartido del proceso."""
+    global _keystore
+    if _keystore is None:
+        with _keystore_lock:
+            if _keystore is None:
+                _keystore = CertificateKeyStore()
+    return _keystore
@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+"""
+Circuit breaker y rate limiter distribuidos para los endpoints del SRI
+apps/sri_integration/services/circuit_breaker.py
+
+Estado compartido en Redis por (ambiente, servicio) entre todos los workers:
+- Circuit breaker closed → open → half_open con una sola petición de prueba
+- Token bucket con tasa adaptativa (AIMD) según latencia y errores observados
+- Estado publicado en Redis (hash + canal pub/sub) para dashboards
+- Documentos "aparcados" mientras el circuito está abierto, sin reintentos
+
+Operaciones atómicas con scripts Lua; si Redis no está disponible no se
+bloquea el tráfico (fail-open).
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'sri:guard'
+STATE_CHANNEL = 'sri:guard:events'
+PARKED_KEY = 'sri:parked:{environment}'
+
+# Prefijo de los mensajes de error cuando el endpoint no acepta peticiones
+CIRCUIT_OPEN_PREFIX = 'SRI_CIRCUIT_OPEN'
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class SRIEndpointUnavailable(Exception):
+    """El endpoint del SRI no acepta peticiones (circuito abierto o sin cupo)."""
+
+    def __init__(self, environment, service, reason):
+        self.environment = environment
+        self.service = service
+        self.reason = reason
+        super().__init__(f"SRI {service} ({environment}) unavailable: {reason}")
+
+
+# ============================================================================
+# Scripts Lua
+# ============================================================================
+_ALLOW_SCRIPT = """
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'closed' then return 1 end
+local now = tonumber(ARGV[1])
+if state == 'open' then
+    local opened = tonumber(redis.call('HGET', KEYS[1], 'opened_at') or '0')
+    if now - opened < tonumber(ARGV[2]) then return 0 end
+    redis.call('HSET', KEYS[1], 'state', 'half_open', 'changed_at', ARGV[1], 'probe_until', now + tonumber(ARGV[3]))
+    return 2
+end
+local probe_until = tonumber(redis.call('HGET', KEYS[1], 'probe_until') or '0')
+if now >= probe_until then
+    redis.call('HSET', KEYS[1], 'probe_until', now + tonumber(ARGV[3]))
+    return 2
+end
+return 0
+"""
+
+_RECORD_SCRIPT = """
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if ARGV[2] == '1' then
+    redis.call('HSET', KEYS[1], 'failures', 0)
+    if state ~= 'closed' then
+        redis.call('HSET', KEYS[1], 'state', 'closed', 'changed_at', ARGV[1])
+        return 'closed'
+    end
+    return ''
+end
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+if state == 'half_open' or (state == 'closed' and failures >= tonumber(ARGV[3])) then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', ARGV[1], 'changed_at', ARGV[1])
+    return 'open'
+end
+return ''
+"""
+
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local burst = tonumber(ARGV[3])
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate') or ARGV[2])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or ARGV[3])
+local ts = tonumber(redis.call('HGET', KEYS[1], 'ts') or ARGV[1])
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+if tokens >= 1 then
+    redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'ts', ARGV[1], 'rate', rate)
+    return '0'
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', ARGV[1], 'rate', rate)
+return tostring((1 - tokens) / rate)
+"""
+
+_ADAPT_SCRIPT = """
+local latency = tonumber(ARGV[3])
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate') or ARGV[7])
+if ARGV[2] == '0' or latency > tonumber(ARGV[6]) then
+    rate = math.max(tonumber(ARGV[4]), rate * 0.5)
+else
+    rate = math.min(tonumber(ARGV[5]), rate + tonumber(ARGV[8]))
+end
+local ewma = tonumber(redis.call('HGET', KEYS[1], 'latency_ewma') or ARGV[3])
+redis.call('HSET', KEYS[1], 'rate', rate, 'latency_ewma', ewma * 0.8 + latency * 0.2)
+redis.call('HINCRBY', KEYS[1], 'requests', 1)
+if ARGV[2] == '0' then redis.call('HINCRBY', KEYS[1], 'errors', 1) end
+return tostring(rate)
+"""
+
+
+def _get_redis():
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except Exception as e:
+        logger.warning(f"Redis not available for SRI circuit breaker: {e}")
+        return None
+
+
+# ============================================================================
+# Guardia por endpoint
+# ============================================================================
+class SRIEndpointGuard:
+    """
+    Circuit breaker + token bucket adaptativo para un servicio del SRI
+    ('reception' / 'authorization') en un ambiente ('TEST' / 'PRODUCTION').
+    """
+
+    def __init__(self, environment, service):
+        self.environment = environment
+        self.service = service
+        self.breaker_key = f"{KEY_PREFIX}:{environment}:{service}:breaker"
+        self.limiter_key = f"{KEY_PREFIX}:{environment}:{service}:limiter"
+
+        self.enabled = getattr(settings, 'SRI_CIRCUIT_BREAKER_ENABLED', True)
+        self.threshold = getattr(settings, 'SRI_CIRCUIT_BREAKER_FAILURE_THRESHOLD', 5)
+        self.recovery_seconds = getattr(settings, 'SRI_CIRCUIT_BREAKER_RECOVERY_TIMEOUT', 60)
+        self.probe_timeout = getattr(settings, 'SRI_CIRCUIT_BREAKER_PROBE_TIMEOUT', 30)
+
+        self.rate_limit_enabled = getattr(settings, 'SRI_RATE_LIMIT_ENABLED', True)
+        self.initial_rate = getattr(settings, 'SRI_RATE_LIMIT_INITIAL_RPS', 20.0)
+        self.min_rate = getattr(settings, 'SRI_RATE_LIMIT_MIN_RPS', 1.0)
+        self.max_rate = getattr(settings, 'SRI_RATE_LIMIT_MAX_RPS', 50.0)
+        self.rate_step = getattr(settings, 'SRI_RATE_LIMIT_STEP_RPS', 0.5)
+        self.burst = getattr(settings, 'SRI_RATE_LIMIT_BURST', 20)
+        self.max_wait = getattr(settings, 'SRI_RATE_LIMIT_MAX_WAIT', 10)
+        self.slow_latency = getattr(settings, 'SRI_RATE_LIMIT_SLOW_SECONDS', 10.0)
+
+        self._redis = None
+        self._scripts = None
+
+    def _get_scripts(self):
+        if self._scripts is None:
+            redis_conn = _get_redis()
+            if redis_conn is None:
+                return None, None
+            self._redis = redis_conn
+            self._scripts = {
+                'allow': redis_conn.register_script(_ALLOW_SCRIPT),
+                'record': redis_conn.register_script(_RECORD_SCRIPT),
+                'acquire': redis_conn.register_script(_ACQUIRE_SCRIPT),
+                'adapt': redis_conn.register_script(_ADAPT_SCRIPT),
+            }
+        return self._redis, self._scripts
+
+    # ------------------------------------------------------------------------
+    # Antes / después de cada petición
+    # ------------------------------------------------------------------------
+    def before_request(self):
+        """
+        Verifica el circuito y espera un token.
+        Lanza SRIEndpointUnavailable si el circuito está abierto o no hay cupo
+        en SRI_RATE_LIMIT_MAX_WAIT segundos.
+        """
+        if not self._check_circuit():
+            return
+
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = self._acquire_token()
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise SRIEndpointUnavailable(self.environment, self.service, 'rate limited')
+            time.sleep(wait)
+
+    async def abefore_request(self, executor=None):
+        """
+        Versión awaitable de before_request para el cliente asíncrono: la
+        espera del token es asyncio.sleep y solo las llamadas a Redis pasan por
+        `executor` (None = executor por defecto del loop), así un token
+        escaso no deja hilos bloqueados durmiendo.
+        """
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(executor, self._check_circuit):
+            return
+
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = await loop.run_in_executor(executor, self._acquire_token)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise SRIEndpointUnavailable(self.environment, self.service, 'rate limited')
+            await asyncio.sleep(wait)
+
+    def _check_circuit(self):
+        """
+        Verifica el circuito (lanza SRIEndpointUnavailable si está abierto).
+        Retorna True si además hay que esperar un token del rate limiter.
+        """
+        if not self.enabled and not self.rate_limit_enabled:
+            return False
+
+        redis_conn, scripts = self._get_scripts()
+        if scripts is None:
+            return False
+
+        if self.enabled:
+            try:
+                allowed = scripts['allow'](
+                    keys=[self.breaker_key],
+                    args=[time.time(), self.recovery_seconds, self.probe_timeout]
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ [SRI_GUARD] Redis error, allowing request: {e}")
+                return False
+            if not allowed:
+                raise SRIEndpointUnavailable(self.environment, self.service, 'circuit open')
+            if allowed == 2:
+                self._publish(HALF_OPEN)
+
+        return self.rate_limit_enabled
+
+    def _acquire_token(self):
+        """Toma un token del bucket; retorna los segundos a esperar antes de reintentar (0 = tomado)."""
+        redis_conn, scripts = self._get_scripts()
+        if scripts is None:
+            return 0.0
+
+        try:
+            return float(scripts['acquire'](
+                keys=[self.limiter_key],
+                args=[time.time(), self.initial_rate, self.burst]
+            ))
+        except Exception as e:
+            logger.warning(f"⚠️ [SRI_GUARD] Redis error, allowing request: {e}")
+            return 0.0
+
+    def after_request(self, success, latency):
+        """Registra el resultado: transiciones del circuito y ajuste de la tasa."""
+        redis_conn, scripts = self._get_scripts()
+        if scripts is None:
+            return
+
+        try:
+            if self.enabled:
+                transition = scripts['record'](
+                    keys=[self.breaker_key],
+                    args=[time.time(), '1' if success else '0', self.threshold]
+                )
+                if transition:
+                    self._publish(transition.decode() if isinstance(transition, bytes) else transition)
+
+            if self.rate_limit_enabled:
+                scripts['adapt'](
+                    keys=[self.limiter_key],
+                    args=[time.time(), '1' if success else '0', latency, self.min_rate,
+                          self.max_rate, self.slow_latency, self.initial_rate, self.rate_step]
+                )
+        except Exception as e:
+            logger.warning(f"⚠️ [SRI_GUARD] Could not record SRI result: {e}")
+
+    async def aafter_request(self, success, latency, executor=None):
+        """Versión awaitable de after_request (las llamadas a Redis corren en `executor`)."""
+        await asyncio.get_running_loop().run_in_executor(executor, self.after_request, success, latency)
+
+    # ------------------------------------------------------------------------
+    # Estado
+    # ------------------------------------------------------------------------
+    def is_open(self):
+        """True si el circuito está abierto y aún no toca probar."""
+        state = self.get_state()
+        if state['state'] != OPEN:
+            return False
+        return time.time() - state['opened_at'] < self.recovery_seconds
+
+    def get_state(self):
+        redis_conn, _ = self._get_scripts()
+        breaker, limiter = {}, {}
+        if redis_conn is not None:
+            try:
+                pipe = redis_conn.pipeline()
+                pipe.hgetall(self.breaker_key)
+                pipe.hgetall(self.limiter_key)
+                breaker, limiter = pipe.execute()
+            except Exception as e:
+                logger.warning(f"⚠️ [SRI_GUARD] Could not read state: {e}")
+
+        def _get(data, key, default=None, cast=str):
+            value = data.get(key.encode()) if data else None
+            return cast(value.decode() if isinstance(value, bytes) else value) if value is not None else default
+
+        requests_count = _get(limiter, 'requests', 0, int)
+        return {
+            'environment': self.environment,
+            'service': self.service,
+            'state': _get(breaker, 'state', CLOSED),
+            'failures': _get(breaker, 'failures', 0, int),
+            'threshold': self.threshold,
+            'opened_at': _get(breaker, 'opened_at', 0.0, float),
+            'changed_at': _get(breaker, 'changed_at', 0.0, float),
+            'recovery_seconds': self.recovery_seconds,
+            'rate_rps': _get(limiter, 'rate', self.initial_rate, float),
+            'latency_ewma_seconds': _get(limiter, 'latency_ewma', None, float),
+            'requests': requests_count,
+            'errors': _get(limiter, 'errors', 0, int),
+        }
+
+    def reset(self):
+        redis_conn, _ = self._get_scripts()
+        if redis_conn is not None:
+            redis_conn.delete(self.breaker_key, self.limiter_key)
+            self._publish(CLOSED)
+
+    def _publish(self, state):
+        logger.warning(f"🔌 [SRI_GUARD] {self.service} ({self.environment}) circuit → {state}")
+        try:
+            self._redis.publish(STATE_CHANNEL, json.dumps({
+                'environment': self.environment,
+                'service': self.service,
+                'state': state,
+                'timestamp': time.time(),
+            }))
+        except Exception:
+            pass
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def get_endpoint_guard(environment, service):
+    key = (environment, service)
+    guard = _guards.get(key)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.get(key)
+            if guard is None:
+                guard = SRIEndpointGuard(environment, service)
+                _guards[key] = guard
+    return guard
+
+
+def service_for_url(url):
+    """'reception' o 'authorization' según el endpoint del SRI."""
+    return 'reception' if 'Recepcion' in url else 'authorization'
+
+
+def is_sri_available(environment, service='reception'):
+    return not get_endpoint_guard(environment, service).is_open()
+
+
+def get_guard_states():
+    """Estado de todos los circuitos para dashboards / endpoints de estado."""
+    return [
+        get_endpoint_guard(environment, service).get_state()
+        for environment in ('TEST', 'PRODUCTION')
+        for service in ('reception', 'authorization')
+    ]
+
+
+# ============================================================================
+# Documentos aparcados (circuito abierto)
+# ============================================================================
+def park_document(document_id, environment):
+    """Aparca un documento hasta que el circuito de recepción se cierre."""
+    redis_conn = _get_redis()
+    if redis_conn is None:
+        return False
+    try:
+        redis_conn.zadd(PARKED_KEY.format(environment=environment), {str(document_id): time.time()})
+        logger.info(f"🅿️ [SRI_GUARD] Document {document_id} parked while SRI {environment} is unavailable")
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ [SRI_GUARD] Could not park document {document_id}: {e}")
+        return False
+
+
+def pop_parked_documents(environment, limit=500):
+    """Extrae hasta `limit` documentos aparcados (los más antiguos primero)."""
+    redis_conn = _get_redis()
+    if redis_conn is None:
+        return []
+    try:
+        items = redis_conn.zpopmin(PARKED_KEY.format(environment=environment), limit)
+        return [int(member) for member, _ in items]
+    except Exception as e:
+        logger.warning(f"⚠️ [SRI_GUARD] Could not read parked documents: {e}")
+        return []
@@ -1,20 +1,22 @@
 # -*- coding: utf-8 -*-
 """
-Procesador principal de documentos electrónicos - VERSIÓN JAR
-RESUELVE: Error 39 FIRMA INVALIDA usando JAR de Java oficial
-
-FIX DEFINITIVO JAR: 
-- Usa JAR compilado de firma XAdES-BES (compatible con TODOS los proveedores)
+Procesador principal de documentos electrónicos
+RESUELVE: Error 39 FIRMA INVALIDA
+
+FIRMA XAdES-BES:
+- JAR oficial por defecto (SRI_SIGNING_BACKEND='jar'), vía sidecar JVM de firma
+  (SRI_SIGNING_DAEMON_SOCKET) si está desplegado y subprocess si no
+- Firma nativa en proceso (XAdESBESSigner) con SRI_SIGNING_BACKEND='python',
+  con el JAR como respaldo si falla
 - Soporta multi-tenant (múltiples empresas con diferentes certificados)
 """
 
 import logging
-import os
 import time
-import subprocess
 from datetime import datetime, timezone, timedelta
+from django.conf import settings
 from django.core.files.base import ContentFile
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.utils import timezone as django_timezone
 from apps.sri_integration.models import ElectronicDocument
 from apps.sri_integration.services.xml_generator import XMLGenerator
@@ -22,6 +24,12 @@ from apps.sri_integration.services.pdf_generator import PDFGenerator
 from apps.sri_integration.services.global_certificate_manager import get_certificate_manager
 from apps.sri_integration.services.soap_client import SRISOAPClient
 from apps.sri_integration.services.email_service import EmailService
+from apps.sri_integration.services.xades_signer import sign_xml
+from apps.sri_integration.services.jar_signer import JarSigningError, sign_with_jar
+from apps.sri_integration.services.signing_daemon import get_signing_daemon_client
+from apps.sri_integration.services.circuit_breaker import CIRCUIT_OPEN_PREFIX, park_document
+from apps.sri_integration.services.document_snapshot import load_document_snapshot, sync_snapshot_fields
+from apps.sri_integration.services.xsd_validator import XSDSchemaMissingError
 from apps.core.models import AuditLog
 
 # Imports básicos para verificación de certificado
@@ -38,62 +46,46 @@ ECUADOR_TZ = timezone(timedelta(hours=-5))
 class DocumentProcessor:
     """
     Procesador principal de documentos electrónicos del SRI.
-    Implementa firma XAdES-BES usando JAR de Java oficial.
+    Firma XAdES-BES con el JAR de Java oficial o, si se configura, en proceso.
     """
 
     def __init__(self, company):
         self.company = company
         self.sri_config = company.sri_configuration
         self.cert_manager = get_certificate_manager()
+        self._snapshots = {}
 
     # ========================================================================
     # Flujo principal
     # ========================================================================
-    def process_document(self, document, send_email=True, certificate_password=None):
-        """Procesa completamente un documento electrónico."""
-        try:
-            with transaction.atomic():
-                logger.info(f"Iniciando procesamiento de documento {document.id}")
-
-                # --- Validaciones previas ---
-                cert_data = self.cert_manager.get_certificate(self.company.id)
-                if not cert_data:
-                    msg = f"Certificate not available for company {self.company.id}"
-                    logger.error(msg)
-                    return False, msg
-
-                is_valid, validation_msg = self.cert_manager.validate_certificate(self.company.id)
-                if not is_valid:
-                    logger.error(f"Certificate validation failed: {validation_msg}")
-                    return False, f"Certificate validation failed: {validation_msg}"
+    def process_document(self, document, send_email=True, certificate_password=None,
+                         wait_for_authorization=None):
+        """
+        Procesa completamente un documento electrónico.
 
-                ok, cert_msg = self._verify_certificate(cert_data)
-                if not ok:
-                    logger.error(f"Certificate check failed: {cert_msg}")
-                    return False, cert_msg
+        Por defecto (SRI_ASYNC_AUTHORIZATION=True) solo ejecuta la etapa de envío
+        (XML, firma, recepción) y programa la etapa de autorización, PDF, email y
+        consumo del plan en Celery al confirmarse la transacción, sin bloquear el
+        worker HTTP ni mantener la transacción abierta mientras el SRI autoriza.
+        Con wait_for_authorization=True mantiene el flujo bloqueante anterior.
+        """
+        if wait_for_authorization is None:
+            wait_for_authorization = not getattr(settings, 'SRI_ASYNC_AUTHORIZATION', True)
 
-                # 1. Generar XML
-                logger.info(f"Generando XML para documento {document.id}")
-                ok, xml_content = self._generate_xml(document)
+        try:
+            with transaction.atomic():
+                ok, message = self.submit_document(document)
                 if not ok:
-                    logger.error(f"XML generation failed: {xml_content}")
-                    return False, f"XML generation failed: {xml_content}"
+                    return False, message
 
-                # 2. Firmar XML (usando JAR)
-                logger.info(f"Firmando XML para documento {document.id}")
-                ok, signed_xml = self._sign_xml(document, xml_content)
-                if not ok:
-                    logger.error(f"XML signing failed: {signed_xml}")
-                    return False, f"XML signing failed: {signed_xml}"
+                if not wait_for_authorization:
+                    from apps.sri_integration.tasks import schedule_document_finalization
+                    schedule_document_finalization(document.id, send_email=send_email)
 
-                # 3. Enviar al SRI
-                logger.info(f"Enviando documento {document.id} al SRI")
-                ok, sri_msg = self._send_to_sri(document, signed_xml)
-                if not ok:
-                    logger.error(f"SRI submission failed: {sri_msg}")
-                    return False, sri_msg
+                    logger.info(f"Documento {document.id} recibido por el SRI, autorización programada")
+                    return True, f"Document processed successfully with status: {document.status}"
 
-                # 4. Consultar autorización
+                # 4. Consultar autorización (bloqueante)
                 logger.info(f"Consultando autorización para documento {document.id}")
                 ok, auth_msg = self._check_authorization(document)
                 if not ok:
@@ -106,14 +98,9 @@ class DocumentProcessor:
 
                 document.refresh_from_db()
 
-                # 6. Enviar email si está autorizado
-                if document.status == 'AUTHORIZED' and send_email:
-                    logger.info(f"Enviando email para documento {document.id}")
-                    self._send_email(document)
-
-                # 7. Consumir factura del plan SOLO si fue autorizada por el SRI
+                # 6-7. Email y consumo del plan si está autorizado
                 if document.status == 'AUTHORIZED':
-                    self._consume_invoice_from_plan(document)
+                    self._complete_authorized_document(document, send_email, generate_pdf=False)
 
                 logger.info(f"Documento {document.id} procesado con estado: {document.status}")
                 return True, f"Document processed successfully with status: {document.status}"
@@ -124,6 +111,255 @@ class DocumentProcessor:
             document.save()
             return False, f"PROCESSOR_CRITICAL_ERROR: {str(e)}"
 
+    def submit_document(self, document):
+        """
+        Etapa de envío: validaciones, XML, firma y recepción en el SRI.
+        Deja el documento en SENT (RECIBIDA) sin esperar la autorización.
+        """
+        logger.info(f"Iniciando procesamiento de documento {document.id}")
+
+        ok, signed_xml = self.prepare_document(document)
+        if not ok:
+            return False, signed_xml
+
+        # 3. Enviar al SRI
+        logger.info(f"Enviando documento {document.id} al SRI")
+        ok, sri_msg = self._send_to_sri(document, signed_xml)
+        if not ok:
+            logger.error(f"SRI submission failed: {sri_msg}")
+            return False, sri_msg
+
+        return True, sri_msg
+
+    def submit_documents_batch(self, documents):
+        """
+        Etapa de envío en lote masivo: genera el XML de todos los documentos, los
+        firma en un solo lote (una llamada al sidecar de firma si se usa el JAR) y
+        los envía al SRI agrupados (una llamada validarComprobante por lote).
+
+        Returns:
+            dict: {document.id: (success, message)}
+        """
+        results = {}
+
+        ok, cert_msg = self._validate_certificate_setup()
+        if not ok:
+            return {document.id: (False, cert_msg) for document in documents}
+
+        # Un lote solo admite comprobantes del mismo tipo
+        prepared_by_type = {}
+        for document, (ok, signed_xml) in zip(documents, self.prepare_documents(documents)):
+            if not ok:
+                document.status = 'ERROR'
+                document.save(update_fields=['status', 'updated_at'])
+                results[document.id] = (False, signed_xml)
+                continue
+            if isinstance(signed_xml, str):
+                signed_xml = signed_xml.encode('utf-8')
+            prepared_by_type.setdefault(document.document_type, []).append((document, signed_xml))
+
+        sri_client = SRISOAPClient(self.company)
+        for document_type, items in prepared_by_type.items():
+            logger.info(f"Enviando lote de {len(items)} documentos {document_type} al SRI")
+            try:
+                batch_results = sri_client.send_batch_to_reception(items)
+                for document_id, (ok, message) in batch_results.items():
+                    if not ok and message.startswith(CIRCUIT_OPEN_PREFIX):
+                        park_document(document_id, sri_client.environment)
+                results.update(batch_results)
+            except Exception as e:
+                msg = f"PROCESSOR_SRI_EXCEPTION: {str(e)}"
+                logger.error(msg)
+                for document, _ in items:
+                    results[document.id] = (False, msg)
+
+        return results
+
+    def prepare_document(self, document, validate_certificate=True):
+        """
+        Validaciones de certificado, generación de XML y firma XAdES-BES.
+
+        Returns:
+            tuple: (success, signed_xml | mensaje de error)
+        """
+        if validate_certificate:
+            ok, cert_msg = self._validate_certificate_setup()
+            if not ok:
+                return False, cert_msg
+
+        # 1. Generar XML
+        logger.info(f"Generando XML para documento {document.id}")
+        ok, xml_content = self._generate_xml(document)
+        if not ok:
+            logger.error(f"XML generation failed: {xml_content}")
+            return False, f"XML generation failed: {xml_content}"
+
+        # 2. Firmar XML (XAdES-BES)
+        logger.info(f"Firmando XML para documento {document.id}")
+        ok, signed_xml = self._sign_xml(document, xml_content)
+        if not ok:
+            logger.error(f"XML signing failed: {signed_xml}")
+            return False, f"XML signing failed: {signed_xml}"
+
+        return True, signed_xml
+
+    def prepare_documents(self, documents):
+        """
+        prepare_document para un lote masivo (certificado ya validado): genera
+        todos los XML y los firma juntos con _sign_xml_batch.
+
+        Returns:
+            list: (success, signed_xml | mensaje de error), en el orden de `documents`
+        """
+        results = [None] * len(documents)
+        to_sign = []
+        positions = []
+
+        for index, document in enumerate(documents):
+            logger.info(f"Generando XML para documento {document.id}")
+            ok, xml_content = self._generate_xml(document)
+            if not ok:
+                logger.error(f"XML generation failed: {xml_content}")
+                results[index] = (False, f"XML generation failed: {xml_content}")
+                continue
+            to_sign.append((document, xml_content))
+            positions.append(index)
+
+        if to_sign:
+            logger.info(f"Firmando lote de {len(to_sign)} XML")
+            for index, (ok, signed_xml) in zip(positions, self._sign_xml_batch(to_sign)):
+                if not ok:
+                    logger.error(f"XML signing failed: {signed_xml}")
+                    signed_xml = f"XML signing failed: {signed_xml}"
+                results[index] = (ok, signed_xml)
+
+        return results
+
+    def _validate_certificate_setup(self):
+        """Validaciones previas del certificado de la empresa."""
+        cert_data = self.cert_manager.get_certificate(self.company.id)
+        if not cert_data:
+            msg = f"Certificate not available for company {self.company.id}"
+            logger.error(msg)
+            return False, msg
+
+        is_valid, validation_msg = self.cert_manager.validate_certificate(self.company.id)
+        if not is_valid:
+            logger.error(f"Certificate validation failed: {validation_msg}")
+            return False, f"Certificate validation failed: {validation_msg}"
+
+        ok, cert_msg = self._verify_certificate(cert_data)
+        if not ok:
+            logger.error(f"Certificate check failed: {cert_msg}")
+            return False, cert_msg
+
+        return True, "Certificate OK"
+
+    def finalize_document(self, document, send_email=True):
+        """
+        Etapa de autorización (no bloqueante): una sola consulta al SRI.
+
+        Returns:
+            tuple: (finished, message). finished=False con el documento aún en
+            SENT significa que sigue en proceso y debe reintentarse más tarde.
+        """
+        if document.status == 'AUTHORIZED':
+            self._complete_authorized_document(document, send_email)
+            return True, "Document already authorized"
+
+        if document.status != 'SENT':
+            return True, f"Document not pending authorization (status: {document.status})"
+
+        sri_client = SRISOAPClient(self.company)
+        success, message = sri_client.get_document_authorization(document)
+
+        document.refresh_from_db()
+
+        if success or document.status == 'AUTHORIZED':
+            logger.info(f"Documento {document.id} autorizado por el SRI")
+            self._complete_authorized_document(document, send_email)
+            return True, message
+
+        msg_lower = message.lower()
+        rejected = 'no autorizado' in msg_lower or 'not authorized' in msg_lower
+        if not rejected and ('proceso' in msg_lower or 'pendiente' in msg_lower or document.status == 'SENT'):
+            logger.info(f"Documento {document.id} aún en proceso en el SRI: {message}")
+            self._sync_source_document_status(document)
+            return False, message
+
+        logger.error(f"Error definitivo en autorización de documento {document.id}: {message}")
+        self._sync_source_document_status(document)
+        return True, f"AUTHORIZATION_ERROR: {message}"
+
+    def _complete_authorized_document(self, document, send_email=True, generate_pdf=True):
+        """
+        Pasos posteriores a la autorización: PDF, email y consumo del plan.
+
+        El poller y la cadena de reintentos del documento pueden llegar a la vez,
+        pero la fila no queda bloqueada mientras se genera el PDF o se habla con
+        el SMTP:
+        - el RIDE se registra con un UPDATE de pdf_file; el almacén es direccionado
+          por contenido, así que generarlo dos veces no duplica archivos
+        - el email se reclama con un UPDATE condicional de email_sent antes de
+          enviarlo (un solo envío) y se libera si el envío falla
+        - el consumo del plan es idempotente (InvoiceConsumption única)
+        """
+        current = ElectronicDocument.objects.only('pdf_file', 'email_sent').get(pk=document.pk)
+        document.pdf_file = current.pdf_file
+        document.email_sent = current.email_sent
+
+        if generate_pdf and not document.pdf_file:
+            ok, pdf_msg = self._generate_pdf(document)
+            if not ok:
+                logger.warning(f"PDF generation failed: {pdf_msg}")
+
+        if send_email and not document.email_sent and self._claim_email(document):
+            logger.info(f"Enviando email para documento {document.id}")
+            ok, email_msg = self._send_email(document)
+            if not ok:
+                logger.warning(f"Email not sent for document {document.id}: {email_msg}")
+                self._release_email_claim(document)
+
+        self._consume_invoice_from_plan(document)
+        self._sync_source_document_status(document)
+
+    def _claim_email(self, document):
+        """
+        Reclama el envío del email: solo un proceso pasa email_sent de False a True.
+        Un worker que muere durante el envío deja email_sent=True sin
+        email_sent_date (a lo sumo un envío, nunca dos).
+        """
+        return ElectronicDocument.objects.filter(pk=document.pk, email_sent=False).update(
+            email_sent=True, updated_at=django_timezone.now()
+        ) == 1
+
+    def _release_email_claim(self, document):
+        ElectronicDocument.objects.filter(pk=document.pk, email_sent_date__isnull=True).update(
+            email_sent=False, updated_at=django_timezone.now()
+        )
+        document.email_sent = False
+
+    def _sync_source_document_status(self, document):
+        """Propaga el estado al documento de origen (nota de crédito, retención, etc.)."""
+        from apps.sri_integration.models import CreditNote, DebitNote, Retention, PurchaseSettlement
+
+        models_by_type = {
+            'CREDIT_NOTE': CreditNote,
+            'DEBIT_NOTE': DebitNote,
+            'RETENTION': Retention,
+            'PURCHASE_SETTLEMENT': PurchaseSettlement,
+        }
+        model = models_by_type.get(document.document_type)
+        if model is None or not document.access_key:
+            return
+
+        try:
+            model.objects.filter(access_key=document.access_key).exclude(
+                status=document.status
+            ).update(status=document.status)
+        except Exception as e:
+            logger.warning(f"Could not sync status for {document.document_type} {document.access_key}: {e}")
+
     # ========================================================================
     # Consumo de factura del plan de billing
     # ========================================================================
@@ -136,20 +372,33 @@ class DocumentProcessor:
         try:
             from apps.billing.models import CompanyBillingProfile, InvoiceConsumption
 
-            billing_profile = CompanyBillingProfile.objects.get(company=self.company)
-            balance_before = billing_profile.available_invoices
-
-            consumed = billing_profile.consume_invoice()
+            with transaction.atomic():
+                # Bloqueo del perfil: serializa los consumos de la empresa y hace
+                # atómicos el chequeo de idempotencia y el descuento del saldo
+                billing_profile = CompanyBillingProfile.objects.select_for_update().get(company=self.company)
 
-            if consumed:
-                InvoiceConsumption.objects.create(
+                # Idempotente: la etapa de autorización puede ejecutarse más de una vez
+                if InvoiceConsumption.objects.filter(
                     company=self.company,
                     invoice_id=str(document.access_key),
-                    invoice_type=document.document_type,
-                    balance_before=balance_before,
-                    balance_after=billing_profile.available_invoices,
-                    api_endpoint='document_processor',
-                )
+                ).exists():
+                    logger.info(f"BILLING: Documento {document.access_key} ya consumido, omitiendo")
+                    return
+
+                balance_before = billing_profile.available_invoices
+                consumed = billing_profile.consume_invoice()
+
+                if consumed:
+                    InvoiceConsumption.objects.create(
+                        company=self.company,
+                        invoice_id=str(document.access_key),
+                        invoice_type=document.document_type,
+                        balance_before=balance_before,
+                        balance_after=billing_profile.available_invoices,
+                        api_endpoint='document_processor',
+                    )
+
+            if consumed:
                 logger.info(
                     f"✅ BILLING: Factura consumida - "
                     f"empresa={self.company.id} ({self.company.business_name}), "
@@ -166,6 +415,9 @@ class DocumentProcessor:
                     f"saldo={balance_before}"
                 )
 
+        except IntegrityError:
+            # UniqueConstraint(company, invoice_id): otro proceso ya lo consumió
+            logger.info(f"BILLING: Documento {document.access_key} ya consumido (concurrente), omitiendo")
         except CompanyBillingProfile.DoesNotExist:
             logger.error(
                 f"❌ BILLING: No existe perfil de facturación para empresa "
@@ -227,108 +479,157 @@ class DocumentProcessor:
             return False, f"Certificate verification failed: {str(e)}"
 
     # ========================================================================
-    # Firma XAdES-BES usando JAR de Java
+    # Firma XAdES-BES (JAR de Java oficial; nativa en Python opcional)
     # ========================================================================
     def _sign_xml(self, document, xml_content):
         """
-        Firma el XML usando JAR de Java (compatible con TODOS los proveedores).
-        Resuelve Error 39 - Funciona con Security Data, BCE, Uanataca, etc.
+        Firma el XML con XAdES-BES.
+        Por defecto usa el JAR oficial: primero el sidecar JVM y solo arranca
+        `java -jar` si no está desplegado. Con SRI_SIGNING_BACKEND='python' firma
+        en memoria con XAdESBESSigner y recurre al JAR si la firma nativa falla.
         """
-        try:
-            logger.info(f"🔐 Iniciando firma XML para documento {document.id} usando JAR")
+        return self._sign_xml_batch([(document, xml_content)])[0]
+
+    def _sign_xml_batch(self, items):
+        """
+        Firma un lote de (document, xml_content) con el mismo orden de respaldo que
+        _sign_xml; los documentos que van al JAR se firman en una sola llamada
+        al sidecar en lugar de una por documento.
 
+        Returns:
+            list: (success, signed_xml | mensaje de error), en el orden de `items`
+        """
+        try:
             # Obtener certificado de la empresa
             cert_data = self.cert_manager.get_certificate(self.company.id)
-            if not cert_data:
-                return False, "Certificate not available"
+        except Exception as e:
+            logger.error(f"❌ Error loading certificate for company {self.company.id}: {str(e)}")
+            return [(False, f"XML_SIGNING_ERROR: {str(e)}")] * len(items)
+        if not cert_data:
+            return [(False, "Certificate not available")] * len(items)
+
+        signed = [None] * len(items)
+        backend = getattr(settings, 'SRI_SIGNING_BACKEND', 'jar')
+
+        if backend == 'python':
+            for index, (document, xml_content) in enumerate(items):
+                try:
+                    logger.info(f"🔐 Firmando XML en proceso para documento {document.id}")
+                    signed[index] = sign_xml(xml_content, cert_data)
+                except Exception as e:
+                    logger.warning(
+                        f"⚠️ Firma nativa falló para documento {document.id}, usando JAR: {str(e)}"
+                    )
 
-            # Rutas temporales
-            xml_unsigned_path = f"/tmp/factura_{document.id}_unsigned.xml"
+        pending = [index for index, signed_xml in enumerate(signed) if signed_xml is None]
+        if pending:
+            daemon_results = self._sign_xml_with_daemon([items[index] for index in pending], cert_data)
+            for index, signed_xml in zip(pending, daemon_results):
+                signed[index] = signed_xml
 
-            # Guardar XML sin firmar
-            with open(xml_unsigned_path, 'w', encoding='utf-8') as f:
-                f.write(xml_content)
+        results = []
+        for (document, xml_content), signed_xml in zip(items, signed):
+            try:
+                if signed_xml is None:
+                    ok, result = self._sign_xml_with_jar(document, xml_content, cert_data)
+                    if not ok:
+                        results.append((False, result))
+                        continue
+                    signed_xml = result
+                results.append(self._store_signed_xml(document, signed_xml))
+            except Exception as e:
+                logger.error(f"❌ Error signing XML for document {document.id}: {str(e)}")
+                results.append((False, f"XML_SIGNING_ERROR: {str(e)}"))
+
+        return results
+
+    def _store_signed_xml(self, document, signed_xml):
+        """Guarda el XML firmado en el documento y lo deja en SIGNED."""
+        logger.info(f"📊 XML firmado: {len(signed_xml)} bytes")
+
+        # Guardar en el documento
+        filename = f"{document.access_key}_signed.xml"
+        document.signed_xml_file.save(
+            filename,
+            ContentFile(signed_xml),
+            save=True
+        )
+
+        document.status = 'SIGNED'
+        document.save()
+
+        logger.info(f"✅ XML firmado correctamente para documento {document.id}")
+        return True, signed_xml.decode('utf-8')
+
+    def _sign_xml_with_daemon(self, items, cert_data):
+        """
+        Firma un lote de (document, xml_content) en el sidecar JVM del JAR (JVMs
+        calientes detrás de un socket local) con una sola llamada.
+        Retorna una lista alineada con `items`: el XML firmado o None para los
+        documentos que deben ir al subprocess (sidecar ausente, caído o rechazo).
+        """
+        client = get_signing_daemon_client()
+        if client is None or not client.is_available():
+            return [None] * len(items)
+
+        logger.info(f"🔐 Firmando {len(items)} XML en sidecar JVM")
+        results = client.sign_batch([(self.company.id, xml_content) for _, xml_content in items])
+        if results is None:
+            return [None] * len(items)
+
+        signed = []
+        for (document, _), (ok, signed_xml) in zip(items, results):
+            if not ok:
+                logger.warning(f"⚠️ Sidecar JVM rechazó documento {document.id}: {signed_xml}")
+                signed_xml = None
+            signed.append(signed_xml)
+
+        if any(signed_xml is not None for signed_xml in signed):
+            cert_data.update_usage()
+        return signed
+
+    def _sign_xml_with_jar(self, document, xml_content, cert_data):
+        """
+        Firma el XML usando JAR de Java (compatible con TODOS los proveedores).
+        Resuelve Error 39 - Funciona con Security Data, BCE, Uanataca, etc.
+        """
+        try:
+            logger.info(f"🔐 Iniciando firma XML para documento {document.id} usando JAR")
 
             # Obtener certificado P12 y password de LA EMPRESA actual
             p12_path = cert_data.certificate_obj.certificate_file.path
-            password = cert_data.password
-
             logger.info(f"📋 Firmando con JAR")
             logger.info(f"   Certificado: {p12_path}")
-            logger.info(f"   XML input: {xml_unsigned_path}")
-
-            # Ejecutar JAR de firma (requiere 5 parámetros: p12, password, xml_input, output_dir, output_filename)
-            output_filename = f'factura_{document.id}_signed.xml'
-            logger.info(f"   XML output: /tmp/{output_filename}")
-
-            result = subprocess.run([
-                'java', '-jar', '/app/sri.jar',
-                p12_path,
-                password,
-                xml_unsigned_path,
-                '/tmp',          # Directorio de salida
-                output_filename  # Nombre del archivo
-            ], capture_output=True, text=True, check=True)
-
-            # Ruta del archivo firmado
-            xml_signed_path = f'/tmp/{output_filename}'
 
+            signed_xml = sign_with_jar(p12_path, cert_data.password, xml_content)
             logger.info(f"✅ JAR ejecutado exitosamente")
-            if result.stdout:
-                logger.info(f"   JAR stdout: {result.stdout.strip()}")
-            if result.stderr:
-                logger.warning(f"   JAR stderr: {result.stderr.strip()}")
 
-            # Leer XML firmado
-            with open(xml_signed_path, 'rb') as f:
-                signed_xml = f.read()
-
-            logger.info(f"📊 XML firmado: {len(signed_xml)} bytes")
-
-            # Guardar en el documento
-            filename = f"{document.access_key}_signed.xml"
-            document.signed_xml_file.save(
-                filename,
-                ContentFile(signed_xml),
-                save=True
-            )
-
-            document.status = 'SIGNED'
-            document.save()
             cert_data.update_usage()
 
-            # Debug
-            debug_path = f"/tmp/signed_debug_{document.id}.xml"
-            with open(debug_path, 'wb') as debug_f:
-                debug_f.write(signed_xml)
-            logger.info(f"DEBUG: XML firmado guardado en {debug_path}")
+            return True, signed_xml
 
-            # Limpiar archivos temporales
-            try:
-                os.unlink(xml_unsigned_path)
-                os.unlink(xml_signed_path)
-            except Exception:
-                pass
-
-            logger.info(f"✅ XML firmado correctamente con JAR para documento {document.id}")
-            return True, signed_xml.decode('utf-8')
-
-        except subprocess.CalledProcessError as e:
-            logger.error(f"❌ Error ejecutando JAR: {e.stderr}")
-            return False, f"JAR_SIGNING_ERROR: {e.stderr}"
+        except JarSigningError as e:
+            logger.error(f"❌ Error ejecutando JAR: {e}")
+            return False, f"JAR_SIGNING_ERROR: {e}"
         except Exception as e:
-            logger.error(f"❌ Error signing XML for document {document.id}: {str(e)}")
+            logger.error(f"❌ Error signing XML with JAR for document {document.id}: {str(e)}")
             return False, f"XML_SIGNING_ERROR: {str(e)}"
 
     # ========================================================================
     # Resto de métodos
     # ========================================================================
     def _generate_xml(self, document):
-        """Generar XML del documento."""
+        """
+        Generar XML del documento.
+
+        Returns:
+            tuple: (True, bytes UTF-8 del comprobante) o (False, mensaje de error)
+        """
+        xml_generator = None
         try:
             logger.info(f"Generando XML para documento {document.id}, tipo: {document.document_type}")
 
-            xml_generator = XMLGenerator(document)
+            xml_generator = XMLGenerator(self._get_snapshot(document))
 
             generators = {
                 'INVOICE': xml_generator.generate_invoice_xml,
@@ -342,22 +643,54 @@ class DocumentProcessor:
             if not gen_func:
                 return False, f"Unsupported document type: {document.document_type}"
 
-            xml_content = gen_func()
+            # Bytes UTF-8 tal como se serializaron: se guardan y se firman sin pasar por str
+            xml_content = gen_func(as_bytes=True)
 
             filename = f"{document.access_key}.xml"
             document.xml_file.save(
                 filename,
-                ContentFile(xml_content.encode('utf-8')),
+                ContentFile(xml_content),
                 save=True
             )
 
-            logger.info(f"XML generado, tamaño: {len(xml_content)} caracteres")
+            logger.info(f"XML generado, tamaño: {len(xml_content)} bytes")
             return True, xml_content
 
+        except XSDSchemaMissingError as e:
+            logger.error(f"❌ XSD validation enabled but schema unavailable for document {document.id}: {str(e)}")
+            return False, f"XML_SCHEMA_MISSING: {str(e)}"
         except Exception as e:
             logger.error(f"Error generating XML: {str(e)}")
+            if xml_generator is not None and xml_generator.schema_errors:
+                self._store_schema_errors(document, xml_generator.schema_errors)
+                return False, f"XML_SCHEMA_ERROR: {str(e)}"
             return False, f"XML_GENERATION_ERROR: {str(e)}"
 
+    def _get_snapshot(self, document):
+        """
+        Snapshot precargado del documento, compartido por las etapas XML, PDF y
+        email de este procesador. Los campos propios se toman de la instancia viva
+        (estado, autorización) sin volver a consultar las relaciones.
+        """
+        if not isinstance(document, ElectronicDocument):
+            return document
+
+        snapshot = self._snapshots.get(document.pk)
+        if snapshot is None:
+            snapshot = load_document_snapshot(document)
+            self._snapshots[document.pk] = snapshot
+        return sync_snapshot_fields(snapshot, document)
+
+    def _store_schema_errors(self, document, errors):
+        """Guarda los errores XSD en el documento: no se firma ni se envía al SRI."""
+        document.status = 'ERROR'
+        document.sri_response = {
+            'estado': 'XSD_INVALIDO',
+            'xsd_errors': errors,
+            'validated_at': django_timezone.now().isoformat(),
+        }
+        document.save(update_fields=['status', 'sri_response', 'updated_at'])
+
     def _send_to_sri(self, document, signed_xml):
         """Enviar documento al SRI."""
         try:
@@ -377,6 +710,10 @@ class DocumentProcessor:
                 document.status = 'SENT'
                 document.save()
                 return True, message
+            elif message.startswith(CIRCUIT_OPEN_PREFIX):
+                # SRI no disponible: se aparca firmado y se reenvía al cerrarse el circuito
+                park_document(document.id, sri_client.environment)
+                return False, message
             else:
                 return False, f"SRI_SUBMISSION_FAILED: {message}"
 
@@ -436,7 +773,7 @@ class DocumentProcessor:
         try:
             logger.info(f"Generando PDF para documento {document.id}")
 
-            pdf_generator = PDFGenerator(document)
+            pdf_generator = PDFGenerator(self._get_snapshot(document))
 
             generators = {
                 'INVOICE': pdf_generator.generate_invoice_pdf,
@@ -455,7 +792,11 @@ class DocumentProcessor:
             document.pdf_file.save(
                 filename,
                 ContentFile(pdf_content),
-                save=True
+                save=False
+            )
+            # Solo la columna del PDF: no pisar estado/email escritos por otros procesos
+            ElectronicDocument.objects.filter(pk=document.pk).update(
+                pdf_file=document.pdf_file.name, updated_at=django_timezone.now()
             )
 
             logger.info(f"PDF generado para documento {document.id}")
@@ -482,7 +823,9 @@ class DocumentProcessor:
             if success:
                 document.email_sent = True
                 document.email_sent_date = django_timezone.now()
-                document.save()
+                ElectronicDocument.objects.filter(pk=document.pk).update(
+                    email_sent=True, email_sent_date=document.email_sent_date, updated_at=django_timezone.now()
+                )
                 logger.info(f"Email enviado para documento {document.id}")
 
             return success, message
@@ -529,7 +872,7 @@ class DocumentProcessor:
             'total_amount': document.total_amount,
             'created_at': document.created_at,
             'updated_at': document.updated_at,
-            'processor_version': 'JAR_JAVA_OFICIAL',
+            'processor_version': f"XADES_BES_{getattr(settings, 'SRI_SIGNING_BACKEND', 'jar').upper()}",
         }
 
     def validate_company_setup(self):
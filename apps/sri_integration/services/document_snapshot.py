@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot precargado de un documento electrónico
+apps/sri_integration/services/document_snapshot.py
+
+Una sola pasada select_related / prefetch_related (documento, empresa,
+configuración SRI, ítems, impuestos por ítem e impuestos del documento)
+compartida por las etapas de XML, PDF y email, en lugar de que cada una
+recorra document.items / document.taxes / company.sri_configuration por
+su cuenta.
+
+El snapshot es de solo lectura: los archivos y el estado se siguen guardando
+sobre la instancia original del documento.
+"""
+
+from apps.sri_integration.models import ElectronicDocument
+
+SNAPSHOT_SELECT_RELATED = ('company', 'company__sri_configuration')
+SNAPSHOT_PREFETCH_RELATED = ('items', 'items__taxes', 'taxes')
+
+# Documento + empresa + configuración en un JOIN y 1 consulta por relación
+# prefetch (ítems, impuestos de los ítems, impuestos del documento); XML y PDF
+# no agregan consultas (tests/test_document_snapshot.py)
+SNAPSHOT_QUERY_COUNT = 1 + 3
+
+
+def snapshot_queryset(queryset=None):
+    """QuerySet de ElectronicDocument con todas las relaciones del snapshot."""
+    if queryset is None:
+        queryset = ElectronicDocument.objects.all()
+
+    return queryset.select_related(*SNAPSHOT_SELECT_RELATED).prefetch_related(*SNAPSHOT_PREFETCH_RELATED)
+
+
+def load_document_snapshot(document):
+    """
+    Snapshot de un documento (instancia o id) en SNAPSHOT_QUERY_COUNT consultas.
+    Si la instancia ya es un snapshot se retorna tal cual.
+    """
+    if isinstance(document, ElectronicDocument) and getattr(document, '_is_snapshot', False):
+        return document
+
+    document_id = document.pk if isinstance(document, ElectronicDocument) else document
+    snapshot = snapshot_queryset().get(pk=document_id)
+    snapshot._is_snapshot = True
+    return snapshot
+
+
+def sync_snapshot_fields(snapshot, document):
+    """
+    Copia los campos propios (estado, autorización, archivos...) de la
+    instancia viva al snapshot sin tocar las relaciones precargadas ni la BD.
+    """
+    if snapshot is document:
+        return snapshot
+
+    for field in ElectronicDocument._meta.concrete_fields:
+        if not field.is_relation:
+            setattr(snapshot, field.attname, getattr(document, field.attname))
+    return snapshot
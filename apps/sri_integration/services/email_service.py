@@ -7,6 +7,7 @@ USANDO SENDGRID EXCLUSIVAMENTE
 import logging
 from django.utils import timezone
 from apps.core.models import AuditLog
+from apps.sri_integration.storage import read_artifact
 
 logger = logging.getLogger(__name__)
 
@@ -42,36 +43,36 @@ class EmailService:
                 logger.error("❌ SendGrid API key not configured")
                 return False, "SendGrid API key not configured"
             
-            # Obtener rutas de archivos
-            xml_path = None
-            pdf_path = None
+            # Contenido de los archivos (el almacén de artefactos guarda el XML comprimido)
+            xml_content = None
+            pdf_content = None
             
             # XML firmado (preferido)
             if document.signed_xml_file:
                 try:
-                    xml_path = document.signed_xml_file.path
-                    logger.info(f"✅ Using signed XML: {xml_path}")
+                    xml_content = read_artifact(document.signed_xml_file)
+                    logger.info(f"✅ Using signed XML: {document.signed_xml_file.name}")
                 except Exception as e:
                     logger.warning(f"⚠️ Cannot access signed XML: {e}")
             
             # XML regular si no hay firmado
-            if not xml_path and document.xml_file:
+            if not xml_content and document.xml_file:
                 try:
-                    xml_path = document.xml_file.path
-                    logger.info(f"✅ Using regular XML: {xml_path}")
+                    xml_content = read_artifact(document.xml_file)
+                    logger.info(f"✅ Using regular XML: {document.xml_file.name}")
                 except Exception as e:
                     logger.warning(f"⚠️ Cannot access XML: {e}")
             
             # PDF
             if document.pdf_file:
                 try:
-                    pdf_path = document.pdf_file.path
-                    logger.info(f"✅ Using PDF: {pdf_path}")
+                    pdf_content = read_artifact(document.pdf_file)
+                    logger.info(f"✅ Using PDF: {document.pdf_file.name}")
                 except Exception as e:
                     logger.warning(f"⚠️ Cannot access PDF: {e}")
             
             # Debe tener al menos un archivo
-            if not xml_path and not pdf_path:
+            if not xml_content and not pdf_content:
                 logger.error("❌ No files to send")
                 return False, "No files available to send"
             
@@ -81,9 +82,11 @@ class EmailService:
             success = sendgrid.send_invoice(
                 to_email=document.customer_email,
                 invoice_number=document.document_number,
-                xml_path=xml_path if xml_path else "",
-                pdf_path=pdf_path if pdf_path else "",
-                cliente_nombre=document.customer_name
+                xml_path="",
+                pdf_path="",
+                cliente_nombre=document.customer_name,
+                xml_content=xml_content,
+                pdf_content=pdf_content
             )
             
             if success:
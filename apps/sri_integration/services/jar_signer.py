@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+Firma con el JAR oficial del SRI (sri.jar)
+apps/sri_integration/services/jar_signer.py
+
+Un solo punto para invocar el JAR, compartido por DocumentProcessor (respaldo
+de la firma nativa), el sidecar de firma, las pruebas de compatibilidad del
+firmador y el benchmark:
+- SRI_SIGNING_JAR_PATH: ruta del JAR (por defecto /app/sri.jar)
+- sign_with_jar: una JVM por llamada, con directorio temporal propio
+- JarWorker / JarWorkerPool: JVMs de larga vida con SriJarWorker
+  (apps/sri_integration/jvm/), que cargan el JAR una vez y firman documento
+  tras documento sin pagar el arranque de la JVM
+"""
+
+import base64
+import logging
+import os
+import queue
+import select
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JAR_PATH = '/app/sri.jar'
+DEFAULT_WORKER_CLASSPATH = '/opt/vendo_sri/jvm'
+WORKER_CLASS = 'SriJarWorker'
+
+
+class JarSigningError(Exception):
+    """El JAR terminó con error o no produjo el XML firmado."""
+
+
+def get_jar_path():
+    return getattr(settings, 'SRI_SIGNING_JAR_PATH', DEFAULT_JAR_PATH) or DEFAULT_JAR_PATH
+
+
+def jar_available(jar_path=None):
+    """True si hay `java` en el PATH y el JAR existe."""
+    return shutil.which('java') is not None and os.path.isfile(jar_path or get_jar_path())
+
+
+def get_worker_classpath():
+    return getattr(settings, 'SRI_SIGNING_WORKER_CLASSPATH', DEFAULT_WORKER_CLASSPATH) or DEFAULT_WORKER_CLASSPATH
+
+
+def worker_available(jar_path=None):
+    """True si además del JAR está compilado SriJarWorker (Dockerfile)."""
+    return jar_available(jar_path) and os.path.isfile(
+        os.path.join(get_worker_classpath(), f'{WORKER_CLASS}.class')
+    )
+
+
+def worker_command(jar_path=None):
+    return [
+        'java', '-Djava.security.manager=allow',
+        '-cp', get_worker_classpath(),
+        WORKER_CLASS, jar_path or get_jar_path(),
+    ]
+
+
+def _work_dir_root():
+    """tmpfs si existe: los archivos de entrada y salida del JAR no tocan disco."""
+    configured = getattr(settings, 'SRI_SIGNING_WORK_DIR', '')
+    if configured:
+        return configured
+    return '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def sign_with_jar(p12_path, password, xml_content, jar_path=None, timeout=None):
+    """
+    Firma un comprobante arrancando `java -jar` (5 parámetros: p12, password,
+    xml de entrada, directorio y nombre del archivo de salida).
+
+    Returns:
+        XML firmado en bytes
+
+    Raises:
+        JarSigningError si el JAR falla, no termina a tiempo o no deja el archivo firmado
+    """
+    if isinstance(xml_content, str):
+        xml_content = xml_content.encode('utf-8')
+
+    # Directorio temporal propio: sin colisiones entre workers ni restos en /tmp
+    with tempfile.TemporaryDirectory(prefix='sri_sign_') as work_dir:
+        xml_unsigned_path = os.path.join(work_dir, 'unsigned.xml')
+        output_filename = 'signed.xml'
+
+        with open(xml_unsigned_path, 'wb') as f:
+            f.write(xml_content)
+
+        try:
+            result = subprocess.run([
+                'java', '-jar', jar_path or get_jar_path(),
+                p12_path,
+                password,
+                xml_unsigned_path,
+                work_dir,        # Directorio de salida
+                output_filename  # Nombre del archivo
+            ], capture_output=True, text=True, check=True, timeout=timeout)
+        except subprocess.CalledProcessError as e:
+            raise JarSigningError(e.stderr.strip() or f"JAR exited with code {e.returncode}")
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise JarSigningError(str(e))
+
+        if result.stdout:
+            logger.info(f"   JAR stdout: {result.stdout.strip()}")
+        if result.stderr:
+            logger.warning(f"   JAR stderr: {result.stderr.strip()}")
+
+        output_path = os.path.join(work_dir, output_filename)
+        if not os.path.isfile(output_path):
+            raise JarSigningError(f"JAR did not write {output_filename}: {result.stdout.strip()}")
+
+        with open(output_path, 'rb') as f:
+            return f.read()
+
+
+def _b64(value):
+    return base64.b64encode(value.encode('utf-8')).decode('ascii')
+
+
+class JarWorker:
+    """
+    Una JVM caliente con SriJarWorker. Firma un documento a la vez; si la JVM
+    muere o no responde a tiempo se descarta y la siguiente firma arranca otra.
+    """
+
+    def __init__(self, command=None, timeout=60, startup_timeout=60):
+        self.command = command or worker_command()
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.signed = 0
+        self.restarts = 0
+        self._process = None
+        self._buffer = b''
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self._ensure_started()
+
+    def _ensure_started(self):
+        if self._process is not None and self._process.poll() is None:
+            return
+        if self._process is not None:
+            self.restarts += 1
+            logger.warning(f"JAR worker exited with code {self._process.returncode}, restarting")
+
+        self._buffer = b''
+        try:
+            self._process = subprocess.Popen(
+                self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0
+            )
+        except OSError as e:
+            self._process = None
+            raise JarSigningError(f"Could not start JAR worker: {e}")
+
+        line = self._read_line(self.startup_timeout)
+        if line != b'READY':
+            self._kill()
+            raise JarSigningError(f"Unexpected JAR worker greeting: {line!r}")
+
+    def _read_line(self, timeout):
+        fd = self._process.stdout.fileno()
+        deadline = time.monotonic() + timeout
+        while b'\n' not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._kill()
+                raise JarSigningError(f"JAR worker did not answer in {timeout}s")
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                self._kill()
+                raise JarSigningError("JAR worker exited")
+            self._buffer += chunk
+        line, _, self._buffer = self._buffer.partition(b'\n')
+        return line.rstrip(b'\r')
+
+    def _kill(self):
+        # El proceso muerto se conserva para que _ensure_started cuente el reinicio
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+    def sign(self, p12_path, password, xml_content):
+        """
+        Firma un comprobante en la JVM caliente.
+
+        Raises:
+            JarSigningError si el JAR rechaza el documento o el worker falla
+        """
+        if isinstance(xml_content, str):
+            xml_content = xml_content.encode('utf-8')
+
+        with self._lock, tempfile.TemporaryDirectory(prefix='sri_sign_', dir=_work_dir_root()) as work_dir:
+            self._ensure_started()
+
+            xml_unsigned_path = os.path.join(work_dir, 'unsigned.xml')
+            output_filename = 'signed.xml'
+            with open(xml_unsigned_path, 'wb') as f:
+                f.write(xml_content)
+
+            request = '\t'.join(_b64(field) for field in (
+                p12_path, password, xml_unsigned_path, work_dir, output_filename
+            ))
+            try:
+                self._process.stdin.write(request.encode('ascii') + b'\n')
+            except OSError as e:
+                self._kill()
+                raise JarSigningError(f"JAR worker pipe closed: {e}")
+
+            line = self._read_line(self.timeout)
+            if line != b'OK':
+                status, _, message = line.partition(b'\t')
+                if status != b'ERR':
+                    self._kill()
+                    raise JarSigningError(f"Unexpected JAR worker answer: {line[:200]!r}")
+                raise JarSigningError(base64.b64decode(message).decode('utf-8', 'replace'))
+
+            with open(os.path.join(work_dir, output_filename), 'rb') as f:
+                signed_xml = f.read()
+
+        self.signed += 1
+        return signed_xml
+
+    def close(self):
+        with self._lock:
+            process, self._process = self._process, None
+            if process is None:
+                return
+            try:
+                process.stdin.close()
+                process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                process.kill()
+                process.wait()
+
+
+class JarWorkerPool:
+    """
+    Pool de JVMs calientes. Cada firma toma un worker libre; sign_many reparte
+    un lote entre todos los workers y conserva el orden.
+    """
+
+    def __init__(self, size=2, command=None, timeout=60):
+        self.size = max(1, size)
+        self.workers = [JarWorker(command=command, timeout=timeout) for _ in range(self.size)]
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='jar-worker')
+
+    def start(self):
+        """Arranca todas las JVMs (calentamiento antes de atender peticiones)."""
+        for worker in self.workers:
+            worker.start()
+
+    def sign(self, p12_path, password, xml_content):
+        worker = self._idle.get()
+        try:
+            return worker.sign(p12_path, password, xml_content)
+        finally:
+            self._idle.put(worker)
+
+    def _sign_job(self, job):
+        try:
+            return True, self.sign(*job)
+        except JarSigningError as e:
+            return False, str(e)
+
+    def sign_many(self, jobs):
+        """
+        Args:
+            jobs: lista de (p12_path, password, xml_content)
+
+        Returns:
+            lista de (success, signed_xml_bytes | mensaje_error) en el mismo orden
+        """
+        return list(self._executor.map(self._sign_job, jobs))
+
+    def stats(self):
+        return {
+            'workers': self.size,
+            'signed': sum(worker.signed for worker in self.workers),
+            'restarts': sum(worker.restarts for worker in self.workers),
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for worker in self.workers:
+            worker.close()
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+Retención de logs por meses con borrado por lotes
+apps/sri_integration/services/log_retention.py
+
+SRIResponse, AuditLog y CertificateUsageLog crecen con cada llamada al SRI y
+cada firma. Antes se hacía un `.delete()` de todo lo anterior a 30 días: el
+collector de Django cargaba las filas en memoria y la tabla quedaba bloqueada
+durante todo el borrado. Ahora, por tabla y por mes (partición lógica por
+created_at):
+1. Archivo: las filas del mes se leen por páginas keyset sobre la PK
+   (pk > último id, sin OFFSET) y se escriben a un JSONL gzip en
+   LOG_ARCHIVE_DIR/<tabla>/<aaaa>/<mm>/, con archivo temporal + os.replace
+2. Borrado: solo lo ya archivado, por páginas keyset de `cleanup_batch_size`
+   filas, cada lote en su propia transacción corta (DELETE ... WHERE id IN)
+3. Blobs: los raw_payload de SRIResponse borradas se eliminan del almacén de
+   artefactos cuando ya no los referencia otra fila ni ElectronicDocument.sri_response
+4. Métricas: filas, lotes, duración total y tiempo de bloqueo (duración de la
+   transacción de cada lote: máximo y promedio)
+
+SRIResponse respeta SRIConfiguration de cada empresa (auto_cleanup_old_logs,
+cleanup_days_threshold, cleanup_batch_size). AuditLog y CertificateUsageLog
+usan AUDIT_LOG_RETENTION_DAYS / CERTIFICATE_USAGE_LOG_RETENTION_DAYS y
+LOG_RETENTION_BATCH_SIZE.
+
+Si el proceso se corta entre el archivo y el borrado, la siguiente ejecución
+vuelve a archivar esas filas (en otro archivo): nunca se borra algo sin archivar.
+"""
+
+import gzip
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _archive_dir():
+    return getattr(settings, 'LOG_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archives', 'logs'))
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value):
+    return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def month_ranges(oldest, cutoff):
+    """[(inicio, fin)) por mes calendario desde `oldest` hasta `cutoff` (exclusivo)."""
+    start = month_start(timezone.localtime(oldest))
+    cutoff = timezone.localtime(cutoff)
+    while start < cutoff:
+        end = min(next_month(start), cutoff)
+        yield start, end
+        start = next_month(start)
+
+
+class TableRetention:
+    """Archivo + borrado por lotes de un queryset de logs, mes a mes."""
+
+    def __init__(self, queryset, label, cutoff, batch_size, archive=True, pause=0.0, dry_run=False,
+                 blob_field=None, blob_references=None):
+        self.queryset = queryset.filter(created_at__lt=cutoff)
+        self.model = queryset.model
+        self.label = label
+        self.cutoff = cutoff
+        self.batch_size = max(int(batch_size or 100), 1)
+        self.archive = archive
+        self.pause = pause
+        self.dry_run = dry_run
+        # FileField cuyos blobs se borran con la fila (si no quedan referencias)
+        self.blob_field = blob_field
+        self.blob_references = blob_references
+        self.fields = [field.attname for field in self.model._meta.concrete_fields]
+        self.stats = {
+            'table': self.model._meta.db_table,
+            'label': label,
+            'cutoff': cutoff.isoformat(),
+            'batch_size': self.batch_size,
+            'months': 0,
+            'archived': 0,
+            'deleted': 0,
+            'batches': 0,
+            'archive_files': [],
+            'archive_bytes': 0,
+            'blobs_deleted': 0,
+            'lock_ms_max': 0.0,
+            'lock_ms_total': 0.0,
+            'runtime_s': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    def _pages(self, queryset, *fields, raw=False):
+        """
+        Páginas del mes por keyset sobre la PK (pk > último id, ORDER BY pk,
+        LIMIT lote): tantas consultas como páginas con filas, sin importar lo
+        disperso que esté el rango de ids.
+
+        raw=True lee por cursor sin los conversores de Django (los JSONField se
+        archivan tal como están en la BD, sin parsear y volver a serializar).
+        """
+        pk_name = self.model._meta.pk.attname
+        last_pk = None
+        while True:
+            page = queryset.order_by('pk')
+            if last_pk is not None:
+                page = page.filter(pk__gt=last_pk)
+            page = page[:self.batch_size]
+            if raw:
+                sql, params = page.values_list(*fields).query.sql_with_params()
+                with connections[queryset.db].cursor() as cursor:
+                    cursor.execute(sql, params)
+                    rows = [dict(zip(fields, row)) for row in cursor.fetchall()]
+            else:
+                rows = list(page.values(*fields))
+            if not rows:
+                return
+            yield rows
+            if len(rows) < self.batch_size:
+                return
+            last_pk = rows[-1][pk_name]
+
+    def _archive_month(self, queryset, start):
+        """
+        Escribe el mes a un JSONL gzip. Retorna (filas, id máximo archivado);
+        (0, None) si el mes está vacío.
+        """
+        pk_name = self.model._meta.pk.attname
+        directory = os.path.join(_archive_dir(), self.label, f"{start:%Y}", f"{start:%m}")
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.jsonl.gz')
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        count, first_pk, last_pk = 0, None, None
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as archive:
+                for rows in self._pages(queryset, *self.fields, raw=True):
+                    archive.write('\n'.join(map(encoder.encode, rows)).encode('utf-8') + b'\n')
+                    count += len(rows)
+                    first_pk = rows[0][pk_name] if first_pk is None else first_pk
+                    last_pk = rows[-1][pk_name]
+                raw.flush()
+                os.fsync(raw.fileno())
+            if not count:
+                os.unlink(temp_path)
+                return 0, None
+            name = f"{os.path.basename(self.label)}-{start:%Y-%m}-{first_pk}-{last_pk}.jsonl.gz"
+            final_path = os.path.join(directory, name)
+            os.replace(temp_path, final_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        self.stats['archive_files'].append(os.path.relpath(final_path, _archive_dir()))
+        self.stats['archive_bytes'] += os.path.getsize(final_path)
+        self.stats['archived'] += count
+        return count, last_pk
+
+    def _delete_until(self, queryset, last_pk):
+        """Borra por lotes (keyset sobre la PK) hasta el último id archivado (inclusive)."""
+        if last_pk is not None:
+            queryset = queryset.filter(pk__lte=last_pk)
+        pk_name = self.model._meta.pk.attname
+        fields = (pk_name, self.blob_field) if self.blob_field else (pk_name,)
+        manager = self.model._base_manager
+        for rows in self._pages(queryset, *fields):
+            ids = [row[pk_name] for row in rows]
+            started = time.perf_counter()
+            with transaction.atomic(using=manager.db):
+                # Sin collector: estos logs no tienen FKs entrantes ni señales de borrado
+                deleted = manager.filter(pk__in=ids)._raw_delete(manager.db)
+            lock_ms = (time.perf_counter() - started) * 1000
+            self.stats['deleted'] += deleted
+            self.stats['batches'] += 1
+            self.stats['lock_ms_total'] += lock_ms
+            self.stats['lock_ms_max'] = max(self.stats['lock_ms_max'], lock_ms)
+            if self.blob_field:
+                self._purge_blobs({row[self.blob_field] for row in rows if row[self.blob_field]})
+            if self.pause:
+                time.sleep(self.pause)
+
+    def _purge_blobs(self, names):
+        """
+        Borra del almacén los blobs de las filas eliminadas que ya nadie
+        referencia (el almacén deduplica: varias filas pueden compartir blob).
+        """
+        if not names:
+            return
+        referenced = set(
+            self.model._base_manager.filter(**{f'{self.blob_field}__in': names})
+            .values_list(self.blob_field, flat=True)
+        )
+        if self.blob_references:
+            referenced |= self.blob_references(names)
+        storage = self.model._meta.get_field(self.blob_field).storage
+        for name in names - referenced:
+            try:
+                storage.delete(name)
+                self.stats['blobs_deleted'] += 1
+            except Exception as e:
+                logger.warning(f"Could not delete orphan blob {name}: {e}")
+
+    def run(self):
+        started = time.perf_counter()
+        oldest = self.queryset.order_by('created_at').values_list('created_at', flat=True).first()
+        if oldest is not None:
+            for start, end in month_ranges(oldest, self.cutoff):
+                month = self.queryset.filter(created_at__gte=start, created_at__lt=end)
+                if self.dry_run:
+                    count = month.count()
+                    self.stats['archived'] += count
+                    self.stats['months'] += bool(count)
+                    continue
+                if self.archive:
+                    count, last_pk = self._archive_month(month, start)
+                    if not count:
+                        continue
+                    self._delete_until(month, last_pk)
+                else:
+                    self._delete_until(month, None)
+                self.stats['months'] += 1
+
+        self.stats['runtime_s'] = round(time.perf_counter() - started, 3)
+        self.stats['lock_ms_max'] = round(self.stats['lock_ms_max'], 2)
+        self.stats['lock_ms_avg'] = round(self.stats['lock_ms_total'] / self.stats['batches'], 2) if self.stats['batches'] else 0.0
+        self.stats['lock_ms_total'] = round(self.stats['lock_ms_total'], 2)
+        if self.stats['deleted'] or self.stats['archived']:
+            logger.info(
+                f"🧹 [RETENTION] {self.label}: {self.stats['archived']} archived, {self.stats['deleted']} deleted "
+                f"in {self.stats['batches']} batches, {self.stats['blobs_deleted']} blobs purged, {self.stats['runtime_s']}s "
+                f"(lock max {self.stats['lock_ms_max']} ms, avg {self.stats['lock_ms_avg']} ms)"
+            )
+        return self.stats
+
+
+# ============================================================================
+# Políticas
+# ============================================================================
+def _global_batch_size():
+    return getattr(settings, 'LOG_RETENTION_BATCH_SIZE', 1000)
+
+
+def _retention(queryset, label, days, batch_size, **options):
+    cutoff = timezone.now() - timedelta(days=days)
+    return TableRetention(queryset, label, cutoff, batch_size, **options).run()
+
+
+def sri_payload_references(names):
+    """raw_payload aún referenciados desde ElectronicDocument.sri_response."""
+    from apps.sri_integration.models import ElectronicDocument
+    return {
+        response.get('raw_payload')
+        for response in ElectronicDocument.objects.filter(sri_response__raw_payload__in=list(names))
+        .values_list('sri_response', flat=True)
+        if isinstance(response, dict)
+    }
+
+
+def sri_response_policies():
+    """(company_id, días, tamaño de lote) de las empresas con limpieza automática."""
+    from apps.sri_integration.models import SRIConfiguration
+    return list(
+        SRIConfiguration.objects.filter(auto_cleanup_old_logs=True)
+        .values_list('company_id', 'cleanup_days_threshold', 'cleanup_batch_size')
+    )
+
+
+def run_retention(tables=None, archive=None, dry_run=False):
+    """
+    Ejecuta la retención de las tablas de logs.
+
+    Args:
+        tables: subconjunto de ('sri_responses', 'audit_logs', 'certificate_usage_logs')
+        archive: None = LOG_ARCHIVE_ENABLED
+        dry_run: solo contar lo que se archivaría / borraría
+
+    Returns:
+        dict con las métricas por tabla y la duración total
+    """
+    from apps.core.models import AuditLog
+    from apps.certificates.models import CertificateUsageLog
+    from apps.sri_integration.models import SRIResponse
+
+    tables = tables or ('sri_responses', 'audit_logs', 'certificate_usage_logs')
+    options = {
+        'archive': getattr(settings, 'LOG_ARCHIVE_ENABLED', True) if archive is None else archive,
+        'pause': getattr(settings, 'LOG_RETENTION_BATCH_PAUSE', 0.05),
+        'dry_run': dry_run,
+    }
+    started = time.perf_counter()
+    results = []
+
+    if 'sri_responses' in tables:
+        for company_id, days, batch_size in sri_response_policies():
+            queryset = SRIResponse.objects.filter(document__company_id=company_id)
+            results.append(_retention(
+                queryset, f'sri_responses/company-{company_id}', days, batch_size,
+                blob_field='raw_payload', blob_references=sri_payload_references, **options
+            ))
+
+    if 'audit_logs' in tables:
+        days = getattr(settings, 'AUDIT_LOG_RETENTION_DAYS', 365)
+        results.append(_retention(AuditLog.objects.all(), 'audit_logs', days, _global_batch_size(), **options))
+
+    if 'certificate_usage_logs' in tables:
+        days = getattr(settings, 'CERTIFICATE_USAGE_LOG_RETENTION_DAYS', 90)
+        results.append(_retention(CertificateUsageLog.objects.all(), 'certificate_usage_logs', days, _global_batch_size(), **options))
+
+    return {
+        'tables': results,
+        'archived': sum(result['archived'] for result in results),
+        'deleted': sum(result['deleted'] for result in results),
+        'lock_ms_max': max((result['lock_ms_max'] for result in results), default=0.0),
+        'runtime_s': round(time.perf_counter() - started, 3),
+        'dry_run': dry_run,
+    }
@@ -1,24 +1,353 @@
 # -*- coding: utf-8 -*-
 """
 Generador de PDF (RIDE) para documentos del SRI
+
+Las partes estáticas se construyen una vez y se cachean:
+- Hoja de estilos (por proceso) y estilos de tabla (constantes del módulo)
+- Por empresa: bloque de datos del emisor, contribuyente especial /
+  contabilidad. Se invalidan solos cuando cambia
+  updated_at de la empresa o de su configuración SRI, o con
+  invalidate_company_template()
+En cada render solo se construyen los flowables del documento. El código QR
+se dibuja como un solo path vectorial, sin PIL ni PNG intermedio.
 """
 
+import copy
 import logging
 import io
+import threading
 import qrcode
+from collections import OrderedDict
 from datetime import datetime
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import mm, inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.platypus.flowables import HRFlowable
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus.flowables import Flowable, HRFlowable
 from django.conf import settings
 from django.core.files.base import ContentFile
 
 logger = logging.getLogger(__name__)
 
 
+# ============================================================================
+# Estilos (una vez por proceso)
+# ============================================================================
+def _build_styles():
+    """
+    Hoja de estilos base + estilos personalizados para el PDF
+    """
+    styles = getSampleStyleSheet()
+    
+    # Estilo para título principal
+    styles.add(ParagraphStyle(
+        name='CompanyTitle',
+        parent=styles['Title'],
+        fontSize=16,
+        textColor=colors.black,
+        alignment=1,  # Centro
+        spaceAfter=6
+    ))
+    
+    # Estilo para subtítulos
+    styles.add(ParagraphStyle(
+        name='SectionTitle',
+        parent=styles['Heading2'],
+        fontSize=12,
+        textColor=colors.black,
+        alignment=0,  # Izquierda
+        spaceBefore=12,
+        spaceAfter=6
+    ))
+    
+    # Estilo para datos de empresa
+    styles.add(ParagraphStyle(
+        name='CompanyData',
+        parent=styles['Normal'],
+        fontSize=10,
+        textColor=colors.black,
+        alignment=1,  # Centro
+        spaceAfter=3
+    ))
+    
+    # Estilo para encabezados de tabla
+    styles.add(ParagraphStyle(
+        name='TableHeader',
+        parent=styles['Normal'],
+        fontSize=9,
+        textColor=colors.white,
+        alignment=1,
+        fontName='Helvetica-Bold'
+    ))
+    
+    # Estilo para celdas de tabla
+    styles.add(ParagraphStyle(
+        name='TableCell',
+        parent=styles['Normal'],
+        fontSize=8,
+        textColor=colors.black,
+        alignment=0
+    ))
+    
+    # Estilo para totales
+    styles.add(ParagraphStyle(
+        name='TotalStyle',
+        parent=styles['Normal'],
+        fontSize=10,
+        textColor=colors.black,
+        alignment=2,  # Derecha
+        fontName='Helvetica-Bold'
+    ))
+    
+    return styles
+
+
+_styles = None
+_styles_lock = threading.Lock()
+
+
+def get_pdf_styles():
+    """Hoja de estilos compartida (los estilos no se modifican al renderizar)"""
+    global _styles
+    if _styles is None:
+        with _styles_lock:
+            if _styles is None:
+                _styles = _build_styles()
+    return _styles
+
+
+# ============================================================================
+# Estilos de tabla (Table.setStyle copia los comandos: se pueden compartir)
+# ============================================================================
+HEADER_TABLE_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+    ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+    ('BOX', (0, 0), (-1, -1), 1, colors.black),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+])
+
+LABEL_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+
+CUSTOMER_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 3),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+])
+
+REASONS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+])
+
+DETAILS_TABLE_STYLE = TableStyle([
+    # Encabezados
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    
+    # Contenido
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('ALIGN', (0, 1), (0, -1), 'LEFT'),     # Código
+    ('ALIGN', (1, 1), (1, -1), 'LEFT'),     # Descripción
+    ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),   # Números
+    
+    # Bordes
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    
+    # Padding
+    ('LEFTPADDING', (0, 0), (-1, -1), 3),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+])
+
+TOTALS_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -2), 'Helvetica'),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),  # Última fila en negrita
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 5),
+    ('LEFTPADDING', (0, 0), (-1, -1), 5),
+    ('BOX', (0, -1), (-1, -1), 1, colors.black),  # Borde solo en total
+])
+
+RIGHT_ALIGN_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (0, 0), 'RIGHT'),
+])
+
+AUTHORIZATION_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 3),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+])
+
+FOOTER_TABLE_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('ALIGN', (0, 0), (0, 0), 'CENTER'),
+    ('ALIGN', (1, 0), (1, 0), 'LEFT'),
+])
+
+DETAILS_COL_WIDTHS = [
+    1*inch,    # Código
+    2.5*inch,  # Descripción
+    0.7*inch,  # Cantidad
+    0.8*inch,  # Precio
+    0.7*inch,  # Descuento
+    0.8*inch   # Subtotal
+]
+
+DETAILS_HEADERS = ["Código", "Descripción", "Cant.", "P. Unit.", "Desc.", "Subtotal"]
+
+QR_SIZE = 1*inch
+
+
+# ============================================================================
+# Partes estáticas por empresa
+# ============================================================================
+class _VectorQRCode(Flowable):
+    """
+    Código QR como path vectorial: un rectángulo por cada tramo horizontal
+    de módulos oscuros, rellenado en una sola operación
+    """
+    
+    def __init__(self, data, size):
+        super().__init__()
+        qr = qrcode.QRCode(
+            version=None,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            border=1,
+        )
+        qr.add_data(data)
+        qr.make(fit=True)
+        self.matrix = qr.get_matrix()  # Incluye el borde
+        self.size = size
+    
+    def wrap(self, available_width, available_height):
+        return self.size, self.size
+    
+    def draw(self):
+        count = len(self.matrix)
+        module = self.size / count
+        path = self.canv.beginPath()
+        for row_index, row in enumerate(self.matrix):
+            y = self.size - (row_index + 1) * module
+            start = None
+            for col_index, dark in enumerate(row + [False]):
+                if dark and start is None:
+                    start = col_index
+                elif not dark and start is not None:
+                    path.rect(start * module, y, (col_index - start) * module, module)
+                    start = None
+        self.canv.setFillColor(colors.black)
+        self.canv.drawPath(path, stroke=0, fill=1)
+
+
+class CompanyTemplate:
+    """
+    Partes del RIDE que solo dependen de la empresa. Los Paragraph se copian
+    en cada render (copy.copy comparte el texto ya parseado; wrap/split
+    escriben solo en la copia).
+    """
+    
+    def __init__(self, company, sri_config, styles):
+        self.version = company_template_version(company, sri_config)
+        
+        company_block = [
+            Paragraph(company.business_name, styles['CompanyTitle']),
+            Paragraph(f"<b>RUC:</b> {company.ruc}", styles['CompanyData']),
+            Paragraph(f"<b>Dirección:</b> {company.address}", styles['CompanyData']),
+        ]
+        if company.phone:
+            company_block.append(Paragraph(f"<b>Teléfono:</b> {company.phone}", styles['CompanyData']))
+        company_block.append(Paragraph(f"<b>Email:</b> {company.email}", styles['CompanyData']))
+        self.company_block = company_block
+        
+        # Información de contribuyente especial y contabilidad
+        info_data = []
+        if sri_config.special_taxpayer and sri_config.special_taxpayer_number:
+            info_data.append(f"CONTRIBUYENTE ESPECIAL No: {sri_config.special_taxpayer_number}")
+        info_data.append(f"OBLIGADO A LLEVAR CONTABILIDAD: {'SÍ' if sri_config.accounting_required else 'NO'}")
+        self.taxpayer_info = [Paragraph(info, styles['CompanyData']) for info in info_data]
+        
+        self.environment = Paragraph(
+            f"<b>Ambiente:</b> {sri_config.get_environment_display()}", styles['CompanyData']
+        )
+    
+    def company_flowables(self):
+        return [copy.copy(paragraph) for paragraph in self.company_block]
+    
+    def taxpayer_flowables(self):
+        return [copy.copy(paragraph) for paragraph in self.taxpayer_info]
+    
+    def environment_flowable(self):
+        return copy.copy(self.environment)
+
+
+def company_template_version(company, sri_config):
+    """Cambia al guardar la empresa o su configuración SRI"""
+    return (
+        getattr(company, 'updated_at', None),
+        getattr(sri_config, 'updated_at', None),
+    )
+
+
+_company_templates = OrderedDict()
+_templates_lock = threading.Lock()
+_template_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def get_company_template(company, sri_config):
+    """Plantilla cacheada de la empresa (LRU, PDF_TEMPLATE_CACHE_SIZE entradas)"""
+    version = company_template_version(company, sri_config)
+    template = _company_templates.get(company.pk)
+    if template is not None and template.version == version:
+        _template_stats['hits'] += 1
+        return template
+    
+    _template_stats['misses'] += 1
+    template = CompanyTemplate(company, sri_config, get_pdf_styles())
+    max_size = getattr(settings, 'PDF_TEMPLATE_CACHE_SIZE', 500)
+    with _templates_lock:
+        _company_templates[company.pk] = template
+        _company_templates.move_to_end(company.pk)
+        while len(_company_templates) > max_size:
+            _company_templates.popitem(last=False)
+    return template
+
+
+def invalidate_company_template(company_id=None):
+    """Descarta la plantilla de una empresa (o todas si company_id es None)"""
+    with _templates_lock:
+        if company_id is None:
+            _company_templates.clear()
+        else:
+            _company_templates.pop(company_id, None)
+        _template_stats['invalidations'] += 1
+
+
+def get_template_stats():
+    return dict(_template_stats, cached_companies=len(_company_templates))
+
+
 class PDFGenerator:
     """
     Generador de PDF (RIDE) para documentos electrónicos del SRI
@@ -28,72 +357,8 @@ class PDFGenerator:
         self.document = document
         self.company = document.company
         self.sri_config = self.company.sri_configuration
-        self.styles = getSampleStyleSheet()
-        self._setup_custom_styles()
-    
-    def _setup_custom_styles(self):
-        """
-        Configura estilos personalizados para el PDF
-        """
-        # Estilo para título principal
-        self.styles.add(ParagraphStyle(
-            name='CompanyTitle',
-            parent=self.styles['Title'],
-            fontSize=16,
-            textColor=colors.black,
-            alignment=1,  # Centro
-            spaceAfter=6
-        ))
-        
-        # Estilo para subtítulos
-        self.styles.add(ParagraphStyle(
-            name='SectionTitle',
-            parent=self.styles['Heading2'],
-            fontSize=12,
-            textColor=colors.black,
-            alignment=0,  # Izquierda
-            spaceBefore=12,
-            spaceAfter=6
-        ))
-        
-        # Estilo para datos de empresa
-        self.styles.add(ParagraphStyle(
-            name='CompanyData',
-            parent=self.styles['Normal'],
-            fontSize=10,
-            textColor=colors.black,
-            alignment=1,  # Centro
-            spaceAfter=3
-        ))
-        
-        # Estilo para encabezados de tabla
-        self.styles.add(ParagraphStyle(
-            name='TableHeader',
-            parent=self.styles['Normal'],
-            fontSize=9,
-            textColor=colors.white,
-            alignment=1,
-            fontName='Helvetica-Bold'
-        ))
-        
-        # Estilo para celdas de tabla
-        self.styles.add(ParagraphStyle(
-            name='TableCell',
-            parent=self.styles['Normal'],
-            fontSize=8,
-            textColor=colors.black,
-            alignment=0
-        ))
-        
-        # Estilo para totales
-        self.styles.add(ParagraphStyle(
-            name='TotalStyle',
-            parent=self.styles['Normal'],
-            fontSize=10,
-            textColor=colors.black,
-            alignment=2,  # Derecha
-            fontName='Helvetica-Bold'
-        ))
+        self.styles = get_pdf_styles()
+        self.template = get_company_template(self.company, self.sri_config)
     
     def generate_invoice_pdf(self):
         """
@@ -230,11 +495,7 @@ class PDFGenerator:
             ]
             
             table = Table(data, colWidths=[2.5*inch, 3*inch])
-            table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
+            table.setStyle(LABEL_TABLE_STYLE)
             elements.append(table)
             elements.append(Spacer(1, 5*mm))
         return elements
@@ -259,14 +520,7 @@ class PDFGenerator:
                 table_data.append(row)
         
         table = Table(table_data, colWidths=[4*inch, 1.5*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-            ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-        ]))
+        table.setStyle(REASONS_TABLE_STYLE)
         elements.append(table)
         elements.append(Spacer(1, 5*mm))
         return elements
@@ -280,32 +534,20 @@ class PDFGenerator:
         # Tabla principal del encabezado
         header_data = [
             [
-                # Columna izquierda - Datos de la empresa
-                [
-                    Paragraph(self.company.business_name, self.styles['CompanyTitle']),
-                    Paragraph(f"<b>RUC:</b> {self.company.ruc}", self.styles['CompanyData']),
-                    Paragraph(f"<b>Dirección:</b> {self.company.address}", self.styles['CompanyData']),
-                    Paragraph(f"<b>Teléfono:</b> {self.company.phone}", self.styles['CompanyData']) if self.company.phone else "",
-                    Paragraph(f"<b>Email:</b> {self.company.email}", self.styles['CompanyData']),
-                ],
+                # Columna izquierda - Datos de la empresa (plantilla cacheada)
+                self.template.company_flowables(),
                 # Columna derecha - Tipo de documento y numeración
                 [
                     Paragraph(f"<b>{self.document.get_document_type_display().upper()}</b>", self.styles['CompanyTitle']),
                     Paragraph(f"<b>No:</b> {self.document.document_number}", self.styles['CompanyData']),
                     Paragraph(f"<b>Fecha:</b> {self.document.issue_date.strftime('%d/%m/%Y')}", self.styles['CompanyData']),
-                    Paragraph(f"<b>Ambiente:</b> {self.sri_config.get_environment_display()}", self.styles['CompanyData']),
+                    self.template.environment_flowable(),
                 ]
             ]
         ]
         
         header_table = Table(header_data, colWidths=[3.5*inch, 2.5*inch])
-        header_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-            ('BOX', (0, 0), (-1, -1), 1, colors.black),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ]))
+        header_table.setStyle(HEADER_TABLE_STYLE)
         
         elements.append(header_table)
         elements.append(Spacer(1, 10*mm))
@@ -316,19 +558,8 @@ class PDFGenerator:
         """
         Construye la información de la factura
         """
-        elements = []
-        
-        # Información de contribuyente especial y contabilidad
-        info_data = []
-        
-        if self.sri_config.special_taxpayer and self.sri_config.special_taxpayer_number:
-            info_data.append(f"CONTRIBUYENTE ESPECIAL No: {self.sri_config.special_taxpayer_number}")
-        
-        info_data.append(f"OBLIGADO A LLEVAR CONTABILIDAD: {'SÍ' if self.sri_config.accounting_required else 'NO'}")
-        
-        for info in info_data:
-            elements.append(Paragraph(info, self.styles['CompanyData']))
-        
+        # Contribuyente especial y contabilidad (plantilla cacheada)
+        elements = self.template.taxpayer_flowables()
         elements.append(Spacer(1, 5*mm))
         
         return elements
@@ -356,13 +587,7 @@ class PDFGenerator:
             customer_data.append(["Email:", self.document.customer_email])
         
         customer_table = Table(customer_data, colWidths=[1.5*inch, 4*inch])
-        customer_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 3),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 3),
-        ]))
+        customer_table.setStyle(CUSTOMER_TABLE_STYLE)
         
         elements.append(customer_table)
         elements.append(Spacer(1, 5*mm))
@@ -377,18 +602,8 @@ class PDFGenerator:
         
         elements.append(Paragraph("DETALLE", self.styles['SectionTitle']))
         
-        # Encabezados de la tabla
-        headers = [
-            "Código",
-            "Descripción", 
-            "Cant.",
-            "P. Unit.",
-            "Desc.",
-            "Subtotal"
-        ]
-        
         # Datos de la tabla
-        table_data = [headers]
+        table_data = [DETAILS_HEADERS]
         
         for item in self.document.items.all():
             row = [
@@ -402,43 +617,8 @@ class PDFGenerator:
             table_data.append(row)
         
         # Crear tabla
-        details_table = Table(table_data, colWidths=[
-            1*inch,    # Código
-            2.5*inch,  # Descripción
-            0.7*inch,  # Cantidad
-            0.8*inch,  # Precio
-            0.7*inch,  # Descuento
-            0.8*inch   # Subtotal
-        ])
-        
-        # Estilo de la tabla
-        table_style = [
-            # Encabezados
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            
-            # Contenido
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('ALIGN', (0, 1), (0, -1), 'LEFT'),     # Código
-            ('ALIGN', (1, 1), (1, -1), 'LEFT'),     # Descripción
-            ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),   # Números
-            
-            # Bordes
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            
-            # Padding
-            ('LEFTPADDING', (0, 0), (-1, -1), 3),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 3),
-            ('TOPPADDING', (0, 0), (-1, -1), 3),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        ]
-        
-        details_table.setStyle(TableStyle(table_style))
+        details_table = Table(table_data, colWidths=DETAILS_COL_WIDTHS)
+        details_table.setStyle(DETAILS_TABLE_STYLE)
         
         elements.append(details_table)
         elements.append(Spacer(1, 5*mm))
@@ -472,22 +652,11 @@ class PDFGenerator:
         
         # Crear tabla alineada a la derecha
         totals_table = Table(totals_data, colWidths=[2*inch, 1*inch])
-        totals_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (0, -2), 'Helvetica'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),  # Última fila en negrita
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-            ('LEFTPADDING', (0, 0), (-1, -1), 5),
-            ('BOX', (0, -1), (-1, -1), 1, colors.black),  # Borde solo en total
-        ]))
+        totals_table.setStyle(TOTALS_TABLE_STYLE)
         
         # Alinear tabla a la derecha
         totals_flow = Table([[totals_table]], colWidths=[6.5*inch])
-        totals_flow.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, 0), 'RIGHT'),
-        ]))
+        totals_flow.setStyle(RIGHT_ALIGN_TABLE_STYLE)
         
         elements.append(totals_flow)
         elements.append(Spacer(1, 10*mm))
@@ -532,13 +701,7 @@ class PDFGenerator:
             auth_data.append(["ESTADO:", "PENDIENTE DE AUTORIZACIÓN"])
         
         auth_table = Table(auth_data, colWidths=[2*inch, 4*inch])
-        auth_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 3),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 3),
-        ]))
+        auth_table.setStyle(AUTHORIZATION_TABLE_STYLE)
         
         elements.append(auth_table)
         elements.append(Spacer(1, 5*mm))
@@ -568,11 +731,7 @@ class PDFGenerator:
             ]
             
             footer_table = Table(footer_data, colWidths=[1.5*inch, 4.5*inch])
-            footer_table.setStyle(TableStyle([
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('ALIGN', (0, 0), (0, 0), 'CENTER'),
-                ('ALIGN', (1, 0), (1, 0), 'LEFT'),
-            ]))
+            footer_table.setStyle(FOOTER_TABLE_STYLE)
             
             elements.append(footer_table)
         
@@ -580,32 +739,11 @@ class PDFGenerator:
     
     def _generate_qr_code(self):
         """
-        Genera código QR con la clave de acceso
+        Genera código QR vectorial con la clave de acceso
         """
         try:
-            # Crear QR con la clave de acceso
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=3,
-                border=1,
-            )
-            qr.add_data(self.document.access_key)
-            qr.make(fit=True)
-            
-            # Crear imagen
-            qr_img = qr.make_image(fill_color="black", back_color="white")
-            
-            # Convertir a formato que ReportLab pueda usar
-            img_buffer = io.BytesIO()
-            qr_img.save(img_buffer, format='PNG')
-            img_buffer.seek(0)
-            
-            # Crear objeto Image de ReportLab
-            reportlab_img = Image(img_buffer, width=1*inch, height=1*inch)
-            
-            return reportlab_img
+            return _VectorQRCode(self.document.access_key, QR_SIZE)
             
         except Exception as e:
             logger.error(f"Error generating QR code: {str(e)}")
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+Selección de la clave de FIRMA de un P12 sin subprocess
+apps/sri_integration/services/pkcs12_keys.py
+
+Los P12 de Security Data, BCE y Uanataca pueden traer varias claves
+(firma + cifrado). `pkcs12.load_key_and_certificates` solo retorna una, por
+eso antes se ejecutaba `openssl pkcs12 -nocerts -legacy` y se buscaba
+"Signing Key" en el PEM. Aquí se recorren los SafeBags del PFX una sola vez:
+- Bolsas de clave (keyBag / pkcs8ShroudedKeyBag) de las SafeContents sin cifrar,
+  con sus atributos friendlyName y localKeyId
+- Certificados y cadena vía cryptography (verifica MAC y contraseña)
+- Selección: friendlyName de firma ("Signing Key", "firma", ...), luego el uso de
+  clave del certificado que corresponde a cada clave (digitalSignature /
+  nonRepudiation sin solo keyEncipherment), luego la clave por defecto
+"""
+
+import logging
+
+from collections import namedtuple
+
+from cryptography import x509
+from cryptography.exceptions import UnsupportedAlgorithm
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.serialization import pkcs12
+
+logger = logging.getLogger(__name__)
+
+# OIDs (codificación DER del contenido, sin tag ni longitud)
+_OID_DATA = bytes.fromhex('2a864886f70d010701')                 # 1.2.840.113549.1.7.1
+_OID_KEY_BAG = bytes.fromhex('2a864886f70d010c0a0101')          # 1.2.840.113549.1.12.10.1.1
+_OID_SHROUDED_KEY_BAG = bytes.fromhex('2a864886f70d010c0a0102') # 1.2.840.113549.1.12.10.1.2
+_OID_SAFE_CONTENTS_BAG = bytes.fromhex('2a864886f70d010c0a0106')
+_OID_FRIENDLY_NAME = bytes.fromhex('2a864886f70d010914')        # 1.2.840.113549.1.9.20
+_OID_LOCAL_KEY_ID = bytes.fromhex('2a864886f70d010915')         # 1.2.840.113549.1.9.21
+
+_TAG_OCTET_STRING = 0x04
+_TAG_OID = 0x06
+_TAG_BMP_STRING = 0x1E
+_TAG_CONTEXT_0 = 0xA0
+
+SIGNING_NAME_HINTS = ('signing', 'firma', 'signature', 'sign')
+ENCRYPTION_NAME_HINTS = ('encryption', 'cifrado', 'encrypt')
+
+
+SigningKey = namedtuple('SigningKey', 'private_key certificate additional_certificates friendly_name reason key_count')
+
+
+class PKCS12ParseError(ValueError):
+    """Estructura PFX no reconocida."""
+
+
+# ============================================================================
+# Lector DER/BER mínimo (longitudes indefinidas y OCTET STRING construidos)
+# ============================================================================
+def _read_tlv(data, offset):
+    """(tag, inicio del contenido, fin del contenido, fin del TLV)."""
+    if offset + 2 > len(data):
+        raise PKCS12ParseError("TLV truncado")
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length == 0x80:
+        # Longitud indefinida: el contenido termina en el EOC (00 00) de su nivel
+        start = offset
+        while data[offset:offset + 2] != b'\x00\x00':
+            offset = _read_tlv(data, offset)[3]
+        return tag, start, offset, offset + 2
+    if length & 0x80:
+        count = length & 0x7F
+        length = int.from_bytes(data[offset:offset + count], 'big')
+        offset += count
+    end = offset + length
+    if end > len(data):
+        raise PKCS12ParseError("Longitud fuera del buffer")
+    return tag, offset, end, end
+
+
+def _children(data, start, end):
+    offset = start
+    while offset < end:
+        tlv = _read_tlv(data, offset)
+        yield tlv
+        offset = tlv[3]
+
+
+def _octets(data, tag, start, end):
+    """Contenido de un OCTET STRING primitivo o construido (BER)."""
+    if tag == _TAG_OCTET_STRING:
+        return data[start:end]
+    if tag == _TAG_OCTET_STRING | 0x20:
+        return b''.join(_octets(data, *child[:3]) for child in _children(data, start, end))
+    raise PKCS12ParseError(f"Se esperaba OCTET STRING, tag {tag:#x}")
+
+
+def _explicit_content(data, start, end):
+    """Primer elemento dentro de un [0] EXPLICIT."""
+    return next(_children(data, start, end))
+
+
+def _content_info_data(data, start, end):
+    """Octetos de un ContentInfo de tipo data; None si es otro tipo (encryptedData...)."""
+    children = list(_children(data, start, end))
+    if len(children) < 2 or children[0][0] != _TAG_OID or data[children[0][1]:children[0][2]] != _OID_DATA:
+        return None
+    tag, c_start, c_end, _ = children[1]
+    if tag != _TAG_CONTEXT_0:
+        return None
+    return _octets(data, *_explicit_content(data, c_start, c_end)[:3])
+
+
+def _bag_attributes(data, start, end):
+    friendly_name = None
+    local_key_id = None
+    for _, a_start, a_end, _ in _children(data, start, end):
+        attr = list(_children(data, a_start, a_end))
+        if len(attr) < 2:
+            continue
+        oid = data[attr[0][1]:attr[0][2]]
+        values = list(_children(data, attr[1][1], attr[1][2]))
+        if not values:
+            continue
+        v_tag, v_start, v_end, _ = values[0]
+        if oid == _OID_FRIENDLY_NAME and v_tag == _TAG_BMP_STRING:
+            friendly_name = bytes(data[v_start:v_end]).decode('utf-16-be', errors='replace')
+        elif oid == _OID_LOCAL_KEY_ID:
+            local_key_id = bytes(data[v_start:v_end])
+    return friendly_name, local_key_id
+
+
+def _collect_key_bags(data, start, end, bags):
+    """Recorre SafeContents acumulando (tipo, der, friendlyName, localKeyId)."""
+    for _, b_start, b_end, _ in _children(data, start, end):
+        parts = list(_children(data, b_start, b_end))
+        if len(parts) < 2 or parts[0][0] != _TAG_OID:
+            continue
+        bag_id = data[parts[0][1]:parts[0][2]]
+        _, v_start, v_end, _ = parts[1]
+        _, value_start, value_end, value_stop = _explicit_content(data, v_start, v_end)
+
+        if bag_id == _OID_SAFE_CONTENTS_BAG:
+            _collect_key_bags(data, value_start, value_end, bags)
+            continue
+        if bag_id not in (_OID_KEY_BAG, _OID_SHROUDED_KEY_BAG):
+            continue
+
+        friendly_name, local_key_id = (None, None)
+        if len(parts) > 2:
+            friendly_name, local_key_id = _bag_attributes(data, parts[2][1], parts[2][2])
+        # El [0] EXPLICIT contiene un único TLV: se pasa completo (tag + longitud) a cryptography
+        bags.append((
+            'shrouded' if bag_id == _OID_SHROUDED_KEY_BAG else 'plain',
+            bytes(data[v_start:value_stop]),
+            friendly_name,
+            local_key_id,
+        ))
+
+
+def extract_key_bags(p12_data):
+    """
+    Bolsas de clave del PFX: lista de (tipo, der, friendlyName, localKeyId).
+    Las claves dentro de SafeContents cifradas (encryptedData) no se listan.
+    """
+    data = memoryview(p12_data)
+    _, start, end, _ = _read_tlv(data, 0)
+    pfx = list(_children(data, start, end))
+    if len(pfx) < 2:
+        raise PKCS12ParseError("PFX sin authSafe")
+
+    auth_safe = _content_info_data(data, pfx[1][1], pfx[1][2])
+    if auth_safe is None:
+        raise PKCS12ParseError("authSafe no es de tipo data (PFX con clave pública no soportado)")
+
+    auth = memoryview(auth_safe)
+    _, a_start, a_end, _ = _read_tlv(auth, 0)
+    bags = []
+    for _, ci_start, ci_end, _ in _children(auth, a_start, a_end):
+        safe_contents = _content_info_data(auth, ci_start, ci_end)
+        if safe_contents is None:
+            continue
+        contents = memoryview(safe_contents)
+        _, s_start, s_end, _ = _read_tlv(contents, 0)
+        _collect_key_bags(contents, s_start, s_end, bags)
+    return bags
+
+
+# ============================================================================
+# Selección de la clave de firma
+# ============================================================================
+def _public_der(public_key):
+    return public_key.public_bytes(
+        serialization.Encoding.DER,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+
+
+def _name_hint(friendly_name, hints):
+    name = (friendly_name or '').lower()
+    return any(hint in name for hint in hints)
+
+
+def _signs(certificate):
+    """True si el uso de clave del certificado permite firmar."""
+    if certificate is None:
+        return False
+    try:
+        usage = certificate.extensions.get_extension_for_class(x509.KeyUsage).value
+    except x509.ExtensionNotFound:
+        return False
+    return usage.digital_signature or usage.content_commitment
+
+
+def _load_bag_key(kind, der, password_bytes, validate):
+    return serialization.load_der_private_key(
+        der,
+        password_bytes if kind == 'shrouded' else None,
+        unsafe_skip_rsa_key_validation=not validate,
+    )
+
+
+def load_signing_key(p12_data, password):
+    """
+    Clave de firma del P12 con su certificado y la cadena restante.
+
+    Returns:
+        SigningKey(private_key, certificate, additional_certificates,
+                   friendly_name, reason, key_count)
+
+    Raises:
+        ValueError si la contraseña es incorrecta o el P12 no tiene clave / certificado
+    """
+    password_bytes = password.encode('utf-8') if isinstance(password, str) else password
+    bundle = pkcs12.load_pkcs12(p12_data, password_bytes)
+
+    certificates = [bundle.cert.certificate] if bundle.cert else []
+    certificates += [entry.certificate for entry in bundle.additional_certs]
+    if not certificates:
+        raise ValueError("El P12 no contiene certificados")
+
+    try:
+        bags = extract_key_bags(p12_data)
+    except (PKCS12ParseError, StopIteration, IndexError) as e:
+        logger.warning(f"⚠️ Could not walk P12 SafeBags, using default key: {e}")
+        bags = []
+
+    candidates = []
+    if len(bags) > 1:
+        # Multi-clave: cryptography solo retorna una, se descifra cada bolsa.
+        # La validación RSA (lo más costoso) se hace solo sobre la clave elegida
+        for kind, der, friendly_name, _ in bags:
+            try:
+                private_key = _load_bag_key(kind, der, password_bytes, validate=False)
+            except (ValueError, TypeError, UnsupportedAlgorithm) as e:
+                logger.warning(f"⚠️ Key bag '{friendly_name}' could not be decrypted: {e}")
+                continue
+            candidates.append((private_key, friendly_name, (kind, der)))
+
+    if not candidates:
+        # Una sola clave (caso común): la que ya descifró load_pkcs12
+        if bundle.key is None:
+            raise ValueError("El P12 no contiene clave privada")
+        candidates = [(bundle.key, bags[0][2] if bags else None, None)]
+
+    by_public_key = {_public_der(certificate.public_key()): certificate for certificate in certificates}
+    matched = [
+        (private_key, friendly_name, by_public_key.get(_public_der(private_key.public_key())), bag)
+        for private_key, friendly_name, bag in candidates
+    ]
+
+    selected, reason = None, None
+    if len(matched) == 1:
+        selected, reason = matched[0], 'single_key'
+    else:
+        for entry in matched:
+            if _name_hint(entry[1], SIGNING_NAME_HINTS) and not _name_hint(entry[1], ENCRYPTION_NAME_HINTS):
+                selected, reason = entry, 'friendly_name'
+                break
+        if selected is None:
+            for entry in matched:
+                if _signs(entry[2]) and not _name_hint(entry[1], ENCRYPTION_NAME_HINTS):
+                    selected, reason = entry, 'key_usage'
+                    break
+        if selected is None:
+            selected, reason = matched[0], 'first_key'
+            logger.warning(f"⚠️ {len(matched)} keys in P12 and none marked for signing, using first key")
+
+    private_key, friendly_name, certificate, bag = selected
+    if bag is not None:
+        if bundle.key is not None and _public_der(bundle.key.public_key()) == _public_der(private_key.public_key()):
+            private_key = bundle.key
+        else:
+            private_key = _load_bag_key(*bag, password_bytes, validate=True)
+    if certificate is None:
+        certificate = certificates[0]
+        logger.warning("⚠️ No certificate matches the signing key, using the P12 main certificate")
+
+    return SigningKey(
+        private_key=private_key,
+        certificate=certificate,
+        additional_certificates=[cert for cert in certificates if cert is not certificate],
+        friendly_name=friendly_name,
+        reason=reason,
+        key_count=len(matched),
+    )
@@ -16,8 +16,13 @@ class SendGridService:
         self.from_email = "noreply@fronteratech.ec"
         self.from_name = "Frontera Tech - API VENDO - Facturacion"
     
-    def send_invoice(self, to_email, invoice_number, xml_path, pdf_path, cliente_nombre=None):
-        """Envía factura con archivos adjuntos usando SendGrid API directamente"""
+    def send_invoice(self, to_email, invoice_number, xml_path, pdf_path, cliente_nombre=None,
+                     xml_content=None, pdf_content=None):
+        """
+        Envía factura con archivos adjuntos usando SendGrid API directamente.
+        xml_content / pdf_content (bytes) tienen prioridad sobre las rutas: los
+        artefactos comprimidos del almacén no tienen ruta local legible.
+        """
         if not self.sg:
             logger.error("SendGrid no está configurado")
             return False
@@ -156,9 +161,11 @@ class SendGridService:
             )
             
             # Adjuntar XML
-            if xml_path and os.path.exists(xml_path):
+            if xml_content is None and xml_path and os.path.exists(xml_path):
                 with open(xml_path, "rb") as f:
-                    xml_data = base64.b64encode(f.read()).decode()
+                    xml_content = f.read()
+            if xml_content:
+                xml_data = base64.b64encode(xml_content).decode()
                 xml_attachment = Attachment(
                     FileContent(xml_data),
                     FileName(f"factura_{invoice_number}.xml"),
@@ -166,14 +173,16 @@ class SendGridService:
                     Disposition("attachment")
                 )
                 message.add_attachment(xml_attachment)
-                logger.info(f"XML adjuntado: {xml_path}")
+                logger.info(f"XML adjuntado: {len(xml_content)} bytes")
             else:
                 logger.warning(f"XML no encontrado: {xml_path}")
             
             # Adjuntar PDF
-            if pdf_path and os.path.exists(pdf_path):
+            if pdf_content is None and pdf_path and os.path.exists(pdf_path):
                 with open(pdf_path, "rb") as f:
-                    pdf_data = base64.b64encode(f.read()).decode()
+                    pdf_content = f.read()
+            if pdf_content:
+                pdf_data = base64.b64encode(pdf_content).decode()
                 pdf_attachment = Attachment(
                     FileContent(pdf_data),
                     FileName(f"factura_{invoice_number}.pdf"),
@@ -181,7 +190,7 @@ class SendGridService:
                     Disposition("attachment")
                 )
                 message.add_attachment(pdf_attachment)
-                logger.info(f"PDF adjuntado: {pdf_path}")
+                logger.info(f"PDF adjuntado: {len(pdf_content)} bytes")
             else:
                 logger.warning(f"PDF no encontrado: {pdf_path}")
             
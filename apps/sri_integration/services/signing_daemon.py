@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Sidecar de firma XAdES-BES con JVMs calientes: servidor y cliente
+apps/sri_integration/services/signing_daemon.py
+
+Evita arrancar una JVM por documento cuando el proveedor del certificado
+exige el JAR oficial: el sidecar (manage.py run_signing_daemon) mantiene un
+pool de JVMs con el JAR ya cargado (JarWorkerPool) y escucha en un socket Unix
+local (SRI_SIGNING_DAEMON_SOCKET) lotes de (company_id, xml_bytes). Sin
+sidecar los llamadores usan el subprocess `java -jar`.
+
+Protocolo (un mensaje por petición, conexión reutilizable):
+    [4 bytes big-endian: longitud][JSON UTF-8]
+
+    Petición:  {"items": [{"company_id": 1, "xml": "<base64>"}, ...]}
+    Respuesta: {"results": [{"ok": true, "xml": "<base64>"},
+                            {"ok": false, "error": "..."}, ...]}
+"""
+
+import base64
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('>I')
+MAX_MESSAGE_SIZE = 256 * 1024 * 1024
+
+
+class SigningDaemonError(Exception):
+    """Error de comunicación con el daemon de firma."""
+
+
+# ============================================================================
+# Framing del protocolo
+# ============================================================================
+def _recv_exact(sock, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1024 * 1024))
+        if not chunk:
+            raise SigningDaemonError("Connection closed by peer")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_message(sock, payload):
+    data = json.dumps(payload).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def recv_message(sock):
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > MAX_MESSAGE_SIZE:
+        raise SigningDaemonError(f"Message too large: {size} bytes")
+    return json.loads(_recv_exact(sock, size).decode('utf-8'))
+
+
+# ============================================================================
+# Servidor (sidecar)
+# ============================================================================
+def company_credentials(company_id):
+    """(ruta del P12, password) del certificado activo de la empresa."""
+    from apps.sri_integration.services.global_certificate_manager import get_certificate_manager
+
+    cert_data = get_certificate_manager().get_certificate(company_id)
+    if cert_data is None or cert_data.certificate_obj is None:
+        raise SigningDaemonError(f"Certificate not available for company {company_id}")
+    return cert_data.certificate_obj.certificate_file.path, cert_data.password
+
+
+class _DaemonRequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        # Una conexión por cliente (hilo del worker), reutilizada entre lotes
+        while True:
+            try:
+                request = recv_message(self.request)
+            except (OSError, SigningDaemonError, ValueError):
+                return
+            try:
+                send_message(self.request, {'results': self.server.sign_items(request.get('items', []))})
+            except OSError:
+                return
+
+
+class SigningDaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Sidecar de firma: atiende el protocolo en un socket Unix y firma cada lote
+    repartiéndolo entre las JVMs calientes del pool.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, pool, credentials=company_credentials):
+        self.pool = pool
+        self.credentials = credentials
+        self.stats = {'batches': 0, 'signed': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _DaemonRequestHandler)
+
+    def sign_items(self, items):
+        results = [None] * len(items)
+        jobs = []
+        positions = []
+
+        for index, item in enumerate(items):
+            try:
+                p12_path, password = self.credentials(item['company_id'])
+                jobs.append((p12_path, password, base64.b64decode(item['xml'])))
+                positions.append(index)
+            except Exception as e:
+                results[index] = {'ok': False, 'error': str(e)}
+
+        for index, (ok, value) in zip(positions, self.pool.sign_many(jobs)):
+            if ok:
+                results[index] = {'ok': True, 'xml': base64.b64encode(value).decode('ascii')}
+            else:
+                results[index] = {'ok': False, 'error': value}
+
+        signed = sum(1 for result in results if result['ok'])
+        with self._stats_lock:
+            self.stats['batches'] += 1
+            self.stats['signed'] += signed
+            self.stats['errors'] += len(results) - signed
+        return results
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+# ============================================================================
+# Cliente
+# ============================================================================
+class SigningDaemonClient:
+    """
+    Cliente del daemon de firma.
+    Mantiene una conexión por hilo y la reutiliza entre documentos; si el
+    daemon no responde se marca como caído durante `retry_after` segundos
+    para que los llamadores usen el subprocess sin pagar un connect por intento.
+    """
+
+    def __init__(self, socket_path, timeout=30, retry_after=30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def is_available(self):
+        return bool(self.socket_path) and time.monotonic() >= self._down_until
+
+    def _get_connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _close_connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def _roundtrip(self, payload):
+        sock = self._get_connection()
+        send_message(sock, payload)
+        return recv_message(sock)
+
+    def sign_batch(self, items):
+        """
+        Firma un lote de documentos.
+
+        Args:
+            items: lista de tuplas (company_id, xml_bytes)
+
+        Returns:
+            lista de tuplas (success, signed_xml_bytes | mensaje_error), en el
+            mismo orden; None si el daemon no está disponible.
+        """
+        if not items or not self.is_available():
+            return None
+
+        payload = {
+            'items': [
+                {
+                    'company_id': company_id,
+                    'xml': base64.b64encode(
+                        xml if isinstance(xml, bytes) else xml.encode('utf-8')
+                    ).decode('ascii'),
+                }
+                for company_id, xml in items
+            ]
+        }
+
+        response = None
+        # Un reintento: la conexión reutilizada pudo haber sido cerrada por el daemon
+        for attempt in range(2):
+            try:
+                response = self._roundtrip(payload)
+                break
+            except (OSError, SigningDaemonError, ValueError) as e:
+                self._close_connection()
+                if attempt == 1:
+                    self._down_until = time.monotonic() + self.retry_after
+                    logger.warning(f"Signing daemon unavailable at {self.socket_path}: {e}")
+                    return None
+
+        results = []
+        for result in response.get('results', []):
+            if result.get('ok'):
+                results.append((True, base64.b64decode(result['xml'])))
+            else:
+                results.append((False, result.get('error', 'Unknown daemon error')))
+
+        if len(results) != len(items):
+            logger.error(f"Signing daemon returned {len(results)} results for {len(items)} items")
+            return None
+
+        return results
+
+    def sign(self, company_id, xml_content):
+        """Firma un único documento. Retorna None si el daemon no está disponible."""
+        results = self.sign_batch([(company_id, xml_content)])
+        return results[0] if results else None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_signing_daemon_client():
+    """
+    Cliente compartido del proceso, o None si SRI_SIGNING_DAEMON_SOCKET no está configurado.
+    """
+    global _client
+    socket_path = getattr(settings, 'SRI_SIGNING_DAEMON_SOCKET', '')
+    if not socket_path:
+        return None
+
+    if _client is None or _client.socket_path != socket_path:
+        with _client_lock:
+            if _client is None or _client.socket_path != socket_path:
+                _client = SigningDaemonClient(
+                    socket_path,
+                    timeout=getattr(settings, 'SRI_SIGNING_DAEMON_TIMEOUT', 30),
+                )
+    return _client
+
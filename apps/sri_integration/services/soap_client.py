@@ -11,15 +11,19 @@ Cliente SOAP para integración con el SRI - VERSIÓN COMPLETA CORREGIDA
 """
 
 import logging
+import random
+import time
 import requests
 import base64
 from datetime import datetime
 from xml.etree import ElementTree as ET
 from django.conf import settings
 from django.utils import timezone
-from apps.sri_integration.models import SRIConfiguration, SRIResponse
+from apps.sri_integration.models import SRIConfiguration, SRIResponse, ElectronicDocument
 from apps.core.models import AuditLog
-from urllib3.util.retry import Retry
+from apps.sri_integration.response_log import compact_response, is_in_process, typed_fields
+from apps.sri_integration.services.sri_transport import get_transport
+from apps.sri_integration.services.circuit_breaker import SRIEndpointUnavailable, CIRCUIT_OPEN_PREFIX
 
 logger = logging.getLogger(__name__)
 
@@ -28,8 +32,6 @@ ZEEP_AVAILABLE = False
 try:
     from zeep import Client, Transport, Settings
     from zeep.exceptions import Fault
-    from requests import Session
-    from requests.adapters import HTTPAdapter
     ZEEP_AVAILABLE = True
     logger.info("Zeep library loaded successfully")
 except ImportError as e:
@@ -78,6 +80,14 @@ class SRISOAPClient:
         }
     }
     
+    AUTHORIZATION_HEADERS = {
+        'Content-Type': 'text/xml; charset=utf-8',
+        'SOAPAction': '',
+        'User-Agent': 'SRI-Ecuador-Auth-Final-Fixed/2025.3',
+        'Accept': 'text/xml, application/soap+xml',
+        'Cache-Control': 'no-cache'
+    }
+    
     def __init__(self, company):
         self.company = company
         try:
@@ -144,25 +154,9 @@ class SRISOAPClient:
         try:
             logger.info("🔧 [SRI_ZEEP] Using Zeep SOAP client")
             
-            # ✅ CONFIGURAR SESIÓN CON RETRY
-            session = Session()
-            retry_strategy = Retry(
-                total=3,
-                backoff_factor=1,
-                status_forcelist=[500, 502, 503, 504],
-                allowed_methods=["POST"]
-            )
-            adapter = HTTPAdapter(max_retries=retry_strategy)
-            session.mount("http://", adapter)
-            session.mount("https://", adapter)
-            
-            # ✅ CONFIGURAR TRANSPORT
-            transport = Transport(session=session)
-            settings = Settings(strict=False, xml_huge_tree=True)
-            
-            # ✅ CREAR CLIENTE ZEEP
+            # ✅ CLIENTE ZEEP COMPARTIDO (sesión keep-alive y WSDL cacheado)
             wsdl_url = self.SRI_URLS[self.environment]['reception']
-            client = Client(wsdl_url, transport=transport, settings=settings)
+            client = get_transport(self.environment).get_zeep_client(wsdl_url)
             
             # ✅ PREPARAR XML (PRESERVACIÓN DE FIRMA)
             # Asegurar bytes
@@ -277,29 +271,15 @@ class SRISOAPClient:
             xml_size_original = len(xml_bytes)
             logger.info(f"✅ [SRI_ROBUST] XML bytes prepared, size: {xml_size_original}")
 
-            # ===== PASO 2: ENCODING BASE64 =====
+            # ===== PASO 2-3: BASE64 + SOAP ENVELOPE QUE FUNCIONA CON SRI =====
+            # ✅ ESTRUCTURA EXACTA: xml SIN NAMESPACE como requiere el SRI
             try:
-                # Codificación directa de los bytes
-                xml_b64 = base64.b64encode(xml_bytes).decode('ascii')
-                # Eliminar saltos de línea si existen en el b64 (RFC 2045 vs SOAP)
-                xml_b64 = xml_b64.replace('\n', '').replace('\r', '')
-                
-                logger.info(f"✅ [SRI_ROBUST] Base64 encoded successfully, size: {len(xml_b64)}")
+                soap_envelope = self.build_reception_envelope(xml_bytes)
+                logger.info(f"✅ [SRI_ROBUST] Base64 envelope built, size: {len(soap_envelope)}")
             except Exception as e:
                 logger.error(f"❌ [SRI_ROBUST] Encoding error: {str(e)}")
                 return False, f"XML encoding error: {str(e)}"
             
-            # ===== PASO 3: SOAP ENVELOPE QUE FUNCIONA CON SRI =====
-            # ✅ ESTRUCTURA EXACTA: xml SIN NAMESPACE como requiere el SRI
-            soap_envelope = f'''<?xml version="1.0" encoding="UTF-8"?>
-<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:ser="http://ec.gob.sri.ws.recepcion">
-    <soap:Body>
-        <ser:validarComprobante>
-            <xml>{xml_b64}</xml>
-        </ser:validarComprobante>
-    </soap:Body>
-</soap:Envelope>'''
-            
             # ===== PASO 4: HEADERS OPTIMIZADOS =====
             headers = {
                 'Content-Type': 'text/xml; charset=utf-8',
@@ -320,19 +300,9 @@ class SRISOAPClient:
             max_attempts = 7  # ✅ Más intentos
             backoff_delays = [3, 7, 15, 30, 60, 120, 300]  # ✅ Backoff exponencial
             
-            session = requests.Session()
-            
-            # ✅ RETRY STRATEGY MÁS AGRESIVA
-            retry_strategy = Retry(
-                total=0,  # ✅ Manejamos los reintentos manualmente
-                backoff_factor=0,
-                status_forcelist=[],
-                allowed_methods=["POST"]
-            )
-            
-            adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
-            session.mount("http://", adapter)
-            session.mount("https://", adapter)
+            # ✅ TRANSPORTE COMPARTIDO DEL PROCESO (conexiones TLS keep-alive)
+            # Los reintentos se manejan manualmente en el bucle
+            transport = get_transport(self.environment)
             
             # ===== PASO 6: BUCLE DE REINTENTOS INTELIGENTE =====
             last_error = None
@@ -352,7 +322,7 @@ class SRISOAPClient:
                     timeout_connect = 30 + (attempt * 10)  # 30, 40, 50, etc.
                     timeout_read = 90 + (attempt * 30)     # 90, 120, 150, etc.
                     
-                    response = session.post(
+                    response = transport.post(
                         endpoint_url,
                         data=soap_envelope.encode('utf-8'),
                         headers=headers,
@@ -435,6 +405,11 @@ class SRISOAPClient:
                             )
                             return False, error_msg
                 
+                except SRIEndpointUnavailable as e:
+                    # ✅ CIRCUITO ABIERTO: no seguir reintentando, el documento se aparca
+                    logger.warning(f"🔌 [SRI_ROBUST] {e} - stopping retries")
+                    return False, f"{CIRCUIT_OPEN_PREFIX}: {e}"
+                
                 except requests.exceptions.Timeout:
                     timeout_msg = f"Timeout on attempt {attempt + 1} (connect: {timeout_connect}s, read: {timeout_read}s)"
                     logger.error(f"⏰ [SRI_ROBUST] {timeout_msg}")
@@ -755,6 +730,245 @@ class SRISOAPClient:
             logger.error(f"❌ [SRI_FIXED] XML validation error: {e}")
             return False
     
+    # ========================================================================
+    # RECEPCIÓN EN LOTE (LOTE MASIVO)
+    # ========================================================================
+    
+    RECEPTION_HEADERS = {
+        'Content-Type': 'text/xml; charset=utf-8',
+        'SOAPAction': '',
+        'User-Agent': 'SRI-Ecuador-Client-Robust/2025.2',
+        'Accept': 'text/xml, application/soap+xml',
+        'Cache-Control': 'no-cache'
+    }
+    
+    @staticmethod
+    def build_reception_envelope(xml_bytes):
+        """Sobre SOAP validarComprobante con el XML (comprobante o lote) en base64"""
+        xml_b64 = base64.b64encode(xml_bytes).decode('ascii')
+        return f'''<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:ser="http://ec.gob.sri.ws.recepcion">
+    <soap:Body>
+        <ser:validarComprobante>
+            <xml>{xml_b64}</xml>
+        </ser:validarComprobante>
+    </soap:Body>
+</soap:Envelope>'''
+    
+    @staticmethod
+    def build_batch_xml(batch_access_key, ruc, signed_xmls):
+        """
+        XML del lote masivo (ficha técnica SRI):
+        <lote version="1.0.0"><claveAcceso/><ruc/><comprobantes>
+        <comprobante><![CDATA[...xml firmado...]]></comprobante>...</comprobantes></lote>
+        Los comprobantes van sin modificar dentro de CDATA para no invalidar la firma.
+        """
+        parts = [
+            b'<?xml version="1.0" encoding="UTF-8"?>\n<lote version="1.0.0">',
+            f'<claveAcceso>{batch_access_key}</claveAcceso>'.encode('ascii'),
+            f'<ruc>{ruc}</ruc>'.encode('ascii'),
+            b'<comprobantes>',
+        ]
+        for signed_xml in signed_xmls:
+            if isinstance(signed_xml, str):
+                signed_xml = signed_xml.encode('utf-8')
+            parts.append(b'<comprobante><![CDATA[' + signed_xml + b']]></comprobante>')
+        parts.append(b'</comprobantes></lote>')
+        return b''.join(parts)
+    
+    @staticmethod
+    def split_batches(items, max_bytes, max_documents):
+        """
+        Divide [(document, signed_xml_bytes)] en lotes que respeten el tamaño
+        máximo del SRI (bytes del lote sin base64) y el número de comprobantes.
+        """
+        batches = []
+        current = []
+        current_size = 0
+        overhead = 256  # cabecera del lote y etiquetas por comprobante
+        
+        for document, signed_xml in items:
+            item_size = len(signed_xml) + 48
+            if current and (current_size + item_size + overhead > max_bytes or len(current) >= max_documents):
+                batches.append(current)
+                current = []
+                current_size = 0
+            current.append((document, signed_xml))
+            current_size += item_size
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    def parse_batch_reception_response(self, response_text):
+        """
+        Parsea RespuestaRecepcionComprobante de un lote.
+        
+        Returns:
+            tuple: (estado, errores_por_clave {claveAcceso: [errores]}, errores_generales)
+        """
+        root = ET.fromstring(response_text.encode('utf-8'))
+        
+        estado = None
+        errors_by_key = {}
+        general_errors = []
+        
+        for elem in root.iter():
+            if elem.tag.split('}')[-1] == 'estado' and estado is None:
+                estado = (elem.text or '').strip()
+            
+            if elem.tag.split('}')[-1] != 'comprobante':
+                continue
+            
+            clave = None
+            messages = []
+            for child in elem.iter():
+                tag = child.tag.split('}')[-1]
+                if tag == 'claveAcceso':
+                    clave = (child.text or '').strip()
+                elif tag == 'mensaje' and len(child):
+                    fields = {c.tag.split('}')[-1]: (c.text or '').strip() for c in child}
+                    detail = f"Error {fields.get('identificador', 'N/A')}: {fields.get('mensaje', '')}"
+                    if fields.get('informacionAdicional'):
+                        detail += f" - {fields['informacionAdicional']}"
+                    messages.append(detail)
+            
+            if clave:
+                errors_by_key[clave] = messages
+            else:
+                general_errors.extend(messages)
+        
+        if estado == 'DEVUELTA' and not errors_by_key and not general_errors:
+            general_errors = self._extract_error_messages_fixed(root, {
+                'soap': 'http://schemas.xmlsoap.org/soap/envelope/',
+                'ns2': 'http://ec.gob.sri.ws.recepcion'
+            })
+        
+        return estado, errors_by_key, general_errors
+    
+    def send_batch_to_reception(self, items, max_bytes=None, max_documents=None):
+        """
+        ✅ ENVÍO EN LOTE MASIVO: varios comprobantes firmados en una sola llamada
+        validarComprobante, con una clave de acceso de lote.
+        
+        Args:
+            items: lista de tuplas (document, signed_xml) de una misma empresa
+            
+        Returns:
+            dict: {document.id: (success, message)}
+        """
+        max_bytes = max_bytes or getattr(settings, 'SRI_LOTE_MAX_BYTES', 500 * 1024)
+        max_documents = max_documents or getattr(settings, 'SRI_LOTE_MAX_DOCUMENTS', 50)
+        
+        prepared = [
+            (document, signed_xml.encode('utf-8') if isinstance(signed_xml, str) else signed_xml)
+            for document, signed_xml in items
+        ]
+        
+        results = {}
+        endpoint_url = self.SRI_URLS[self.environment]["reception_endpoint"]
+        
+        transport = get_transport(self.environment)
+        for batch in self.split_batches(prepared, max_bytes, max_documents):
+            results.update(self._send_single_batch(transport, endpoint_url, batch))
+        
+        return results
+    
+    @staticmethod
+    def batch_retry_delay(attempt):
+        """
+        Espera antes del reintento `attempt` (1, 2, ...) de un lote: backoff
+        exponencial desde SRI_LOTE_RETRY_BASE_DELAY, tope SRI_LOTE_RETRY_MAX_DELAY,
+        con jitter (mitad fija, mitad aleatoria) para que los workers que
+        fallaron juntos no reintenten a la vez.
+        """
+        base = getattr(settings, 'SRI_LOTE_RETRY_BASE_DELAY', 2.0)
+        cap = getattr(settings, 'SRI_LOTE_RETRY_MAX_DELAY', 30.0)
+        delay = min(cap, base * (2 ** (attempt - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    def _send_single_batch(self, transport, endpoint_url, batch):
+        documents = [document for document, _ in batch]
+        batch_access_key = ElectronicDocument.generate_batch_access_key(documents)
+        lote_xml = self.build_batch_xml(batch_access_key, self.company.ruc, [xml for _, xml in batch])
+        soap_envelope = self.build_reception_envelope(lote_xml).encode('utf-8')
+        
+        logger.info(f"📦 [SRI_LOTE] Sending batch {batch_access_key} with {len(batch)} documents "
+                    f"({len(lote_xml)} bytes) to {endpoint_url}")
+        
+        response = None
+        last_error = None
+        max_attempts = getattr(settings, 'SRI_LOTE_MAX_ATTEMPTS', 3)
+        for attempt in range(max_attempts):
+            if attempt > 0:
+                delay = self.batch_retry_delay(attempt)
+                logger.info(f"⏳ [SRI_LOTE] Waiting {delay:.1f}s before attempt {attempt + 1}/{max_attempts}")
+                time.sleep(delay)
+            try:
+                response = transport.post(
+                    endpoint_url,
+                    data=soap_envelope,
+                    headers=self.RECEPTION_HEADERS,
+                    timeout=(30, 180),
+                    verify=True,
+                    allow_redirects=False
+                )
+                if response.status_code in [502, 503, 504]:
+                    last_error = f"HTTP {response.status_code}"
+                    logger.warning(f"⚠️ [SRI_LOTE] {last_error} on attempt {attempt + 1}, retrying")
+                    continue
+                break
+            except SRIEndpointUnavailable as e:
+                logger.warning(f"🔌 [SRI_LOTE] {e} - batch not sent")
+                return {document.id: (False, f"{CIRCUIT_OPEN_PREFIX}: {e}") for document in documents}
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                last_error = str(e)
+                logger.warning(f"⚠️ [SRI_LOTE] Attempt {attempt + 1} failed: {last_error}")
+                response = None
+        
+        if response is None or response.status_code in [502, 503, 504]:
+            message = f"SRI temporarily unavailable: {last_error}"
+            return {document.id: (False, message) for document in documents}
+        
+        try:
+            estado, errors_by_key, general_errors = self.parse_batch_reception_response(response.text)
+        except ET.ParseError as e:
+            message = f"Invalid XML response from SRI: {str(e)}"
+            logger.error(f"❌ [SRI_LOTE] {message}")
+            return {document.id: (False, message) for document in documents}
+        
+        logger.info(f"📨 [SRI_LOTE] Batch {batch_access_key} estado: {estado}, "
+                    f"{len(errors_by_key)} documents with messages")
+        
+        # Lote rechazado como un todo (clave del lote, estructura, RUC...)
+        batch_rejected = estado != 'RECIBIDA' and not errors_by_key
+        
+        results = {}
+        for document in documents:
+            document_errors = errors_by_key.get(document.access_key)
+            raw = {
+                "batch_access_key": batch_access_key,
+                "batch_estado": estado,
+                "method": "requests_lote"
+            }
+            
+            if document_errors or batch_rejected:
+                errors = document_errors or general_errors or [f"Unexpected SRI batch state: {estado or 'None'}"]
+                error_text = "; ".join(errors)
+                raw["errors"] = errors
+                self._log_sri_response(document, "RECEPTION", "DEVUELTA", error_text, raw)
+                document.status = "ERROR"
+                document.save(update_fields=['status', 'updated_at'])
+                results[document.id] = (False, f"SRI rejected document: {error_text}")
+            else:
+                self._log_sri_response(document, "RECEPTION", "RECIBIDA",
+                                       "Document received by SRI successfully (batch)", raw)
+                document.status = "SENT"
+                document.save(update_fields=['status', 'updated_at'])
+                results[document.id] = (True, "Document received by SRI successfully")
+        
+        return results
+    
     # ========================================================================
     # AUTORIZACIÓN DE COMPROBANTES - SECCIÓN CON FIXES CRÍTICOS #1 Y #2
     # ========================================================================
@@ -823,13 +1037,9 @@ class SRISOAPClient:
         try:
             logger.info("🔧 [SRI_AUTH_ZEEP] Getting authorization using Zeep")
             
-            # ✅ CONFIGURAR CLIENTE ZEEP PARA AUTORIZACIÓN
-            session = Session()
-            transport = Transport(session=session)
-            settings = Settings(strict=False, xml_huge_tree=True)
-            
+            # ✅ CLIENTE ZEEP COMPARTIDO PARA AUTORIZACIÓN
             wsdl_url = self.SRI_URLS[self.environment]['authorization']
-            client = Client(wsdl_url, transport=transport, settings=settings)
+            client = get_transport(self.environment).get_zeep_client(wsdl_url)
             
             # ✅ LLAMADA ZEEP
             logger.info(f"🔧 [SRI_AUTH_ZEEP] Calling autorizacionComprobante with access key: {document.access_key}")
@@ -899,9 +1109,12 @@ class SRISOAPClient:
                     'estado': estado,
                     'numeroAutorizacion': numero_autorizacion,
                     'fechaAutorizacion': fecha_autorizacion_str,
-                    'response': str(response),
                     'method': 'zeep'
                 }
+                if estado == 'NO AUTORIZADO':
+                    response_data['errors'] = self._extract_zeep_auth_errors(autorizacion)
+                response_data['response'] = str(response)
+                response_data = compact_response(document.access_key, 'AUTHORIZATION', response_data)
                 
                 # ✅ LOG CORREGIDO
                 self._log_sri_response(
@@ -923,7 +1136,7 @@ class SRISOAPClient:
                     
                 elif estado == 'NO AUTORIZADO':
                     # ✅ FIX #3: EXTRAER ERRORES ZEEP CON ESTRUCTURA ANIDADA
-                    error_messages = self._extract_zeep_auth_errors(autorizacion)
+                    error_messages = response_data.get('errors', [])
                     error_text = "; ".join(error_messages) if error_messages else "Document not authorized"
                     
                     # ✅ NO cambiar a ERROR si estaba en SENT
@@ -994,30 +1207,17 @@ class SRISOAPClient:
             # ✅ SOAP ENVELOPE DEFINITIVAMENTE CORREGIDO - xmlns="" EXPLÍCITO
             # El SRI quiere: <{}claveAccesoComprobante> (sin namespace)
             # Solución: xmlns="" para anular el namespace heredado
-            soap_body = f'''<?xml version="1.0" encoding="UTF-8"?>
-<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
-    <soap:Body>
-        <autorizacionComprobante xmlns="http://ec.gob.sri.ws.autorizacion">
-            <claveAccesoComprobante xmlns="">{document.access_key}</claveAccesoComprobante>
-        </autorizacionComprobante>
-    </soap:Body>
-</soap:Envelope>'''
+            soap_body = self.build_authorization_envelope(document.access_key)
             
             # ✅ HEADERS ULTRA CORREGIDOS
-            headers = {
-                'Content-Type': 'text/xml; charset=utf-8',
-                'SOAPAction': '',
-                'User-Agent': 'SRI-Ecuador-Auth-Final-Fixed/2025.3',
-                'Accept': 'text/xml, application/soap+xml',
-                'Cache-Control': 'no-cache'
-            }
+            headers = self.AUTHORIZATION_HEADERS
             
             endpoint_url = self.SRI_URLS[self.environment]['authorization_endpoint']
             logger.info(f"🌐 [SRI_AUTH_ULTRA] Sending to: {endpoint_url}")
             logger.info(f"🔑 [SRI_AUTH_ULTRA] Access key: {document.access_key}")
             logger.info(f"🔧 [SRI_AUTH_ULTRA] Using xmlns='' to remove namespace from claveAccesoComprobante")
             
-            response = requests.post(
+            response = get_transport(self.environment).post(
                 endpoint_url,
                 data=soap_body.encode('utf-8'),
                 headers=headers,
@@ -1038,9 +1238,66 @@ class SRISOAPClient:
             else:
                 return False, f'Authorization HTTP Error: {response.status_code}'
                 
+        except SRIEndpointUnavailable as e:
+            return False, f'{CIRCUIT_OPEN_PREFIX}: {e}'
         except Exception as e:
             return False, f'Authorization request failed: {str(e)}'
     
+    @staticmethod
+    def build_authorization_envelope(access_key):
+        """
+        Envelope SOAP de autorizacionComprobante para una clave de acceso.
+        xmlns="" en claveAccesoComprobante: el SRI la espera sin namespace.
+        """
+        return f'''<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+    <soap:Body>
+        <autorizacionComprobante xmlns="http://ec.gob.sri.ws.autorizacion">
+            <claveAccesoComprobante xmlns="">{access_key}</claveAccesoComprobante>
+        </autorizacionComprobante>
+    </soap:Body>
+</soap:Envelope>'''
+    
+    def parse_authorization_response(self, response_text):
+        """
+        Parsea la respuesta de autorizacionComprobante SIN modificar documentos.
+        
+        Returns:
+            dict con estado, numeroAutorizacion, fechaAutorizacion (str),
+            fecha_autorizacion (datetime) y errors; None si no hay autorización.
+        """
+        root = ET.fromstring(response_text.encode('utf-8'))
+        
+        ns = {
+            'soap': 'http://schemas.xmlsoap.org/soap/envelope/',
+            'ns2': 'http://ec.gob.sri.ws.autorizacion'
+        }
+        
+        autorizacion_elems = root.findall('.//ns2:autorizacion', ns) or root.findall('.//autorizacion')
+        
+        for autorizacion_elem in autorizacion_elems:
+            estado_elem = autorizacion_elem.find('.//estado')
+            if estado_elem is None:
+                continue
+            
+            numero_elem = autorizacion_elem.find('.//numeroAutorizacion')
+            fecha_elem = autorizacion_elem.find('.//fechaAutorizacion')
+            fecha_str = fecha_elem.text if fecha_elem is not None else ''
+            estado = estado_elem.text
+            
+            return {
+                'estado': estado,
+                'numeroAutorizacion': numero_elem.text if numero_elem is not None else '',
+                'fechaAutorizacion': fecha_str,
+                'fecha_autorizacion': self._parse_authorization_date(fecha_str),
+                'errors': (
+                    self._extract_authorization_errors_ultra_fixed(autorizacion_elem)
+                    if estado != 'AUTORIZADO' else []
+                ),
+            }
+        
+        return None
+    
     def _process_authorization_response_ultra_fixed(self, document, response):
         """
         ✅ PROCESAR RESPUESTA DE AUTORIZACIÓN - VERSIÓN ULTRA CORREGIDA
@@ -1088,9 +1345,13 @@ class SRISOAPClient:
                         'estado': estado,
                         'numeroAutorizacion': numero_autorizacion,
                         'fechaAutorizacion': fecha_autorizacion_str,
-                        'response': response_text,
                         'method': 'requests_ultra_fixed'
                     }
+                    if estado == 'NO AUTORIZADO':
+                        response_data['errors'] = self._extract_authorization_errors_ultra_fixed(autorizacion_elem)
+                    # El texto SOAP (con el comprobante autorizado) va al almacén de artefactos
+                    response_data['response'] = response_text
+                    response_data = compact_response(document.access_key, 'AUTHORIZATION', response_data)
                     
                     # ✅ LOG CORREGIDO
                     self._log_sri_response(
@@ -1112,7 +1373,7 @@ class SRISOAPClient:
                         
                     elif estado == 'NO AUTORIZADO':
                         # ✅ EXTRAER ERRORES
-                        error_messages = self._extract_authorization_errors_ultra_fixed(autorizacion_elem)
+                        error_messages = response_data.get('errors', [])
                         error_text = "; ".join(error_messages) if error_messages else "Document not authorized"
                         
                         # ✅ NO cambiar a ERROR si estaba en SENT - mantener el estado exitoso de recepción
@@ -1302,16 +1563,17 @@ class SRISOAPClient:
                 electronic_doc = document
             
             # ✅ TRUNCAR response_code a máximo 10 caracteres OBLIGATORIO
-            response_code_truncated = str(response_code)[:10] if response_code else "UNKNOWN"
+            # (el estado completo, p. ej. "EN PROCESAMIENTO", va en `state`)
+            response_state = str(response_code) if response_code else "UNKNOWN"
+            response_code_truncated = response_state[:10]
             
             # ✅ TRUNCAR message si es muy largo (para evitar problemas de BD)
             message_truncated = str(message)[:500] if message else ""
             
-            # ✅ ASEGURAR QUE raw_response SEA DICT
-            if isinstance(raw_response, dict):
-                raw_response_safe = raw_response
-            else:
-                raw_response_safe = {'response': str(raw_response)[:1000]}  # Limitar tamaño
+            # ✅ raw_response COMPACTO: el texto SOAP va al almacén de artefactos
+            raw_response_safe = compact_response(
+                getattr(electronic_doc, 'access_key', None), operation_type, raw_response
+            )
             
             # ✅ CREAR REGISTRO EN SRIResponse - SOLO CAMPOS QUE EXISTEN
             sri_response = SRIResponse.objects.create(
@@ -1319,28 +1581,30 @@ class SRISOAPClient:
                 operation_type=operation_type,
                 response_code=response_code_truncated,  # ✅ CORREGIDO: Máximo 10 chars
                 response_message=message_truncated,
-                raw_response=raw_response_safe
+                raw_response=raw_response_safe,
+                **typed_fields(raw_response_safe, response_state)
             )
             
-            # ✅ LOG DE AUDITORÍA (OPCIONAL Y PROTEGIDO)
-            try:
-                AuditLog.objects.create(
-                    action=f'SRI_{operation_type}_{response_code_truncated}',
-                    model_name='ElectronicDocument',
-                    object_id=str(document.id),
-                    object_representation=str(document)[:100],  # ✅ Limitar representación
-                    additional_data={
-                        'operation_type': operation_type,
-                        'response_code': response_code_truncated,
-                        'message': message_truncated[:200],  # ✅ Límite adicional para auditoría
-                        'environment': self.environment,
-                        'document_number': getattr(document, 'document_number', 'N/A'),
-                        'access_key': getattr(document, 'access_key', 'N/A'),
-                        'sri_version': '2025.4_AUTH_PARSING_FIXED'
-                    }
-                )
-            except Exception as audit_error:
-                logger.warning(f"⚠️ [SRI_LOG_FIXED] Audit log failed (non-critical): {audit_error}")
+            # ✅ LOG DE AUDITORÍA (OPCIONAL Y PROTEGIDO): no en cada consulta "EN PROCESO"
+            if not is_in_process(response_state):
+                try:
+                    AuditLog.objects.create(
+                        action=f'SRI_{operation_type}_{response_code_truncated}',
+                        model_name='ElectronicDocument',
+                        object_id=str(document.id),
+                        object_representation=str(document)[:100],  # ✅ Limitar representación
+                        additional_data={
+                            'operation_type': operation_type,
+                            'response_code': response_code_truncated,
+                            'message': message_truncated[:200],  # ✅ Límite adicional para auditoría
+                            'environment': self.environment,
+                            'document_number': getattr(document, 'document_number', 'N/A'),
+                            'access_key': getattr(document, 'access_key', 'N/A'),
+                            'sri_version': '2025.4_AUTH_PARSING_FIXED'
+                        }
+                    )
+                except Exception as audit_error:
+                    logger.warning(f"⚠️ [SRI_LOG_FIXED] Audit log failed (non-critical): {audit_error}")
             
             logger.info(f"✅ [SRI_LOG_FIXED] Response logged: {operation_type} - {response_code_truncated}")
             
@@ -1472,11 +1736,8 @@ class SRISOAPClient:
         """
         if ZEEP_AVAILABLE and not self._reception_client:
             try:
-                session = Session()
-                transport = Transport(session=session)
-                settings = Settings(strict=False, xml_huge_tree=True)
                 wsdl_url = self.SRI_URLS[self.environment]['reception']
-                self._reception_client = Client(wsdl_url, transport=transport, settings=settings)
+                self._reception_client = get_transport(self.environment).get_zeep_client(wsdl_url)
                 logger.info("✅ Reception client (Zeep) initialized")
             except Exception as e:
                 logger.warning(f"⚠️ Could not initialize Zeep reception client: {e}")
@@ -1491,11 +1752,8 @@ class SRISOAPClient:
         """
         if ZEEP_AVAILABLE and not self._authorization_client:
             try:
-                session = Session()
-                transport = Transport(session=session)
-                settings = Settings(strict=False, xml_huge_tree=True)
                 wsdl_url = self.SRI_URLS[self.environment]['authorization']
-                self._authorization_client = Client(wsdl_url, transport=transport, settings=settings)
+                self._authorization_client = get_transport(self.environment).get_zeep_client(wsdl_url)
                 logger.info("✅ Authorization client (Zeep) initialized")
             except Exception as e:
                 logger.warning(f"⚠️ Could not initialize Zeep authorization client: {e}")
@@ -1525,6 +1783,7 @@ class SRISOAPClient:
             'reception_client_initialized': self._reception_client is not None,
             'authorization_client_initialized': self._authorization_client is not None,
             'sri_urls': self.SRI_URLS[self.environment],
+            'transport': get_transport(self.environment).get_stats(),
             'client_version': 'COMPLETE_FIXED_V2025.4_AUTH_PARSING',
             'functionality_status': 'ALL_ORIGINAL_FUNCTIONS_MAINTAINED_AND_ENHANCED'
         }
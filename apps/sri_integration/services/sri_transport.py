@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Transporte HTTP compartido para los servicios SOAP del SRI
+apps/sri_integration/services/sri_transport.py
+
+Un transporte por proceso (worker) y ambiente:
+- requests.Session con conexiones TLS keep-alive reutilizadas entre documentos y tareas
+- Pool de conexiones dimensionado a la concurrencia del worker
+- Clientes Zeep cacheados y WSDL cacheado en disco (no se re-descarga por llamada)
+- Estadísticas de pool y latencia por llamada SOAP
+- Circuit breaker y rate limiter compartidos (circuit_breaker.py) en cada petición
+"""
+
+import logging
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+from apps.sri_integration.services.circuit_breaker import get_endpoint_guard, service_for_url
+
+logger = logging.getLogger(__name__)
+
+try:
+    from zeep import Client, Settings
+    from zeep.cache import SqliteCache
+    from zeep.transports import Transport
+    ZEEP_AVAILABLE = True
+except ImportError:
+    ZEEP_AVAILABLE = False
+
+
+class SRIGuardedAdapter(requests.adapters.HTTPAdapter):
+    """
+    HTTPAdapter que pasa cada petición (requests y Zeep) por el circuit breaker
+    y el rate limiter del endpoint. Un HTTP 500 con respuesta válida del SRI
+    (SOAP fault con estado/mensajes) no cuenta como falla del servicio.
+    """
+
+    FAILURE_STATUS = (500, 502, 503, 504)
+    SRI_RESPONSE_KEYWORDS = (b'RECIBIDA', b'DEVUELTA', b'estado', b'comprobante')
+
+    def __init__(self, environment, *args, **kwargs):
+        self.environment = environment
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        guard = get_endpoint_guard(self.environment, service_for_url(request.url))
+        guard.before_request()
+
+        started = time.monotonic()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            guard.after_request(False, time.monotonic() - started)
+            raise
+
+        success = response.status_code not in self.FAILURE_STATUS or (
+            response.status_code == 500 and any(k in response.content for k in self.SRI_RESPONSE_KEYWORDS)
+        )
+        guard.after_request(success, time.monotonic() - started)
+        return response
+
+
+class SRITransport:
+    """
+    Sesión HTTP y clientes Zeep de larga vida para un ambiente del SRI.
+    """
+
+    def __init__(self, environment, pool_maxsize=None, wsdl_cache_path=None):
+        self.environment = environment
+        self.pool_maxsize = pool_maxsize or getattr(settings, 'SRI_HTTP_POOL_MAXSIZE', 10)
+        self.wsdl_cache_path = wsdl_cache_path or getattr(settings, 'SRI_WSDL_CACHE_PATH', '')
+        self.wsdl_cache_timeout = getattr(settings, 'SRI_WSDL_CACHE_TIMEOUT', 86400)
+
+        # Los reintentos los maneja cada llamador (backoff propio del cliente SOAP)
+        self.adapter = SRIGuardedAdapter(
+            environment,
+            pool_connections=2,  # recepción y autorización (mismo host, distinto path)
+            pool_maxsize=self.pool_maxsize,
+            max_retries=0,
+            pool_block=False
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+        self._zeep_clients = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'errors': 0,
+            'total_latency': 0.0,
+            'max_latency': 0.0,
+        }
+
+    # ========================================================================
+    # HTTP
+    # ========================================================================
+    def post(self, url, data, headers=None, timeout=None, **kwargs):
+        """POST sobre la sesión compartida, registrando la latencia."""
+        started = time.monotonic()
+        try:
+            response = self.session.post(
+                url,
+                data=data,
+                headers=headers,
+                timeout=timeout,
+                verify=kwargs.pop('verify', True),
+                allow_redirects=kwargs.pop('allow_redirects', False),
+                **kwargs
+            )
+        except Exception:
+            self._record(time.monotonic() - started, error=True)
+            raise
+
+        self._record(time.monotonic() - started)
+        return response
+
+    def _record(self, latency, error=False):
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['total_latency'] += latency
+            if latency > self._stats['max_latency']:
+                self._stats['max_latency'] = latency
+            if error:
+                self._stats['errors'] += 1
+
+    # ========================================================================
+    # Zeep
+    # ========================================================================
+    def get_zeep_client(self, wsdl_url):
+        """Cliente Zeep cacheado por WSDL, sobre la misma sesión HTTP."""
+        if not ZEEP_AVAILABLE:
+            return None
+
+        client = self._zeep_clients.get(wsdl_url)
+        if client is None:
+            with self._lock:
+                client = self._zeep_clients.get(wsdl_url)
+                if client is None:
+                    cache = None
+                    if self.wsdl_cache_path:
+                        try:
+                            os.makedirs(os.path.dirname(self.wsdl_cache_path), exist_ok=True)
+                            cache = SqliteCache(path=self.wsdl_cache_path, timeout=self.wsdl_cache_timeout)
+                        except Exception as e:
+                            logger.warning(f"⚠️ [SRI_TRANSPORT] WSDL disk cache unavailable: {e}")
+
+                    transport = Transport(session=self.session, cache=cache)
+                    client = Client(
+                        wsdl_url,
+                        transport=transport,
+                        settings=Settings(strict=False, xml_huge_tree=True)
+                    )
+                    self._zeep_clients[wsdl_url] = client
+                    logger.info(f"✅ [SRI_TRANSPORT] Zeep client ready for {wsdl_url}")
+        return client
+
+    # ========================================================================
+    # Estadísticas
+    # ========================================================================
+    def get_stats(self):
+        """Conexiones abiertas (handshakes TLS) vs peticiones y latencia por llamada."""
+        connections_opened = 0
+        pooled_requests = 0
+        idle_connections = 0
+        for pool in list(self.adapter.poolmanager.pools._container.values()):
+            connections_opened += getattr(pool, 'num_connections', 0)
+            pooled_requests += getattr(pool, 'num_requests', 0)
+            idle_connections += pool.pool.qsize() if getattr(pool, 'pool', None) else 0
+
+        with self._lock:
+            stats = dict(self._stats)
+
+        requests_count = stats['requests']
+        return {
+            'environment': self.environment,
+            'pid': os.getpid(),
+            'pool_maxsize': self.pool_maxsize,
+            'requests': requests_count,
+            'errors': stats['errors'],
+            'connections_opened': connections_opened,
+            'idle_connections': idle_connections,
+            'handshakes_saved': max(0, pooled_requests - connections_opened),
+            'avg_latency_ms': round(stats['total_latency'] / requests_count * 1000, 1) if requests_count else None,
+            'max_latency_ms': round(stats['max_latency'] * 1000, 1),
+            'zeep_clients': list(self._zeep_clients.keys()),
+        }
+
+    def close(self):
+        self.session.close()
+        self._zeep_clients.clear()
+
+
+_transports = {}
+_transports_pid = None
+_transports_lock = threading.Lock()
+
+
+def get_transport(environment):
+    """
+    Transporte compartido del proceso para el ambiente ('TEST' / 'PRODUCTION').
+    Se recrea tras un fork (workers prefork de Celery) para no compartir sockets.
+    """
+    global _transports_pid
+
+    pid = os.getpid()
+    transport = _transports.get(environment) if _transports_pid == pid else None
+    if transport is None:
+        with _transports_lock:
+            if _transports_pid != pid:
+                _transports.clear()
+                _transports_pid = pid
+            transport = _transports.get(environment)
+            if transport is None:
+                transport = SRITransport(environment)
+                _transports[environment] = transport
+    return transport
+
+
+def get_transport_stats():
+    """Estadísticas de todos los transportes del proceso actual."""
+    if _transports_pid != os.getpid():
+        return {}
+    return {environment: transport.get_stats() for environment, transport in list(_transports.items())}
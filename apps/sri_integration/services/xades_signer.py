@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Firmador XAdES-BES nativo en Python
+apps/sri_integration/services/xades_signer.py
+
+Reemplaza la ejecución de `java -jar /app/sri.jar` por documento:
+- Firma completamente en memoria (sin archivos en /tmp)
+- Usa la clave de FIRMA ya cargada por GlobalCertificateManager (CertificateData)
+- Genera la misma estructura que el JAR oficial (ficha técnica SRI):
+  SignedProperties + KeyInfo + comprobante (enveloped), RSA-SHA1, C14N inclusiva
+"""
+
+import base64
+import hashlib
+import logging
+import random
+from datetime import datetime, timezone, timedelta
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# Constantes
+# ============================================================================
+ECUADOR_TZ = timezone(timedelta(hours=-5))
+
+DS_NS = 'http://www.w3.org/2000/09/xmldsig#'
+ETSI_NS = 'http://uri.etsi.org/01903/v1.3.2#'
+NSMAP = {'ds': DS_NS, 'etsi': ETSI_NS}
+
+C14N_ALGORITHM = 'http://www.w3.org/TR/2001/REC-xml-c14n-20010315'
+RSA_SHA1_ALGORITHM = 'http://www.w3.org/2000/09/xmldsig#rsa-sha1'
+SHA1_ALGORITHM = 'http://www.w3.org/2000/09/xmldsig#sha1'
+ENVELOPED_ALGORITHM = 'http://www.w3.org/2000/09/xmldsig#enveloped-signature'
+SIGNED_PROPERTIES_TYPE = 'http://uri.etsi.org/01903#SignedProperties'
+
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>\n'
+
+# Parser reutilizable: conserva los espacios para no alterar el digest
+_PARSER = etree.XMLParser(remove_blank_text=False, resolve_entities=False)
+
+
+def _ds(tag):
+    return f'{{{DS_NS}}}{tag}'
+
+
+def _etsi(tag):
+    return f'{{{ETSI_NS}}}{tag}'
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def _b64_wrapped(data, width=76):
+    """Base64 con saltos de línea cada 76 caracteres (igual que el JAR)."""
+    encoded = _b64(data)
+    return '\n'.join(encoded[i:i + width] for i in range(0, len(encoded), width))
+
+
+def _sha1_b64(data):
+    return _b64(hashlib.sha1(data).digest())
+
+
+def _c14n(element):
+    """C14N inclusiva del elemento dentro de su contexto de namespaces."""
+    return etree.tostring(element, method='c14n', exclusive=False, with_comments=False)
+
+
+def _int_to_b64(value):
+    length = (value.bit_length() + 7) // 8
+    return _b64_wrapped(value.to_bytes(length, 'big'))
+
+
+class XAdESSignerError(Exception):
+    """Error durante la firma XAdES-BES nativa."""
+
+
+class XAdESBESSigner:
+    """
+    Firmador XAdES-BES en proceso, compatible con el JAR oficial del SRI.
+    Se construye a partir de un CertificateData del GlobalCertificateManager.
+    """
+
+    def __init__(self, cert_data):
+        self.cert_data = cert_data
+        self.private_key = cert_data.private_key
+        self.certificate = cert_data.certificate
+
+        if self.private_key is None or self.certificate is None:
+            raise XAdESSignerError("Certificate data without private key or certificate")
+
+        # Datos del certificado que no cambian entre documentos
+        self._cert_der = self.certificate.public_bytes(serialization.Encoding.DER)
+        self._cert_b64 = _b64_wrapped(self._cert_der)
+        self._cert_digest = _sha1_b64(self._cert_der)
+        self._issuer_name = self.certificate.issuer.rfc4514_string()
+        self._serial_number = str(self.certificate.serial_number)
+
+        public_numbers = self.certificate.public_key().public_numbers()
+        self._modulus = _int_to_b64(public_numbers.n)
+        self._exponent = _int_to_b64(public_numbers.e)
+
+    # ========================================================================
+    # API pública
+    # ========================================================================
+    def sign(self, xml_content, signing_time=None, ids=None):
+        """
+        Firma el comprobante y retorna el XML firmado en bytes (UTF-8).
+
+        Args:
+            xml_content: XML sin firmar (str o bytes)
+            signing_time: datetime opcional para SigningTime (por defecto: ahora en Ecuador)
+            ids: IDs de la firma (por defecto aleatorios, como el JAR); permite
+                reproducir una firma existente
+        """
+        root, signature, signed_info_c14n = self.prepare(xml_content, signing_time, ids)
+
+        # 3. Firma RSA-SHA1 sobre SignedInfo canonicalizado
+        signature_value = self.private_key.sign(
+            signed_info_c14n,
+            padding.PKCS1v15(),
+            hashes.SHA1()
+        )
+        signature.find(_ds('SignatureValue')).text = '\n' + _b64_wrapped(signature_value) + '\n'
+
+        self.cert_data.update_usage()
+
+        return XML_DECLARATION + etree.tostring(root, encoding='utf-8')
+
+    def prepare(self, xml_content, signing_time=None, ids=None):
+        """
+        Inserta la firma con los tres digests calculados, sin SignatureValue.
+        Solo usa datos públicos (comprobante, certificado, IDs, hora).
+
+        Returns:
+            (raíz del comprobante, elemento ds:Signature, C14N de SignedInfo a firmar)
+        """
+        if isinstance(xml_content, str):
+            xml_content = xml_content.encode('utf-8')
+
+        try:
+            root = etree.fromstring(xml_content.lstrip(b'\xef\xbb\xbf'), _PARSER)
+        except etree.XMLSyntaxError as e:
+            raise XAdESSignerError(f"Invalid XML: {e}")
+
+        comprobante_id = root.get('id')
+        if not comprobante_id:
+            comprobante_id = 'comprobante'
+            root.set('id', comprobante_id)
+
+        # 1. Digest del comprobante ANTES de insertar la firma (enveloped-signature)
+        document_digest = _sha1_b64(_c14n(root))
+
+        ids = dict(ids or self._generate_ids())
+        ids['comprobante'] = comprobante_id
+        signature = self._build_signature(ids, signing_time)
+        root.append(signature)
+
+        signed_info = signature.find(_ds('SignedInfo'))
+        key_info = signature.find(_ds('KeyInfo'))
+        signed_properties = signature.find(f"{_ds('Object')}/{_etsi('QualifyingProperties')}/{_etsi('SignedProperties')}")
+
+        # 2. Digests de SignedProperties y KeyInfo (ya en su contexto de namespaces)
+        digests = signed_info.findall(f"{_ds('Reference')}/{_ds('DigestValue')}")
+        digests[0].text = _sha1_b64(_c14n(signed_properties))
+        digests[1].text = _sha1_b64(_c14n(key_info))
+        digests[2].text = document_digest
+
+        return root, signature, _c14n(signed_info)
+
+    # ========================================================================
+    # Construcción de la estructura de firma
+    # ========================================================================
+    @staticmethod
+    def _generate_ids():
+        """IDs numéricos aleatorios con el mismo formato que el JAR."""
+        def rnd():
+            return random.randint(1, 999999)
+
+        signature_id = f"Signature{rnd()}"
+        return {
+            'signature': signature_id,
+            'signed_info': f"Signature-SignedInfo{rnd()}",
+            'signed_properties': f"{signature_id}-SignedProperties{rnd()}",
+            'signed_properties_ref': f"SignedPropertiesID{rnd()}",
+            'certificate': f"Certificate{rnd()}",
+            'reference': f"Reference-ID-{rnd()}",
+            'signature_value': f"SignatureValue{rnd()}",
+            'object': f"{signature_id}-Object{rnd()}",
+        }
+
+    def _build_signature(self, ids, signing_time=None):
+        signature = etree.Element(_ds('Signature'), nsmap=NSMAP)
+        signature.set('Id', ids['signature'])
+
+        # SignedInfo
+        signed_info = etree.SubElement(signature, _ds('SignedInfo'), Id=ids['signed_info'])
+        etree.SubElement(signed_info, _ds('CanonicalizationMethod'), Algorithm=C14N_ALGORITHM)
+        etree.SubElement(signed_info, _ds('SignatureMethod'), Algorithm=RSA_SHA1_ALGORITHM)
+
+        ref_props = etree.SubElement(signed_info, _ds('Reference'))
+        ref_props.set('Id', ids['signed_properties_ref'])
+        ref_props.set('Type', SIGNED_PROPERTIES_TYPE)
+        ref_props.set('URI', f"#{ids['signed_properties']}")
+        etree.SubElement(ref_props, _ds('DigestMethod'), Algorithm=SHA1_ALGORITHM)
+        etree.SubElement(ref_props, _ds('DigestValue'))
+
+        ref_cert = etree.SubElement(signed_info, _ds('Reference'), URI=f"#{ids['certificate']}")
+        etree.SubElement(ref_cert, _ds('DigestMethod'), Algorithm=SHA1_ALGORITHM)
+        etree.SubElement(ref_cert, _ds('DigestValue'))
+
+        ref_doc = etree.SubElement(signed_info, _ds('Reference'))
+        ref_doc.set('Id', ids['reference'])
+        ref_doc.set('URI', f"#{ids['comprobante']}")
+        transforms = etree.SubElement(ref_doc, _ds('Transforms'))
+        etree.SubElement(transforms, _ds('Transform'), Algorithm=ENVELOPED_ALGORITHM)
+        etree.SubElement(ref_doc, _ds('DigestMethod'), Algorithm=SHA1_ALGORITHM)
+        etree.SubElement(ref_doc, _ds('DigestValue'))
+
+        # SignatureValue (se completa al final)
+        etree.SubElement(signature, _ds('SignatureValue'), Id=ids['signature_value'])
+
+        # KeyInfo
+        key_info = etree.SubElement(signature, _ds('KeyInfo'), Id=ids['certificate'])
+        x509_data = etree.SubElement(key_info, _ds('X509Data'))
+        x509_cert = etree.SubElement(x509_data, _ds('X509Certificate'))
+        x509_cert.text = '\n' + self._cert_b64 + '\n'
+        key_value = etree.SubElement(key_info, _ds('KeyValue'))
+        rsa_key_value = etree.SubElement(key_value, _ds('RSAKeyValue'))
+        etree.SubElement(rsa_key_value, _ds('Modulus')).text = '\n' + self._modulus + '\n'
+        etree.SubElement(rsa_key_value, _ds('Exponent')).text = self._exponent
+
+        # Object / QualifyingProperties / SignedProperties
+        obj = etree.SubElement(signature, _ds('Object'), Id=ids['object'])
+        qualifying = etree.SubElement(obj, _etsi('QualifyingProperties'), Target=f"#{ids['signature']}")
+        signed_props = etree.SubElement(qualifying, _etsi('SignedProperties'), Id=ids['signed_properties'])
+
+        sig_props = etree.SubElement(signed_props, _etsi('SignedSignatureProperties'))
+        now = signing_time or datetime.now(ECUADOR_TZ)
+        etree.SubElement(sig_props, _etsi('SigningTime')).text = now.strftime('%Y-%m-%dT%H:%M:%S-05:00')
+
+        signing_cert = etree.SubElement(sig_props, _etsi('SigningCertificate'))
+        cert = etree.SubElement(signing_cert, _etsi('Cert'))
+        cert_digest = etree.SubElement(cert, _etsi('CertDigest'))
+        etree.SubElement(cert_digest, _ds('DigestMethod'), Algorithm=SHA1_ALGORITHM)
+        etree.SubElement(cert_digest, _ds('DigestValue')).text = self._cert_digest
+        issuer_serial = etree.SubElement(cert, _etsi('IssuerSerial'))
+        etree.SubElement(issuer_serial, _ds('X509IssuerName')).text = self._issuer_name
+        etree.SubElement(issuer_serial, _ds('X509SerialNumber')).text = self._serial_number
+
+        data_props = etree.SubElement(signed_props, _etsi('SignedDataObjectProperties'))
+        data_format = etree.SubElement(data_props, _etsi('DataObjectFormat'), ObjectReference=f"#{ids['reference']}")
+        etree.SubElement(data_format, _etsi('Description')).text = 'contenido comprobante'
+        etree.SubElement(data_format, _etsi('MimeType')).text = 'text/xml'
+
+        return signature
+
+
+def get_signer(cert_data):
+    """
+    Obtiene el firmador asociado al CertificateData (se crea una sola vez
+    por certificado cargado y vive mientras el certificado esté en cache).
+    """
+    signer = getattr(cert_data, '_xades_signer', None)
+    if signer is None:
+        signer = XAdESBESSigner(cert_data)
+        cert_data._xades_signer = signer
+    return signer
+
+
+def sign_xml(xml_content, cert_data, signing_time=None):
+    """
+    Función helper: firma un comprobante con el CertificateData de la empresa.
+    Retorna bytes UTF-8 del XML firmado.
+    """
+    return get_signer(cert_data).sign(xml_content, signing_time=signing_time)
@@ -7,19 +7,91 @@ IMPORTANTE: Versiones 2.0.0 y 2.1.0 son SOLO para casos especiales
 CUMPLE: Resoluciones vigentes del SRI Ecuador
 """
 
+import io
 import logging
 import os
+import re
 from datetime import datetime
-from xml.etree.ElementTree import Element, SubElement, tostring
-from xml.dom import minidom
+from lxml import etree
+from lxml.etree import Element, SubElement
 from django.utils import timezone
 from django.conf import settings
-from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
 from apps.sri_integration.models import ElectronicDocument
+from apps.sri_integration.services.xsd_validator import XSDSchemaMissingError, XSDValidationError, validate_comprobante
+from apps.sri_integration.tax_engine import (
+    IVA_TAX_CODE, ZERO, default_percentage_code, format_amount, resolve_rate, tax_amount, to_decimal
+)
 
 logger = logging.getLogger(__name__)
 
 
+class XMLStreamValidator:
+    """
+    Validaciones XML según Ficha Técnica v2.32 (noviembre 2025), aplicadas a
+    cada sección a medida que se escribe (sin re-escanear el XML completo).
+    """
+    
+    # Elementos que nunca pueden ir vacíos
+    REQUIRED_TEXT = ('razonSocial', 'identificacionComprador', 'ruc', 'claveAcceso')
+    
+    # Límites de longitud según Ficha Técnica
+    FIELD_LIMITS = {
+        'razonSocial': 300,
+        'descripcion': 300,
+        'codigoPrincipal': 25,
+        'codigoAuxiliar': 25,
+    }
+    
+    # Decimales: solo advertencia
+    DECIMAL_FIELDS = ('cantidad', 'precioUnitario', 'valor')
+    DECIMAL_PATTERN = re.compile(r'^\d+\.\d{3,}$')
+    
+    # Elementos esenciales por tipo de comprobante
+    ESSENTIAL_ELEMENTS = ('ambiente', 'ruc', 'claveAcceso', 'tipoEmision', 'codDoc')
+    ESSENTIAL_BY_DOCUMENT = {
+        'factura': ('totalSinImpuestos', 'importeTotal'),
+        'liquidacionCompra': ('totalSinImpuestos', 'importeTotal'),
+        'notaCredito': ('totalSinImpuestos', 'valorModificacion'),
+        'notaDebito': ('totalSinImpuestos', 'valorTotal'),
+        'comprobanteRetencion': (),
+    }
+    
+    def __init__(self, root_tag):
+        self.root_tag = root_tag
+        self.missing = set(self.ESSENTIAL_ELEMENTS) | set(self.ESSENTIAL_BY_DOCUMENT.get(root_tag, ()))
+        self.decimal_warnings = 0
+    
+    def check(self, element):
+        """Valida una sección antes de escribirla. Lanza ValueError si no cumple."""
+        for node in element.iter():
+            tag = node.tag
+            text = node.text
+            self.missing.discard(tag)
+            
+            if tag in self.REQUIRED_TEXT and not (text and text.strip()):
+                raise ValueError(f"ERROR: Elemento vacío detectado: <{tag}>")
+            
+            if tag == 'campoAdicional' and not node.get('nombre', '').strip():
+                raise ValueError('ERROR: Elemento vacío detectado: <campoAdicional nombre="">')
+            
+            limit = self.FIELD_LIMITS.get(tag)
+            if limit and text and len(text) > limit:
+                raise ValueError(f"ERROR: Campo {tag} excede límite de {limit} caracteres")
+            
+            if tag in self.DECIMAL_FIELDS and text and self.DECIMAL_PATTERN.match(text):
+                self.decimal_warnings += 1
+    
+    def finish(self):
+        """Verifica los elementos esenciales una vez escrito todo el comprobante."""
+        if self.missing:
+            raise ValueError(f"ERROR: Elemento esencial faltante: <{sorted(self.missing)[0]}>")
+        
+        if self.decimal_warnings:
+            logger.warning(f"ADVERTENCIA: {self.decimal_warnings} valores decimales con más de 2 decimales")
+        
+        logger.info("Validación XML completada exitosamente")
+
+
 class XMLGeneratorSRI2025:
     """
     Generador de XML para documentos electrónicos del SRI
@@ -51,9 +123,12 @@ class XMLGeneratorSRI2025:
         self.company = document.company
         self.sri_config = self.company.sri_configuration
         
-        # Crear directorio base para XMLs si no existe
+        # Errores XSD del último comprobante generado (ver _write_comprobante)
+        self.schema_errors = []
+        
+        # Directorio para save_xml_to_file (se crea al usarlo; los XML del flujo
+        # normal van al almacén de artefactos vía los FileField del documento)
         self.xml_base_dir = os.path.join(settings.BASE_DIR, 'storage', 'invoices', 'xml')
-        os.makedirs(self.xml_base_dir, exist_ok=True)
         
         # Validaciones iniciales críticas
         self._validate_initial_configuration()
@@ -83,323 +158,259 @@ class XMLGeneratorSRI2025:
     
     # ========== MÉTODOS PRINCIPALES ==========
     
-    def generate_xml(self):
-        """Método principal que determina qué tipo de XML generar"""
+    def generate_xml(self, as_bytes=False):
+        """
+        Método principal que determina qué tipo de XML generar.
+        Retorna str; con as_bytes=True los bytes UTF-8 tal como se escribieron.
+        """
         from apps.sri_integration.models import CreditNote, DebitNote, Retention, PurchaseSettlement
         
         try:
             if isinstance(self.document, CreditNote):
-                return self.generate_credit_note_xml()
+                return self.generate_credit_note_xml(as_bytes)
             elif isinstance(self.document, DebitNote):
-                return self.generate_debit_note_xml()
+                return self.generate_debit_note_xml(as_bytes)
             elif isinstance(self.document, Retention):
-                return self.generate_retention_xml()
+                return self.generate_retention_xml(as_bytes)
             elif isinstance(self.document, PurchaseSettlement):
-                return self.generate_purchase_settlement_xml()
+                return self.generate_purchase_settlement_xml(as_bytes)
             else:
-                return self.generate_invoice_xml()
+                return self.generate_invoice_xml(as_bytes)
         except Exception as e:
             logger.error(f"Error en generate_xml: {str(e)}")
             raise
     
-    def generate_invoice_xml(self):
+    def generate_invoice_xml(self, as_bytes=False):
         """Genera XML para factura comercial normal v1.1.0"""
         try:
             logger.info(f"Generando XML Factura v{self.XML_VERSIONS['factura']} para ID {self.document.id}")
             
-            # Elemento raíz con versión CORRECTA
-            factura = Element('factura', {
-                'id': 'comprobante',
-                'version': self.XML_VERSIONS['factura']
-            })
-            
             # Información tributaria
             info_tributaria = self._create_info_tributaria('01')  # 01 = Factura
-            factura.append(info_tributaria)
             
             # Información de la factura
             info_factura = self._create_info_factura()
-            factura.append(info_factura)
             
-            # Detalles
-            detalles = SubElement(factura, 'detalles')
-            if hasattr(self.document, 'items') and self.document.items.exists():
-                for item in self.document.items.all():
-                    detalle = self._create_detalle_factura(item)
-                    detalles.append(detalle)
-            else:
-                detalle = self._create_detalle_generico()
-                detalles.append(detalle)
-            
-            # Información adicional
-            info_adicional = self._create_info_adicional()
-            if self._has_valid_content(info_adicional):
-                factura.append(info_adicional)
-            
-            # Convertir a string con codificación correcta
-            xml_str = self._prettify_xml(factura)
-            
-            # Validaciones finales
-            self._validate_xml_structure(xml_str)
+            # Detalles: se escriben uno a uno, sin armar el árbol completo
+            xml_bytes = self._write_comprobante(
+                'factura',
+                [info_tributaria, info_factura],
+                'detalles',
+                self._iter_lines(
+                    (('items', self._create_detalle_factura),),
+                    self._create_detalle_generico
+                )
+            )
             
-            logger.info(f"XML Factura v{self.XML_VERSIONS['factura']} generado exitosamente: {len(xml_str)} caracteres")
-            return xml_str
+            logger.info(f"XML Factura v{self.XML_VERSIONS['factura']} generado exitosamente: {len(xml_bytes)} bytes")
+            return xml_bytes if as_bytes else xml_bytes.decode('utf-8')
             
+        except (XSDValidationError, XSDSchemaMissingError):
+            # Errores de esquema: DocumentProcessor los distingue por tipo
+            raise
         except Exception as e:
             logger.error(f"Error generando XML Factura: {str(e)}")
             raise ValueError(f"Error generando XML Factura: {str(e)}")
     
-    def generate_credit_note_xml(self):
+    def generate_credit_note_xml(self, as_bytes=False):
         """Genera XML para nota de crédito comercial normal v1.1.0"""
         try:
             logger.info(f"Generando XML NotaCredito v{self.XML_VERSIONS['notaCredito']} para ID {self.document.id}")
             
-            nota_credito = Element('notaCredito', {
-                'id': 'comprobante',
-                'version': self.XML_VERSIONS['notaCredito']
-            })
-            
             # Información tributaria
             info_tributaria = self._create_info_tributaria('04')  # 04 = Nota de Crédito
-            nota_credito.append(info_tributaria)
             
             # Información de la nota de crédito
             info_nota_credito = self._create_info_nota_credito()
-            nota_credito.append(info_nota_credito)
             
             # Detalles
-            detalles = SubElement(nota_credito, 'detalles')
-            if hasattr(self.document, 'items') and self.document.items.exists():
-                for item in self.document.items.all():
-                    detalle = self._create_detalle_nota_credito(item)
-                    detalles.append(detalle)
-            else:
-                detalle = self._create_detalle_generico_nota_credito()
-                detalles.append(detalle)
-            
-            # Información adicional
-            info_adicional = self._create_info_adicional()
-            if self._has_valid_content(info_adicional):
-                nota_credito.append(info_adicional)
-            
-            xml_str = self._prettify_xml(nota_credito)
-            self._validate_xml_structure(xml_str)
+            xml_bytes = self._write_comprobante(
+                'notaCredito',
+                [info_tributaria, info_nota_credito],
+                'detalles',
+                self._iter_lines(
+                    (('items', self._create_detalle_nota_credito),),
+                    self._create_detalle_generico_nota_credito
+                )
+            )
             
-            logger.info(f"XML NotaCredito v{self.XML_VERSIONS['notaCredito']} generado exitosamente: {len(xml_str)} caracteres")
-            return xml_str
+            logger.info(f"XML NotaCredito v{self.XML_VERSIONS['notaCredito']} generado exitosamente: {len(xml_bytes)} bytes")
+            return xml_bytes if as_bytes else xml_bytes.decode('utf-8')
             
+        except (XSDValidationError, XSDSchemaMissingError):
+            # Errores de esquema: DocumentProcessor los distingue por tipo
+            raise
         except Exception as e:
             logger.error(f"Error generando XML NotaCredito: {str(e)}")
             raise ValueError(f"Error generando XML NotaCredito: {str(e)}")
     
-    def generate_debit_note_xml(self):
+    def generate_debit_note_xml(self, as_bytes=False):
         """Genera XML para nota de débito v1.0.0"""
         try:
             logger.info(f"Generando XML NotaDebito v{self.XML_VERSIONS['notaDebito']} para ID {self.document.id}")
             
-            nota_debito = Element('notaDebito', {
-                'id': 'comprobante',
-                'version': self.XML_VERSIONS['notaDebito']
-            })
-            
             # Información tributaria
             info_tributaria = self._create_info_tributaria('05')  # 05 = Nota de Débito
-            nota_debito.append(info_tributaria)
             
             # Información de la nota de débito
             info_nota_debito = self._create_info_nota_debito()
-            nota_debito.append(info_nota_debito)
             
             # Motivos
-            motivos = SubElement(nota_debito, 'motivos')
-            if hasattr(self.document, 'motives') and self.document.motives.exists():
-                for motive in self.document.motives.all():
-                    motivo = self._create_motivo_nota_debito(motive)
-                    motivos.append(motivo)
-            elif hasattr(self.document, 'items') and self.document.items.exists():
-                for item in self.document.items.all():
-                    motivo = self._create_motivo_item(item)
-                    motivos.append(motivo)
-            else:
-                motivo = self._create_motivo_generico()
-                motivos.append(motivo)
-            
-            # Información adicional
-            info_adicional = self._create_info_adicional()
-            if self._has_valid_content(info_adicional):
-                nota_debito.append(info_adicional)
-            
-            xml_str = self._prettify_xml(nota_debito)
-            self._validate_xml_structure(xml_str)
+            xml_bytes = self._write_comprobante(
+                'notaDebito',
+                [info_tributaria, info_nota_debito],
+                'motivos',
+                self._iter_lines(
+                    (('motives', self._create_motivo_nota_debito), ('items', self._create_motivo_item)),
+                    self._create_motivo_generico
+                )
+            )
             
-            logger.info(f"XML NotaDebito v{self.XML_VERSIONS['notaDebito']} generado exitosamente: {len(xml_str)} caracteres")
-            return xml_str
+            logger.info(f"XML NotaDebito v{self.XML_VERSIONS['notaDebito']} generado exitosamente: {len(xml_bytes)} bytes")
+            return xml_bytes if as_bytes else xml_bytes.decode('utf-8')
             
+        except (XSDValidationError, XSDSchemaMissingError):
+            # Errores de esquema: DocumentProcessor los distingue por tipo
+            raise
         except Exception as e:
             logger.error(f"Error generando XML NotaDebito: {str(e)}")
             raise ValueError(f"Error generando XML NotaDebito: {str(e)}")
     
-    def generate_retention_xml(self):
+    def generate_retention_xml(self, as_bytes=False):
         """Genera XML para comprobante de retención v2.0.0"""
         try:
             logger.info(f"Generando XML Retención v{self.XML_VERSIONS['comprobanteRetencion']} para ID {self.document.id}")
             
-            comp_retencion = Element('comprobanteRetencion', {
-                'id': 'comprobante',
-                'version': self.XML_VERSIONS['comprobanteRetencion']
-            })
-            
             # Información tributaria
             info_tributaria = self._create_info_tributaria('07')  # 07 = Retención
-            comp_retencion.append(info_tributaria)
             
             # Información de retención
             info_comp_retencion = self._create_info_comp_retencion()
-            comp_retencion.append(info_comp_retencion)
             
             # Impuestos (detalles de retención)
-            impuestos = SubElement(comp_retencion, 'impuestos')
-            if hasattr(self.document, 'details') and self.document.details.exists():
-                for detail in self.document.details.all():
-                    impuesto = self._create_impuesto_retencion(detail)
-                    impuestos.append(impuesto)
-            else:
-                impuesto = self._create_impuesto_retencion_generico()
-                impuestos.append(impuesto)
-            
-            # Información adicional
-            info_adicional = self._create_info_adicional()
-            if self._has_valid_content(info_adicional):
-                comp_retencion.append(info_adicional)
-            
-            xml_str = self._prettify_xml(comp_retencion)
-            self._validate_xml_structure(xml_str)
+            xml_bytes = self._write_comprobante(
+                'comprobanteRetencion',
+                [info_tributaria, info_comp_retencion],
+                'impuestos',
+                self._iter_lines(
+                    (('details', self._create_impuesto_retencion),),
+                    self._create_impuesto_retencion_generico
+                )
+            )
             
-            logger.info(f"XML Retención v{self.XML_VERSIONS['comprobanteRetencion']} generado exitosamente: {len(xml_str)} caracteres")
-            return xml_str
+            logger.info(f"XML Retención v{self.XML_VERSIONS['comprobanteRetencion']} generado exitosamente: {len(xml_bytes)} bytes")
+            return xml_bytes if as_bytes else xml_bytes.decode('utf-8')
             
+        except (XSDValidationError, XSDSchemaMissingError):
+            # Errores de esquema: DocumentProcessor los distingue por tipo
+            raise
         except Exception as e:
             logger.error(f"Error generando XML Retención: {str(e)}")
             raise ValueError(f"Error generando XML Retención: {str(e)}")
     
-    def generate_purchase_settlement_xml(self):
+    def generate_purchase_settlement_xml(self, as_bytes=False):
         """Genera XML para liquidación de compra comercial normal v1.1.0"""
         try:
             logger.info(f"Generando XML LiquidacionCompra v{self.XML_VERSIONS['liquidacionCompra']} para ID {self.document.id}")
             
-            liquidacion_compra = Element('liquidacionCompra', {
-                'id': 'comprobante',
-                'version': self.XML_VERSIONS['liquidacionCompra']
-            })
-            
             # Información tributaria
             info_tributaria = self._create_info_tributaria('03')  # 03 = Liquidación de compra
-            liquidacion_compra.append(info_tributaria)
             
             # Información de liquidación
             info_liquidacion_compra = self._create_info_liquidacion_compra()
-            liquidacion_compra.append(info_liquidacion_compra)
             
             # Detalles
-            detalles = SubElement(liquidacion_compra, 'detalles')
-            if hasattr(self.document, 'items') and self.document.items.exists():
-                for item in self.document.items.all():
-                    detalle = self._create_detalle_liquidacion(item)
-                    detalles.append(detalle)
-            else:
-                detalle = self._create_detalle_generico()
-                detalles.append(detalle)
-            
-            # Información adicional
-            info_adicional = self._create_info_adicional()
-            if self._has_valid_content(info_adicional):
-                liquidacion_compra.append(info_adicional)
-            
-            xml_str = self._prettify_xml(liquidacion_compra)
-            self._validate_xml_structure(xml_str)
+            xml_bytes = self._write_comprobante(
+                'liquidacionCompra',
+                [info_tributaria, info_liquidacion_compra],
+                'detalles',
+                self._iter_lines(
+                    (('items', self._create_detalle_liquidacion),),
+                    self._create_detalle_generico
+                )
+            )
             
-            logger.info(f"XML LiquidacionCompra v{self.XML_VERSIONS['liquidacionCompra']} generado exitosamente: {len(xml_str)} caracteres")
-            return xml_str
+            logger.info(f"XML LiquidacionCompra v{self.XML_VERSIONS['liquidacionCompra']} generado exitosamente: {len(xml_bytes)} bytes")
+            return xml_bytes if as_bytes else xml_bytes.decode('utf-8')
             
+        except (XSDValidationError, XSDSchemaMissingError):
+            # Errores de esquema: DocumentProcessor los distingue por tipo
+            raise
         except Exception as e:
             logger.error(f"Error generando XML LiquidacionCompra: {str(e)}")
             raise ValueError(f"Error generando XML LiquidacionCompra: {str(e)}")
     
-    # ========== VALIDACIONES ==========
+    # ========== ESCRITURA INCREMENTAL ==========
     
-    def _validate_xml_structure(self, xml_str):
-        """Validaciones XML según Ficha Técnica v2.32 (noviembre 2025)"""
-        try:
-            # 1. Validar campos vacíos críticos
-            problematic_patterns = [
-                '<campoAdicional nombre="">',
-                '<campoAdicional nombre="" />',
-                '<razonSocial></razonSocial>',
-                '<identificacionComprador></identificacionComprador>',
-                '<ruc></ruc>',
-                '<claveAcceso></claveAcceso>'
-            ]
-            
-            for pattern in problematic_patterns:
-                if pattern in xml_str:
-                    raise ValueError(f"ERROR: Elemento vacío detectado: {pattern}")
-            
-            # 2. Validar elementos esenciales obligatorios
-            essential_elements = [
-                '<ambiente>', '<ruc>', '<claveAcceso>', 
-                '<totalSinImpuestos>', '<importeTotal>',
-                '<tipoEmision>', '<codDoc>'
-            ]
-            
-            for element in essential_elements:
-                if element not in xml_str:
-                    raise ValueError(f"ERROR: Elemento esencial faltante: {element}")
-            
-            # 3. Validar formato de decimales (solo advertencia, no error)
-            import re
-            decimal_patterns = [
-                r'<cantidad>(\d+\.\d{3,})</cantidad>',
-                r'<precioUnitario>(\d+\.\d{3,})</precioUnitario>',
-                r'<valor>(\d+\.\d{3,})</valor>'
-            ]
-            
-            for pattern in decimal_patterns:
-                matches = re.findall(pattern, xml_str)
-                if matches:
-                    logger.warning(f"ADVERTENCIA: Valores decimales con más de 2 decimales: {matches}")
-            
-            # 4. Validar longitud de campos según Ficha Técnica
-            field_limits = {
-                'razonSocial': 300,
-                'descripcion': 300,
-                'codigoPrincipal': 25,
-                'codigoAuxiliar': 25
-            }
-            
-            for field, limit in field_limits.items():
-                pattern = f'<{field}>(.+?)</{field}>'
-                matches = re.findall(pattern, xml_str)
-                for match in matches:
-                    if len(match) > limit:
-                        raise ValueError(f"ERROR: Campo {field} excede límite de {limit} caracteres")
-            
-            # 5. Verificar que la versión sea correcta (1.1.0 para facturas normales)
-            version_checks = {
-                'factura': '1.1.0',
-                'notaCredito': '1.1.0',
-                'liquidacionCompra': '1.1.0'
-            }
-            
-            for doc_type, expected_version in version_checks.items():
-                if doc_type in xml_str.lower():
-                    if f'version="{expected_version}"' not in xml_str:
-                        logger.warning(f"ADVERTENCIA: Versión XML no es {expected_version} para {doc_type}")
-            
-            logger.info("Validación XML completada exitosamente")
-            
-        except Exception as e:
-            logger.error(f"Error en validación XML: {str(e)}")
-            raise
+    def _write_comprobante(self, root_tag, header_elements, lines_tag, lines):
+        """
+        Escribe el comprobante con lxml.etree.xmlfile, sección por sección.
+        
+        Cada línea (detalle / motivo / impuesto) se construye, valida y serializa
+        de inmediato, así no se arma el árbol completo en memoria. La salida es
+        UTF-8 sin BOM ni espacios entre elementos: el firmador la usa tal cual.
+        
+        El destino es un buffer en memoria a propósito: el mismo documento se
+        valida contra el XSD, se firma y se guarda en el almacén de artefactos
+        (que lo nombra por su hash), sin archivo intermedio. Retorna esos bytes;
+        los generate_*_xml solo decodifican a str si no se pide as_bytes.
+        
+        Con validate_xml_schema activo el resultado se valida además contra el
+        XSD oficial compilado (XSDValidationError con los errores estructurados).
+        """
+        validator = XMLStreamValidator(root_tag)
+        buffer = io.BytesIO()
+        
+        with etree.xmlfile(buffer, encoding='UTF-8') as xf:
+            xf.write_declaration()
+            with xf.element(root_tag, {'id': 'comprobante', 'version': self.XML_VERSIONS[root_tag]}):
+                for element in header_elements:
+                    validator.check(element)
+                    xf.write(element)
+                
+                with xf.element(lines_tag):
+                    for line in lines:
+                        validator.check(line)
+                        xf.write(line)
+                
+                # Información adicional
+                info_adicional = self._create_info_adicional()
+                if self._has_valid_content(info_adicional):
+                    validator.check(info_adicional)
+                    xf.write(info_adicional)
+        
+        validator.finish()
+        
+        xml_bytes = buffer.getvalue()
+        if self._schema_validation_enabled():
+            self.schema_errors = validate_comprobante(xml_bytes, root_tag)
+            if self.schema_errors:
+                raise XSDValidationError(root_tag, self.schema_errors)
+        
+        return xml_bytes
+    
+    def _schema_validation_enabled(self):
+        return (getattr(settings, 'SRI_VALIDATE_XML_SCHEMA', True) and
+                getattr(self.sri_config, 'validate_xml_schema', True))
+    
+    def _iter_lines(self, sources, create_default):
+        """
+        Líneas del comprobante desde la primera relación con registros
+        (p.ej. motives, luego items) o la línea genérica si no hay ninguna.
+        """
+        for related_name, create_line in sources:
+            manager = getattr(self.document, related_name, None)
+            if manager is None:
+                continue
+            
+            has_lines = False
+            for obj in manager.all():
+                has_lines = True
+                yield create_line(obj)
+            if has_lines:
+                return
+        
+        yield create_default()
     
     def _has_valid_content(self, element):
         """Verificación de contenido válido"""
@@ -682,8 +693,9 @@ class XMLGeneratorSRI2025:
         
         # impuestos - Estructura de impuestos
         impuestos = SubElement(detalle, 'impuestos')
-        if hasattr(item, 'taxes') and item.taxes.exists():
-            for tax in item.taxes.all():
+        item_taxes = list(item.taxes.all()) if hasattr(item, 'taxes') else []
+        if item_taxes:
+            for tax in item_taxes:
                 impuesto = self._create_tax_detail(tax, item)
                 impuestos.append(impuesto)
         else:
@@ -708,16 +720,18 @@ class XMLGeneratorSRI2025:
         return impuesto
     
     def _create_default_tax(self, item):
-        """Crea impuesto por defecto (IVA 15% - código 4)"""
+        """Crea impuesto por defecto (IVA, SRI_DEFAULT_IVA_PERCENTAGE_CODE)"""
         impuesto = Element('impuesto')
         
-        SubElement(impuesto, 'codigo').text = '2'  # IVA
-        SubElement(impuesto, 'codigoPorcentaje').text = '4'  # 15% (código actualizado)
-        SubElement(impuesto, 'tarifa').text = '15.00'
+        percentage_code = default_percentage_code()
+        rate = resolve_rate(percentage_code)
+        subtotal = to_decimal(getattr(item, 'subtotal', 0))
         
-        subtotal = float(getattr(item, 'subtotal', 0))
+        SubElement(impuesto, 'codigo').text = IVA_TAX_CODE
+        SubElement(impuesto, 'codigoPorcentaje').text = percentage_code
+        SubElement(impuesto, 'tarifa').text = self._format_decimal(rate)
         SubElement(impuesto, 'baseImponible').text = self._format_decimal(subtotal)
-        SubElement(impuesto, 'valor').text = self._format_decimal(subtotal * 0.15)
+        SubElement(impuesto, 'valor').text = self._format_decimal(tax_amount(subtotal, rate))
         
         return impuesto
     
@@ -729,7 +743,7 @@ class XMLGeneratorSRI2025:
         SubElement(detalle, 'descripcion').text = 'Producto'
         SubElement(detalle, 'cantidad').text = '1.00'
         
-        subtotal = float(self.document.subtotal_without_tax)
+        subtotal = to_decimal(self.document.subtotal_without_tax)
         SubElement(detalle, 'precioUnitario').text = self._format_decimal(subtotal)
         SubElement(detalle, 'descuento').text = '0.00'
         SubElement(detalle, 'precioTotalSinImpuesto').text = self._format_decimal(subtotal)
@@ -737,11 +751,12 @@ class XMLGeneratorSRI2025:
         # Impuestos por defecto
         impuestos = SubElement(detalle, 'impuestos')
         impuesto = Element('impuesto')
-        SubElement(impuesto, 'codigo').text = '2'
-        SubElement(impuesto, 'codigoPorcentaje').text = '4'
-        SubElement(impuesto, 'tarifa').text = '15.00'
+        percentage_code = default_percentage_code()
+        SubElement(impuesto, 'codigo').text = IVA_TAX_CODE
+        SubElement(impuesto, 'codigoPorcentaje').text = percentage_code
+        SubElement(impuesto, 'tarifa').text = self._format_decimal(resolve_rate(percentage_code))
         SubElement(impuesto, 'baseImponible').text = self._format_decimal(subtotal)
-        SubElement(impuesto, 'valor').text = self._format_decimal(float(self.document.total_tax))
+        SubElement(impuesto, 'valor').text = self._format_decimal(self.document.total_tax)
         impuestos.append(impuesto)
         
         return detalle
@@ -749,66 +764,53 @@ class XMLGeneratorSRI2025:
     # ========== MÉTODOS DE UTILIDAD ==========
     
     def _format_decimal(self, value, max_decimals=2):
-        """Formatea decimales según especificaciones SRI"""
+        """Formatea decimales según especificaciones SRI (Decimal exacto, sin float)"""
         try:
             if value is None:
                 return "0.00"
+            return format_amount(value, max_decimals if max_decimals in (2, 6) else 2)
             
-            # Convertir a float primero para normalizar
-            float_val = float(value)
-            
-            # Formatear según decimales máximos
-            if max_decimals == 2:
-                return f"{float_val:.2f}"
-            elif max_decimals == 6:
-                # Para cantidades, permitir hasta 6 pero quitar ceros innecesarios
-                formatted = f"{float_val:.6f}"
-                # Quitar ceros al final pero mantener al menos 2 decimales
-                formatted = formatted.rstrip('0')
-                if formatted.endswith('.'):
-                    formatted += '00'
-                elif len(formatted.split('.')[1]) < 2:
-                    formatted += '0'
-                return formatted
-            else:
-                return f"{float_val:.2f}"
-            
-        except (TypeError, ValueError, OverflowError) as e:
+        except (TypeError, ValueError, ArithmeticError) as e:
             logger.warning(f"Error formateando decimal {value}: {e}")
-            return "0.00" if max_decimals == 2 else "0.00"
+            return "0.00"
     
     def _get_taxes_summary(self):
         """Resumen de impuestos"""
         taxes_summary = {}
         
-        if hasattr(self.document, 'taxes') and self.document.taxes.exists():
-            for tax in self.document.taxes.all():
+        # Un solo recorrido (precargado en el snapshot del documento)
+        document_taxes = list(self.document.taxes.all()) if hasattr(self.document, 'taxes') else []
+        if document_taxes:
+            for tax in document_taxes:
                 key = (str(tax.tax_code), str(tax.percentage_code))
-                if key not in taxes_summary:
-                    taxes_summary[key] = {
-                        'base': Decimal('0'),
-                        'valor': Decimal('0'),
-                        'codigo': str(tax.tax_code),
-                        'codigoPorcentaje': str(tax.percentage_code),
-                        'tarifa': Decimal(str(tax.rate)),
-                        'descuentoAdicional': Decimal('0')
+                entry = taxes_summary.get(key)
+                if entry is None:
+                    entry = taxes_summary[key] = {
+                        'base': ZERO,
+                        'valor': ZERO,
+                        'codigo': key[0],
+                        'codigoPorcentaje': key[1],
+                        'tarifa': to_decimal(tax.rate),
+                        'descuentoAdicional': ZERO
                     }
                 
-                taxes_summary[key]['base'] += Decimal(str(tax.taxable_base))
-                taxes_summary[key]['valor'] += Decimal(str(tax.tax_amount))
+                entry['base'] += to_decimal(tax.taxable_base)
+                entry['valor'] += to_decimal(tax.tax_amount)
                 
                 # Agregar descuento adicional si existe
-                if hasattr(tax, 'additional_discount') and tax.additional_discount:
-                    taxes_summary[key]['descuentoAdicional'] += Decimal(str(tax.additional_discount))
+                additional_discount = getattr(tax, 'additional_discount', None)
+                if additional_discount:
+                    entry['descuentoAdicional'] += to_decimal(additional_discount)
         else:
             # Impuesto por defecto
-            taxes_summary[('2', '4')] = {
-                'base': Decimal(str(self.document.subtotal_without_tax)),
-                'valor': Decimal(str(self.document.total_tax)),
-                'codigo': '2',
-                'codigoPorcentaje': '4',  # Código 4 = IVA 15%
-                'tarifa': Decimal('15.00'),
-                'descuentoAdicional': Decimal('0')
+            percentage_code = default_percentage_code()
+            taxes_summary[(IVA_TAX_CODE, percentage_code)] = {
+                'base': to_decimal(self.document.subtotal_without_tax),
+                'valor': to_decimal(self.document.total_tax),
+                'codigo': IVA_TAX_CODE,
+                'codigoPorcentaje': percentage_code,
+                'tarifa': resolve_rate(percentage_code),
+                'descuentoAdicional': ZERO
             }
         
         return taxes_summary
@@ -879,39 +881,6 @@ class XMLGeneratorSRI2025:
         logger.info(f"Campos adicionales agregados: {added_fields}")
         return info_adicional
     
-    def _prettify_xml(self, elem):
-        """Formateo XML optimizado"""
-        try:
-            # Convertir a bytes con codificación UTF-8
-            rough_string = tostring(elem, encoding='utf-8')
-            
-            # Parse con minidom
-            reparsed = minidom.parseString(rough_string)
-            
-            # Generar XML formateado
-            xml_lines = reparsed.toprettyxml(indent="  ", encoding=None).splitlines()
-            
-            # Filtrar líneas vacías
-            filtered_lines = [line for line in xml_lines if line.strip()]
-            
-            # Asegurar declaración XML correcta
-            if filtered_lines and filtered_lines[0].startswith('<?xml'):
-                final_xml = '\n'.join(filtered_lines)
-            else:
-                final_xml = '<?xml version="1.0" encoding="UTF-8"?>\n' + '\n'.join(filtered_lines)
-            
-            # Validar que no tenga BOM
-            if final_xml.startswith('\ufeff'):
-                final_xml = final_xml[1:]
-            
-            return final_xml
-            
-        except Exception as e:
-            logger.error(f"Error formateando XML: {str(e)}")
-            # Fallback a XML básico sin formato
-            xml_str = tostring(elem, encoding='utf-8').decode('utf-8')
-            return '<?xml version="1.0" encoding="UTF-8"?>\n' + xml_str
-    
     # ========== MÉTODOS PARA OTROS TIPOS DE DOCUMENTO ==========
     
     def _create_info_nota_credito(self):
@@ -1202,6 +1171,7 @@ class XMLGeneratorSRI2025:
         """Obtiene la ruta del archivo XML"""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"{self.document.access_key}_{timestamp}.xml"
+        os.makedirs(self.xml_base_dir, exist_ok=True)
         return os.path.join(self.xml_base_dir, filename)
     
     def save_xml_to_file(self, xml_content):
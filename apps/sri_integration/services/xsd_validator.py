@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Validación XSD de comprobantes del SRI
+apps/sri_integration/services/xsd_validator.py
+
+Los XSD oficiales se compilan una sola vez por proceso en objetos
+lxml.etree.XMLSchema y se reutilizan para cada documento:
+- factura 1.1.0, notaCredito 1.1.0, notaDebito 1.0.0,
+  comprobanteRetencion 2.0.0, liquidacionCompra 1.1.0
+- Archivos en SRI_XSD_DIR (junto al xmldsig-core-schema.xsd que importan);
+  los publica el SRI y no se incluyen en el repositorio: se instalan con
+  `manage.py install_sri_xsd` y el system check sri_integration.W001 avisa
+  si faltan con la validación activa
+- Con la validación activa, un XSD faltante o que no compila es un error
+  (XSDSchemaMissingError): no se emite sin validar. No se cachea, así un XSD
+  instalado después se toma sin reiniciar el proceso
+- Errores estructurados (línea, columna, ruta, mensaje) para guardar en el documento
+"""
+
+import logging
+import os
+import threading
+
+from django.conf import settings
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# Nombres de archivo tal como los publica el SRI en la ficha técnica
+SCHEMA_FILES = {
+    'factura': 'factura_V1.1.0.xsd',
+    'notaCredito': 'notaCredito_V1.1.0.xsd',
+    'notaDebito': 'notaDebito_V1.0.0.xsd',
+    'comprobanteRetencion': 'comprobanteRetencion_V2.0.0.xsd',
+    'liquidacionCompra': 'liquidacionCompra_V1.1.0.xsd',
+}
+
+# Importado por los XSD de comprobantes (firma ds:Signature)
+XMLDSIG_SCHEMA_FILE = 'xmldsig-core-schema.xsd'
+
+MAX_REPORTED_ERRORS = 50
+
+_PARSER = etree.XMLParser(resolve_entities=False, no_network=True)
+
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+
+class XSDValidationError(ValueError):
+    """El comprobante no cumple el XSD oficial. `errors` trae el detalle estructurado."""
+
+    def __init__(self, root_tag, errors):
+        self.root_tag = root_tag
+        self.errors = errors
+        first = errors[0] if errors else {}
+        super().__init__(
+            f"XML no cumple el esquema {SCHEMA_FILES.get(root_tag, root_tag)} "
+            f"({len(errors)} errores): línea {first.get('line')}: {first.get('message')}"
+        )
+
+
+class XSDSchemaMissingError(RuntimeError):
+    """El XSD del comprobante no está instalado en SRI_XSD_DIR o no compila."""
+
+
+def _schema_path(root_tag):
+    return os.path.join(get_xsd_dir(), SCHEMA_FILES[root_tag])
+
+
+def get_schema(root_tag):
+    """
+    XMLSchema compilado para el tipo de comprobante (cacheado en el proceso).
+    Retorna None para tipos sin XSD oficial.
+
+    Raises:
+        XSDSchemaMissingError si el XSD no está instalado o no compila
+    """
+    schema = _schemas.get(root_tag)
+    if schema is not None or root_tag not in SCHEMA_FILES:
+        return schema
+
+    with _schemas_lock:
+        schema = _schemas.get(root_tag)
+        if schema is not None:
+            return schema
+
+        path = _schema_path(root_tag)
+        if not os.path.exists(path):
+            logger.error(f"❌ [SRI_XSD] Schema not installed: {path}")
+            raise XSDSchemaMissingError(f"XSD {SCHEMA_FILES[root_tag]} no instalado en {os.path.dirname(path)}")
+        try:
+            schema = etree.XMLSchema(etree.parse(path, _PARSER))
+        except (etree.XMLSchemaParseError, etree.XMLSyntaxError, OSError) as e:
+            logger.error(f"❌ [SRI_XSD] Cannot compile {path}: {e}")
+            raise XSDSchemaMissingError(f"XSD {SCHEMA_FILES[root_tag]} no compila: {e}")
+
+        logger.info(f"✅ [SRI_XSD] Schema compiled: {SCHEMA_FILES[root_tag]}")
+        _schemas[root_tag] = schema
+        return schema
+
+
+def get_xsd_dir():
+    return getattr(settings, 'SRI_XSD_DIR', '') or os.path.join(settings.BASE_DIR, 'storage', 'xsd')
+
+
+def missing_schema_files():
+    """Archivos XSD esperados que no están en SRI_XSD_DIR."""
+    xsd_dir = get_xsd_dir()
+    return [
+        name for name in [*SCHEMA_FILES.values(), XMLDSIG_SCHEMA_FILE]
+        if not os.path.exists(os.path.join(xsd_dir, name))
+    ]
+
+
+def preload_schemas():
+    """Compila todos los XSD instalados (warm-up de workers). Retorna los cargados."""
+    loaded = []
+    for root_tag in SCHEMA_FILES:
+        try:
+            get_schema(root_tag)
+            loaded.append(root_tag)
+        except XSDSchemaMissingError:
+            pass
+    return loaded
+
+
+def clear_schema_cache():
+    with _schemas_lock:
+        _schemas.clear()
+
+
+def validate_comprobante(xml, root_tag=None):
+    """
+    Valida un comprobante contra su XSD oficial.
+
+    Args:
+        xml: str / bytes / elemento lxml
+        root_tag: tipo de comprobante; si no se indica se toma del elemento raíz
+
+    Returns:
+        list: errores [{line, column, path, type, message}] (vacía si es válido
+        o si el tipo de comprobante no tiene XSD oficial)
+
+    Raises:
+        etree.XMLSyntaxError si el XML está mal formado
+        XSDSchemaMissingError si el XSD del comprobante no está instalado
+    """
+    if isinstance(xml, str):
+        xml = xml.encode('utf-8')
+    root = etree.fromstring(xml, _PARSER) if isinstance(xml, bytes) else xml
+    root_tag = root_tag or etree.QName(root).localname
+
+    schema = get_schema(root_tag)
+    if schema is None:
+        return []
+
+    if schema.validate(root):
+        return []
+
+    return [
+        {
+            'line': error.line,
+            'column': error.column,
+            'path': error.path,
+            'type': error.type_name,
+            'message': error.message,
+        }
+        for error in list(schema.error_log)[:MAX_REPORTED_ERRORS]
+    ]
+
+
+def get_schema_status():
+    """Estado de los XSD en este proceso (instalados / compilados)."""
+    return {
+        root_tag: {
+            'file': filename,
+            'installed': os.path.exists(_schema_path(root_tag)),
+            'compiled': _schemas.get(root_tag) is not None,
+        }
+        for root_tag, filename in SCHEMA_FILES.items()
+    }
@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""
+Almacén de artefactos de comprobantes (XML, XML firmado, RIDE PDF)
+apps/sri_integration/storage.py
+
+Backend de Django Storage para los FileField de los documentos:
+- Direccionado por contenido y agrupado por clave de acceso:
+  artifacts/<aaaa>/<mm>/<clave de acceso>/<tipo>-<sha256[:16]>.<ext>[.zst|.gz]
+  (máx. 99 caracteres: cabe en el max_length=100 de los FileField)
+- Cada artefacto se escribe una sola vez y de forma atómica (archivo temporal
+  en el mismo directorio + os.replace); volver a guardar el mismo contenido
+  (reintentos, regeneraciones) no escribe nada ni crea copias con sufijo
+- XML comprimido con zstd si `zstandard` está instalado, si no gzip; el PDF se
+  guarda tal cual (sus streams ya van comprimidos) y admite lectura por rangos
+  directa sobre el archivo
+- Lectura en streaming y por rangos (iter_chunks / read_range) para las
+  descargas con cabecera Range
+- También guarda el texto SOAP de las respuestas del SRI (ver response_log)
+- Los nombres antiguos (invoices/xml/..., invoices/pdf/...) se siguen leyendo
+  como archivos planos de MEDIA_ROOT
+
+Los blobs comprimidos no tienen ruta local utilizable: usar open() / read()
+en lugar de .path.
+"""
+
+import gzip
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.deconstruct import deconstructible
+from django.utils.http import content_disposition_header
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_PREFIX = 'artifacts'
+DIGEST_LENGTH = 16
+CHUNK_SIZE = 64 * 1024
+
+_ACCESS_KEY_RE = re.compile(r'(\d{49})')
+_COMPRESSED_SUFFIXES = ('.zst', '.gz')
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def artifact_kind(name):
+    """Tipo de artefacto según el nombre con que lo guarda el documento."""
+    base = os.path.basename(name).lower()
+    if base.endswith('.pdf'):
+        return 'ride'
+    if base.endswith('_authorization.xml'):
+        return 'auth'
+    if base.endswith('_reception.xml'):
+        return 'recep'
+    if base.endswith('_signed.xml') or 'firmado' in base:
+        return 'signed'
+    if base.endswith('.xml'):
+        return 'xml'
+    return 'file'
+
+
+def _access_key_of(name):
+    match = _ACCESS_KEY_RE.search(os.path.basename(name))
+    return match.group(1) if match else None
+
+
+@deconstructible
+class DocumentArtifactStorage(FileSystemStorage):
+    """FileSystemStorage direccionado por contenido, comprimido y deduplicado."""
+
+    def __init__(self, location=None, base_url=None, compression=None, compress_level=None,
+                 compress_extensions=None, enabled=None, **kwargs):
+        super().__init__(location=location, base_url=base_url, **kwargs)
+        self._compression = compression
+        self._compress_level = compress_level
+        self._compress_extensions = compress_extensions
+        self._enabled = enabled
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'writes': 0,
+            'dedup_hits': 0,
+            'bytes_in': 0,
+            'bytes_stored': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Configuración (se lee al usar, así los override de settings aplican)
+    # ------------------------------------------------------------------
+    @property
+    def enabled(self):
+        if self._enabled is not None:
+            return self._enabled
+        return getattr(settings, 'SRI_ARTIFACT_STORE', True)
+
+    @property
+    def compression(self):
+        compression = self._compression or getattr(settings, 'SRI_ARTIFACT_COMPRESSION', 'zstd')
+        if compression == 'zstd' and not ZSTD_AVAILABLE:
+            return 'gzip'
+        return compression
+
+    @property
+    def compress_level(self):
+        if self._compress_level is not None:
+            return self._compress_level
+        return getattr(settings, 'SRI_ARTIFACT_COMPRESS_LEVEL', 6 if self.compression == 'gzip' else 3)
+
+    @property
+    def compress_extensions(self):
+        return self._compress_extensions or ('.xml',)
+
+    def _count(self, **values):
+        with self._stats_lock:
+            for name, value in values.items():
+                self._stats[name] += value
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['compression'] = self.compression
+        stats['saved_bytes'] = stats['bytes_in'] - stats['bytes_stored']
+        return stats
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+    def _compress(self, data):
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor(level=self.compress_level, write_content_size=True).compress(data), '.zst'
+        if self.compression == 'gzip':
+            # mtime=0: mismo contenido -> mismos bytes
+            return gzip.compress(data, compresslevel=self.compress_level, mtime=0), '.gz'
+        return data, ''
+
+    def artifact_name(self, name, data):
+        """Nombre direccionado por contenido (sin sufijo de compresión)."""
+        digest = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+        access_key = _access_key_of(name)
+        if access_key:
+            # ddmmaaaa al inicio de la clave de acceso
+            folder = f"{access_key[4:8]}/{access_key[2:4]}/{access_key}"
+        else:
+            folder = f"misc/{digest[:2]}"
+        _, extension = os.path.splitext(name)
+        return f"{ARTIFACT_PREFIX}/{folder}/{artifact_kind(name)}-{digest}{extension.lower()}"
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre final lo decide _save a partir del contenido
+        if self.enabled:
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if not self.enabled:
+            return super()._save(name, content)
+
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        data = content.read()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        final_name = self.artifact_name(name, data)
+        payload, suffix = data, ''
+        if os.path.splitext(final_name)[1] in self.compress_extensions:
+            payload, suffix = self._compress(data)
+        final_name += suffix
+
+        full_path = self.path(final_name, raw=True)
+        if os.path.exists(full_path):
+            self._count(dedup_hits=1)
+            return final_name
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(payload)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+        self._count(writes=1, bytes_in=len(data), bytes_stored=len(payload))
+        return final_name
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+    @staticmethod
+    def is_compressed(name):
+        return name.endswith(_COMPRESSED_SUFFIXES)
+
+    def path(self, name, raw=False):
+        """Ruta local; los blobs comprimidos solo la exponen con raw=True."""
+        if self.is_compressed(name) and not raw:
+            raise NotImplementedError(
+                f"{name} está comprimido: usar storage.open() / read() en lugar de .path"
+            )
+        return super().path(name)
+
+    def exists(self, name):
+        return os.path.lexists(self.path(name, raw=True))
+
+    def delete(self, name):
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        try:
+            os.remove(self.path(name, raw=True))
+        except FileNotFoundError:
+            pass
+
+    def _decompress(self, name, payload):
+        if name.endswith('.zst'):
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError(f"zstandard no está instalado: no se puede leer {name}")
+            return zstandard.ZstdDecompressor().decompress(payload)
+        return gzip.decompress(payload)
+
+    def read(self, name):
+        """Contenido completo (descomprimido)."""
+        with open(self.path(name, raw=True), 'rb') as f:
+            payload = f.read()
+        return self._decompress(name, payload) if self.is_compressed(name) else payload
+
+    def _open(self, name, mode='rb'):
+        if not self.is_compressed(name):
+            return super()._open(name, mode)
+        if 'w' in mode or 'a' in mode:
+            raise ValueError("Los artefactos son inmutables")
+        # XML: pocos KB; un buffer en memoria admite seek / tell / rangos
+        return File(io.BytesIO(self.read(name)), name=os.path.basename(name))
+
+    def size(self, name):
+        """Tamaño del contenido descomprimido."""
+        if not self.is_compressed(name):
+            return super().size(name)
+        full_path = self.path(name, raw=True)
+        if name.endswith('.gz'):
+            # ISIZE: últimos 4 bytes del miembro gzip (contenido < 4 GiB)
+            with open(full_path, 'rb') as f:
+                f.seek(-4, io.SEEK_END)
+                return int.from_bytes(f.read(4), 'little')
+        with open(full_path, 'rb') as f:
+            header = f.read(18)
+        content_size = zstandard.frame_content_size(header) if ZSTD_AVAILABLE else -1
+        return content_size if content_size >= 0 else len(self.read(name))
+
+    def iter_chunks(self, name, start=0, end=None, chunk_size=CHUNK_SIZE):
+        """
+        Bytes [start, end] (end inclusivo, None = hasta el final) en bloques.
+        Los archivos planos se leen con seek; los comprimidos se descomprimen
+        en streaming descartando lo anterior a `start`.
+        """
+        remaining = None if end is None else end - start + 1
+        if remaining is not None and remaining <= 0:
+            return
+
+        if not self.is_compressed(name):
+            with open(self.path(name, raw=True), 'rb') as f:
+                f.seek(start)
+                while remaining is None or remaining > 0:
+                    block = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                    if not block:
+                        break
+                    if remaining is not None:
+                        remaining -= len(block)
+                    yield block
+            return
+
+        with open(self.path(name, raw=True), 'rb') as raw:
+            if name.endswith('.zst'):
+                reader = zstandard.ZstdDecompressor().stream_reader(raw)
+            else:
+                reader = gzip.GzipFile(fileobj=raw)
+            with reader:
+                skip = start
+                while skip > 0:
+                    block = reader.read(min(chunk_size, skip))
+                    if not block:
+                        return
+                    skip -= len(block)
+                while remaining is None or remaining > 0:
+                    block = reader.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                    if not block:
+                        break
+                    if remaining is not None:
+                        remaining -= len(block)
+                    yield block
+
+    def read_range(self, name, start, end=None):
+        """Bytes [start, end] (end inclusivo)."""
+        return b''.join(self.iter_chunks(name, start, end))
+
+
+artifact_storage = DocumentArtifactStorage()
+
+
+def get_artifact_storage():
+    """Storage de los archivos de comprobantes (referenciado por los FileField)."""
+    return artifact_storage
+
+
+def read_artifact(field_file):
+    """Contenido (bytes) de un FieldFile de comprobante, esté o no comprimido."""
+    storage = field_file.storage
+    if hasattr(storage, 'read'):
+        return storage.read(field_file.name)
+    with field_file.open('rb') as f:
+        return f.read()
+
+
+def artifact_content_file(field_file):
+    """ContentFile con el contenido del artefacto (adjuntos de email, copias)."""
+    return ContentFile(read_artifact(field_file), name=os.path.basename(field_file.name))
+
+
+def artifact_exists(field_file):
+    """True si el FieldFile tiene nombre y el blob existe en su storage."""
+    return bool(field_file) and field_file.storage.exists(field_file.name)
+
+
+def artifact_size(field_file):
+    """Tamaño descomprimido del artefacto (0 si no existe)."""
+    try:
+        return field_file.storage.size(field_file.name)
+    except (OSError, ValueError):
+        return 0
+
+
+def _parse_range(header, size):
+    """(inicio, fin) inclusivo de un único rango `bytes=`; None si no aplica o no es satisfacible."""
+    match = _RANGE_RE.match((header or '').strip())
+    if not match or size == 0:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Sufijo: los últimos N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def artifact_response(request, field_file, filename, content_type):
+    """
+    Respuesta de descarga en streaming de un artefacto, con soporte de
+    `Range: bytes=` (206 / 416) para reanudar descargas del RIDE.
+    """
+    storage = field_file.storage
+    name = field_file.name
+    size = storage.size(name)
+
+    range_header = request.META.get('HTTP_RANGE')
+    byte_range = _parse_range(range_header, size) if range_header else None
+    if range_header and byte_range is None and _RANGE_RE.match(range_header.strip()):
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    if hasattr(storage, 'iter_chunks'):
+        chunks = storage.iter_chunks(name, start, end)
+    else:
+        chunks = _iter_file(field_file, start, end)
+
+    response = StreamingHttpResponse(chunks, content_type=content_type, status=206 if byte_range else 200)
+    response['Content-Length'] = str(end - start + 1 if size else 0)
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def _iter_file(field_file, start, end, chunk_size=CHUNK_SIZE):
+    with field_file.open('rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = f.read(min(chunk_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
@@ -12,12 +12,15 @@ Tareas en background para autorización automática de documentos SRI
 
 import logging
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 from django.db import transaction
-from .models import ElectronicDocument, SRIResponse
+from .models import ElectronicDocument
 from .services.soap_client import SRISOAPClient
 from .services.document_processor import DocumentProcessor
+from .services.authorization_poller import AuthorizationPoller, claim_access_keys, release_access_keys
+from .services.circuit_breaker import CIRCUIT_OPEN_PREFIX, is_sri_available, pop_parked_documents
 
 logger = logging.getLogger(__name__)
 
@@ -56,9 +59,16 @@ def check_document_authorization_async(self, document_id):
             logger.warning(f"⏰ [CELERY] Document {document_id} timeout after 24 hours")
             return False
         
-        # Verificar autorización en el SRI
-        sri_client = SRISOAPClient(document.company)
-        success, message = sri_client.get_document_authorization(document)
+        # Verificar autorización en el SRI (salvo que otra tarea ya la esté consultando)
+        claimed = claim_access_keys([document.access_key])
+        if not claimed:
+            logger.info(f"ℹ️ [CELERY] Authorization for document {document_id} already in flight, skipping")
+            return False
+        try:
+            sri_client = SRISOAPClient(document.company)
+            success, message = sri_client.get_document_authorization(document)
+        finally:
+            release_access_keys(claimed)
         
         if success:
             logger.info(f"🎉 [CELERY] Document {document_id} AUTHORIZED: {document.sri_authorization_code}")
@@ -118,7 +128,8 @@ def process_document_async(document_id):
         
         success, message = processor.process_document(document)
         
-        if success and document.status == 'SENT':
+        # En modo asíncrono el procesador ya programó finalize_document_async
+        if success and document.status == 'SENT' and not getattr(settings, 'SRI_ASYNC_AUTHORIZATION', True):
             # Programar verificación de autorización automática
             logger.info(f"📅 [CELERY] Scheduling authorization check for document {document_id}")
             check_document_authorization_async.apply_async(
@@ -143,50 +154,93 @@ def process_document_async(document_id):
         logger.error(f"❌ [CELERY] {error_msg}")
         return {'success': False, 'message': error_msg}
 
+@shared_task(bind=True, max_retries=None)
+def finalize_document_async(self, document_id, send_email=True):
+    """
+    ✅ TAREA: Etapa de autorización de un documento ya recibido por el SRI
+
+    Consulta la autorización una sola vez; si sigue en proceso se reprograma
+    con countdown (sin time.sleep), y al autorizarse genera el PDF, envía el
+    email y consume la factura del plan.
+
+    Args:
+        document_id (int): ID del documento en SENT
+        send_email (bool): Enviar email al cliente al autorizarse
+    """
+    timeouts = getattr(settings, 'SRI_TIMEOUTS', {})
+    max_attempts = timeouts.get('authorization_max_attempts', 10)
+    wait_seconds = timeouts.get('authorization_wait_seconds', 30)
+
+    try:
+        document = ElectronicDocument.objects.select_related('company').get(id=document_id)
+    except ElectronicDocument.DoesNotExist:
+        logger.error(f"❌ [CELERY] Document {document_id} not found for finalization")
+        return {'success': False, 'message': 'Document not found'}
+
+    claimed = claim_access_keys([document.access_key])
+    if not claimed:
+        # El poller u otra tarea está consultando o finalizando esta clave
+        # (también en AUTHORIZED: evita el doble email / consumo): reintentar después
+        finished, message = False, 'Authorization query already in flight'
+    else:
+        try:
+            processor = DocumentProcessor(document.company)
+            finished, message = processor.finalize_document(document, send_email=send_email)
+        except Exception as e:
+            logger.error(f"❌ [CELERY] Error finalizing document {document_id}: {e}")
+            finished, message = False, str(e)
+        finally:
+            release_access_keys(claimed)
+
+    if not finished and message.startswith(CIRCUIT_OPEN_PREFIX):
+        # SRI no disponible: sin reintentos, check_all_pending_authorizations lo retoma
+        logger.warning(f"🔌 [CELERY] Authorization endpoint unavailable, document {document_id} left in SENT")
+    elif not finished:
+        if self.request.retries + 1 < max_attempts:
+            logger.info(f"⏳ [CELERY] Document {document_id} pending, retry "
+                        f"{self.request.retries + 1}/{max_attempts} in {wait_seconds}s")
+            raise self.retry(countdown=wait_seconds)
+
+        # check_all_pending_authorizations continuará con los documentos en SENT
+        logger.warning(f"⏰ [CELERY] Document {document_id} still pending after {max_attempts} attempts")
+
+    logger.info(f"✅ [CELERY] Document {document_id} finalization: {document.status} - {message}")
+    return {
+        'success': finished,
+        'message': message,
+        'document_id': document_id,
+        'status': document.status
+    }
+
 @shared_task
 def check_all_pending_authorizations():
     """
     ✅ TAREA PERIÓDICA: Verificar todos los documentos pendientes de autorización
     
-    Ejecutada automáticamente cada 5 minutos por Celery Beat
+    Ejecutada automáticamente cada 5 minutos por Celery Beat.
+    Consulta en lote todas las claves en SENT (AuthorizationPoller) en lugar
+    de encolar una tarea por documento; los autorizados pasan a
+    finalize_document_async para PDF, email y consumo del plan.
     """
     try:
         logger.info("🔍 [CELERY_BEAT] Checking all pending authorizations")
         
-        # Obtener documentos en SENT de las últimas 24 horas
-        time_limit = timezone.now() - timedelta(hours=24)
-        pending_docs = ElectronicDocument.objects.filter(
-            status='SENT',
-            created_at__gte=time_limit
-        ).select_related('company')
-        
-        total_docs = pending_docs.count()
-        if total_docs == 0:
-            logger.info("ℹ️ [CELERY_BEAT] No pending documents found")
-            return {'checked': 0, 'scheduled': 0}
+        stats = AuthorizationPoller().poll()
         
-        logger.info(f"📊 [CELERY_BEAT] Found {total_docs} pending documents")
-        
-        scheduled_count = 0
-        for doc in pending_docs:
+        finalized_count = 0
+        for document_id in stats.pop('authorized_ids', []):
             try:
-                # Verificar si ya hay una tarea programada para este documento
-                # (esto es una simplificación - en producción podrías usar Redis para tracking)
-                
-                # Programar verificación inmediata
-                check_document_authorization_async.delay(doc.id)
-                scheduled_count += 1
-                
+                finalize_document_async.delay(document_id)
+                finalized_count += 1
             except Exception as e:
-                logger.error(f"❌ [CELERY_BEAT] Error scheduling check for document {doc.id}: {e}")
+                logger.error(f"❌ [CELERY_BEAT] Error scheduling finalization for document {document_id}: {e}")
         
-        logger.info(f"✅ [CELERY_BEAT] Scheduled authorization checks for {scheduled_count}/{total_docs} documents")
+        logger.info(f"✅ [CELERY_BEAT] Checked {stats['checked']} documents, "
+                    f"{finalized_count} scheduled for finalization")
         
-        return {
-            'checked': total_docs,
-            'scheduled': scheduled_count,
-            'timestamp': timezone.now().isoformat()
-        }
+        stats['scheduled'] = finalized_count
+        stats['timestamp'] = timezone.now().isoformat()
+        return stats
         
     except Exception as e:
         logger.error(f"❌ [CELERY_BEAT] Error in check_all_pending_authorizations: {e}")
@@ -195,26 +249,27 @@ def check_all_pending_authorizations():
 @shared_task
 def cleanup_old_sri_responses():
     """
-    ✅ TAREA PERIÓDICA: Limpiar respuestas SRI antiguas
+    ✅ TAREA PERIÓDICA: Retención de logs (SRIResponse, AuditLog, CertificateUsageLog)
     
-    Ejecutada automáticamente cada 24 horas por Celery Beat
+    Ejecutada automáticamente cada 24 horas por Celery Beat. Archiva cada mes
+    a JSONL gzip y borra por lotes keyset (ver services/log_retention.py);
+    retorna las métricas de duración y tiempo de bloqueo por tabla.
     """
     try:
-        logger.info("🧹 [CELERY_CLEANUP] Starting SRI responses cleanup")
-        
-        # Eliminar respuestas de más de 30 días
-        cutoff_date = timezone.now() - timedelta(days=30)
+        from .services.log_retention import run_retention
         
-        old_responses = SRIResponse.objects.filter(created_at__lt=cutoff_date)
-        count = old_responses.count()
+        logger.info("🧹 [CELERY_CLEANUP] Starting log retention")
+        result = run_retention()
         
-        if count > 0:
-            old_responses.delete()
-            logger.info(f"🗑️ [CELERY_CLEANUP] Deleted {count} old SRI responses")
+        if result['deleted']:
+            logger.info(
+                f"🗑️ [CELERY_CLEANUP] Archived {result['archived']} and deleted {result['deleted']} log rows "
+                f"in {result['runtime_s']}s (max lock {result['lock_ms_max']} ms)"
+            )
         else:
-            logger.info("ℹ️ [CELERY_CLEANUP] No old SRI responses to delete")
+            logger.info("ℹ️ [CELERY_CLEANUP] No old log rows to delete")
         
-        return {'deleted_responses': count, 'cutoff_date': cutoff_date.isoformat()}
+        return result
         
     except Exception as e:
         logger.error(f"❌ [CELERY_CLEANUP] Error in cleanup_old_sri_responses: {e}")
@@ -269,39 +324,121 @@ def send_authorization_notification_email(document_id):
         return {'sent': False, 'error': error_msg}
 
 @shared_task
-def bulk_process_documents(document_ids):
+def process_documents_batch_async(company_id, document_ids, send_email=True):
     """
-    ✅ TAREA: Procesar múltiples documentos en lote
+    ✅ TAREA: Enviar varios documentos de una empresa en lote masivo al SRI
+    
+    Genera y firma cada documento, los envía agrupados en lotes
+    (validarComprobante con clave de acceso de lote) y programa la etapa
+    de autorización para los recibidos.
     
     Args:
-        document_ids (list): Lista de IDs de documentos a procesar
-        
-    Returns:
-        dict: Resumen del procesamiento en lote
+        company_id (int): ID de la empresa emisora
+        document_ids (list): IDs de documentos de esa empresa
+        send_email (bool): Enviar email al autorizarse
     """
     try:
-        logger.info(f"📦 [CELERY_BULK] Processing {len(document_ids)} documents in bulk")
+        logger.info(f"📦 [CELERY_LOTE] Processing {len(document_ids)} documents for company {company_id} in batch")
+        
+        documents = list(
+            ElectronicDocument.objects.filter(company_id=company_id, id__in=document_ids)
+            .exclude(status__in=['SENT', 'AUTHORIZED'])
+            .select_related('company', 'company__sri_configuration')
+            .order_by('id')
+        )
+        if not documents:
+            return {'total': 0, 'successful': 0, 'failed': 0, 'errors': []}
+        
+        processor = DocumentProcessor(documents[0].company)
+        batch_results = processor.submit_documents_batch(documents)
         
         results = {
-            'total': len(document_ids),
+            'total': len(documents),
             'successful': 0,
             'failed': 0,
             'errors': []
         }
         
-        for doc_id in document_ids:
-            try:
-                # Procesar cada documento de forma asíncrona
-                result = process_document_async.delay(doc_id)
+        for document_id, (success, message) in batch_results.items():
+            if success:
                 results['successful'] += 1
-                
+                if getattr(settings, 'SRI_ASYNC_AUTHORIZATION', True):
+                    schedule_document_finalization(document_id, send_email=send_email)
+                else:
+                    check_document_authorization_async.apply_async(args=[document_id], countdown=120)
+            else:
+                results['failed'] += 1
+                results['errors'].append({'document_id': document_id, 'error': message})
+        
+        logger.info(f"✅ [CELERY_LOTE] Batch completed for company {company_id}: "
+                   f"{results['successful']} received, {results['failed']} failed")
+        return results
+        
+    except Exception as e:
+        logger.error(f"❌ [CELERY_LOTE] Error in process_documents_batch_async: {e}")
+        return {'error': str(e)}
+
+def _dispatch_documents(document_ids):
+    """
+    Encola documentos para procesamiento: en lote masivo por empresa cuando
+    SRI_LOTE_ENABLED y hay más de un documento, uno por uno en otro caso.
+    
+    Returns:
+        tuple: (encolados, errores)
+    """
+    queued = 0
+    errors = []
+    
+    by_company = {}
+    for doc_id, company_id in ElectronicDocument.objects.filter(id__in=document_ids).values_list('id', 'company_id'):
+        by_company.setdefault(company_id, []).append(doc_id)
+    
+    use_batch = getattr(settings, 'SRI_LOTE_ENABLED', True)
+    
+    for company_id, company_doc_ids in by_company.items():
+        try:
+            if use_batch and len(company_doc_ids) > 1:
+                process_documents_batch_async.delay(company_id, company_doc_ids)
+                queued += len(company_doc_ids)
+                continue
+        except Exception as e:
+            logger.error(f"❌ [CELERY_BULK] Error queueing batch for company {company_id}: {e}")
+        
+        for doc_id in company_doc_ids:
+            try:
+                process_document_async.delay(doc_id)
+                queued += 1
             except Exception as e:
                 logger.error(f"❌ [CELERY_BULK] Error processing document {doc_id}: {e}")
-                results['failed'] += 1
-                results['errors'].append({
+                errors.append({
                     'document_id': doc_id,
                     'error': str(e)
                 })
+    
+    return queued, errors
+
+@shared_task
+def bulk_process_documents(document_ids):
+    """
+    ✅ TAREA: Procesar múltiples documentos en lote
+    
+    Args:
+        document_ids (list): Lista de IDs de documentos a procesar
+        
+    Returns:
+        dict: Resumen del procesamiento en lote
+    """
+    try:
+        logger.info(f"📦 [CELERY_BULK] Processing {len(document_ids)} documents in bulk")
+        
+        queued, errors = _dispatch_documents(document_ids)
+        
+        results = {
+            'total': len(document_ids),
+            'successful': queued,
+            'failed': len(errors),
+            'errors': errors
+        }
         
         logger.info(f"✅ [CELERY_BULK] Bulk processing completed: {results['successful']} successful, {results['failed']} failed")
         
@@ -317,37 +454,27 @@ def retry_failed_documents():
     ✅ TAREA PERIÓDICA: Reintentar documentos que fallaron
     
     Busca documentos en estado ERROR y los reintenta automáticamente
+    (en lote masivo por empresa cuando SRI_LOTE_ENABLED)
     """
     try:
         logger.info("🔄 [CELERY_RETRY] Looking for failed documents to retry")
         
         # Buscar documentos en ERROR de las últimas 6 horas
         time_limit = timezone.now() - timedelta(hours=6)
-        failed_docs = ElectronicDocument.objects.filter(
+        failed_ids = list(ElectronicDocument.objects.filter(
             status='ERROR',
             updated_at__gte=time_limit
-        ).select_related('company')
+        ).values_list('id', flat=True))
         
-        retry_count = 0
-        for doc in failed_docs:
-            try:
-                # Resetear estado para reintento
-                doc.status = 'GENERATED'
-                doc.save(update_fields=['status'])
-                
-                # Procesar nuevamente
-                process_document_async.delay(doc.id)
-                retry_count += 1
-                
-                logger.info(f"🔄 [CELERY_RETRY] Scheduled retry for document {doc.id}")
-                
-            except Exception as e:
-                logger.error(f"❌ [CELERY_RETRY] Error scheduling retry for document {doc.id}: {e}")
+        # Resetear estado para reintento
+        ElectronicDocument.objects.filter(id__in=failed_ids).update(status='GENERATED', updated_at=timezone.now())
+        
+        retry_count, errors = _dispatch_documents(failed_ids)
         
         logger.info(f"✅ [CELERY_RETRY] Scheduled {retry_count} document retries")
         
         return {
-            'found_failed': failed_docs.count(),
+            'found_failed': len(failed_ids),
             'scheduled_retries': retry_count,
             'timestamp': timezone.now().isoformat()
         }
@@ -356,6 +483,41 @@ def retry_failed_documents():
         logger.error(f"❌ [CELERY_RETRY] Error in retry_failed_documents: {e}")
         return {'error': str(e)}
 
+@shared_task
+def resume_parked_documents():
+    """
+    ✅ TAREA PERIÓDICA: Reenviar documentos aparcados por circuito abierto
+    
+    Solo reenvía cuando el circuito de recepción del ambiente ya no está abierto.
+    """
+    try:
+        resumed = {}
+        for environment in ('TEST', 'PRODUCTION'):
+            if not is_sri_available(environment, 'reception'):
+                logger.info(f"🔌 [CELERY_PARKED] SRI {environment} reception still unavailable")
+                continue
+            
+            document_ids = pop_parked_documents(environment)
+            if not document_ids:
+                continue
+            
+            pending_ids = list(ElectronicDocument.objects.filter(
+                id__in=document_ids
+            ).exclude(status__in=['SENT', 'AUTHORIZED']).values_list('id', flat=True))
+            
+            queued, errors = _dispatch_documents(pending_ids)
+            resumed[environment] = queued
+            logger.info(f"✅ [CELERY_PARKED] Resumed {queued} parked documents for {environment}")
+        
+        return {
+            'resumed': resumed,
+            'timestamp': timezone.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"❌ [CELERY_PARKED] Error in resume_parked_documents: {e}")
+        return {'error': str(e)}
+
 @shared_task
 def generate_daily_report():
     """
@@ -439,6 +601,33 @@ def schedule_authorization_check(document_id, delay_minutes=2):
         logger.error(f"❌ [HELPER] Error scheduling authorization check for document {document_id}: {e}")
         return False
 
+def schedule_document_finalization(document_id, send_email=True, delay_seconds=10):
+    """
+    ✅ FUNCIÓN HELPER: Programar la etapa de autorización de un documento
+
+    Se encola al confirmarse la transacción actual para que el worker vea
+    el documento ya en SENT.
+
+    Args:
+        document_id (int): ID del documento
+        send_email (bool): Enviar email al autorizarse
+        delay_seconds (int): Segundos de espera antes de la primera consulta
+    """
+    def _enqueue():
+        try:
+            task = finalize_document_async.apply_async(
+                args=[document_id],
+                kwargs={'send_email': send_email},
+                countdown=delay_seconds
+            )
+            logger.info(f"📅 [HELPER] Finalization scheduled for document {document_id} "
+                       f"in {delay_seconds} seconds (task: {task.id})")
+        except Exception as e:
+            logger.error(f"❌ [HELPER] Error scheduling finalization for document {document_id}: {e}")
+
+    transaction.on_commit(_enqueue)
+    return True
+
 def schedule_document_processing(document_id, delay_seconds=0):
     """
     ✅ FUNCIÓN HELPER: Programar procesamiento de documento
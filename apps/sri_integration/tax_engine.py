@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de impuestos y totales de comprobantes
+apps/sri_integration/tax_engine.py
+
+Un solo cálculo compartido por las vistas de la API, los save() de los modelos
+y el generador XML:
+- Aritmética Decimal exacta (sin pasar por float), redondeo ROUND_HALF_UP al centavo
+- Subtotal por línea: (cantidad × precio unitario) - descuento, redondeado a 0.01;
+  cantidad y precio se normalizan a 6 decimales y el descuento a 2, igual que
+  se guardan en DocumentItem
+- Impuesto por línea: round(subtotal × tarifa / 100); el total por código
+  (código de impuesto, código de porcentaje) es la suma exacta de los valores
+  por línea, así detalle, totalConImpuestos e importeTotal del XML cuadran al centavo
+- Una sola pasada sobre los ítems; modo lote (keep_lines=False) para miles de
+  líneas sin crear un resultado por línea
+- Valores que ya son Decimal se reutilizan sin Decimal(str(...))
+"""
+
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.conf import settings
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+MICRO = Decimal('0.000001')  # cantidad y precio unitario: 6 decimales (DocumentItem)
+HUNDRED = Decimal('100')
+
+# Límites de los importes (DecimalField max_digits=12 de DocumentItem / DocumentTax)
+MAX_UNIT_VALUE = Decimal('999999.999999')     # cantidad y precio unitario: 6 decimales
+MAX_AMOUNT = Decimal('9999999999.99')         # descuento, subtotal e impuesto: 2 decimales
+MAX_DOCUMENT_TOTAL = Decimal('99999999999.99')  # Límite realista para documentos
+
+IVA_TAX_CODE = '2'
+
+# Tabla 17 de la ficha técnica: código de porcentaje IVA -> tarifa (%)
+IVA_RATES = {
+    '0': Decimal('0'),
+    '2': Decimal('12'),
+    '3': Decimal('14'),
+    '4': Decimal('15'),
+    '5': Decimal('5'),
+    '6': Decimal('0'),   # No objeto de impuesto
+    '7': Decimal('0'),   # Exento de IVA
+    '8': Decimal('8'),
+    '10': Decimal('13'),
+}
+
+# Exponentes de cuantización precalculados por número de decimales
+_QUANTIZERS = {places: Decimal(1).scaleb(-places) for places in range(7)}
+
+LineTax = namedtuple('LineTax', 'tax_code percentage_code rate base amount')
+LineResult = namedtuple('LineResult', 'quantity unit_price discount subtotal tax')
+TaxTotal = namedtuple('TaxTotal', 'tax_code percentage_code rate base amount')
+DocumentTotals = namedtuple('DocumentTotals', 'lines taxes subtotal total_discount total_tax total')
+
+
+def default_percentage_code():
+    """Código de porcentaje IVA por defecto (SRI_DEFAULT_IVA_PERCENTAGE_CODE)."""
+    return str(getattr(settings, 'SRI_DEFAULT_IVA_PERCENTAGE_CODE', '4'))
+
+
+def to_decimal(value):
+    """
+    Decimal exacto de un valor numérico. Los Decimal se retornan tal cual;
+    los float se convierten por su representación corta (0.1 -> Decimal('0.1')).
+
+    Raises:
+        ValueError si el valor no es numérico
+    """
+    if value.__class__ is Decimal:
+        return value
+    if value is None or value == '':
+        return ZERO
+    if isinstance(value, int):
+        return Decimal(value)
+    try:
+        if isinstance(value, float):
+            return Decimal(repr(value))
+        return Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"Valor numérico inválido: {value!r}")
+
+
+def quantize(value, places=2):
+    """Redondeo ROUND_HALF_UP a `places` decimales."""
+    return to_decimal(value).quantize(_QUANTIZERS[places], rounding=ROUND_HALF_UP)
+
+
+def format_amount(value, max_decimals=2):
+    """
+    Texto para el XML del SRI: 2 decimales fijos, o hasta `max_decimals`
+    sin ceros sobrantes (mínimo 2) para cantidades y precios unitarios.
+    """
+    amount = to_decimal(value).quantize(_QUANTIZERS[max_decimals], rounding=ROUND_HALF_UP)
+    if max_decimals <= 2:
+        return f"{amount:.{max_decimals}f}"
+
+    text = f"{amount:f}"
+    whole, _, decimals = text.partition('.')
+    decimals = decimals.rstrip('0')
+    if len(decimals) < 2:
+        decimals = decimals.ljust(2, '0')
+    return f"{whole}.{decimals}"
+
+
+def line_subtotal(quantity, unit_price, discount=ZERO):
+    """Subtotal de una línea: (cantidad × precio) - descuento, redondeado al centavo."""
+    return (to_decimal(quantity) * to_decimal(unit_price) - to_decimal(discount)).quantize(
+        CENT, rounding=ROUND_HALF_UP
+    )
+
+
+def tax_amount(base, rate):
+    """Valor del impuesto de una base a una tarifa (%), redondeado al centavo."""
+    return (to_decimal(base) * to_decimal(rate) / HUNDRED).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def resolve_rate(percentage_code, rate_table=None):
+    """
+    Tarifa (%) de un código de porcentaje.
+
+    Raises:
+        ValueError si el código no está en la tabla
+    """
+    rate_table = IVA_RATES if rate_table is None else rate_table
+    try:
+        return rate_table[str(percentage_code)]
+    except KeyError:
+        raise ValueError(f"Código de porcentaje sin tarifa: {percentage_code}")
+
+
+def _field_getter(line):
+    if isinstance(line, dict):
+        return line.get
+    return lambda name, default=None: getattr(line, name, default)
+
+
+def compute_totals(lines, rate_table=None, percentage_code=None, tax_code=IVA_TAX_CODE,
+                   keep_lines=True, per_line_codes=True):
+    """
+    Totales de un comprobante en una sola pasada.
+
+    Args:
+        lines: iterable de dicts u objetos con quantity, unit_price, discount y
+            opcionalmente percentage_code / tax_code / tax_rate por línea
+        rate_table: código de porcentaje -> tarifa (por defecto IVA_RATES)
+        percentage_code: código para líneas que no traen uno
+            (por defecto SRI_DEFAULT_IVA_PERCENTAGE_CODE)
+        keep_lines: False para el modo lote (no se retorna el detalle por línea)
+        per_line_codes: False para ignorar los códigos de cada línea (documentos
+            sin impuestos por ítem)
+
+    Returns:
+        DocumentTotals(lines, taxes, subtotal, total_discount, total_tax, total)
+        con `taxes` ordenado por (tax_code, percentage_code)
+
+    Raises:
+        ValueError si un valor no es numérico o un código no tiene tarifa
+    """
+    rate_table = IVA_RATES if rate_table is None else rate_table
+    default_code = str(percentage_code) if percentage_code is not None else default_percentage_code()
+    default_rate = resolve_rate(default_code, rate_table)
+    default_key = (str(tax_code), default_code)
+
+    results = [] if keep_lines else None
+    totals = {}  # (tax_code, percentage_code) -> [tarifa, base, valor]
+    subtotal = ZERO
+    total_discount = ZERO
+
+    for line in lines:
+        get = _field_getter(line)
+        quantity = to_decimal(get('quantity')).quantize(MICRO, rounding=ROUND_HALF_UP)
+        unit_price = to_decimal(get('unit_price')).quantize(MICRO, rounding=ROUND_HALF_UP)
+        discount = to_decimal(get('discount')).quantize(CENT, rounding=ROUND_HALF_UP)
+        line_base = (quantity * unit_price - discount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+        code = get('percentage_code') if per_line_codes else None
+        if code is None:
+            key, rate = default_key, default_rate
+        else:
+            code = str(code)
+            explicit_rate = get('tax_rate')
+            rate = to_decimal(explicit_rate) if explicit_rate is not None else resolve_rate(code, rate_table)
+            key = (str(get('tax_code') or tax_code), code)
+
+        amount = (line_base * rate / HUNDRED).quantize(CENT, rounding=ROUND_HALF_UP)
+
+        entry = totals.get(key)
+        if entry is None:
+            totals[key] = [rate, line_base, amount]
+        else:
+            entry[1] += line_base
+            entry[2] += amount
+        subtotal += line_base
+        total_discount += discount
+
+        if keep_lines:
+            results.append(LineResult(
+                quantity, unit_price, discount, line_base,
+                LineTax(key[0], key[1], rate, line_base, amount),
+            ))
+
+    taxes = [TaxTotal(key[0], key[1], *totals[key]) for key in sorted(totals)]
+    total_tax = sum((tax.amount for tax in taxes), ZERO)
+
+    return DocumentTotals(
+        lines=results if keep_lines else [],
+        taxes=taxes,
+        subtotal=subtotal,
+        total_discount=total_discount,
+        total_tax=total_tax,
+        total=subtotal + total_tax,
+    )
+
+
+def compute_totals_batch(lines, rate_table=None, percentage_code=None, tax_code=IVA_TAX_CODE,
+                         per_line_codes=True):
+    """Modo lote: solo totales por código y del documento (miles de líneas)."""
+    return compute_totals(lines, rate_table, percentage_code, tax_code,
+                          keep_lines=False, per_line_codes=per_line_codes)
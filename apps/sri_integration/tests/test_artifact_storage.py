@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del almacén de artefactos de comprobantes (XML / RIDE)
+apps/sri_integration/tests/test_artifact_storage.py
+"""
+
+import tempfile
+from types import SimpleNamespace
+
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, SimpleTestCase
+
+from apps.sri_integration.storage import ZSTD_AVAILABLE, DocumentArtifactStorage, artifact_response
+
+ACCESS_KEY = '1510202601179001234500120010010000000011234567813'
+XML = (
+    '<?xml version="1.0" encoding="UTF-8"?><factura id="comprobante" version="1.1.0">'
+    + '<detalle><descripcion>Café molido 500 g</descripcion></detalle>' * 200
+    + '</factura>'
+).encode('utf-8')
+
+
+class DocumentArtifactStorageTests(SimpleTestCase):
+
+    def setUp(self):
+        self.location = self.enterContext(tempfile.TemporaryDirectory())
+
+    def storage(self, compression):
+        return DocumentArtifactStorage(location=self.location, compression=compression, enabled=True)
+
+    def test_compressed_round_trip(self):
+        compressions = [('gzip', '.gz')] + ([('zstd', '.zst')] if ZSTD_AVAILABLE else [])
+        for compression, suffix in compressions:
+            with self.subTest(compression=compression):
+                storage = self.storage(compression)
+
+                name = storage.save(f'invoices/xml/{ACCESS_KEY}.xml', ContentFile(XML))
+
+                self.assertTrue(name.startswith(f'artifacts/2026/10/{ACCESS_KEY}/xml-'))
+                self.assertTrue(name.endswith(f'.xml{suffix}'))
+                with open(storage.path(name, raw=True), 'rb') as f:
+                    self.assertLess(len(f.read()), len(XML))
+                self.assertEqual(storage.read(name), XML)
+                self.assertEqual(storage.size(name), len(XML))
+                with storage.open(name) as f:
+                    self.assertEqual(f.read(), XML)
+                self.assertEqual(storage.read_range(name, 10, 19), XML[10:20])
+                with self.assertRaises(NotImplementedError):
+                    storage.path(name)
+
+    def test_same_content_is_stored_once(self):
+        storage = self.storage('gzip')
+
+        first = storage.save(f'invoices/xml/{ACCESS_KEY}.xml', ContentFile(XML))
+        second = storage.save(f'invoices/xml/{ACCESS_KEY}.xml', ContentFile(XML))
+
+        self.assertEqual(first, second)
+        self.assertEqual(storage.get_stats()['dedup_hits'], 1)
+
+    def test_pdf_is_stored_uncompressed(self):
+        storage = self.storage('gzip')
+        pdf = b'%PDF-1.4\n' + b'0' * 1000
+
+        name = storage.save(f'invoices/pdf/{ACCESS_KEY}.pdf', ContentFile(pdf))
+
+        self.assertTrue(name.endswith('.pdf'))
+        self.assertEqual(storage.size(name), len(pdf))
+        self.assertEqual(storage.read_range(name, 1000), pdf[1000:])
+
+
+class ArtifactResponseTests(SimpleTestCase):
+
+    def setUp(self):
+        location = self.enterContext(tempfile.TemporaryDirectory())
+        storage = DocumentArtifactStorage(location=location, compression='gzip', enabled=True)
+        name = storage.save(f'invoices/xml/{ACCESS_KEY}.xml', ContentFile(XML))
+        self.field_file = SimpleNamespace(storage=storage, name=name)
+        self.factory = RequestFactory()
+
+    def download(self, **headers):
+        request = self.factory.get('/download/', **headers)
+        return artifact_response(request, self.field_file, f'{ACCESS_KEY}.xml', 'application/xml')
+
+    def test_full_download_is_decompressed(self):
+        response = self.download()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(XML)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn(f'{ACCESS_KEY}.xml', response['Content-Disposition'])
+        self.assertEqual(b''.join(response.streaming_content), XML)
+
+    def test_range_request_returns_partial_content(self):
+        response = self.download(HTTP_RANGE='bytes=100-199')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(XML)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), XML[100:200])
+
+    def test_suffix_range_returns_the_tail(self):
+        response = self.download(HTTP_RANGE='bytes=-10')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), XML[-10:])
+
+    def test_unsatisfiable_range(self):
+        response = self.download(HTTP_RANGE=f'bytes={len(XML)}-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(XML)}')
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la configuración efectiva de Celery
+apps/sri_integration/tests/test_celery_config.py
+
+vendo_sri/celery.py sobrescribe beat_schedule y task_routes con app.conf.update,
+así que lo que cuenta es app.conf, no CELERY_BEAT_SCHEDULE en settings.
+"""
+
+from django.test import SimpleTestCase
+
+from vendo_sri.celery import app
+
+
+class BeatScheduleTests(SimpleTestCase):
+
+    def scheduled_tasks(self):
+        return {entry['task'] for entry in app.conf.beat_schedule.values()}
+
+    def test_resume_parked_documents_is_scheduled(self):
+        self.assertIn('apps.sri_integration.tasks.resume_parked_documents', self.scheduled_tasks())
+
+    def test_settings_beat_entries_are_in_app_conf(self):
+        from django.conf import settings
+        expected = {entry['task'] for entry in settings.CELERY_BEAT_SCHEDULE.values()}
+        self.assertEqual(expected - self.scheduled_tasks(), set())
+
+
+class TaskRoutesTests(SimpleTestCase):
+
+    def test_finalize_document_async_goes_to_authorization_queue(self):
+        route = app.conf.task_routes['apps.sri_integration.tasks.finalize_document_async']
+        self.assertEqual(route['queue'], 'sri_authorization')
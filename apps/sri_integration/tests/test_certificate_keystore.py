@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del almacén compartido de claves de firma
+apps/sri_integration/tests/test_certificate_keystore.py
+"""
+
+import os
+from unittest import mock
+
+from cryptography import x509
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import serialization
+from django.test import SimpleTestCase, override_settings
+
+from apps.sri_integration.services import certificate_keystore
+from apps.sri_integration.services.certificate_keystore import _RELEASE_LOCK_SCRIPT, CertificateKeyStore
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+KEY = Fernet.generate_key().decode()
+SECRET_KEY = 'keystore-tests-secret-key-not-the-default'
+
+
+class FakeRedis:
+    """GET / SET NX EX / DEL y el script de liberación del lock, en memoria."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+    def register_script(self, script):
+        assert script == _RELEASE_LOCK_SCRIPT
+
+        def release(keys, args):
+            if self.data.get(keys[0]) == args[0].encode():
+                return self.delete(keys[0])
+            return 0
+        return release
+
+
+def _read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+@override_settings(SECRET_KEY=SECRET_KEY, CERTIFICATE_SHARED_KEYSTORE=True, CERTIFICATE_KEYSTORE_KEY=KEY)
+class CertificateKeyStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch.object(certificate_keystore, '_get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.private_key = serialization.load_pem_private_key(_read_fixture('test_signer.key.pem'), password=None)
+        self.certificate = x509.load_pem_x509_certificate(_read_fixture('test_signer.cert.pem'))
+
+    def _publish(self, keystore, version='1:0.000000'):
+        keystore.publish(7, version, self.private_key, self.certificate, [], load_ms=12.5)
+
+    def test_bundle_roundtrip(self):
+        keystore = CertificateKeyStore()
+        self._publish(keystore)
+
+        loaded = keystore.fetch(7, '1:0.000000')
+
+        self.assertEqual(loaded.source, 'keystore')
+        self.assertEqual(loaded.certificate, self.certificate)
+        self.assertEqual(loaded.private_key.private_numbers(), self.private_key.private_numbers())
+        self.assertIsNone(keystore.fetch(7, '1:9.000000'))
+
+    def test_bundle_needs_the_same_keystore_key(self):
+        self._publish(CertificateKeyStore())
+
+        with self.settings(CERTIFICATE_KEYSTORE_KEY=Fernet.generate_key().decode()):
+            keystore = CertificateKeyStore()
+            self.assertIsNone(keystore.fetch(7, '1:0.000000'))
+            self.assertEqual(keystore.get_stats()['invalid_bundles'], 1)
+
+    def test_key_rotation_keeps_reading_old_bundles(self):
+        self._publish(CertificateKeyStore())
+
+        with self.settings(CERTIFICATE_KEYSTORE_KEY=f"{Fernet.generate_key().decode()},{KEY}"):
+            self.assertIsNotNone(CertificateKeyStore().fetch(7, '1:0.000000'))
+
+    def test_disabled_without_keystore_key(self):
+        for value in ('', 'not-a-fernet-key'):
+            with self.subTest(key=value), self.settings(CERTIFICATE_KEYSTORE_KEY=value):
+                keystore = CertificateKeyStore()
+                self.assertFalse(keystore.enabled)
+                self.assertIn('CERTIFICATE_KEYSTORE_KEY', keystore.disabled_reason)
+
+    @override_settings(SECRET_KEY='django-insecure-vendo-sri-change-this-in-production')
+    def test_disabled_with_default_secret_key(self):
+        keystore = CertificateKeyStore()
+        self._publish(keystore)
+
+        self.assertFalse(keystore.enabled)
+        self.assertEqual(keystore.disabled_reason, 'SECRET_KEY por defecto en uso')
+        self.assertEqual(self.redis.data, {})
+
+    def test_loader_lock_is_released_only_by_its_owner(self):
+        keystore = CertificateKeyStore()
+        lock_key = keystore._lock_key(7)
+
+        token = keystore.acquire_loader(7)
+        self.assertTrue(token)
+        self.assertIsNone(keystore.acquire_loader(7))
+
+        # El lock venció y lo tomó otro proceso: liberar con el token viejo no lo borra
+        self.redis.delete(lock_key)
+        other = keystore.acquire_loader(7)
+        keystore.release_loader(7, token)
+        self.assertEqual(self.redis.get(lock_key), other.encode())
+
+        keystore.release_loader(7, other)
+        self.assertNotIn(lock_key, self.redis.data)
+
+    def test_without_redis_every_process_loads(self):
+        keystore = CertificateKeyStore()
+
+        with mock.patch.object(certificate_keystore, '_get_redis', return_value=None):
+            token = keystore.acquire_loader(7)
+            keystore.release_loader(7, token)
+
+        self.assertTrue(token)
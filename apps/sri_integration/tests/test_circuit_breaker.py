@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del guard de endpoints del SRI (circuit breaker + token bucket)
+apps/sri_integration/tests/test_circuit_breaker.py
+
+Los scripts Lua se sustituyen por funciones Python: aquí se prueba la espera
+del token, no la lógica del bucket en Redis.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.sri_integration.services.circuit_breaker import SRIEndpointGuard, SRIEndpointUnavailable
+
+
+class FakeScripts:
+    """allow / acquire / record / adapt con la firma de los scripts registrados."""
+
+    def __init__(self, allowed=1, waits=None):
+        self.allowed = allowed
+        self.waits = waits or []
+        self.calls = {'allow': 0, 'acquire': 0, 'record': 0, 'adapt': 0}
+        self.threads = set()
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+            self.threads.add(threading.current_thread().name)
+
+    def allow(self, keys, args):
+        self._count('allow')
+        return self.allowed
+
+    def acquire(self, keys, args):
+        # Devuelve las esperas de `waits` en orden y luego 0 (token tomado)
+        self._count('acquire')
+        return self.waits.pop(0) if self.waits else 0
+
+    def record(self, keys, args):
+        self._count('record')
+        return None
+
+    def adapt(self, keys, args):
+        self._count('adapt')
+        return 1
+
+    def as_dict(self):
+        return {'allow': self.allow, 'acquire': self.acquire, 'record': self.record, 'adapt': self.adapt}
+
+
+@override_settings(SRI_CIRCUIT_BREAKER_ENABLED=True, SRI_RATE_LIMIT_ENABLED=True, SRI_RATE_LIMIT_MAX_WAIT=10)
+class EndpointGuardWaitTests(SimpleTestCase):
+
+    def _guard(self, scripts):
+        guard = SRIEndpointGuard('TEST', 'reception')
+        guard._get_scripts = lambda: (None, scripts.as_dict())
+        guard._publish = mock.Mock()
+        return guard
+
+    def test_sync_path_sleeps_until_token(self):
+        scripts = FakeScripts(waits=[0.25, 0.5])
+        guard = self._guard(scripts)
+
+        with mock.patch('apps.sri_integration.services.circuit_breaker.time.sleep') as sleep:
+            guard.before_request()
+
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.25, 0.5])
+        self.assertEqual(scripts.calls['acquire'], 3)
+
+    def test_async_path_waits_with_asyncio_sleep(self):
+        scripts = FakeScripts(waits=[0.25, 0.5])
+        guard = self._guard(scripts)
+        sleeps = []
+
+        async def fake_sleep(seconds):
+            sleeps.append(seconds)
+
+        with mock.patch('apps.sri_integration.services.circuit_breaker.time.sleep') as thread_sleep, \
+                mock.patch('apps.sri_integration.services.circuit_breaker.asyncio.sleep', fake_sleep):
+            asyncio.run(guard.abefore_request())
+
+        self.assertEqual(sleeps, [0.25, 0.5])
+        thread_sleep.assert_not_called()
+        self.assertEqual(scripts.calls['acquire'], 3)
+
+    def test_waiting_requests_do_not_hold_executor_threads(self):
+        # 20 peticiones esperan 0.2 s cada una con un solo hilo para Redis:
+        # durmiendo en el hilo tardarían ~4 s, con asyncio.sleep ~0.2 s
+        scripts = FakeScripts(waits=[0.2] * 20)
+        guard = self._guard(scripts)
+
+        async def run():
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix='guard-test') as executor:
+                await asyncio.gather(*(guard.abefore_request(executor) for _ in range(20)))
+
+        started = time.monotonic()
+        asyncio.run(run())
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(scripts.calls['acquire'], 40)
+        self.assertEqual({name.split('_')[0] for name in scripts.threads}, {'guard-test'})
+
+    def test_async_path_rejects_when_wait_exceeds_deadline(self):
+        guard = self._guard(FakeScripts(waits=[60]))
+
+        with self.assertRaisesMessage(SRIEndpointUnavailable, 'rate limited'):
+            asyncio.run(guard.abefore_request())
+
+    def test_open_circuit_raises_without_acquiring(self):
+        scripts = FakeScripts(allowed=0)
+        guard = self._guard(scripts)
+
+        with self.assertRaisesMessage(SRIEndpointUnavailable, 'circuit open'):
+            asyncio.run(guard.abefore_request())
+        self.assertEqual(scripts.calls['acquire'], 0)
+
+    def test_redis_errors_fail_open(self):
+        scripts = FakeScripts()
+        scripts.allow = mock.Mock(side_effect=ConnectionError('redis down'))
+        scripts.acquire = mock.Mock(side_effect=ConnectionError('redis down'))
+        guard = self._guard(scripts)
+
+        guard.before_request()
+        asyncio.run(guard.abefore_request())
+
+    def test_async_after_request_records_result(self):
+        scripts = FakeScripts()
+        guard = self._guard(scripts)
+
+        asyncio.run(guard.aafter_request(True, 0.3))
+
+        self.assertEqual((scripts.calls['record'], scripts.calls['adapt']), (1, 1))
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de los pasos posteriores a la autorización (PDF, email, consumo del plan)
+apps/sri_integration/tests/test_document_completion.py
+"""
+
+import datetime
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.companies.models import Company
+from apps.sri_integration.models import ElectronicDocument, SRIConfiguration
+from apps.sri_integration.services.document_processor import DocumentProcessor
+
+
+class CompleteAuthorizedDocumentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(
+            ruc='1790012345001',
+            business_name='COMERCIAL ANDINA S.A.',
+            email='facturas@andina.ec',
+            address='Av. Amazonas N24-03 y Colón',
+        )
+        SRIConfiguration.objects.update_or_create(company=cls.company, defaults={'email_enabled': True})
+        cls.document = ElectronicDocument.objects.create(
+            company=cls.company,
+            document_type='INVOICE',
+            issue_date=datetime.date(2026, 10, 15),
+            customer_identification_type='05',
+            customer_identification='1712345678',
+            customer_name='José Pérez',
+            customer_email='jose@example.com',
+            subtotal_without_tax=Decimal('10.00'),
+            total_tax=Decimal('1.50'),
+            total_amount=Decimal('11.50'),
+            status='AUTHORIZED',
+        )
+
+    def setUp(self):
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.consume = self.enterContext(mock.patch.object(DocumentProcessor, '_consume_invoice_from_plan'))
+        self.email_service = self.enterContext(
+            mock.patch('apps.sri_integration.services.document_processor.EmailService')
+        )
+        self.send = self.email_service.return_value.send_document_email
+        self.send.return_value = (True, 'sent')
+        self.processor = DocumentProcessor(self.company)
+
+    def complete(self):
+        document = ElectronicDocument.objects.get(pk=self.document.pk)
+        self.processor._complete_authorized_document(document, send_email=True, generate_pdf=False)
+        return document
+
+    def test_email_is_sent_once_and_recorded(self):
+        self.complete()
+        self.complete()
+
+        self.send.assert_called_once()
+        self.document.refresh_from_db()
+        self.assertTrue(self.document.email_sent)
+        self.assertIsNotNone(self.document.email_sent_date)
+        self.assertEqual(self.consume.call_count, 2)
+
+    def test_concurrent_completion_during_send_does_not_send_again(self):
+        def send_while_another_worker_completes(document):
+            # El otro worker ve el email ya reclamado y no lo envía
+            self.assertTrue(ElectronicDocument.objects.get(pk=document.pk).email_sent)
+            self.complete()
+            return True, 'sent'
+
+        self.send.side_effect = send_while_another_worker_completes
+
+        self.complete()
+
+        self.send.assert_called_once()
+
+    def test_failed_send_releases_the_claim(self):
+        self.send.return_value = (False, 'SMTP down')
+
+        self.complete()
+        self.document.refresh_from_db()
+        self.assertFalse(self.document.email_sent)
+
+        self.send.return_value = (True, 'sent')
+        self.complete()
+        self.assertEqual(self.send.call_count, 2)
+        self.document.refresh_from_db()
+        self.assertTrue(self.document.email_sent)
+
+    def test_completion_does_not_overwrite_other_columns(self):
+        document = ElectronicDocument.objects.get(pk=self.document.pk)
+        # Otro proceso cambia el estado mientras este tiene la instancia en memoria
+        ElectronicDocument.objects.filter(pk=self.document.pk).update(sri_authorization_code='X123')
+
+        self.processor._complete_authorized_document(document, send_email=True, generate_pdf=False)
+
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.sri_authorization_code, 'X123')
+        self.assertTrue(self.document.email_sent)
+
+    def test_pdf_is_recorded_without_overwriting_the_row(self):
+        document = ElectronicDocument.objects.get(pk=self.document.pk)
+        ElectronicDocument.objects.filter(pk=self.document.pk).update(sri_authorization_code='X123')
+
+        with mock.patch('apps.sri_integration.services.document_processor.PDFGenerator') as generator:
+            generator.return_value.generate_invoice_pdf.return_value = b'%PDF-1.4 ride'
+            self.processor._complete_authorized_document(document, send_email=False)
+
+        self.document.refresh_from_db()
+        self.assertTrue(self.document.pdf_file.name.endswith('.pdf'))
+        self.assertEqual(self.document.sri_authorization_code, 'X123')
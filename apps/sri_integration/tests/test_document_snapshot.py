@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del snapshot precargado de documentos
+apps/sri_integration/tests/test_document_snapshot.py
+"""
+
+import datetime
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+
+from apps.companies.models import Company
+from apps.sri_integration.models import DocumentItem, DocumentTax, ElectronicDocument, SRIConfiguration
+from apps.sri_integration.services.document_processor import DocumentProcessor
+from apps.sri_integration.services.document_snapshot import SNAPSHOT_QUERY_COUNT, load_document_snapshot
+from apps.sri_integration.services.pdf_generator import PDFGenerator
+from apps.sri_integration.services.xml_generator import XMLGenerator
+
+ITEMS = 5
+
+
+@override_settings(SRI_VALIDATE_XML_SCHEMA=False)
+class DocumentSnapshotQueryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(
+            ruc='1790012345001',
+            business_name='COMERCIAL ANDINA S.A.',
+            trade_name='Andina',
+            email='facturas@andina.ec',
+            phone='022345678',
+            address='Av. Amazonas N24-03 y Colón',
+            ciudad='Quito',
+            provincia='Pichincha',
+        )
+        SRIConfiguration.objects.update_or_create(
+            company=cls.company,
+            defaults={'validate_xml_schema': False},
+        )
+
+        cls.document = ElectronicDocument.objects.create(
+            company=cls.company,
+            document_type='INVOICE',
+            issue_date=datetime.date(2026, 10, 15),
+            customer_identification_type='05',
+            customer_identification='1712345678',
+            customer_name='José Pérez',
+            subtotal_without_tax=Decimal('3.00') * ITEMS,
+            total_tax=Decimal('0.45') * ITEMS,
+            total_amount=Decimal('3.45') * ITEMS,
+        )
+        for index in range(ITEMS):
+            item = DocumentItem.objects.create(
+                document=cls.document,
+                main_code=f'P{index:03d}',
+                description=f'Producto {index}',
+                quantity=Decimal('2'),
+                unit_price=Decimal('1.50'),
+                discount=Decimal('0'),
+                subtotal=Decimal('3.00'),
+            )
+            DocumentTax.objects.create(
+                document=cls.document,
+                item=item,
+                tax_code='2',
+                percentage_code='4',
+                rate=Decimal('15'),
+                taxable_base=Decimal('3.00'),
+                tax_amount=Decimal('0.45'),
+            )
+        DocumentTax.objects.create(
+            document=cls.document,
+            tax_code='2',
+            percentage_code='4',
+            rate=Decimal('15'),
+            taxable_base=Decimal('3.00') * ITEMS,
+            tax_amount=Decimal('0.45') * ITEMS,
+        )
+
+    def test_xml_and_pdf_use_only_the_snapshot_queries(self):
+        with self.assertNumQueries(SNAPSHOT_QUERY_COUNT):
+            snapshot = load_document_snapshot(self.document.pk)
+            xml_content = XMLGenerator(snapshot).generate_invoice_xml()
+            pdf_content = PDFGenerator(snapshot).generate_invoice_pdf()
+
+        self.assertEqual(xml_content.count('<detalle>'), ITEMS)
+        self.assertTrue(pdf_content.startswith(b'%PDF'))
+
+    def test_query_count_does_not_grow_with_items(self):
+        DocumentItem.objects.create(
+            document=self.document,
+            main_code='EXTRA',
+            description='Producto extra',
+            quantity=Decimal('1'),
+            unit_price=Decimal('1.00'),
+            discount=Decimal('0'),
+            subtotal=Decimal('1.00'),
+        )
+
+        with self.assertNumQueries(SNAPSHOT_QUERY_COUNT):
+            snapshot = load_document_snapshot(self.document.pk)
+            XMLGenerator(snapshot).generate_invoice_xml()
+            PDFGenerator(snapshot).generate_invoice_pdf()
+
+    def test_processor_loads_the_snapshot_once_for_xml_and_pdf(self):
+        processor = DocumentProcessor(self.company)
+        document = ElectronicDocument.objects.get(pk=self.document.pk)
+
+        with self.assertNumQueries(SNAPSHOT_QUERY_COUNT):
+            XMLGenerator(processor._get_snapshot(document)).generate_invoice_xml()
+            PDFGenerator(processor._get_snapshot(document)).generate_invoice_pdf()
+
+    def test_snapshot_is_returned_as_is(self):
+        snapshot = load_document_snapshot(self.document.pk)
+
+        with self.assertNumQueries(0):
+            self.assertIs(load_document_snapshot(snapshot), snapshot)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la caché LRU / single-flight del GlobalCertificateManager
+apps/sri_integration/tests/test_global_certificate_manager.py
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from django.test import SimpleTestCase, override_settings
+
+from apps.sri_integration.services.global_certificate_manager import CertificateData, GlobalCertificateManager
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def _read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+@override_settings(MAX_CERTIFICATES_CACHE=2, CERTIFICATE_CACHE_TIMEOUT=3600, CERTIFICATE_LOAD_WAIT_TIMEOUT=5)
+class GlobalCertificateManagerCacheTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.private_key = serialization.load_pem_private_key(_read_fixture('test_signer.key.pem'), password=None)
+        cls.certificate = x509.load_pem_x509_certificate(_read_fixture('test_signer.cert.pem'))
+
+    def setUp(self):
+        # Instancia propia: el singleton del módulo no se comparte entre tests
+        self.manager = object.__new__(GlobalCertificateManager)
+        self.manager._initialized = False
+        self.manager.__init__()
+        self.loads = []
+        self.manager._load_certificate = self.load_certificate
+
+    def load_certificate(self, company_id):
+        self.loads.append(company_id)
+        cert_data = CertificateData(company_id, self.private_key, self.certificate, [], certificate_obj=None)
+        self.manager._store(company_id, cert_data)
+        return cert_data
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.manager.get_certificate(1)
+        self.manager.get_certificate(2)
+        self.manager.get_certificate(1)  # hit: 2 pasa a ser el menos usado
+
+        self.manager.get_certificate(3)
+
+        self.assertEqual(list(self.manager._certificates_cache), [1, 3])
+        self.assertEqual(self.manager._stats['evictions'], 1)
+
+        self.manager.get_certificate(2)
+
+        self.assertEqual(list(self.manager._certificates_cache), [3, 2])
+        self.assertEqual(self.loads, [1, 2, 3, 2])
+        self.assertEqual(self.manager._stats['cache_hits'], 1)
+        self.assertEqual(self.manager._stats['cache_misses'], 4)
+
+    def test_entry_past_ttl_is_reloaded(self):
+        first = self.manager.get_certificate(1)
+        first.cached_until = time.monotonic() - 1
+
+        second = self.manager.get_certificate(1)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(self.loads, [1, 1])
+        self.assertEqual(self.manager._stats['ttl_evictions'], 1)
+
+    def test_concurrent_cold_loads_share_one_load(self):
+        release = threading.Event()
+        load = self.load_certificate
+
+        def slow_load(company_id):
+            release.wait(5)
+            return load(company_id)
+
+        self.manager._load_certificate = slow_load
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(self.manager.get_certificate, 7) for _ in range(8)]
+            deadline = time.monotonic() + 5
+            while self.manager._stats['single_flight_waits'] < 7 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            release.set()
+            results = [future.result(timeout=5) for future in futures]
+
+        self.assertEqual(self.loads, [7])
+        self.assertEqual(self.manager._stats['single_flight_waits'], 7)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(self.manager._in_flight, {})
+
+    def test_cold_load_does_not_block_other_companies(self):
+        started, release = threading.Event(), threading.Event()
+        load = self.load_certificate
+
+        def slow_load(company_id):
+            if company_id == 7:
+                started.set()
+                release.wait(5)
+            return load(company_id)
+
+        self.manager._load_certificate = slow_load
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = executor.submit(self.manager.get_certificate, 7)
+            self.assertTrue(started.wait(5))
+
+            other = self.manager.get_certificate(8)
+
+            self.assertFalse(pending.done())
+            release.set()
+            pending.result(timeout=5)
+
+        self.assertEqual(other.company_id, 8)
+        self.assertEqual(self.loads, [8, 7])
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de JarWorker / JarWorkerPool contra un worker stub en Python que habla el
+protocolo de SriJarWorker (READY, OK, ERR) sin necesitar java ni sri.jar
+apps/sri_integration/tests/test_jar_signer.py
+"""
+
+import os
+import sys
+import tempfile
+import textwrap
+
+from django.test import SimpleTestCase
+
+from apps.sri_integration.services.jar_signer import JarSigningError, JarWorker, JarWorkerPool
+
+STUB_WORKER = textwrap.dedent('''
+    import base64
+    import os
+    import sys
+
+    print('READY', flush=True)
+    for line in sys.stdin:
+        p12, password, xml_in, out_dir, out_name = (
+            base64.b64decode(field).decode('utf-8') for field in line.rstrip('\\n').split('\\t')
+        )
+        with open(xml_in, 'rb') as f:
+            xml = f.read()
+        if b'<crash/>' in xml:
+            sys.exit(3)
+        if b'<fail/>' in xml:
+            message = base64.b64encode(b'firma rechazada').decode('ascii')
+            print('ERR\\t' + message, flush=True)
+            continue
+        if b'<hang/>' in xml:
+            sys.stdin.readline()
+        with open(os.path.join(out_dir, out_name), 'wb') as f:
+            f.write(b'<signed p12="' + p12.encode() + b'" pid="' + str(os.getpid()).encode() + b'">' + xml + b'</signed>')
+        print('OK', flush=True)
+''')
+
+
+class JarWorkerTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        stub_path = os.path.join(self.tmpdir.name, 'stub_worker.py')
+        with open(stub_path, 'w') as f:
+            f.write(STUB_WORKER)
+        self.command = [sys.executable, stub_path]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+class JarWorkerTests(JarWorkerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.worker = JarWorker(command=self.command, timeout=5, startup_timeout=10)
+
+    def tearDown(self):
+        self.worker.close()
+        super().tearDown()
+
+    def test_signs_several_documents_in_one_process(self):
+        first = self.worker.sign('/certs/1.p12', 'secret', '<a>ñ</a>')
+        second = self.worker.sign('/certs/1.p12', 'secret', b'<b/>')
+
+        self.assertTrue(first.startswith(b'<signed p12="/certs/1.p12"'))
+        self.assertTrue(first.endswith('<a>ñ</a></signed>'.encode('utf-8')))
+        pid = first.split(b'pid="')[1].split(b'"')[0]
+        self.assertIn(b'pid="' + pid + b'"', second)
+        self.assertEqual(self.worker.signed, 2)
+        self.assertEqual(self.worker.restarts, 0)
+
+    def test_rejected_document_keeps_worker_alive(self):
+        with self.assertRaisesMessage(JarSigningError, 'firma rechazada'):
+            self.worker.sign('/certs/1.p12', 'secret', '<fail/>')
+
+        self.worker.sign('/certs/1.p12', 'secret', '<a/>')
+        self.assertEqual(self.worker.restarts, 0)
+
+    def test_crashed_worker_is_restarted(self):
+        with self.assertRaises(JarSigningError):
+            self.worker.sign('/certs/1.p12', 'secret', '<crash/>')
+
+        self.assertTrue(self.worker.sign('/certs/1.p12', 'secret', '<a/>').endswith(b'<a/></signed>'))
+        self.assertEqual(self.worker.restarts, 1)
+
+    def test_hung_worker_is_killed_after_timeout(self):
+        self.worker.timeout = 0.5
+
+        with self.assertRaisesMessage(JarSigningError, 'did not answer'):
+            self.worker.sign('/certs/1.p12', 'secret', '<hang/>')
+
+        self.worker.timeout = 5
+        self.worker.sign('/certs/1.p12', 'secret', '<a/>')
+        self.assertEqual(self.worker.restarts, 1)
+
+    def test_unexpected_greeting_is_an_error(self):
+        worker = JarWorker(command=[sys.executable, '-c', 'print("HELLO")'], startup_timeout=10)
+
+        with self.assertRaisesMessage(JarSigningError, 'greeting'):
+            worker.start()
+        worker.close()
+
+    def test_missing_executable_is_an_error(self):
+        worker = JarWorker(command=[os.path.join(self.tmpdir.name, 'no-java')])
+
+        with self.assertRaisesMessage(JarSigningError, 'Could not start'):
+            worker.start()
+
+
+class JarWorkerPoolTests(JarWorkerTestCase):
+
+    def test_sign_many_keeps_order_and_per_item_errors(self):
+        pool = JarWorkerPool(size=3, command=self.command, timeout=5)
+        self.addCleanup(pool.close)
+        jobs = [('/certs/1.p12', 'secret', f'<doc n="{n}"/>' if n != 4 else '<fail/>') for n in range(10)]
+
+        results = pool.sign_many(jobs)
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[4], (False, 'firma rechazada'))
+        for n, (ok, signed) in enumerate(results):
+            if n != 4:
+                self.assertTrue(ok)
+                self.assertTrue(signed.endswith(f'<doc n="{n}"/></signed>'.encode()))
+        self.assertEqual(pool.stats(), {'workers': 3, 'signed': 9, 'restarts': 0})
+
+    def test_start_warms_every_worker(self):
+        pool = JarWorkerPool(size=2, command=self.command, timeout=5)
+        self.addCleanup(pool.close)
+
+        pool.start()
+
+        self.assertTrue(all(worker._process.poll() is None for worker in pool.workers))
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la retención mensual de logs (archivo + borrado por lotes)
+apps/sri_integration/tests/test_log_retention.py
+"""
+
+import datetime
+import gzip
+import json
+import os
+import tempfile
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.companies.models import Company
+from apps.sri_integration.models import ElectronicDocument, SRIResponse
+from apps.sri_integration.response_log import store_raw_payload
+from apps.sri_integration.services.log_retention import TableRetention, sri_payload_references
+from apps.sri_integration.storage import get_artifact_storage
+
+
+def _local(*args):
+    return timezone.make_aware(datetime.datetime(*args))
+
+
+class TableRetentionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(
+            ruc='1790012345001',
+            business_name='COMERCIAL ANDINA S.A.',
+            email='facturas@andina.ec',
+            address='Av. Amazonas N24-03 y Colón',
+        )
+        cls.document = ElectronicDocument.objects.create(
+            company=cls.company,
+            document_type='INVOICE',
+            issue_date=datetime.date(2026, 8, 10),
+            customer_identification_type='05',
+            customer_identification='1712345678',
+            customer_name='José Pérez',
+            subtotal_without_tax=Decimal('10.00'),
+            total_tax=Decimal('1.50'),
+            total_amount=Decimal('11.50'),
+            status='SENT',
+        )
+
+    def setUp(self):
+        self.archive_dir = self.enterContext(tempfile.TemporaryDirectory())
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(MEDIA_ROOT=media_root, LOG_ARCHIVE_DIR=self.archive_dir))
+        self.storage = get_artifact_storage()
+
+    def response(self, created_at, payload=None):
+        raw_payload = store_raw_payload(self.document.access_key, 'AUTHORIZATION', payload) if payload else ''
+        response = SRIResponse.objects.create(
+            document=self.document,
+            operation_type='AUTHORIZATION',
+            response_code='EN PROCESO',
+            response_message='Authorization response: EN PROCESO',
+            state='EN PROCESO',
+            raw_response={'estado': 'EN PROCESO'},
+            raw_payload=raw_payload,
+        )
+        SRIResponse.objects.filter(pk=response.pk).update(created_at=created_at)
+        return response
+
+    def test_two_months_are_archived_deleted_and_orphan_blobs_purged(self):
+        orphan = self.response(_local(2026, 8, 10, 12), '<soap>orphan</soap>')
+        shared_old = self.response(_local(2026, 8, 20, 12), '<soap>shared</soap>')
+        from_document = self.response(_local(2026, 9, 5, 12), '<soap>document</soap>')
+        without_payload = self.response(_local(2026, 9, 15, 12))
+        kept = self.response(_local(2026, 10, 5, 12), '<soap>shared</soap>')
+        self.assertEqual(shared_old.raw_payload.name, kept.raw_payload.name)
+        ElectronicDocument.objects.filter(pk=self.document.pk).update(
+            sri_response={'estado': 'EN PROCESO', 'raw_payload': from_document.raw_payload.name}
+        )
+
+        stats = TableRetention(
+            SRIResponse.objects.filter(document__company=self.company),
+            f'sri_responses/company-{self.company.id}',
+            cutoff=_local(2026, 10, 1),
+            batch_size=1,
+            blob_field='raw_payload',
+            blob_references=sri_payload_references,
+        ).run()
+
+        self.assertEqual(stats['months'], 2)
+        self.assertEqual(stats['archived'], 4)
+        self.assertEqual(stats['deleted'], 4)
+        self.assertEqual(stats['batches'], 4)
+        self.assertEqual(stats['blobs_deleted'], 1)
+        self.assertEqual(list(SRIResponse.objects.values_list('pk', flat=True)), [kept.pk])
+
+        # Archivo antes del borrado: un JSONL gzip por mes con las filas borradas
+        self.assertEqual(len(stats['archive_files']), 2)
+        archived = {}
+        for relative in stats['archive_files']:
+            with gzip.open(os.path.join(self.archive_dir, relative), 'rt', encoding='utf-8') as f:
+                archived[os.path.dirname(relative)] = [json.loads(line)['id'] for line in f]
+        prefix = f'sri_responses/company-{self.company.id}/2026'
+        self.assertEqual(archived, {
+            f'{prefix}/08': [orphan.pk, shared_old.pk],
+            f'{prefix}/09': [from_document.pk, without_payload.pk],
+        })
+
+        # Solo se purga el blob que ya nadie referencia
+        self.assertFalse(self.storage.exists(orphan.raw_payload.name))
+        self.assertTrue(self.storage.exists(kept.raw_payload.name))
+        self.assertTrue(self.storage.exists(from_document.raw_payload.name))
+
+    def test_dry_run_only_counts(self):
+        self.response(_local(2026, 8, 10, 12), '<soap>orphan</soap>')
+
+        stats = TableRetention(
+            SRIResponse.objects.all(), 'sri_responses', cutoff=_local(2026, 10, 1), batch_size=10, dry_run=True
+        ).run()
+
+        self.assertEqual((stats['archived'], stats['deleted'], stats['months']), (1, 0, 1))
+        self.assertEqual(SRIResponse.objects.count(), 1)
+        self.assertEqual(os.listdir(self.archive_dir), [])
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la selección de la clave de firma en P12 multi-clave
+apps/sri_integration/tests/test_pkcs12_keys.py
+
+cryptography solo serializa P12 de una clave, así que los PFX multi-clave
+(firma + cifrado, como los de Security Data / BCE / Uanataca) se arman aquí
+con un codificador DER mínimo y su MAC PKCS#12.
+"""
+
+import datetime
+import hashlib
+import hmac
+import os
+
+from cryptography import x509
+from cryptography.hazmat.decrepit.ciphers.algorithms import TripleDES
+from cryptography.hazmat.primitives import hashes, padding, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.ciphers import Cipher, modes
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509.oid import NameOID
+from django.test import SimpleTestCase
+
+from apps.sri_integration.services.pkcs12_keys import extract_key_bags, load_signing_key
+
+PASSWORD = 'clave-de-prueba'
+NON_ASCII_PASSWORD = 'contraseña€Ñandú'
+
+_OID_DATA = '2a864886f70d010701'
+_OID_KEY_BAG = '2a864886f70d010c0a0101'
+_OID_SHROUDED_KEY_BAG = '2a864886f70d010c0a0102'
+_OID_CERT_BAG = '2a864886f70d010c0a0103'
+_OID_X509_CERTIFICATE = '2a864886f70d01091601'
+_OID_FRIENDLY_NAME = '2a864886f70d010914'
+_OID_LOCAL_KEY_ID = '2a864886f70d010915'
+_OID_PBE_SHA1_3DES = '2a864886f70d010c0103'
+_OID_SHA1 = '2b0e03021a'
+
+
+# ============================================================================
+# Codificador DER / BER mínimo
+# ============================================================================
+def _tlv(tag, content, indefinite=False):
+    if indefinite:
+        return bytes([tag, 0x80]) + content + b'\x00\x00'
+    length = len(content)
+    if length < 0x80:
+        header = bytes([length])
+    else:
+        size = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+        header = bytes([0x80 | len(size)]) + size
+    return bytes([tag]) + header + content
+
+
+def _seq(*items, indefinite=False):
+    return _tlv(0x30, b''.join(items), indefinite)
+
+
+def _set(*items):
+    return _tlv(0x31, b''.join(items))
+
+
+def _oid(hex_value):
+    return _tlv(0x06, bytes.fromhex(hex_value))
+
+
+def _int(value):
+    return _tlv(0x02, value.to_bytes((value.bit_length() + 8) // 8, 'big'))
+
+
+def _octets(value, indefinite=False):
+    if not indefinite:
+        return _tlv(0x04, value)
+    # OCTET STRING construido: trozos primitivos dentro de una longitud indefinida
+    chunks = [value[i:i + 64] for i in range(0, len(value), 64)]
+    return _tlv(0x24, b''.join(_tlv(0x04, chunk) for chunk in chunks), indefinite=True)
+
+
+def _explicit(content, indefinite=False):
+    return _tlv(0xA0, content, indefinite)
+
+
+# ============================================================================
+# PKCS#12 (RFC 7292): KDF, bolsas y PFX
+# ============================================================================
+def _bmp_password(password):
+    return password.encode('utf-16-be') + b'\x00\x00'
+
+
+def _pkcs12_kdf(password, salt, purpose, iterations, size):
+    """Apéndice B de RFC 7292 con SHA-1 (purpose 1 = clave, 2 = IV, 3 = MAC)."""
+    u, v = 20, 64
+    diversifier = bytes([purpose]) * v
+    password = _bmp_password(password)
+
+    def fill(value):
+        size = v * -(-len(value) // v)
+        return (value * (size // len(value) + 1))[:size] if value else b''
+
+    block = bytearray(fill(salt) + fill(password))
+    derived = b''
+    while len(derived) < size:
+        digest = hashlib.sha1(diversifier + bytes(block)).digest()
+        for _ in range(iterations - 1):
+            digest = hashlib.sha1(digest).digest()
+        derived += digest
+        increment = int.from_bytes((digest * (v // u + 1))[:v], 'big') + 1
+        for start in range(0, len(block), v):
+            chunk = (int.from_bytes(block[start:start + v], 'big') + increment) % (1 << (8 * v))
+            block[start:start + v] = chunk.to_bytes(v, 'big')
+    return derived[:size]
+
+
+def _private_key_info(private_key):
+    return private_key.private_bytes(
+        serialization.Encoding.DER,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+def _shrouded_aes(private_key, password):
+    """EncryptedPrivateKeyInfo PBES2 / AES-256-CBC (lo que genera OpenSSL 3)."""
+    return private_key.private_bytes(
+        serialization.Encoding.DER,
+        serialization.PrivateFormat.PKCS8,
+        serialization.BestAvailableEncryption(password.encode('utf-8')),
+    )
+
+
+def _shrouded_3des(private_key, password):
+    """EncryptedPrivateKeyInfo pbeWithSHAAnd3-KeyTripleDES-CBC (P12 legacy)."""
+    salt, iterations = os.urandom(8), 2048
+    key = _pkcs12_kdf(password, salt, 1, iterations, 24)
+    iv = _pkcs12_kdf(password, salt, 2, iterations, 8)
+    padder = padding.PKCS7(64).padder()
+    plain = padder.update(_private_key_info(private_key)) + padder.finalize()
+    encryptor = Cipher(TripleDES(key), modes.CBC(iv)).encryptor()
+    encrypted = encryptor.update(plain) + encryptor.finalize()
+    algorithm = _seq(_oid(_OID_PBE_SHA1_3DES), _seq(_octets(salt), _int(iterations)))
+    return _seq(algorithm, _octets(encrypted))
+
+
+def _attributes(friendly_name, local_key_id):
+    attributes = []
+    if friendly_name is not None:
+        attributes.append(_seq(_oid(_OID_FRIENDLY_NAME), _set(_tlv(0x1E, friendly_name.encode('utf-16-be')))))
+    attributes.append(_seq(_oid(_OID_LOCAL_KEY_ID), _set(_octets(local_key_id))))
+    return _set(*attributes)
+
+
+def _key_bag(private_key, certificate, friendly_name, password, encryption, indefinite=False):
+    local_key_id = certificate.fingerprint(hashes.SHA1())
+    if encryption == 'plain':
+        bag_id, value = _OID_KEY_BAG, _private_key_info(private_key)
+    elif encryption == '3des':
+        bag_id, value = _OID_SHROUDED_KEY_BAG, _shrouded_3des(private_key, password)
+    else:
+        bag_id, value = _OID_SHROUDED_KEY_BAG, _shrouded_aes(private_key, password)
+    return _seq(
+        _oid(bag_id),
+        _explicit(value, indefinite),
+        _attributes(friendly_name, local_key_id),
+        indefinite=indefinite,
+    )
+
+
+def _cert_bag(certificate, friendly_name):
+    der = certificate.public_bytes(serialization.Encoding.DER)
+    value = _seq(_oid(_OID_X509_CERTIFICATE), _explicit(_octets(der)))
+    return _seq(
+        _oid(_OID_CERT_BAG),
+        _explicit(value),
+        _attributes(friendly_name, certificate.fingerprint(hashes.SHA1())),
+    )
+
+
+def _data_content_info(content, indefinite=False):
+    return _seq(_oid(_OID_DATA), _explicit(_octets(content, indefinite), indefinite), indefinite=indefinite)
+
+
+def build_p12(entries, password=PASSWORD, encryption='aes', indefinite=False):
+    """
+    PFX con una bolsa de clave por entrada (clave, certificado, friendlyName)
+    y los certificados en SafeContents sin cifrar, firmado con MAC SHA-1.
+    """
+    key_bags = [
+        _key_bag(private_key, certificate, friendly_name, password, encryption, indefinite)
+        for private_key, certificate, friendly_name in entries
+    ]
+    cert_bags = [_cert_bag(certificate, friendly_name) for _, certificate, friendly_name in entries]
+    auth_safe = _seq(
+        _data_content_info(_seq(*key_bags, indefinite=indefinite), indefinite),
+        _data_content_info(_seq(*cert_bags)),
+        indefinite=indefinite,
+    )
+
+    salt, iterations = os.urandom(8), 2048
+    mac_key = _pkcs12_kdf(password, salt, 3, iterations, 20)
+    mac = hmac.new(mac_key, auth_safe, hashlib.sha1).digest()
+    mac_data = _seq(_seq(_seq(_oid(_OID_SHA1), b'\x05\x00'), _octets(mac)), _octets(salt), _int(iterations))
+    return _seq(_int(3), _data_content_info(auth_safe, indefinite), mac_data, indefinite=indefinite)
+
+
+# ============================================================================
+# Claves y certificados de prueba
+# ============================================================================
+def _certificate(private_key, common_name, signing):
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    usage = x509.KeyUsage(
+        digital_signature=signing, content_commitment=signing, key_encipherment=not signing,
+        data_encipherment=False, key_agreement=False, key_cert_sign=False, crl_sign=False,
+        encipher_only=False, decipher_only=False,
+    )
+    return (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(private_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=365))
+        .add_extension(usage, critical=True)
+        .sign(private_key, hashes.SHA256())
+    )
+
+
+def _public_der(key):
+    return key.public_key().public_bytes(
+        serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+
+class LoadSigningKeyTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        cls.encryption_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        cls.signing_cert = _certificate(cls.signing_key, 'JOSE PEREZ FIRMA', signing=True)
+        cls.encryption_cert = _certificate(cls.encryption_key, 'JOSE PEREZ CIFRADO', signing=False)
+
+    def entries(self, signing_name, encryption_name):
+        # La clave de cifrado va primero: elegir "la primera" sería incorrecto
+        return [
+            (self.encryption_key, self.encryption_cert, encryption_name),
+            (self.signing_key, self.signing_cert, signing_name),
+        ]
+
+    def assertSigningKeySelected(self, result, reason):
+        self.assertEqual(result.reason, reason)
+        self.assertEqual(_public_der(result.private_key), _public_der(self.signing_key))
+        self.assertEqual(result.certificate, self.signing_cert)
+        self.assertEqual(result.additional_certificates, [self.encryption_cert])
+
+    def test_single_key_p12_from_cryptography(self):
+        p12_data = pkcs12.serialize_key_and_certificates(
+            b'Signing Key', self.signing_key, self.signing_cert, None,
+            serialization.BestAvailableEncryption(PASSWORD.encode('utf-8')),
+        )
+
+        result = load_signing_key(p12_data, PASSWORD)
+
+        self.assertEqual(result.reason, 'single_key')
+        self.assertEqual(result.key_count, 1)
+        self.assertEqual(_public_der(result.private_key), _public_der(self.signing_key))
+        self.assertEqual(result.certificate, self.signing_cert)
+
+    def test_single_key_legacy_3des_p12(self):
+        encryption = (
+            serialization.PrivateFormat.PKCS12.encryption_builder()
+            .key_cert_algorithm(pkcs12.PBES.PBESv1SHA1And3KeyTripleDESCBC)
+            .hmac_hash(hashes.SHA1())
+            .build(PASSWORD.encode('utf-8'))
+        )
+        p12_data = pkcs12.serialize_key_and_certificates(
+            b'Signing Key', self.signing_key, self.signing_cert, None, encryption
+        )
+
+        result = load_signing_key(p12_data, PASSWORD)
+
+        self.assertEqual(result.reason, 'single_key')
+        self.assertEqual(_public_der(result.private_key), _public_der(self.signing_key))
+
+    def test_key_bags_are_listed_with_their_attributes(self):
+        p12_data = build_p12(self.entries('Signing Key', 'Encryption Key'))
+
+        bags = extract_key_bags(p12_data)
+
+        self.assertEqual([(kind, name) for kind, _, name, _ in bags], [
+            ('shrouded', 'Encryption Key'),
+            ('shrouded', 'Signing Key'),
+        ])
+        self.assertEqual(bags[1][3], self.signing_cert.fingerprint(hashes.SHA1()))
+
+    def test_signing_key_selected_by_friendly_name(self):
+        p12_data = build_p12(self.entries('Signing Key', 'Encryption Key'))
+
+        result = load_signing_key(p12_data, PASSWORD)
+
+        self.assertEqual(result.key_count, 2)
+        self.assertEqual(result.friendly_name, 'Signing Key')
+        self.assertSigningKeySelected(result, 'friendly_name')
+
+    def test_signing_key_selected_by_key_usage(self):
+        # Nombres sin pista de uso: decide el KeyUsage del certificado de cada clave
+        p12_data = build_p12(self.entries('jose perez 2', 'jose perez 1'))
+
+        result = load_signing_key(p12_data, PASSWORD)
+
+        self.assertSigningKeySelected(result, 'key_usage')
+
+    def test_encryption_hint_wins_over_signing_hint(self):
+        # "Signature Encryption Key" no se toma como clave de firma por el nombre
+        p12_data = build_p12(self.entries(None, 'Signature Encryption Key'))
+
+        result = load_signing_key(p12_data, PASSWORD)
+
+        self.assertSigningKeySelected(result, 'key_usage')
+
+    def test_indefinite_length_encoding(self):
+        p12_data = build_p12(self.entries('Signing Key', 'Encryption Key'), indefinite=True)
+        self.assertEqual(p12_data[:2], b'\x30\x80')
+
+        result = load_signing_key(p12_data, PASSWORD)
+
+        self.assertSigningKeySelected(result, 'friendly_name')
+
+    def test_legacy_3des_key_bags(self):
+        p12_data = build_p12(self.entries('Signing Key', 'Encryption Key'), encryption='3des')
+
+        result = load_signing_key(p12_data, PASSWORD)
+
+        self.assertSigningKeySelected(result, 'friendly_name')
+
+    def test_unencrypted_key_bags(self):
+        p12_data = build_p12(self.entries('jose perez 2', 'jose perez 1'), encryption='plain')
+
+        self.assertEqual([bag[0] for bag in extract_key_bags(p12_data)], ['plain', 'plain'])
+        self.assertSigningKeySelected(load_signing_key(p12_data, PASSWORD), 'key_usage')
+
+    def test_non_ascii_password_with_aes_bags(self):
+        p12_data = build_p12(self.entries('Signing Key', 'Encryption Key'), password=NON_ASCII_PASSWORD)
+
+        result = load_signing_key(p12_data, NON_ASCII_PASSWORD)
+
+        self.assertSigningKeySelected(result, 'friendly_name')
+
+    def test_non_ascii_password_with_3des_bags(self):
+        p12_data = build_p12(
+            self.entries('jose perez 2', 'jose perez 1'), password=NON_ASCII_PASSWORD, encryption='3des'
+        )
+
+        result = load_signing_key(p12_data, NON_ASCII_PASSWORD.encode('utf-8'))
+
+        self.assertSigningKeySelected(result, 'key_usage')
+
+    def test_wrong_password_is_rejected(self):
+        p12_data = build_p12(self.entries('Signing Key', 'Encryption Key'))
+
+        with self.assertRaises(ValueError):
+            load_signing_key(p12_data, 'otra-clave')
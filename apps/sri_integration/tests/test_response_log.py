@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del registro compacto de respuestas del SRI
+apps/sri_integration/tests/test_response_log.py
+"""
+
+import datetime
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.companies.models import Company
+from apps.sri_integration.models import ElectronicDocument, SRIConfiguration, SRIResponse
+from apps.sri_integration.services.authorization_poller import AuthorizationPoller
+from apps.sri_integration.services.soap_client import SRISOAPClient
+
+
+class SRIResponseTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(
+            ruc='1790012345001',
+            business_name='COMERCIAL ANDINA S.A.',
+            trade_name='Andina',
+            email='facturas@andina.ec',
+            phone='022345678',
+            address='Av. Amazonas N24-03 y Colón',
+            ciudad='Quito',
+            provincia='Pichincha',
+        )
+        SRIConfiguration.objects.get_or_create(company=cls.company)
+        cls.document = ElectronicDocument.objects.create(
+            company=cls.company,
+            document_type='INVOICE',
+            issue_date=datetime.date(2026, 10, 15),
+            customer_identification_type='05',
+            customer_identification='1712345678',
+            customer_name='José Pérez',
+            subtotal_without_tax=Decimal('10.00'),
+            total_tax=Decimal('1.50'),
+            total_amount=Decimal('11.50'),
+            status='SENT',
+        )
+
+
+class LogSRIResponseTests(SRIResponseTestCase):
+
+    def setUp(self):
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.client = SRISOAPClient(self.company)
+        patcher = mock.patch('apps.sri_integration.services.soap_client.AuditLog')
+        self.audit_log = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_long_in_process_state_is_not_audited(self):
+        self.client._log_sri_response(
+            self.document, 'AUTHORIZATION', 'EN PROCESAMIENTO', 'Pendiente', {'response': '<soap/>'}
+        )
+
+        response = SRIResponse.objects.get(document=self.document)
+        self.assertEqual(response.response_code, 'EN PROCESA')
+        self.assertEqual(response.state, 'EN PROCESAMIENTO')
+        self.audit_log.objects.create.assert_not_called()
+
+    def test_final_state_is_audited(self):
+        self.client._log_sri_response(
+            self.document, 'AUTHORIZATION', 'AUTORIZADO', 'OK', {'estado': 'AUTORIZADO', 'response': '<soap/>'}
+        )
+
+        self.assertEqual(SRIResponse.objects.get(document=self.document).state, 'AUTORIZADO')
+        self.audit_log.objects.create.assert_called_once()
+        self.assertEqual(self.audit_log.objects.create.call_args.kwargs['action'], 'SRI_AUTHORIZATION_AUTORIZADO')
+
+
+class AuthorizationPollerResponseTests(SRIResponseTestCase):
+
+    def setUp(self):
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.client = mock.Mock(environment='TEST')
+
+    def test_long_in_process_state_is_stored_in_full(self):
+        result = {
+            'estado': 'EN PROCESAMIENTO',
+            'numeroAutorizacion': '',
+            'fechaAutorizacion': '',
+            'fecha_autorizacion': None,
+            'errors': [],
+        }
+
+        stats = AuthorizationPoller()._apply_results(self.client, [self.document], [result])
+
+        response = SRIResponse.objects.get(document=self.document)
+        self.assertEqual(stats['pending'], 1)
+        self.assertEqual(response.response_code, 'EN PROCESA')
+        self.assertEqual(response.state, 'EN PROCESAMIENTO')
+
+    def test_unchanged_in_process_state_is_not_rewritten(self):
+        result = {
+            'estado': 'EN PROCESO',
+            'numeroAutorizacion': '',
+            'fechaAutorizacion': '',
+            'fecha_autorizacion': None,
+            'errors': [],
+        }
+        poller = AuthorizationPoller()
+        poller._apply_results(self.client, [self.document], [result])
+        document = ElectronicDocument.objects.get(pk=self.document.pk)
+
+        with mock.patch.object(ElectronicDocument.objects, 'bulk_update') as bulk_update:
+            stats = poller._apply_results(self.client, [document], [result])
+
+        self.assertEqual(stats['pending'], 1)
+        bulk_update.assert_not_called()
+        self.assertEqual(SRIResponse.objects.filter(document=self.document).count(), 1)
+
+    def test_audit_log_failure_keeps_the_authorization(self):
+        result = {
+            'estado': 'AUTORIZADO',
+            'numeroAutorizacion': '1510202601179001234500120010010000000011234567813',
+            'fechaAutorizacion': '2026-10-15T10:00:00-05:00',
+            'fecha_autorizacion': None,
+            'errors': [],
+        }
+
+        with mock.patch(
+            'apps.sri_integration.services.authorization_poller.AuditLog.objects.bulk_create',
+            side_effect=RuntimeError('audit table locked'),
+        ):
+            stats = AuthorizationPoller()._apply_results(self.client, [self.document], [result])
+
+        self.document.refresh_from_db()
+        self.assertEqual(stats['authorized'], 1)
+        self.assertEqual(self.document.status, 'AUTHORIZED')
+        self.assertEqual(SRIResponse.objects.get(document=self.document).state, 'AUTORIZADO')
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del sidecar de firma: cliente contra un daemon stub, servidor con un pool
+de JVMs falso y el lote masivo de DocumentProcessor sobre el socket Unix
+apps/sri_integration/tests/test_signing_daemon.py
+"""
+
+import base64
+import os
+import socketserver
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.sri_integration.services import signing_daemon
+from apps.sri_integration.services.document_processor import DocumentProcessor
+from apps.sri_integration.services.signing_daemon import (
+    SigningDaemonClient,
+    SigningDaemonError,
+    SigningDaemonServer,
+    get_signing_daemon_client,
+    recv_message,
+    send_message,
+)
+
+
+class _StubHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        self.server.connections += 1
+        while True:
+            try:
+                request = recv_message(self.request)
+            except Exception:
+                return
+            self.server.batches.append(request['items'])
+            send_message(self.request, self.server.respond(request['items']))
+            if self.server.close_after_reply:
+                return
+
+
+class StubSigningDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Daemon stub: 'firma' envolviendo el XML; los XML con <fail/> se rechazan."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        self.connections = 0
+        self.batches = []
+        self.close_after_reply = False
+        self.drop_results = False
+        super().__init__(socket_path, _StubHandler)
+
+    def respond(self, items):
+        results = []
+        for item in items:
+            xml = base64.b64decode(item['xml'])
+            if b'<fail/>' in xml:
+                results.append({'ok': False, 'error': f"bad xml for {item['company_id']}"})
+            else:
+                signed = b'<signed company="%d">' % item['company_id'] + xml + b'</signed>'
+                results.append({'ok': True, 'xml': base64.b64encode(signed).decode('ascii')})
+        return {'results': results[:-1] if self.drop_results else results}
+
+
+class SigningDaemonClientTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmpdir.name, 'signer.sock')
+        self.server = StubSigningDaemon(self.socket_path)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.client = SigningDaemonClient(self.socket_path, timeout=5, retry_after=30)
+
+    def tearDown(self):
+        self.client._close_connection()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_sign_batch_keeps_order_and_per_item_errors(self):
+        results = self.client.sign_batch([(1, b'<a/>'), (2, '<fail/>'), (3, '<c>ñ</c>')])
+
+        self.assertEqual(results, [
+            (True, b'<signed company="1"><a/></signed>'),
+            (False, 'bad xml for 2'),
+            (True, '<signed company="3"><c>ñ</c></signed>'.encode('utf-8')),
+        ])
+        self.assertEqual(len(self.server.batches), 1)
+
+    def test_sign_single_document(self):
+        self.assertEqual(self.client.sign(7, b'<x/>'), (True, b'<signed company="7"><x/></signed>'))
+
+    def test_connection_is_reused_between_batches(self):
+        for _ in range(3):
+            self.client.sign(1, b'<a/>')
+
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.batches), 3)
+
+    def test_reconnects_once_when_daemon_closed_connection(self):
+        self.server.close_after_reply = True
+
+        self.assertEqual(self.client.sign(1, b'<a/>')[0], True)
+        self.assertEqual(self.client.sign(1, b'<b/>')[0], True)
+        self.assertEqual(self.server.connections, 2)
+        self.assertTrue(self.client.is_available())
+
+    def test_result_count_mismatch_returns_none(self):
+        self.server.drop_results = True
+
+        self.assertIsNone(self.client.sign_batch([(1, b'<a/>'), (2, b'<b/>')]))
+
+    def test_down_daemon_is_skipped_until_retry_after(self):
+        client = SigningDaemonClient(os.path.join(self.tmpdir.name, 'missing.sock'), timeout=1, retry_after=30)
+
+        self.assertIsNone(client.sign(1, b'<a/>'))
+        self.assertFalse(client.is_available())
+        # Marcado como caído: ya no intenta conectar
+        self.assertIsNone(client.sign_batch([(1, b'<a/>')]))
+
+    def test_empty_batch_does_not_call_daemon(self):
+        self.assertIsNone(self.client.sign_batch([]))
+        self.assertEqual(self.server.batches, [])
+
+
+class SigningDaemonSettingsTests(SimpleTestCase):
+
+    def tearDown(self):
+        signing_daemon._client = None
+
+    @override_settings(SRI_SIGNING_DAEMON_SOCKET='')
+    def test_no_client_without_socket(self):
+        self.assertIsNone(get_signing_daemon_client())
+
+    @override_settings(SRI_SIGNING_DAEMON_SOCKET='/tmp/a.sock', SRI_SIGNING_DAEMON_TIMEOUT=5)
+    def test_client_is_shared_per_socket(self):
+        client = get_signing_daemon_client()
+
+        self.assertIs(get_signing_daemon_client(), client)
+        self.assertEqual(client.timeout, 5)
+        with self.settings(SRI_SIGNING_DAEMON_SOCKET='/tmp/b.sock'):
+            self.assertEqual(get_signing_daemon_client().socket_path, '/tmp/b.sock')
+
+
+class FakeJarPool:
+    """Pool de JVMs falso: 'firma' con el P12 recibido; los XML con <fail/> fallan."""
+
+    def __init__(self):
+        self.calls = []
+
+    def sign_many(self, jobs):
+        self.calls.append(jobs)
+        results = []
+        for p12_path, password, xml in jobs:
+            if b'<fail/>' in xml:
+                results.append((False, 'JAR rejected document'))
+            else:
+                results.append((True, b'<signed p12="%s">' % p12_path.encode() + xml + b'</signed>'))
+        return results
+
+
+def fake_credentials(company_id):
+    if company_id == 404:
+        raise SigningDaemonError(f"Certificate not available for company {company_id}")
+    return f'/certs/{company_id}.p12', 'secret'
+
+
+class SigningDaemonServerTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmpdir.name, 'signer.sock')
+        self.pool = FakeJarPool()
+        self.server = SigningDaemonServer(self.socket_path, self.pool, credentials=fake_credentials)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.client = SigningDaemonClient(self.socket_path, timeout=5, retry_after=30)
+
+    def tearDown(self):
+        self.client._close_connection()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+
+class SigningDaemonServerTests(SigningDaemonServerTestCase):
+
+    def test_batch_is_signed_in_one_pool_call(self):
+        results = self.client.sign_batch([(1, b'<a/>'), (2, b'<fail/>'), (404, b'<b/>'), (3, b'<c/>')])
+
+        self.assertEqual(results, [
+            (True, b'<signed p12="/certs/1.p12"><a/></signed>'),
+            (False, 'JAR rejected document'),
+            (False, 'Certificate not available for company 404'),
+            (True, b'<signed p12="/certs/3.p12"><c/></signed>'),
+        ])
+        # La empresa sin certificado no llega a las JVMs
+        self.assertEqual(len(self.pool.calls), 1)
+        self.assertEqual(len(self.pool.calls[0]), 3)
+        self.assertEqual(self.server.stats, {'batches': 1, 'signed': 2, 'errors': 2})
+
+    def test_connection_serves_several_batches(self):
+        for _ in range(3):
+            self.assertEqual(self.client.sign(1, b'<a/>')[0], True)
+
+        self.assertEqual(len(self.pool.calls), 3)
+
+    def test_stale_socket_is_replaced_and_removed_on_close(self):
+        self.client._close_connection()
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertFalse(os.path.exists(self.socket_path))
+
+        open(self.socket_path, 'w').close()
+        self.server = SigningDaemonServer(self.socket_path, self.pool, credentials=fake_credentials)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.assertEqual(self.client.sign(1, b'<a/>')[0], True)
+
+
+@override_settings(SRI_SIGNING_BACKEND='jar')
+class DocumentProcessorBatchSigningTests(SigningDaemonServerTestCase):
+
+    def make_processor(self):
+        processor = DocumentProcessor.__new__(DocumentProcessor)
+        processor.company = mock.Mock(id=1)
+        processor.cert_manager = mock.Mock()
+        processor.cert_manager.get_certificate.return_value = mock.Mock(
+            certificate_obj=mock.Mock(certificate_file=mock.Mock(path='/certs/1.p12')), password='secret'
+        )
+        return processor
+
+    def make_documents(self, count):
+        return [mock.Mock(id=index, access_key=f'{index:049d}') for index in range(count)]
+
+    def test_bulk_signing_uses_one_daemon_call(self):
+        processor = self.make_processor()
+        documents = self.make_documents(4)
+        items = [(document, f'<doc id="{document.id}"/>') for document in documents]
+
+        with mock.patch('apps.sri_integration.services.document_processor.get_signing_daemon_client',
+                        return_value=self.client):
+            results = processor._sign_xml_batch(items)
+
+        self.assertEqual(len(self.pool.calls), 1)
+        self.assertEqual(len(self.pool.calls[0]), 4)
+        self.assertEqual(results[2], (True, '<signed p12="/certs/1.p12"><doc id="2"/></signed>'))
+        for document in documents:
+            self.assertEqual(document.status, 'SIGNED')
+            document.signed_xml_file.save.assert_called_once()
+
+    def test_rejected_documents_fall_back_to_subprocess(self):
+        processor = self.make_processor()
+        documents = self.make_documents(2)
+        items = [(documents[0], '<ok/>'), (documents[1], '<fail/>')]
+
+        with mock.patch('apps.sri_integration.services.document_processor.get_signing_daemon_client',
+                        return_value=self.client), \
+                mock.patch('apps.sri_integration.services.document_processor.sign_with_jar',
+                           return_value=b'<signed by="subprocess"/>') as sign_with_jar:
+            results = processor._sign_xml_batch(items)
+
+        self.assertEqual(len(self.pool.calls), 1)
+        sign_with_jar.assert_called_once_with('/certs/1.p12', 'secret', '<fail/>')
+        self.assertEqual(results, [
+            (True, '<signed p12="/certs/1.p12"><ok/></signed>'),
+            (True, '<signed by="subprocess"/>'),
+        ])
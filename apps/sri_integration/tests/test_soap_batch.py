@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del envío en lote masivo a recepción del SRI
+apps/sri_integration/tests/test_soap_batch.py
+
+build_batch_xml / split_batches / parse_batch_reception_response por separado
+y send_batch_to_reception completo contra un servidor SOAP stub local.
+"""
+
+import base64
+import datetime
+import re
+import tempfile
+import threading
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from lxml import etree
+
+from apps.companies.models import Company
+from apps.sri_integration.models import ElectronicDocument, SRIConfiguration
+from apps.sri_integration.services.soap_client import SRISOAPClient
+
+SIGNED_XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<factura id="comprobante" version="1.1.0"><razonSocial>Ñandú &amp; Cía</razonSocial>'
+    '<ds:Signature xmlns:ds="http://www.w3.org/2000/09/xmldsig#">x</ds:Signature></factura>'
+).encode('utf-8')
+
+
+def reception_response(estado, comprobantes=''):
+    return (
+        '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
+        '<ns2:validarComprobanteResponse xmlns:ns2="http://ec.gob.sri.ws.recepcion">'
+        f'<RespuestaRecepcionComprobante><estado>{estado}</estado>'
+        f'<comprobantes>{comprobantes}</comprobantes></RespuestaRecepcionComprobante>'
+        '</ns2:validarComprobanteResponse></soap:Body></soap:Envelope>'
+    )
+
+
+def comprobante_response(access_key, identificador, mensaje, informacion=''):
+    clave = f'<claveAcceso>{access_key}</claveAcceso>' if access_key else ''
+    extra = f'<informacionAdicional>{informacion}</informacionAdicional>' if informacion else ''
+    return (
+        f'<comprobante>{clave}<mensajes><mensaje><identificador>{identificador}</identificador>'
+        f'<mensaje>{mensaje}</mensaje>{extra}<tipo>ERROR</tipo></mensaje></mensajes></comprobante>'
+    )
+
+
+class BatchXMLTests(SimpleTestCase):
+
+    def test_build_batch_xml_keeps_signed_comprobantes_untouched(self):
+        second = SIGNED_XML.decode('utf-8')
+
+        lote = SRISOAPClient.build_batch_xml('1' * 49, '1790012345001', [SIGNED_XML, second])
+
+        root = etree.fromstring(lote)
+        self.assertEqual(root.tag, 'lote')
+        self.assertEqual(root.get('version'), '1.0.0')
+        self.assertEqual(root.findtext('claveAcceso'), '1' * 49)
+        self.assertEqual(root.findtext('ruc'), '1790012345001')
+        comprobantes = root.findall('comprobantes/comprobante')
+        self.assertEqual(len(comprobantes), 2)
+        for comprobante in comprobantes:
+            self.assertEqual(comprobante.text.encode('utf-8'), SIGNED_XML)
+        self.assertIn(b'<comprobante><![CDATA[' + SIGNED_XML + b']]></comprobante>', lote)
+
+    def test_reception_envelope_carries_the_batch_in_base64(self):
+        lote = SRISOAPClient.build_batch_xml('1' * 49, '1790012345001', [SIGNED_XML])
+
+        envelope = etree.fromstring(SRISOAPClient.build_reception_envelope(lote).encode('utf-8'))
+
+        self.assertEqual(base64.b64decode(envelope.findtext('.//xml')), lote)
+
+    def test_split_batches_by_document_count(self):
+        items = [(index, b'x' * 100) for index in range(7)]
+
+        batches = SRISOAPClient.split_batches(items, max_bytes=10 ** 6, max_documents=3)
+
+        self.assertEqual([[document for document, _ in batch] for batch in batches], [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_split_batches_by_size(self):
+        # Cada ítem ocupa 1000 + 48 bytes y el lote 256 de cabecera
+        items = [(index, b'x' * 1000) for index in range(5)]
+
+        batches = SRISOAPClient.split_batches(items, max_bytes=2400, max_documents=50)
+
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        for batch in batches:
+            size = sum(len(xml) + 48 for _, xml in batch) + 256
+            self.assertLessEqual(size, 2400)
+
+    def test_oversized_document_goes_alone(self):
+        items = [(0, b'x' * 10), (1, b'x' * 5000), (2, b'x' * 10)]
+
+        batches = SRISOAPClient.split_batches(items, max_bytes=1000, max_documents=50)
+
+        self.assertEqual([[document for document, _ in batch] for batch in batches], [[0], [1], [2]])
+
+    def test_split_batches_empty(self):
+        self.assertEqual(SRISOAPClient.split_batches([], max_bytes=1000, max_documents=10), [])
+
+
+class BatchResponseParsingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.client = SRISOAPClient.__new__(SRISOAPClient)
+
+    def test_received_batch(self):
+        estado, errors_by_key, general_errors = self.client.parse_batch_reception_response(
+            reception_response('RECIBIDA')
+        )
+
+        self.assertEqual((estado, errors_by_key, general_errors), ('RECIBIDA', {}, []))
+
+    def test_errors_by_access_key(self):
+        response = reception_response('DEVUELTA', (
+            comprobante_response('1' * 49, '35', 'ARCHIVO NO CUMPLE ESTRUCTURA XML', 'cvc-complex-type')
+            + comprobante_response('2' * 49, '45', 'SECUENCIAL REGISTRADO')
+        ))
+
+        estado, errors_by_key, general_errors = self.client.parse_batch_reception_response(response)
+
+        self.assertEqual(estado, 'DEVUELTA')
+        self.assertEqual(errors_by_key, {
+            '1' * 49: ['Error 35: ARCHIVO NO CUMPLE ESTRUCTURA XML - cvc-complex-type'],
+            '2' * 49: ['Error 45: SECUENCIAL REGISTRADO'],
+        })
+        self.assertEqual(general_errors, [])
+
+    def test_batch_level_errors(self):
+        response = reception_response('DEVUELTA', comprobante_response('', '62', 'CLAVE DE LOTE INVALIDA'))
+
+        estado, errors_by_key, general_errors = self.client.parse_batch_reception_response(response)
+
+        self.assertEqual(estado, 'DEVUELTA')
+        self.assertEqual(errors_by_key, {})
+        self.assertEqual(general_errors, ['Error 62: CLAVE DE LOTE INVALIDA'])
+
+
+class BatchRetryDelayTests(SimpleTestCase):
+
+    @override_settings(SRI_LOTE_RETRY_BASE_DELAY=2.0, SRI_LOTE_RETRY_MAX_DELAY=5.0)
+    def test_exponential_with_jitter_and_cap(self):
+        with mock.patch('apps.sri_integration.services.soap_client.random.uniform', side_effect=lambda a, b: b):
+            upper = [SRISOAPClient.batch_retry_delay(attempt) for attempt in (1, 2, 3, 4)]
+        with mock.patch('apps.sri_integration.services.soap_client.random.uniform', side_effect=lambda a, b: a):
+            lower = [SRISOAPClient.batch_retry_delay(attempt) for attempt in (1, 2, 3, 4)]
+
+        self.assertEqual(upper, [2.0, 4.0, 5.0, 5.0])
+        self.assertEqual(lower, [1.0, 2.0, 2.5, 2.5])
+
+    def test_delays_are_spread(self):
+        delays = {SRISOAPClient.batch_retry_delay(2) for _ in range(20)}
+
+        self.assertGreater(len(delays), 1)
+
+
+# ============================================================================
+# Servidor SOAP stub
+# ============================================================================
+class _StubSOAPHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append(body)
+        status, text = self.server.responses.pop(0) if self.server.responses else (500, 'no response')
+        payload = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubSOAPServer(ThreadingHTTPServer):
+
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+        super().__init__(('127.0.0.1', 0), _StubSOAPHandler)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/RecepcionComprobantesOffline'
+
+    def lotes(self):
+        """XML del lote de cada petición recibida."""
+        return [
+            base64.b64decode(re.search(rb'<xml>(.*?)</xml>', body, re.S).group(1))
+            for body in self.requests
+        ]
+
+
+@override_settings(
+    SRI_CIRCUIT_BREAKER_ENABLED=False,
+    SRI_RATE_LIMIT_ENABLED=False,
+    SRI_LOTE_MAX_ATTEMPTS=3,
+)
+class SendBatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(
+            ruc='1790012345001',
+            business_name='COMERCIAL ANDINA S.A.',
+            trade_name='Andina',
+            email='facturas@andina.ec',
+            phone='022345678',
+            address='Av. Amazonas N24-03 y Colón',
+            ciudad='Quito',
+            provincia='Pichincha',
+        )
+        SRIConfiguration.objects.get_or_create(company=cls.company)
+        cls.documents = [
+            ElectronicDocument.objects.create(
+                company=cls.company,
+                document_type='INVOICE',
+                issue_date=datetime.date(2026, 10, 15),
+                customer_identification_type='05',
+                customer_identification='1712345678',
+                customer_name=f'Cliente {index}',
+                subtotal_without_tax=Decimal('10.00'),
+                total_tax=Decimal('1.50'),
+                total_amount=Decimal('11.50'),
+                status='SIGNED',
+            )
+            for index in range(2)
+        ]
+
+    def setUp(self):
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+
+        self.server = StubSOAPServer()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.client = SRISOAPClient(self.company)
+        self.client.SRI_URLS = {self.client.environment: {'reception_endpoint': self.server.url}}
+        sleep_patcher = mock.patch('apps.sri_integration.services.soap_client.time.sleep')
+        self.sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+        self.items = [(document, SIGNED_XML) for document in self.documents]
+
+    def _statuses(self):
+        return [ElectronicDocument.objects.get(pk=document.pk).status for document in self.documents]
+
+    def test_received_batch_marks_documents_sent(self):
+        self.server.responses = [(200, reception_response('RECIBIDA'))]
+
+        results = self.client.send_batch_to_reception(self.items)
+
+        self.assertEqual(results, {document.id: (True, 'Document received by SRI successfully') for document in self.documents})
+        self.assertEqual(self._statuses(), ['SENT', 'SENT'])
+        lote = etree.fromstring(self.server.lotes()[0])
+        self.assertEqual(lote.findtext('ruc'), self.company.ruc)
+        self.assertEqual(len(lote.findall('comprobantes/comprobante')), 2)
+        self.sleep.assert_not_called()
+
+    def test_gateway_errors_are_retried_with_backoff(self):
+        self.server.responses = [
+            (503, 'Service Unavailable'),
+            (502, 'Bad Gateway'),
+            (200, reception_response('RECIBIDA')),
+        ]
+
+        results = self.client.send_batch_to_reception(self.items)
+
+        self.assertTrue(all(ok for ok, _ in results.values()))
+        self.assertEqual(len(self.server.requests), 3)
+        delays = [call.args[0] for call in self.sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertTrue(1.0 <= delays[0] <= 2.0)
+        self.assertTrue(2.0 <= delays[1] <= 4.0)
+
+    def test_exhausted_retries_fail_the_batch_without_trailing_wait(self):
+        self.server.responses = [(504, 'Gateway Timeout')] * 3
+
+        results = self.client.send_batch_to_reception(self.items)
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.sleep.call_count, 2)
+        for ok, message in results.values():
+            self.assertFalse(ok)
+            self.assertIn('HTTP 504', message)
+        self.assertEqual(self._statuses(), ['SIGNED', 'SIGNED'])
+
+    def test_per_document_rejection(self):
+        rejected = self.documents[1]
+        self.server.responses = [(200, reception_response(
+            'DEVUELTA', comprobante_response(rejected.access_key, '45', 'SECUENCIAL REGISTRADO')
+        ))]
+
+        results = self.client.send_batch_to_reception(self.items)
+
+        self.assertTrue(results[self.documents[0].id][0])
+        self.assertEqual(results[rejected.id], (False, 'SRI rejected document: Error 45: SECUENCIAL REGISTRADO'))
+        self.assertEqual(self._statuses(), ['SENT', 'ERROR'])
+
+    def test_documents_are_split_into_several_batches(self):
+        self.server.responses = [(200, reception_response('RECIBIDA'))] * 2
+
+        self.client.send_batch_to_reception(self.items, max_documents=1)
+
+        self.assertEqual(len(self.server.requests), 2)
+        keys = [etree.fromstring(lote).findtext('claveAcceso') for lote in self.server.lotes()]
+        self.assertEqual(len(set(keys)), 2)
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del motor de impuestos y de su alineación con los modelos
+apps/sri_integration/tests/test_tax_engine.py
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.sri_integration import tax_engine
+from apps.sri_integration.models import DocumentItem, DocumentTax, SafeDocumentCalculations
+from apps.sri_integration.tax_engine import ZERO
+
+
+class TaxEngineModelAlignmentTests(SimpleTestCase):
+
+    def test_every_iva_rate_code_is_a_valid_percentage_code(self):
+        choices = {code for code, _ in DocumentTax.TAX_RATES}
+
+        self.assertEqual(set(tax_engine.IVA_RATES), choices)
+        self.assertIn(tax_engine.default_percentage_code(), choices)
+
+    def test_percentage_code_field_accepts_the_engine_codes(self):
+        field = DocumentTax._meta.get_field('percentage_code')
+
+        for code in tax_engine.IVA_RATES:
+            with self.subTest(code=code):
+                field.run_validators(code)
+                field.validate(code, None)
+
+    def test_safe_calculation_limits_are_the_engine_limits(self):
+        self.assertEqual(SafeDocumentCalculations.MAX_QUANTITY_PRICE, tax_engine.MAX_UNIT_VALUE)
+        self.assertEqual(SafeDocumentCalculations.MAX_SUBTOTAL, tax_engine.MAX_AMOUNT)
+        self.assertEqual(SafeDocumentCalculations.MAX_DOCUMENT_TOTAL, tax_engine.MAX_DOCUMENT_TOTAL)
+
+    def test_unit_value_limit_fits_document_item_fields(self):
+        for name in ('quantity', 'unit_price'):
+            field = DocumentItem._meta.get_field(name)
+            with self.subTest(field=name):
+                field.run_validators(tax_engine.MAX_UNIT_VALUE)
+        DocumentItem._meta.get_field('subtotal').run_validators(tax_engine.MAX_AMOUNT)
+
+    def test_line_over_the_limit_is_rejected(self):
+        is_valid, _, error = SafeDocumentCalculations.validate_item_calculation(
+            tax_engine.MAX_UNIT_VALUE + Decimal('1'), Decimal('1')
+        )
+
+        self.assertFalse(is_valid)
+        self.assertIn('Quantity exceeds maximum allowed', error)
+
+
+def legacy_item_subtotal(quantity, unit_price, discount=0):
+    """Subtotal por ítem de SafeDocumentCalculations antes del motor de impuestos."""
+    subtotal = Decimal(str(quantity)) * Decimal(str(unit_price)) - Decimal(str(discount))
+    return subtotal.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def mixed_lines(count):
+    codes = ('0', '4', '5', '8')
+    return [
+        {
+            'quantity': Decimal(1 + index % 7),
+            'unit_price': Decimal('0.335') + Decimal(index % 13) / 7,
+            'discount': Decimal('0.05') if index % 5 == 0 else ZERO,
+            'percentage_code': codes[index % len(codes)],
+        }
+        for index in range(count)
+    ]
+
+
+class ComputeTotalsTests(SimpleTestCase):
+
+    def test_line_rounding_matches_legacy_item_subtotal(self):
+        # Con la precisión con que se guardan: 6 decimales, descuento a 2
+        cases = [
+            (3, '0.335', '0'),
+            ('2.5', '1.13', '0'),
+            ('0.333333', 3, '0'),
+            (7, '19.999', '1.01'),
+            ('1.000001', '0.994999', '0'),
+        ]
+
+        totals = tax_engine.compute_totals(
+            {'quantity': q, 'unit_price': p, 'discount': d} for q, p, d in cases
+        )
+
+        for (q, p, d), line in zip(cases, totals.lines):
+            with self.subTest(quantity=q, unit_price=p, discount=d):
+                self.assertEqual(line.subtotal, legacy_item_subtotal(q, p, d))
+                self.assertEqual(
+                    line.subtotal, SafeDocumentCalculations.validate_item_calculation(q, p, d)[1]
+                )
+
+    def test_totals_per_code_with_mixed_iva_codes(self):
+        lines = [
+            {'quantity': 2, 'unit_price': '10.00', 'percentage_code': '4'},
+            {'quantity': 1, 'unit_price': '7.99', 'percentage_code': '4'},
+            {'quantity': 3, 'unit_price': '4.50', 'percentage_code': '5'},
+            {'quantity': 1, 'unit_price': '12.35', 'percentage_code': '8'},
+            {'quantity': 1, 'unit_price': '5.00', 'percentage_code': '0'},
+        ]
+
+        totals = tax_engine.compute_totals(lines)
+
+        self.assertEqual(
+            [(tax.percentage_code, tax.rate, tax.base, tax.amount) for tax in totals.taxes],
+            [
+                ('0', Decimal('0'), Decimal('5.00'), Decimal('0.00')),
+                ('4', Decimal('15'), Decimal('27.99'), Decimal('4.20')),
+                ('5', Decimal('5'), Decimal('13.50'), Decimal('0.68')),
+                ('8', Decimal('8'), Decimal('12.35'), Decimal('0.99')),
+            ]
+        )
+        self.assertEqual({tax.tax_code for tax in totals.taxes}, {tax_engine.IVA_TAX_CODE})
+        self.assertEqual(totals.subtotal, Decimal('58.84'))
+        self.assertEqual(totals.total_tax, Decimal('5.87'))
+        self.assertEqual(totals.total, Decimal('64.71'))
+
+    def test_code_total_is_the_sum_of_rounded_line_taxes(self):
+        lines = [{'quantity': 1, 'unit_price': '0.03', 'percentage_code': '4'}] * 3
+
+        totals = tax_engine.compute_totals(lines)
+
+        self.assertEqual([line.tax.amount for line in totals.lines], [Decimal('0.00')] * 3)
+        self.assertEqual(totals.taxes[0].base, Decimal('0.09'))
+        self.assertEqual(totals.taxes[0].amount, Decimal('0.00'))
+        self.assertEqual(totals.total, Decimal('0.09'))
+
+    def test_explicit_tax_rate_overrides_the_rate_table(self):
+        totals = tax_engine.compute_totals([
+            {'quantity': 1, 'unit_price': '10.00', 'percentage_code': '4', 'tax_rate': '10'},
+            {'quantity': 1, 'unit_price': '10.00', 'percentage_code': '8'},
+        ])
+
+        self.assertEqual(totals.lines[0].tax.rate, Decimal('10'))
+        self.assertEqual(totals.lines[0].tax.amount, Decimal('1.00'))
+        self.assertEqual(totals.lines[1].tax.amount, Decimal('0.80'))
+        self.assertEqual(totals.total_tax, Decimal('1.80'))
+
+    @override_settings(SRI_DEFAULT_IVA_PERCENTAGE_CODE='5')
+    def test_lines_without_code_use_the_default_percentage_code(self):
+        totals = tax_engine.compute_totals([{'quantity': 1, 'unit_price': '10.00'}])
+
+        self.assertEqual(totals.taxes[0].percentage_code, '5')
+        self.assertEqual(totals.total_tax, Decimal('0.50'))
+
+    def test_float_and_str_inputs_are_coerced_to_decimal(self):
+        coerced = tax_engine.compute_totals([
+            SimpleNamespace(quantity=1.1, unit_price='2.20', discount=0.1, percentage_code=4),
+        ])
+        exact = tax_engine.compute_totals([
+            {'quantity': Decimal('1.1'), 'unit_price': Decimal('2.2'), 'discount': Decimal('0.1'),
+             'percentage_code': '4'},
+        ])
+
+        line = coerced.lines[0]
+        for value in (line.quantity, line.unit_price, line.discount, line.subtotal, line.tax.amount):
+            self.assertIs(type(value), Decimal)
+        self.assertEqual(line.subtotal, Decimal('2.32'))
+        self.assertEqual(coerced, exact)
+        self.assertEqual(tax_engine.to_decimal(0.1), Decimal('0.1'))
+
+    def test_invalid_values_and_codes_raise_value_error(self):
+        with self.assertRaises(ValueError):
+            tax_engine.compute_totals([{'quantity': 'abc', 'unit_price': '1.00'}])
+        with self.assertRaises(ValueError):
+            tax_engine.compute_totals([{'quantity': 1, 'unit_price': '1.00', 'percentage_code': '99'}])
+
+    def test_batch_mode_matches_per_document_totals(self):
+        lines = mixed_lines(2000)
+
+        full = tax_engine.compute_totals(lines)
+        batch = tax_engine.compute_totals_batch(lines)
+
+        self.assertEqual(batch.lines, [])
+        self.assertEqual(len(full.lines), 2000)
+        self.assertEqual(batch._replace(lines=full.lines), full)
+        self.assertEqual(full.total_tax, sum(line.tax.amount for line in full.lines))
+        self.assertEqual(full.subtotal, sum(line.subtotal for line in full.lines))
+
+
+class CalculationLimitTests(SimpleTestCase):
+
+    def test_line_subtotal_over_the_amount_limit_is_rejected(self):
+        is_valid, _, error = SafeDocumentCalculations.validate_item_calculation(
+            tax_engine.MAX_UNIT_VALUE, tax_engine.MAX_UNIT_VALUE
+        )
+
+        self.assertFalse(is_valid)
+        self.assertIn(f'exceeds maximum allowed ({tax_engine.MAX_AMOUNT})', error)
+
+    def test_discount_over_the_line_amount_is_rejected(self):
+        is_valid, _, error = SafeDocumentCalculations.validate_item_calculation(1, '5.00', '5.01')
+
+        self.assertFalse(is_valid)
+        self.assertIn('Discount cannot be greater', error)
+
+    def test_document_total_over_the_limit_is_rejected(self):
+        items = [{'quantity': 100000, 'unit_price': '99999.99'}] * 11
+
+        is_valid, _, error = SafeDocumentCalculations.validate_document_total(items)
+
+        self.assertFalse(is_valid)
+        self.assertIn(f'exceeds reasonable limit ({tax_engine.MAX_DOCUMENT_TOTAL})', error)
+
+    def test_document_total_at_the_limit_matches_the_engine_subtotal(self):
+        items = [{'quantity': 100000, 'unit_price': '99999.99'}] * 10
+
+        is_valid, total, _ = SafeDocumentCalculations.validate_document_total(items)
+
+        self.assertTrue(is_valid)
+        self.assertEqual(total, tax_engine.compute_totals_batch(items).subtotal)
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del firmador XAdES-BES nativo
+apps/sri_integration/tests/test_xades_signer.py
+
+Fixtures (fixtures/):
+- test_signer.key.pem / test_signer.cert.pem: clave y certificado autofirmado de pruebas
+- factura_unsigned.xml: comprobante sin firmar
+- factura_signed.golden.xml: la misma factura firmada con GOLDEN_IDS y SIGNING_TIME;
+  si la salida del firmador cambia a propósito, regenerarla con
+  XAdESBESSigner(cert_data).sign(unsigned, SIGNING_TIME, GOLDEN_IDS)
+- jar/*.xml: comprobantes firmados por el JAR oficial; para cada uno se
+  reconstruye la firma con los mismos IDs, hora y certificado y se compara
+  el C14N de SignedInfo byte a byte. Se generan en una máquina con Java y
+  sri.jar con `manage.py benchmark_signing --engine jar --save-jar-sample
+  apps/sri_integration/tests/fixtures/jar`
+
+Donde hay Java y sri.jar (la imagen Docker) la prueba de compatibilidad además
+firma factura_unsigned.xml con el JAR en el momento, con un P12 armado con la
+clave y el certificado de pruebas, y compara el documento firmado completo.
+"""
+
+import base64
+import copy
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.serialization import pkcs12
+from django.test import SimpleTestCase
+from lxml import etree
+
+from apps.sri_integration.services.global_certificate_manager import CertificateData
+from apps.sri_integration.services.jar_signer import jar_available, sign_with_jar
+from apps.sri_integration.services.xades_signer import (
+    DS_NS,
+    ECUADOR_TZ,
+    ETSI_NS,
+    XAdESBESSigner,
+    XAdESSignerError,
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+JAR_FIXTURES_DIR = os.path.join(FIXTURES_DIR, 'jar')
+NS = {'ds': DS_NS, 'etsi': ETSI_NS}
+TEST_P12_PASSWORD = 'vendo-sri-test'
+
+SIGNING_TIME = datetime(2026, 10, 15, 10, 20, 30, tzinfo=ECUADOR_TZ)
+GOLDEN_IDS = {
+    'signature': 'Signature620397',
+    'signed_info': 'Signature-SignedInfo814726',
+    'signed_properties': 'Signature620397-SignedProperties24123',
+    'signed_properties_ref': 'SignedPropertiesID149683',
+    'certificate': 'Certificate1562780',
+    'reference': 'Reference-ID-363558',
+    'signature_value': 'SignatureValue398963',
+    'object': 'Signature620397-Object231987',
+}
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def _cert_data(certificate=None):
+    private_key = serialization.load_pem_private_key(_fixture('test_signer.key.pem'), password=None)
+    certificate = certificate or x509.load_pem_x509_certificate(_fixture('test_signer.cert.pem'))
+    return CertificateData(1, private_key, certificate, [], None)
+
+
+def write_test_p12(directory):
+    """P12 con la clave y el certificado de pruebas, para firmar con el JAR."""
+    cert_data = _cert_data()
+    path = os.path.join(directory, 'test_signer.p12')
+    with open(path, 'wb') as f:
+        f.write(pkcs12.serialize_key_and_certificates(
+            b'test_signer', cert_data.private_key, cert_data.certificate, None,
+            serialization.BestAvailableEncryption(TEST_P12_PASSWORD.encode()),
+        ))
+    return path
+
+
+def _c14n(element):
+    return etree.tostring(element, method='c14n', exclusive=False, with_comments=False)
+
+
+def _sha1_b64(data):
+    return base64.b64encode(hashlib.sha1(data).digest()).decode('ascii')
+
+
+def _without_signature(root):
+    """Transformación enveloped-signature: quita ds:Signature y conserva el texto que la sigue."""
+    root = copy.deepcopy(root)
+    signature = root.find('ds:Signature', NS)
+    previous = signature.getprevious()
+    if signature.tail:
+        if previous is not None:
+            previous.tail = (previous.tail or '') + signature.tail
+        else:
+            root.text = (root.text or '') + signature.tail
+    root.remove(signature)
+    return root
+
+
+def verify_signed_xml(signed_xml, certificate=None):
+    """
+    Verificación independiente del firmador, como la haría el SRI sobre los
+    bytes recibidos: digests de las tres referencias y SignatureValue con la
+    clave pública del certificado incluido en KeyInfo (o el indicado).
+    Lanza AssertionError / InvalidSignature si algo no cuadra.
+    """
+    root = etree.fromstring(signed_xml)
+    signature = root.find('ds:Signature', NS)
+    signed_info = signature.find('ds:SignedInfo', NS)
+
+    for reference in signed_info.findall('ds:Reference', NS):
+        target_id = reference.get('URI')[1:]
+        if target_id == root.get('id'):
+            content = _c14n(_without_signature(root))
+        else:
+            target = root.xpath('//*[@Id=$id]', id=target_id)[0]
+            content = _c14n(target)
+        expected = reference.findtext('ds:DigestValue', namespaces=NS)
+        assert _sha1_b64(content) == expected, f"Digest mismatch for #{target_id}"
+
+    if certificate is None:
+        der = base64.b64decode(signature.findtext('ds:KeyInfo/ds:X509Data/ds:X509Certificate', namespaces=NS))
+        certificate = x509.load_der_x509_certificate(der)
+    certificate.public_key().verify(
+        base64.b64decode(signature.findtext('ds:SignatureValue', namespaces=NS)),
+        _c14n(signed_info),
+        padding.PKCS1v15(),
+        hashes.SHA1(),
+    )
+    return root
+
+
+class XAdESSignerGoldenTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cert_data = _cert_data()
+        self.signer = XAdESBESSigner(self.cert_data)
+        self.unsigned = _fixture('factura_unsigned.xml')
+
+    def test_output_matches_golden_file(self):
+        signed = self.signer.sign(self.unsigned, SIGNING_TIME, GOLDEN_IDS)
+
+        self.assertEqual(signed, _fixture('factura_signed.golden.xml'))
+
+    def test_golden_file_verifies_with_certificate(self):
+        certificate = self.cert_data.certificate
+
+        root = verify_signed_xml(_fixture('factura_signed.golden.xml'), certificate)
+        embedded = root.findtext('ds:Signature/ds:KeyInfo/ds:X509Data/ds:X509Certificate', namespaces=NS)
+        self.assertEqual(
+            base64.b64decode(embedded),
+            certificate.public_bytes(serialization.Encoding.DER),
+        )
+
+    def test_fresh_signature_verifies_with_certificate(self):
+        signed = self.signer.sign(self.unsigned)
+
+        verify_signed_xml(signed, self.cert_data.certificate)
+        self.assertEqual(self.cert_data.usage_count, 1)
+
+    def test_signed_info_c14n_survives_serialization(self):
+        # Lo que firma el firmador (árbol en memoria) == lo que canonicaliza
+        # quien verifica tras parsear los bytes enviados
+        _, _, signed_info_c14n = self.signer.prepare(self.unsigned, SIGNING_TIME, GOLDEN_IDS)
+        reparsed = etree.fromstring(_fixture('factura_signed.golden.xml'))
+
+        self.assertEqual(signed_info_c14n, _c14n(reparsed.find('ds:Signature/ds:SignedInfo', NS)))
+        self.assertTrue(signed_info_c14n.startswith(
+            f'<ds:SignedInfo xmlns:ds="{DS_NS}" xmlns:etsi="{ETSI_NS}" Id="{GOLDEN_IDS["signed_info"]}">'.encode()
+        ))
+
+    def test_tampered_document_fails_digest(self):
+        signed = _fixture('factura_signed.golden.xml').replace(
+            b'<importeTotal>23.00</importeTotal>', b'<importeTotal>2.30</importeTotal>'
+        )
+
+        with self.assertRaisesMessage(AssertionError, '#comprobante'):
+            verify_signed_xml(signed)
+
+    def test_altered_signature_value_fails(self):
+        root = etree.fromstring(self.signer.sign(self.unsigned))
+        signature_value = root.find('ds:Signature/ds:SignatureValue', NS)
+        signature_value.text = base64.b64encode(
+            self.cert_data.private_key.sign(b'otro contenido', padding.PKCS1v15(), hashes.SHA1())
+        ).decode('ascii')
+
+        with self.assertRaises(InvalidSignature):
+            verify_signed_xml(etree.tostring(root), self.cert_data.certificate)
+
+    def test_invalid_xml_raises(self):
+        with self.assertRaises(XAdESSignerError):
+            self.signer.sign(b'<factura><sin-cerrar></factura>')
+
+
+class XAdESSignerJarCompatibilityTests(SimpleTestCase):
+    """
+    Firmas del JAR oficial en fixtures/jar/: con los mismos IDs, SigningTime y
+    certificado, el firmador debe producir exactamente el mismo C14N de
+    SignedInfo (RSA PKCS#1 v1.5 es determinista: misma firma). Solo usa datos
+    públicos, así que no hace falta la clave privada del certificado del JAR.
+    """
+
+    def _jar_samples(self):
+        if not os.path.isdir(JAR_FIXTURES_DIR):
+            return []
+        return sorted(
+            os.path.join(JAR_FIXTURES_DIR, name)
+            for name in os.listdir(JAR_FIXTURES_DIR)
+            if name.endswith('.xml')
+        )
+
+    @staticmethod
+    def _ids_from(signature):
+        signed_info = signature.find('ds:SignedInfo', NS)
+        references = signed_info.findall('ds:Reference', NS)
+        return {
+            'signature': signature.get('Id'),
+            'signed_info': signed_info.get('Id'),
+            'signed_properties': references[0].get('URI')[1:],
+            'signed_properties_ref': references[0].get('Id'),
+            'certificate': signature.find('ds:KeyInfo', NS).get('Id'),
+            'reference': references[2].get('Id'),
+            'signature_value': signature.find('ds:SignatureValue', NS).get('Id'),
+            'object': signature.find('ds:Object', NS).get('Id'),
+        }
+
+    def _prepare_like_jar(self, jar_root, cert_data=None):
+        """Firma del firmador nativo con los IDs, hora y certificado de la firma del JAR."""
+        jar_signature = jar_root.find('ds:Signature', NS)
+        if cert_data is None:
+            der = base64.b64decode(jar_signature.findtext('ds:KeyInfo/ds:X509Data/ds:X509Certificate', namespaces=NS))
+            cert_data = _cert_data(x509.load_der_x509_certificate(der))
+        signing_time = datetime.fromisoformat(jar_signature.findtext('.//etsi:SigningTime', namespaces=NS))
+        signer = XAdESBESSigner(cert_data)
+        unsigned = etree.tostring(_without_signature(jar_root), encoding='utf-8')
+        return signer, unsigned, signing_time, self._ids_from(jar_signature)
+
+    def assert_matches_jar(self, jar_signed):
+        jar_root = verify_signed_xml(jar_signed)
+        jar_signature = jar_root.find('ds:Signature', NS)
+        signer, unsigned, signing_time, ids = self._prepare_like_jar(jar_root)
+
+        _, signature, signed_info_c14n = signer.prepare(unsigned, signing_time, ids)
+
+        for xpath in ('ds:Object/etsi:QualifyingProperties/etsi:SignedProperties', 'ds:KeyInfo'):
+            self.assertEqual(_c14n(signature.find(xpath, NS)), _c14n(jar_signature.find(xpath, NS)), xpath)
+        self.assertEqual(signed_info_c14n, _c14n(jar_signature.find('ds:SignedInfo', NS)))
+
+    def test_signed_info_c14n_matches_jar_output(self):
+        samples = self._jar_samples()
+        if not samples:
+            self.skipTest('Sin comprobantes firmados por el JAR en fixtures/jar/')
+
+        for path in samples:
+            with self.subTest(sample=os.path.basename(path)):
+                with open(path, 'rb') as f:
+                    self.assert_matches_jar(f.read())
+
+    def test_signed_document_matches_live_jar_output(self):
+        if not jar_available():
+            self.skipTest('Sin java o sin SRI_SIGNING_JAR_PATH en este entorno')
+
+        unsigned = _fixture('factura_unsigned.xml')
+        with tempfile.TemporaryDirectory() as work_dir:
+            jar_signed = sign_with_jar(write_test_p12(work_dir), TEST_P12_PASSWORD, unsigned, timeout=120)
+
+        self.assert_matches_jar(jar_signed)
+
+        # Con la clave privada la firma RSA PKCS#1 v1.5 también es reproducible:
+        # el documento firmado completo debe coincidir en C14N
+        jar_root = etree.fromstring(jar_signed)
+        self.assertEqual(_c14n(_without_signature(jar_root)), _c14n(etree.fromstring(unsigned)))
+        signer, _, signing_time, ids = self._prepare_like_jar(jar_root, _cert_data())
+        ours = etree.fromstring(signer.sign(unsigned, signing_time, ids))
+        self.assertEqual(_c14n(ours), _c14n(jar_root))
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del generador XML en streaming frente a la salida anterior
+apps/sri_integration/tests/test_xml_generator.py
+
+fixtures/factura_minidom.xml es la factura de `_invoice(3)` tal como la
+generaba el generador anterior (ElementTree + minidom.toprettyxml, con
+sangría y saltos de línea entre elementos).
+"""
+
+import datetime
+import os
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, override_settings
+from lxml import etree
+
+from apps.sri_integration.services.xml_generator import XMLGeneratorSRI2025
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+class _Related:
+    """Imita el related manager (exists / all) sobre una lista."""
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def exists(self):
+        return bool(self.objects)
+
+    def all(self):
+        return self.objects
+
+
+def _invoice(items):
+    sri_config = SimpleNamespace(
+        establishment_code='001', emission_point='002', environment='TEST',
+        special_taxpayer=False, accounting_required=True,
+    )
+    company = SimpleNamespace(
+        business_name='ACME S.A.', ruc='1790012345001', trade_name='ACME',
+        address='Av. 1', sri_configuration=sri_config,
+    )
+    detail = [
+        SimpleNamespace(
+            main_code=f'P{index}', auxiliary_code='', description=f'Producto {index} & <x>',
+            quantity=Decimal('2'), unit_price=Decimal('1.50'), discount=Decimal('0'),
+            subtotal=Decimal('3.00'), additional_details=None,
+            taxes=_Related([SimpleNamespace(
+                tax_code='2', percentage_code='4', rate=Decimal('15'),
+                taxable_base=Decimal('3.00'), tax_amount=Decimal('0.45'),
+            )]),
+        )
+        for index in range(items)
+    ]
+    return SimpleNamespace(
+        id=1, company=company, access_key='1' * 49, document_number='001-002-000000123',
+        issue_date=datetime.date(2026, 10, 16), customer_identification_type='05',
+        customer_name='Cliente', customer_identification='1712345678', customer_address='Quito',
+        subtotal_without_tax=Decimal('3') * items, total_discount=0, total_amount=Decimal('3.45') * items,
+        total_tax=Decimal('0.45') * items, currency='DOLAR', items=_Related(detail), taxes=_Related([]),
+        payment_methods=_Related([]), additional_data={'a': 'b'}, customer_email='a@b.ec',
+        customer_phone='0999999999', observations='',
+    )
+
+
+def _c14n(xml, remove_blank_text=False):
+    parser = etree.XMLParser(remove_blank_text=remove_blank_text)
+    return etree.tostring(etree.fromstring(xml.encode('utf-8'), parser), method='c14n')
+
+
+@override_settings(SRI_VALIDATE_XML_SCHEMA=False)
+class StreamedXMLCompatibilityTests(SimpleTestCase):
+
+    def setUp(self):
+        with open(os.path.join(FIXTURES_DIR, 'factura_minidom.xml'), encoding='utf-8') as f:
+            self.previous = f.read()
+        self.streamed = XMLGeneratorSRI2025(_invoice(3)).generate_invoice_xml()
+
+    def test_same_c14n_once_indentation_is_dropped(self):
+        self.assertEqual(_c14n(self.streamed, remove_blank_text=True), _c14n(self.previous, remove_blank_text=True))
+
+    def test_plain_c14n_differs_only_by_indentation(self):
+        # La sangría de minidom son nodos de texto que C14N conserva: la salida
+        # compacta NO es idéntica en C14N (ni en digest) a la anterior
+        self.assertNotEqual(_c14n(self.streamed), _c14n(self.previous))
+        self.assertEqual(_c14n(self.streamed), _c14n(self.streamed, remove_blank_text=True))
+
+    def test_streamed_output_is_compact_utf8(self):
+        self.assertTrue(self.streamed.startswith("<?xml version='1.0' encoding='UTF-8'?>\n<factura "))
+        self.assertNotIn('>\n', self.streamed.split('\n', 1)[1])
+        self.assertIn('Producto 0 &amp; &lt;x&gt;', self.streamed)
+
+    def test_bytes_output_is_the_serialized_document(self):
+        xml_bytes = XMLGeneratorSRI2025(_invoice(3)).generate_invoice_xml(as_bytes=True)
+
+        self.assertIsInstance(xml_bytes, bytes)
+        self.assertFalse(xml_bytes.startswith(b'\xef\xbb\xbf'))
+        self.assertEqual(xml_bytes.decode('utf-8'), self.streamed)
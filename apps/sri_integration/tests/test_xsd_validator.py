@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la validación XSD de comprobantes
+apps/sri_integration/tests/test_xsd_validator.py
+
+Usa fixtures/xsd/factura_V1.1.0.xsd, un esquema reducido de factura (los XSD
+oficiales del SRI no se incluyen en el repositorio).
+"""
+
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from lxml import etree
+
+from apps.companies.models import Company
+from apps.sri_integration.checks import check_xsd_schemas
+from apps.sri_integration.models import DocumentItem, ElectronicDocument, SRIConfiguration
+from apps.sri_integration.services import xsd_validator
+from apps.sri_integration.services.document_processor import DocumentProcessor
+from apps.sri_integration.services.xsd_validator import (
+    XSDSchemaMissingError,
+    XSDValidationError,
+    get_schema,
+    preload_schemas,
+    validate_comprobante,
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+XSD_DIR = os.path.join(FIXTURES_DIR, 'xsd')
+XMLDSIG_STUB = (
+    '<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+    'targetNamespace="http://www.w3.org/2000/09/xmldsig#"/>'
+)
+
+
+def _factura():
+    with open(os.path.join(FIXTURES_DIR, 'factura_unsigned.xml'), 'rb') as f:
+        return f.read()
+
+
+class XSDValidatorTests(SimpleTestCase):
+
+    def setUp(self):
+        xsd_validator.clear_schema_cache()
+        self.addCleanup(xsd_validator.clear_schema_cache)
+
+    @override_settings(SRI_XSD_DIR=XSD_DIR)
+    def test_valid_factura_has_no_errors(self):
+        self.assertEqual(validate_comprobante(_factura()), [])
+
+    @override_settings(SRI_XSD_DIR=XSD_DIR)
+    def test_invalid_factura_reports_structured_errors(self):
+        xml = _factura().replace(
+            b'<claveAcceso>1510202601179001234500110010010000001231234567818</claveAcceso>',
+            b'<claveAcceso>123</claveAcceso>',
+        ).replace(b'<cantidad>2.000000</cantidad>', b'<cantidad>dos</cantidad>')
+
+        errors = validate_comprobante(xml)
+
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(errors[0]['line'], 9)
+        self.assertIn('claveAcceso', errors[0]['message'])
+        self.assertEqual(errors[0]['path'], '/factura/infoTributaria/claveAcceso')
+        self.assertIn('cantidad', errors[1]['message'])
+        self.assertEqual(set(errors[0]), {'line', 'column', 'path', 'type', 'message'})
+
+    @override_settings(SRI_XSD_DIR=XSD_DIR)
+    def test_missing_required_element(self):
+        root = etree.fromstring(_factura())
+        root.remove(root.find('detalles'))
+
+        errors = validate_comprobante(root)
+
+        self.assertEqual(len(errors), 1)
+        self.assertIn('detalles', errors[0]['message'])
+        exception = XSDValidationError('factura', errors)
+        self.assertIn('factura_V1.1.0.xsd', str(exception))
+
+    @override_settings(SRI_XSD_DIR=XSD_DIR)
+    def test_malformed_xml_raises_syntax_error(self):
+        with self.assertRaises(etree.XMLSyntaxError):
+            validate_comprobante(b'<factura><infoTributaria></factura>')
+
+    @override_settings(SRI_XSD_DIR=XSD_DIR)
+    def test_type_without_official_schema_is_not_validated(self):
+        self.assertEqual(validate_comprobante(b'<guiaRemision id="comprobante"/>'), [])
+
+    def test_missing_schema_fails_loudly_and_is_not_cached(self):
+        empty_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, empty_dir)
+
+        with self.settings(SRI_XSD_DIR=empty_dir):
+            with self.assertRaisesMessage(XSDSchemaMissingError, 'factura_V1.1.0.xsd'):
+                validate_comprobante(_factura())
+            self.assertNotIn('factura', xsd_validator._schemas)
+
+            # Instalado después: se toma sin reiniciar el proceso
+            shutil.copy(os.path.join(XSD_DIR, 'factura_V1.1.0.xsd'), empty_dir)
+            self.assertEqual(validate_comprobante(_factura()), [])
+            self.assertIs(get_schema('factura'), xsd_validator._schemas['factura'])
+
+    def test_broken_schema_fails_loudly(self):
+        broken_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, broken_dir)
+        with open(os.path.join(broken_dir, 'factura_V1.1.0.xsd'), 'w') as f:
+            f.write('<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema"><xsd:element/></xsd:schema>')
+
+        with self.settings(SRI_XSD_DIR=broken_dir):
+            with self.assertRaisesMessage(XSDSchemaMissingError, 'no compila'):
+                get_schema('factura')
+
+    @override_settings(SRI_XSD_DIR=XSD_DIR)
+    def test_preload_returns_only_installed_schemas(self):
+        self.assertEqual(preload_schemas(), ['factura'])
+
+
+@override_settings(SRI_VALIDATE_XML_SCHEMA=True)
+class DocumentProcessorSchemaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(
+            ruc='1790012345001',
+            business_name='COMERCIAL ANDINA S.A.',
+            email='facturas@andina.ec',
+            address='Av. Amazonas N24-03 y Colón',
+        )
+        SRIConfiguration.objects.update_or_create(
+            company=cls.company,
+            defaults={'validate_xml_schema': True},
+        )
+        cls.document = ElectronicDocument.objects.create(
+            company=cls.company,
+            document_type='INVOICE',
+            issue_date=datetime.date(2026, 10, 15),
+            customer_identification_type='05',
+            customer_identification='1712345678',
+            customer_name='José Pérez',
+            subtotal_without_tax=Decimal('3.00'),
+            total_tax=Decimal('0.45'),
+            total_amount=Decimal('3.45'),
+        )
+        DocumentItem.objects.create(
+            document=cls.document,
+            main_code='P001',
+            description='Producto',
+            quantity=Decimal('2'),
+            unit_price=Decimal('1.50'),
+            discount=Decimal('0'),
+            subtotal=Decimal('3.00'),
+        )
+
+    def setUp(self):
+        xsd_validator.clear_schema_cache()
+        self.addCleanup(xsd_validator.clear_schema_cache)
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+
+    def test_missing_schema_is_reported_as_schema_missing(self):
+        empty_dir = self.enterContext(tempfile.TemporaryDirectory())
+
+        with self.settings(SRI_XSD_DIR=empty_dir):
+            ok, message = DocumentProcessor(self.company)._generate_xml(self.document)
+
+        self.assertFalse(ok)
+        self.assertTrue(message.startswith('XML_SCHEMA_MISSING:'), message)
+        self.assertIn('factura_V1.1.0.xsd', message)
+
+    def test_schema_errors_are_reported_and_stored(self):
+        strict_dir = self.enterContext(tempfile.TemporaryDirectory())
+        with open(os.path.join(XSD_DIR, 'factura_V1.1.0.xsd')) as f:
+            schema = f.read()
+        # Exige un elemento que el generador no emite
+        with open(os.path.join(strict_dir, 'factura_V1.1.0.xsd'), 'w') as f:
+            f.write(schema.replace('element name="infoTributaria"', 'element name="infoTributariaX"'))
+
+        with self.settings(SRI_XSD_DIR=strict_dir):
+            ok, message = DocumentProcessor(self.company)._generate_xml(self.document)
+
+        self.assertFalse(ok)
+        self.assertTrue(message.startswith('XML_SCHEMA_ERROR:'), message)
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.status, 'ERROR')
+        self.assertEqual(self.document.sri_response['estado'], 'XSD_INVALIDO')
+
+
+class InstallXSDTests(SimpleTestCase):
+
+    def setUp(self):
+        xsd_validator.clear_schema_cache()
+        self.addCleanup(xsd_validator.clear_schema_cache)
+        self.target = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(SRI_XSD_DIR=self.target))
+        # Como en el .zip del SRI: XSD en una subcarpeta
+        self.source = self.enterContext(tempfile.TemporaryDirectory())
+        os.makedirs(os.path.join(self.source, 'XSD'))
+        shutil.copy(os.path.join(XSD_DIR, 'factura_V1.1.0.xsd'), os.path.join(self.source, 'XSD'))
+        with open(os.path.join(self.source, 'XSD', 'xmldsig-core-schema.xsd'), 'w') as f:
+            f.write(XMLDSIG_STUB)
+
+    def call(self, *args):
+        out = io.StringIO()
+        call_command('install_sri_xsd', *args, stdout=out)
+        return out.getvalue()
+
+    def test_incomplete_set_is_refused(self):
+        with self.assertRaisesMessage(CommandError, 'notaCredito_V1.1.0.xsd'):
+            self.call(self.source)
+        self.assertEqual(os.listdir(self.target), [])
+
+    def test_partial_install_from_zip_compiles_schemas(self):
+        archive_path = os.path.join(self.source, 'xsd.zip')
+        with zipfile.ZipFile(archive_path, 'w') as archive:
+            for name in os.listdir(os.path.join(self.source, 'XSD')):
+                archive.write(os.path.join(self.source, 'XSD', name), f'XSD/{name}')
+
+        output = self.call(archive_path, '--allow-partial')
+
+        self.assertIn('✅ factura_V1.1.0.xsd', output)
+        self.assertEqual(sorted(os.listdir(self.target)), ['factura_V1.1.0.xsd', 'xmldsig-core-schema.xsd'])
+        self.assertEqual(validate_comprobante(_factura()), [])
+
+    def test_schema_that_does_not_compile_fails(self):
+        with open(os.path.join(self.source, 'XSD', 'factura_V1.1.0.xsd'), 'w') as f:
+            f.write('<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema"><xsd:element/></xsd:schema>')
+
+        with self.assertRaisesMessage(CommandError, 'no compila'):
+            self.call(self.source, '--allow-partial')
+
+
+class XSDSystemCheckTests(SimpleTestCase):
+
+    def test_missing_schemas_are_reported_when_validation_is_on(self):
+        empty_dir = self.enterContext(tempfile.TemporaryDirectory())
+
+        with self.settings(SRI_VALIDATE_XML_SCHEMA=True, SRI_XSD_DIR=empty_dir):
+            warnings = check_xsd_schemas(None)
+
+        self.assertEqual([warning.id for warning in warnings], ['sri_integration.W001'])
+        self.assertIn('factura_V1.1.0.xsd', warnings[0].msg)
+        self.assertIn('install_sri_xsd', warnings[0].hint)
+
+    def test_no_warning_when_validation_is_off(self):
+        empty_dir = self.enterContext(tempfile.TemporaryDirectory())
+
+        with self.settings(SRI_VALIDATE_XML_SCHEMA=False, SRI_XSD_DIR=empty_dir):
+            self.assertEqual(check_xsd_schemas(None), [])
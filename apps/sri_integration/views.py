@@ -11,15 +11,18 @@ from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 from django.db import transaction, connection
-from django.http import HttpResponse, Http404, FileResponse, JsonResponse
+from django.http import HttpResponse, Http404, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_GET
 from django.core.cache import cache
+from .services.circuit_breaker import get_guard_states, is_sri_available
+from .services.xsd_validator import get_schema_status
+from .services.bulk_items import bulk_create_document_items
+from .storage import artifact_exists, artifact_response, artifact_size
 from celery.result import AsyncResult
 from celery.app.control import Control
 from celery import current_app
-import os
 import mimetypes
 import json
 import logging
@@ -28,7 +31,7 @@ from dateutil import parser
 
 from .models import (
     DebitNote, PurchaseSettlement, Retention, SRIConfiguration, ElectronicDocument, DocumentItem,
-    DocumentTax, SRIResponse, CreditNote
+    SRIResponse, CreditNote
 )
 from .serializers import (
     SRIConfigurationSerializer, ElectronicDocumentSerializer,
@@ -100,7 +103,6 @@ class ElectronicDocumentViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             try:
                 from django.utils import timezone
-                from decimal import Decimal, ROUND_HALF_UP
                 from apps.companies.models import Company
                 from django.conf import settings
                 
@@ -124,82 +126,26 @@ class ElectronicDocumentViewSet(viewsets.ModelViewSet):
                 sequence = sri_config.get_next_sequence("INVOICE")
                 document_number = sri_config.get_full_document_number("INVOICE", sequence)
                 
-                # Crear documento electrónico
-                document = ElectronicDocument.objects.create(
-                    company=company,
-                    document_type="INVOICE",
-                    document_number=document_number,
-                    issue_date=validated_data.get("issue_date", timezone.now().date()),
-                    customer_identification_type=validated_data["customer_identification_type"],
-                    customer_identification=validated_data["customer_identification"],
-                    customer_name=validated_data["customer_name"],
-                    customer_address=validated_data.get("customer_address", ""),
-                    customer_email=validated_data.get("customer_email", ""),
-                    customer_phone=validated_data.get("customer_phone", ""),
-                    status="DRAFT"
-                )
-                
-                # Función para redondear decimales correctamente
-                def fix_decimal_places(value, places=2):
-                    if isinstance(value, (int, float)):
-                        value = Decimal(str(value))
-                    elif isinstance(value, str):
-                        value = Decimal(value)
-                    quantizer = Decimal("0." + "0" * places)
-                    return value.quantize(quantizer, rounding=ROUND_HALF_UP)
-                
-                # Crear items
-                total_subtotal = Decimal("0.00")
-                total_tax = Decimal("0.00")
-                
-                for item_data in items_data:
-                    # Convertir a Decimal y calcular subtotal
-                    quantity = fix_decimal_places(Decimal(str(item_data["quantity"])), 6)
-                    unit_price = fix_decimal_places(Decimal(str(item_data["unit_price"])), 6)
-                    discount = fix_decimal_places(Decimal(str(item_data.get("discount", 0))), 2)
-                    
-                    # Calcular subtotal con redondeo correcto
-                    raw_subtotal = (quantity * unit_price) - discount
-                    subtotal = fix_decimal_places(raw_subtotal, 2)
-                    
-                    # Crear item
-                    item = DocumentItem.objects.create(
-                        document=document,
-                        main_code=item_data["main_code"],
-                        auxiliary_code=item_data.get("auxiliary_code", ""),
-                        description=item_data["description"],
-                        quantity=quantity,
-                        unit_price=unit_price,
-                        discount=discount,
-                        subtotal=subtotal
-                    )
-                    
-                    # Calcular impuesto (IVA 15% por defecto)
-                    tax_rate = Decimal("15.00")
-                    tax_amount = fix_decimal_places(subtotal * tax_rate / 100, 2)
-                    
-                    # Crear impuesto
-                    DocumentTax.objects.create(
-                        document=document,
-                        item=item,
-                        tax_code="2",  # IVA
-                        percentage_code="2",  # 15%
-                        rate=tax_rate,
-                        taxable_base=subtotal,
-                        tax_amount=tax_amount
+                # Documento, items, impuestos y totales en una sola transacción
+                with transaction.atomic():
+                    document = ElectronicDocument.objects.create(
+                        company=company,
+                        document_type="INVOICE",
+                        document_number=document_number,
+                        issue_date=validated_data.get("issue_date", timezone.now().date()),
+                        customer_identification_type=validated_data["customer_identification_type"],
+                        customer_identification=validated_data["customer_identification"],
+                        customer_name=validated_data["customer_name"],
+                        customer_address=validated_data.get("customer_address", ""),
+                        customer_email=validated_data.get("customer_email", ""),
+                        customer_phone=validated_data.get("customer_phone", ""),
+                        status="DRAFT"
                     )
                     
-                    total_subtotal += subtotal
-                    total_tax += tax_amount
-                
-                # Actualizar totales del documento
-                total_amount = total_subtotal + total_tax
-                
-                document.subtotal_without_tax = fix_decimal_places(total_subtotal, 2)
-                document.total_tax = fix_decimal_places(total_tax, 2)
-                document.total_amount = fix_decimal_places(total_amount, 2)
-                document.status = "GENERATED"
-                document.save()
+                    # Crear items e impuestos en bloque y asignar totales (motor de impuestos)
+                    bulk_create_document_items(document, items_data)
+                    document.status = "GENERATED"
+                    document.save()
                 
                 # ===============================================
                 # NUEVA FUNCIONALIDAD: ENVÍO AUTOMÁTICO AL SRI
@@ -218,12 +164,10 @@ class ElectronicDocumentViewSet(viewsets.ModelViewSet):
                     try:
                         # Verificar circuit breaker si está habilitado
                         if circuit_breaker_enabled:
-                            circuit_key = f"sri_circuit_breaker_{company.id}"
-                            circuit_failures = cache.get(circuit_key, 0)
-                            circuit_threshold = getattr(settings, 'SRI_CIRCUIT_BREAKER_FAILURE_THRESHOLD', 5)
+                            sri_environment = getattr(getattr(company, 'sri_configuration', None), 'environment', 'TEST')
                             
-                            if circuit_failures >= circuit_threshold:
-                                logger.warning(f"Circuit breaker abierto para empresa {company.id} - {circuit_failures} fallas")
+                            if not is_sri_available(sri_environment, 'reception'):
+                                logger.warning(f"Circuit breaker abierto para SRI {sri_environment} (empresa {company.id})")
                                 response_serializer = ElectronicDocumentSerializer(document)
                                 response_data = response_serializer.data
                                 response_data.update({
@@ -307,11 +251,6 @@ class ElectronicDocumentViewSet(viewsets.ModelViewSet):
                                 if success:
                                     logger.info(f"✅ Documento {document.id} procesado automáticamente - Status: {document.status}")
                                     
-                                    # Actualizar circuit breaker en caso de éxito
-                                    if circuit_breaker_enabled:
-                                        circuit_key = f"sri_circuit_breaker_{company.id}"
-                                        cache.delete(circuit_key)
-                                    
                                     # Serializar respuesta con información del procesamiento
                                     response_serializer = ElectronicDocumentSerializer(document)
                                     response_data = response_serializer.data
@@ -329,13 +268,6 @@ class ElectronicDocumentViewSet(viewsets.ModelViewSet):
                                 else:
                                     logger.warning(f"⚠️ Auto-envío síncrono falló para documento {document.id}: {message}")
                                     
-                                    # Incrementar circuit breaker si está habilitado
-                                    if circuit_breaker_enabled:
-                                        circuit_key = f"sri_circuit_breaker_{company.id}"
-                                        circuit_failures = cache.get(circuit_key, 0) + 1
-                                        recovery_timeout = getattr(settings, 'SRI_CIRCUIT_BREAKER_RECOVERY_TIMEOUT', 60)
-                                        cache.set(circuit_key, circuit_failures, timeout=recovery_timeout)
-                                    
                                     # Intentar reintento automático si está habilitado
                                     auto_retry = getattr(settings, 'SRI_AUTO_RETRY_FAILED', True)
                                     if auto_retry:
@@ -373,13 +305,6 @@ class ElectronicDocumentViewSet(viewsets.ModelViewSet):
                     except Exception as e:
                         logger.error(f"❌ Error en auto-procesamiento de documento {document.id}: {str(e)}")
                         
-                        # Incrementar circuit breaker
-                        if circuit_breaker_enabled:
-                            circuit_key = f"sri_circuit_breaker_{company.id}"
-                            circuit_failures = cache.get(circuit_key, 0) + 1
-                            recovery_timeout = getattr(settings, 'SRI_CIRCUIT_BREAKER_RECOVERY_TIMEOUT', 60)
-                            cache.set(circuit_key, circuit_failures, timeout=recovery_timeout)
-                        
                         # Devolver la factura creada pero con error de envío
                         response_serializer = ElectronicDocumentSerializer(document)
                         response_data = response_serializer.data
@@ -932,22 +857,13 @@ class ElectronicDocumentViewSet(viewsets.ModelViewSet):
         except:
             pass
         
-        # Verificar circuit breaker si está disponible
+        # Estado del circuit breaker compartido por endpoint del SRI
         circuit_breaker_status = {}
-        if hasattr(request.user, 'company') or request.user.is_authenticated:
-            try:
-                user_companies = get_user_companies_secure(request.user)
-                for company in user_companies:
-                    circuit_key = f"sri_circuit_breaker_{company.id}"
-                    circuit_failures = cache.get(circuit_key, 0)
-                    circuit_threshold = getattr(settings, 'SRI_CIRCUIT_BREAKER_FAILURE_THRESHOLD', 5)
-                    circuit_breaker_status[f"company_{company.id}"] = {
-                        'failures': circuit_failures,
-                        'threshold': circuit_threshold,
-                        'is_open': circuit_failures >= circuit_threshold
-                    }
-            except:
-                pass
+        try:
+            for guard_state in get_guard_states():
+                circuit_breaker_status[f"{guard_state['environment']}_{guard_state['service']}"] = guard_state
+        except Exception:
+            pass
         
         return Response({
             "auto_send_configuration": {
@@ -984,6 +900,7 @@ class ElectronicDocumentViewSet(viewsets.ModelViewSet):
             "validation": {
                 "pre_validation": getattr(settings, 'SRI_PRE_VALIDATION', True),
                 "validate_xml_schema": getattr(settings, 'SRI_VALIDATE_XML_SCHEMA', True),
+                "xml_schemas": get_schema_status(),
                 "validate_business_rules": getattr(settings, 'SRI_VALIDATE_BUSINESS_RULES', True)
             },
             "backup_and_cleanup": {
@@ -1025,12 +942,10 @@ class ElectronicDocumentViewSet(viewsets.ModelViewSet):
             circuit_breaker_enabled = getattr(settings, 'SRI_CIRCUIT_BREAKER_ENABLED', True)
             
             if circuit_breaker_enabled:
-                circuit_key = f"sri_circuit_breaker_{document.company.id}"
-                circuit_failures = cache.get(circuit_key, 0)
-                circuit_threshold = getattr(settings, 'SRI_CIRCUIT_BREAKER_FAILURE_THRESHOLD', 5)
+                sri_environment = getattr(getattr(document.company, 'sri_configuration', None), 'environment', 'TEST')
                 
-                if circuit_failures >= circuit_threshold:
-                    logger.warning(f"Manual processing blocked by circuit breaker for company {document.company.id}")
+                if not is_sri_available(sri_environment, 'reception'):
+                    logger.warning(f"Manual processing blocked by circuit breaker for SRI {sri_environment}")
                     return Response({
                         "success": False,
                         "message": "Manual processing temporarily disabled due to multiple recent failures",
@@ -1038,7 +953,6 @@ class ElectronicDocumentViewSet(viewsets.ModelViewSet):
                         "document_number": document.document_number,
                         "processing_method": "manual",
                         "circuit_breaker_open": True,
-                        "failures_count": circuit_failures,
                         "suggestion": "Wait a few minutes and try again, or contact support if the issue persists."
                     }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
             
@@ -1060,11 +974,6 @@ class ElectronicDocumentViewSet(viewsets.ModelViewSet):
                 )
                 
                 if success:
-                    # Limpiar circuit breaker en caso de éxito
-                    if circuit_breaker_enabled:
-                        circuit_key = f"sri_circuit_breaker_{document.company.id}"
-                        cache.delete(circuit_key)
-                    
                     logger.info(f"✅ Manual processing successful for document {document.id}")
                     
                     return Response({
@@ -1085,13 +994,6 @@ class ElectronicDocumentViewSet(viewsets.ModelViewSet):
                         "processing_timestamp": timezone.now().isoformat()
                     })
                 else:
-                    # Incrementar circuit breaker en caso de falla
-                    if circuit_breaker_enabled:
-                        circuit_key = f"sri_circuit_breaker_{document.company.id}"
-                        circuit_failures = cache.get(circuit_key, 0) + 1
-                        recovery_timeout = getattr(settings, 'SRI_CIRCUIT_BREAKER_RECOVERY_TIMEOUT', 60)
-                        cache.set(circuit_key, circuit_failures, timeout=recovery_timeout)
-                    
                     logger.error(f"❌ Manual processing failed for document {document.id}: {message}")
                     
                     return Response({
@@ -1118,19 +1020,6 @@ class ElectronicDocumentViewSet(viewsets.ModelViewSet):
         except Exception as e:
             logger.error(f"Error in manual processing for document {pk}: {str(e)}")
             
-            # Incrementar circuit breaker incluso para errores inesperados
-            try:
-                if hasattr(self, 'get_object'):
-                    doc = self.get_object()
-                    circuit_breaker_enabled = getattr(settings, 'SRI_CIRCUIT_BREAKER_ENABLED', True)
-                    if circuit_breaker_enabled:
-                        circuit_key = f"sri_circuit_breaker_{doc.company.id}"
-                        circuit_failures = cache.get(circuit_key, 0) + 1
-                        recovery_timeout = getattr(settings, 'SRI_CIRCUIT_BREAKER_RECOVERY_TIMEOUT', 60)
-                        cache.set(circuit_key, circuit_failures, timeout=recovery_timeout)
-            except:
-                pass
-            
             return Response(
                 {
                     "success": False,
@@ -1312,8 +1201,8 @@ def download_document_pdf(request, document_id):
         
         # Verificar que el archivo existe físicamente
         try:
-            if not os.path.exists(files['pdf_file'].path):
-                logger.error(f"Archivo PDF no existe: {files['pdf_file'].path}")
+            if not artifact_exists(files['pdf_file']):
+                logger.error(f"Archivo PDF no existe: {files['pdf_file'].name}")
                 return JsonResponse({
                     'error': 'PDF_FILE_NOT_FOUND',
                     'message': 'El archivo PDF no se encuentra en el servidor'
@@ -1337,12 +1226,7 @@ def download_document_pdf(request, document_id):
         filename = f"{files['document_number']}_{type_name}_{files['status'].lower()}.pdf"
         
         # Servir archivo
-        response = FileResponse(
-            files['pdf_file'].open('rb'),
-            as_attachment=True,
-            filename=filename,
-            content_type='application/pdf'
-        )
+        response = artifact_response(request, files['pdf_file'], filename, 'application/pdf')
         
         logger.info(f"Usuario {request.user.username} descargó PDF del {type_name} {document_id} en estado {files['status']}")
         return response
@@ -1399,8 +1283,8 @@ def download_document_xml(request, document_id):
         
         # Verificar que el archivo existe físicamente
         try:
-            if not os.path.exists(xml_file.path):
-                logger.error(f"Archivo XML no existe: {xml_file.path}")
+            if not artifact_exists(xml_file):
+                logger.error(f"Archivo XML no existe: {xml_file.name}")
                 return JsonResponse({
                     'error': 'XML_FILE_NOT_FOUND',
                     'message': 'El archivo XML no se encuentra en el servidor'
@@ -1424,12 +1308,7 @@ def download_document_xml(request, document_id):
         filename = f"{files['document_number']}_{type_name}_{filename_prefix}.xml"
         
         # Servir archivo
-        response = FileResponse(
-            xml_file.open('rb'),
-            as_attachment=True,
-            filename=filename,
-            content_type='application/xml'
-        )
+        response = artifact_response(request, xml_file, filename, 'application/xml')
         
         logger.info(f"Usuario {request.user.username} descargó XML del {type_name} {document_id}")
         return response
@@ -1492,9 +1371,9 @@ def check_document_files(request, document_id):
         # Verificar PDF
         if files['pdf_file']:
             try:
-                if os.path.exists(files['pdf_file'].path):
+                if artifact_exists(files['pdf_file']):
                     file_status['files']['pdf']['exists'] = True
-                    file_status['files']['pdf']['size'] = os.path.getsize(files['pdf_file'].path)
+                    file_status['files']['pdf']['size'] = artifact_size(files['pdf_file'])
                     # CAMBIO: Permitir descarga en más estados
                     file_status['files']['pdf']['downloadable'] = files['status'] in pdf_valid_states
             except (AttributeError, ValueError, OSError):
@@ -1504,9 +1383,9 @@ def check_document_files(request, document_id):
         xml_to_check = files['signed_xml_file'] or files['xml_file']
         if xml_to_check:
             try:
-                if os.path.exists(xml_to_check.path):
+                if artifact_exists(xml_to_check):
                     file_status['files']['xml']['exists'] = True
-                    file_status['files']['xml']['size'] = os.path.getsize(xml_to_check.path)
+                    file_status['files']['xml']['size'] = artifact_size(xml_to_check)
                     file_status['files']['xml']['downloadable'] = files['status'] in xml_valid_states
             except (AttributeError, ValueError, OSError):
                 pass
@@ -49,6 +49,10 @@ app.conf.update(
             'queue': 'sri_authorization',
             'routing_key': 'sri.authorization',
         },
+        'apps.sri_integration.tasks.finalize_document_async': {
+            'queue': 'sri_authorization',
+            'routing_key': 'sri.authorization',
+        },
         'apps.sri_integration.tasks.process_document_async': {
             'queue': 'sri_processing',
             'routing_key': 'sri.processing',
@@ -73,10 +77,18 @@ app.conf.update(
             'queue': 'sri_maintenance',
             'routing_key': 'sri.maintenance',
         },
+        'apps.sri_integration.tasks.resume_parked_documents': {
+            'queue': 'sri_maintenance',
+            'routing_key': 'sri.maintenance',
+        },
         'apps.sri_integration.tasks.generate_daily_report': {
             'queue': 'sri_reports',
             'routing_key': 'sri.reports',
         },
+        'apps.api.tasks.flush_api_token_usage': {
+            'queue': 'sri_maintenance',
+            'routing_key': 'sri.maintenance',
+        },
     },
     
     # Configuración de colas
@@ -123,12 +135,26 @@ app.conf.update(
             'options': {'queue': 'sri_maintenance'}
         },
         
+        # Reenviar documentos aparcados por circuito abierto cada minuto
+        'resume-parked-documents': {
+            'task': 'apps.sri_integration.tasks.resume_parked_documents',
+            'schedule': 60.0,  # 1 minuto (solo actúa con el circuito cerrado)
+            'options': {'queue': 'sri_maintenance'}
+        },
+        
         # Generar reporte diario a las 23:00
         'generate-daily-report': {
             'task': 'apps.sri_integration.tasks.generate_daily_report',
             'schedule': 86400.0,  # 24 horas
             'options': {'queue': 'sri_reports'}
         },
+        
+        # Volcar estadísticas de uso de tokens de empresa cada minuto
+        'flush-api-token-usage': {
+            'task': 'apps.api.tasks.flush_api_token_usage',
+            'schedule': 60.0,  # 1 minuto
+            'options': {'queue': 'sri_maintenance'}
+        },
     },
     
     # Configuración de timezone para beat
@@ -311,7 +311,8 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_THROTTLE_CLASSES": [
         "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle"
+        "apps.api.throttling.UserTokenRateThrottle",
+        "apps.api.throttling.CompanyTokenRateThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
         "anon": config('API_THROTTLE_ANON', default='100/day'),
@@ -395,6 +396,19 @@ SRI_AMBIENTE = config('SRI_AMBIENTE', default='1')  # 1=Pruebas, 2=Producción
 SRI_TIPO_EMISION = config('SRI_TIPO_EMISION', default='1')  # 1=Normal
 SRI_TIMEOUT = config('SRI_TIMEOUT', default=30, cast=int)
 
+# Motor de firma XAdES-BES: 'jar' (sidecar de JVMs calientes o java -jar /app/sri.jar) o
+# 'python' (en proceso). 'jar' hasta que test_signed_document_matches_live_jar_output
+# corra en CI contra una muestra firmada por el JAR (apps/sri_integration/tests/fixtures/jar)
+SRI_SIGNING_BACKEND = config('SRI_SIGNING_BACKEND', default='jar')
+SRI_SIGNING_JAR_PATH = config('SRI_SIGNING_JAR_PATH', default='/app/sri.jar')
+
+# Sidecar de firma con JVMs calientes (manage.py run_signing_daemon); vacío = subprocess del JAR
+SRI_SIGNING_DAEMON_SOCKET = config('SRI_SIGNING_DAEMON_SOCKET', default='')
+SRI_SIGNING_DAEMON_TIMEOUT = config('SRI_SIGNING_DAEMON_TIMEOUT', default=30, cast=int)
+SRI_SIGNING_DAEMON_WORKERS = config('SRI_SIGNING_DAEMON_WORKERS', default=2, cast=int)
+SRI_SIGNING_WORKER_CLASSPATH = config('SRI_SIGNING_WORKER_CLASSPATH', default='/opt/vendo_sri/jvm')
+SRI_SIGNING_WORK_DIR = config('SRI_SIGNING_WORK_DIR', default='')
+
 # URLs SRI según ambiente
 SRI_URLS = {
     '1': {  # Pruebas
@@ -411,6 +425,44 @@ SRI_URLS = {
     }
 }
 
+# Autorización no bloqueante: la petición termina tras RECIBIDA y Celery
+# completa autorización, PDF, email y consumo del plan
+SRI_ASYNC_AUTHORIZATION = config('SRI_ASYNC_AUTHORIZATION', default=True, cast=bool)
+
+# Consulta de autorizaciones en lote (check_all_pending_authorizations)
+SRI_AUTH_POLLER_WORKERS = config('SRI_AUTH_POLLER_WORKERS', default=16, cast=int)
+SRI_AUTH_POLLER_BATCH_SIZE = config('SRI_AUTH_POLLER_BATCH_SIZE', default=500, cast=int)
+
+# Transporte HTTP compartido por proceso (sri_transport.get_transport)
+# Pool dimensionado a la concurrencia del worker (hilos del poller incluidos)
+SRI_HTTP_POOL_MAXSIZE = config(
+    'SRI_HTTP_POOL_MAXSIZE',
+    default=max(SRI_AUTH_POLLER_WORKERS, config('CELERY_WORKER_CONCURRENCY', default=4, cast=int)),
+    cast=int
+)
+SRI_WSDL_CACHE_PATH = config('SRI_WSDL_CACHE_PATH', default=os.path.join(BASE_DIR, 'storage', 'cache', 'sri_wsdl.sqlite'))
+SRI_WSDL_CACHE_TIMEOUT = config('SRI_WSDL_CACHE_TIMEOUT', default=86400, cast=int)
+
+# Cliente asyncio (run_sri_async_worker): llamadas en vuelo por ambiente
+SRI_ASYNC_MAX_CONCURRENCY = config('SRI_ASYNC_MAX_CONCURRENCY', default=100, cast=int)
+
+# RIDE (PDF): plantillas por empresa cacheadas por proceso (bloque del emisor, logo)
+PDF_TEMPLATE_CACHE_SIZE = config('PDF_TEMPLATE_CACHE_SIZE', default=500, cast=int)
+
+# Almacén de artefactos (XML, XML firmado, RIDE): direccionado por contenido,
+# escritura atómica, XML comprimido (zstd si está instalado, si no gzip)
+SRI_ARTIFACT_STORE = config('SRI_ARTIFACT_STORE', default=True, cast=bool)
+SRI_ARTIFACT_COMPRESSION = config('SRI_ARTIFACT_COMPRESSION', default='zstd')  # zstd | gzip | none
+
+# Recepción en lote masivo (bulk_process_documents / retry_failed_documents)
+SRI_LOTE_ENABLED = config('SRI_LOTE_ENABLED', default=True, cast=bool)
+SRI_LOTE_MAX_BYTES = config('SRI_LOTE_MAX_BYTES', default=512000, cast=int)
+SRI_LOTE_MAX_DOCUMENTS = config('SRI_LOTE_MAX_DOCUMENTS', default=50, cast=int)
+# Reintentos de un lote ante 502/503/504 o timeout: backoff exponencial con jitter
+SRI_LOTE_MAX_ATTEMPTS = config('SRI_LOTE_MAX_ATTEMPTS', default=3, cast=int)
+SRI_LOTE_RETRY_BASE_DELAY = config('SRI_LOTE_RETRY_BASE_DELAY', default=2.0, cast=float)
+SRI_LOTE_RETRY_MAX_DELAY = config('SRI_LOTE_RETRY_MAX_DELAY', default=30.0, cast=float)
+
 # Configuración de timeouts para SRI
 SRI_TIMEOUTS = {
     'connection_timeout': config('SRI_CONNECTION_TIMEOUT', default=30, cast=int),
@@ -483,6 +535,7 @@ CELERY_WORKER_MAX_TASKS_PER_CHILD = config('CELERY_WORKER_MAX_TASKS_PER_CHILD',
 # Configuración de routing para tareas SRI
 CELERY_TASK_ROUTES = {
     'apps.sri_integration.tasks.check_document_authorization_async': {'queue': 'sri_authorization'},
+    'apps.sri_integration.tasks.finalize_document_async': {'queue': 'sri_authorization'},
     'apps.sri_integration.tasks.process_document_async': {'queue': 'sri_processing'},
     'apps.sri_integration.tasks.cleanup_expired_documents': {'queue': 'sri_maintenance'},
 }
@@ -505,12 +558,27 @@ CELERY_TASK_SEND_SENT_EVENT = config('CELERY_TASK_SEND_SENT_EVENT', default=True
 CERTIFICATE_CACHE_TIMEOUT = config('CERTIFICATE_CACHE_TIMEOUT', default=3600, cast=int)  # 1 hora
 MAX_CERTIFICATES_CACHE = config('MAX_CERTIFICATES_CACHE', default=1000, cast=int)
 CERTIFICATE_CLEANUP_INTERVAL = config('CERTIFICATE_CLEANUP_INTERVAL', default=300, cast=int)  # 5 minutos
+CERTIFICATE_LOAD_WAIT_TIMEOUT = config('CERTIFICATE_LOAD_WAIT_TIMEOUT', default=60, cast=int)  # Espera de hilos ante una carga en curso (segundos)
+
+# Almacén compartido de claves de firma (Redis): un cargador descifra cada P12
+# y los workers cargan el bundle cifrado en su caché local al primer uso
+CERTIFICATE_SHARED_KEYSTORE = config('CERTIFICATE_SHARED_KEYSTORE', default=True, cast=bool)
+# Clave(s) Fernet del almacén, separadas por comas (la primera cifra). Sin clave,
+# o con el SECRET_KEY por defecto, el almacén queda desactivado
+CERTIFICATE_KEYSTORE_KEY = config('CERTIFICATE_KEYSTORE_KEY', default='')
+CERTIFICATE_KEYSTORE_TTL = config('CERTIFICATE_KEYSTORE_TTL', default=86400, cast=int)  # 24 horas
+CERTIFICATE_KEYSTORE_LOCK_TIMEOUT = config('CERTIFICATE_KEYSTORE_LOCK_TIMEOUT', default=60, cast=int)
+CERTIFICATE_KEYSTORE_WAIT_TIMEOUT = config('CERTIFICATE_KEYSTORE_WAIT_TIMEOUT', default=15, cast=int)
 
 # Auto-precarga de certificados
 CERTIFICATE_AUTO_PRELOAD = config('CERTIFICATE_AUTO_PRELOAD', default=True, cast=bool)
 CERTIFICATE_AUTO_PRELOAD_DELAY = config('CERTIFICATE_AUTO_PRELOAD_DELAY', default=2, cast=int)
 CERTIFICATE_AUTO_CLEANUP = config('CERTIFICATE_AUTO_CLEANUP', default=True, cast=bool)
 
+# Warm-up paralelo de la caché de certificados al arrancar cada worker
+CERTIFICATE_WARMUP_WORKERS = config('CERTIFICATE_WARMUP_WORKERS', default=8, cast=int)
+CERTIFICATE_WARMUP_VOLUME_DAYS = config('CERTIFICATE_WARMUP_VOLUME_DAYS', default=30, cast=int)  # Ventana para ordenar por volumen
+
 # Configuración de validación de certificados
 CERTIFICATE_VALIDATION_RULES = {
     'min_days_before_expiration_warning': config('CERT_EXPIRATION_WARNING_DAYS', default=30, cast=int),
@@ -598,10 +666,18 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'apps.sri_integration.tasks.retry_failed_documents',
         'schedule': 7200.0,  # Cada 2 horas
     },
+    'resume-parked-documents': {
+        'task': 'apps.sri_integration.tasks.resume_parked_documents',
+        'schedule': 60.0,  # Cada minuto (solo actúa con el circuito cerrado)
+    },
     'generate-daily-report': {
         'task': 'apps.sri_integration.tasks.generate_daily_report',
         'schedule': crontab(hour=23, minute=30),  # Diario a las 11:30 PM
     },
+    'flush-api-token-usage': {
+        'task': 'apps.api.tasks.flush_api_token_usage',
+        'schedule': 60.0,  # Cada minuto
+    },
 }
 
 # ==========================================
@@ -756,8 +832,19 @@ SRI_QUEUE_BATCH_TIMEOUT = config('SRI_QUEUE_BATCH_TIMEOUT', default=300, cast=in
 
 # Configuración de validación previa al envío
 SRI_PRE_VALIDATION = config('SRI_PRE_VALIDATION', default=True, cast=bool)
+# Validación XSD antes de firmar. Requiere los XSD oficiales del SRI en SRI_XSD_DIR
+# (no se incluyen en el repositorio); instalarlos al desplegar con:
+#   python manage.py install_sri_xsd <carpeta o .zip de XSD de la ficha técnica del SRI>
+# Si falta uno, los comprobantes de ese tipo fallan (XML_SCHEMA_MISSING) en lugar de
+# emitirse sin validar, y `manage.py check` lo advierte (sri_integration.W001)
 SRI_VALIDATE_XML_SCHEMA = config('SRI_VALIDATE_XML_SCHEMA', default=True, cast=bool)
+# XSD oficiales del SRI (factura_V1.1.0.xsd, notaCredito_V1.1.0.xsd, ...) junto a xmldsig-core-schema.xsd
+SRI_XSD_DIR = config('SRI_XSD_DIR', default=os.path.join(BASE_DIR, 'storage', 'xsd'))
 SRI_VALIDATE_BUSINESS_RULES = config('SRI_VALIDATE_BUSINESS_RULES', default=True, cast=bool)
+# Código de porcentaje IVA para líneas sin impuesto explícito (4 = 15%)
+SRI_DEFAULT_IVA_PERCENTAGE_CODE = config('SRI_DEFAULT_IVA_PERCENTAGE_CODE', default='4')
+# Filas por INSERT en la creación masiva de ítems / impuestos
+SRI_BULK_BATCH_SIZE = config('SRI_BULK_BATCH_SIZE', default=500, cast=int)
 
 # Configuración de monitoreo y métricas
 SRI_METRICS_ENABLED = config('SRI_METRICS_ENABLED', default=True, cast=bool)
@@ -769,6 +856,26 @@ SRI_AUTO_BACKUP_DOCUMENTS = config('SRI_AUTO_BACKUP_DOCUMENTS', default=True, ca
 SRI_BACKUP_RETENTION_DAYS = config('SRI_BACKUP_RETENTION_DAYS', default=365, cast=int)
 SRI_COMPRESS_BACKUP_FILES = config('SRI_COMPRESS_BACKUP_FILES', default=True, cast=bool)
 
+# Retención de logs (SRIResponse usa cleanup_* de SRIConfiguration por empresa):
+# archivo mensual JSONL gzip + borrado por lotes keyset
+AUDIT_LOG_RETENTION_DAYS = config('AUDIT_LOG_RETENTION_DAYS', default=365, cast=int)
+CERTIFICATE_USAGE_LOG_RETENTION_DAYS = config('CERTIFICATE_USAGE_LOG_RETENTION_DAYS', default=90, cast=int)
+LOG_RETENTION_BATCH_SIZE = config('LOG_RETENTION_BATCH_SIZE', default=1000, cast=int)
+LOG_RETENTION_BATCH_PAUSE = config('LOG_RETENTION_BATCH_PAUSE', default=0.05, cast=float)  # segundos entre lotes
+LOG_ARCHIVE_ENABLED = config('LOG_ARCHIVE_ENABLED', default=True, cast=bool)
+LOG_ARCHIVE_DIR = config('LOG_ARCHIVE_DIR', default=os.path.join(BASE_DIR, 'archives', 'logs'))
+
+# Caché de tokens de empresa (vsr_) por proceso + uso con escritura diferida
+# (buffer local -> Redis -> BD con flush_api_token_usage)
+API_TOKEN_CACHE_TTL = config('API_TOKEN_CACHE_TTL', default=30, cast=int)  # segundos
+API_TOKEN_CACHE_MAX_SIZE = config('API_TOKEN_CACHE_MAX_SIZE', default=1000, cast=int)
+API_TOKEN_CACHE_SYNC_INTERVAL = config('API_TOKEN_CACHE_SYNC_INTERVAL', default=1.0, cast=float)  # consulta de invalidaciones en Redis
+API_TOKEN_USAGE_PUSH_INTERVAL = config('API_TOKEN_USAGE_PUSH_INTERVAL', default=1.0, cast=float)  # buffer local -> Redis
+API_TOKEN_USAGE_FLUSH_BATCH_SIZE = config('API_TOKEN_USAGE_FLUSH_BATCH_SIZE', default=500, cast=int)
+
+# Cuotas por token de empresa (requests_per_hour / requests_per_day) con GCRA en Redis
+API_RATE_LIMIT_ENABLED = config('API_RATE_LIMIT_ENABLED', default=True, cast=bool)
+
 # Configuración de integración con webhook
 SRI_WEBHOOK_ENABLED = config('SRI_WEBHOOK_ENABLED', default=False, cast=bool)
 SRI_WEBHOOK_URL = config('SRI_WEBHOOK_URL', default='')
@@ -779,6 +886,17 @@ SRI_WEBHOOK_TIMEOUT = config('SRI_WEBHOOK_TIMEOUT', default=30, cast=int)
 SRI_CIRCUIT_BREAKER_ENABLED = config('SRI_CIRCUIT_BREAKER_ENABLED', default=True, cast=bool)
 SRI_CIRCUIT_BREAKER_FAILURE_THRESHOLD = config('SRI_CIRCUIT_BREAKER_FAILURE_THRESHOLD', default=5, cast=int)
 SRI_CIRCUIT_BREAKER_RECOVERY_TIMEOUT = config('SRI_CIRCUIT_BREAKER_RECOVERY_TIMEOUT', default=60, cast=int)
+SRI_CIRCUIT_BREAKER_PROBE_TIMEOUT = config('SRI_CIRCUIT_BREAKER_PROBE_TIMEOUT', default=30, cast=int)
+
+# Rate limiter adaptativo compartido por endpoint del SRI (token bucket en Redis)
+SRI_RATE_LIMIT_ENABLED = config('SRI_RATE_LIMIT_ENABLED', default=True, cast=bool)
+SRI_RATE_LIMIT_INITIAL_RPS = config('SRI_RATE_LIMIT_INITIAL_RPS', default=20.0, cast=float)
+SRI_RATE_LIMIT_MIN_RPS = config('SRI_RATE_LIMIT_MIN_RPS', default=1.0, cast=float)
+SRI_RATE_LIMIT_MAX_RPS = config('SRI_RATE_LIMIT_MAX_RPS', default=50.0, cast=float)
+SRI_RATE_LIMIT_STEP_RPS = config('SRI_RATE_LIMIT_STEP_RPS', default=0.5, cast=float)
+SRI_RATE_LIMIT_BURST = config('SRI_RATE_LIMIT_BURST', default=20, cast=int)
+SRI_RATE_LIMIT_MAX_WAIT = config('SRI_RATE_LIMIT_MAX_WAIT', default=10, cast=int)
+SRI_RATE_LIMIT_SLOW_SECONDS = config('SRI_RATE_LIMIT_SLOW_SECONDS', default=10.0, cast=float)
 
 # ==========================================
 # DEVELOPMENT SETTINGS